@@ -12,6 +12,9 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 # --- Local Fallback ---
 # Use Supabase if URL and KEY are available, otherwise use local JSON
 LOCAL_JSON_DB = "pos_data.json"
+
+# SQLite file used by the desktop (SQLAlchemy) stack
+DB_FILENAME = "pos.db"
 USE_SUPABASE = bool(SUPABASE_URL and SUPABASE_KEY)
 USE_LOCAL_DB = not USE_SUPABASE
 
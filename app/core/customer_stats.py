@@ -0,0 +1,51 @@
+"""
+Lensy POS - Customer ledger
+Per-customer running totals (orders, amounts, balance, last visit and
+prescriptions), kept up to date by the writes that change them so the
+customer list never has to scan sales to show or sort by them.
+"""
+from app.core.payments import balance_due
+
+STAT_FIELDS = ("order_count", "total_net", "total_paid", "balance_due", "last_order_date", "rx_count")
+
+# Customer list orderings over the ledger: (field, descending)
+CUSTOMER_SORTS = {
+    "name": ("name", False),
+    "balance": ("balance_due", True),
+    "recent": ("last_order_date", True),
+}
+
+
+def empty_stats():
+    return {"order_count": 0, "total_net": 0.0, "total_paid": 0.0, "balance_due": 0.0,
+            "last_order_date": None, "rx_count": 0}
+
+
+def record_order(stats, sale):
+    """Count a new sale in its customer's stats."""
+    stats["order_count"] += 1
+    stats["total_net"] += float(sale.get("net_amount") or 0)
+    stats["total_paid"] += float(sale.get("amount_paid") or 0)
+    stats["balance_due"] += balance_due(sale)
+    order_date = sale.get("order_date")
+    if order_date and (stats["last_order_date"] is None or order_date > stats["last_order_date"]):
+        stats["last_order_date"] = order_date
+
+
+def record_payment(stats, old_paid, new_paid):
+    """Move a sale's amount_paid from old_paid to new_paid."""
+    delta = float(new_paid or 0) - float(old_paid or 0)
+    stats["total_paid"] += delta
+    stats["balance_due"] -= delta
+
+
+def build_customer_stats(sales, prescriptions):
+    """The ledger from scratch: {customer_id: stats} for every customer with a sale or prescription."""
+    ledger = {}
+    for sale in sales:
+        if sale.get("customer_id"):
+            record_order(ledger.setdefault(sale["customer_id"], empty_stats()), sale)
+    for prescription in prescriptions:
+        if prescription.get("customer_id"):
+            ledger.setdefault(prescription["customer_id"], empty_stats())["rx_count"] += 1
+    return ledger
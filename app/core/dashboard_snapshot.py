@@ -0,0 +1,187 @@
+"""
+Lensy POS - Dashboard snapshot
+The dashboard's KPIs and recent orders, computed by a background worker and
+published as an immutable snapshot, so opening the home route renders the
+latest figures at once instead of reading whole tables on the UI thread.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from app.core.events import SALE, CUSTOMER, PRODUCT, INSERT, DELETE
+
+# Seconds between refreshes when nothing wakes the worker sooner
+DEFAULT_REFRESH_INTERVAL = 60
+REFRESH_INTERVAL_SETTING = "dashboard_refresh_seconds"
+
+
+@dataclass(frozen=True)
+class RecentOrder:
+    id: str
+    invoice_no: str
+    customer_id: str    # None for a walk-in
+    customer_name: str
+    order_date: str
+    net_amount: float
+    lab_status: str
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    revenue: float = 0.0
+    balance: float = 0.0
+    orders: int = 0
+    pending: int = 0
+    customers: int = 0
+    products: int = 0
+    recent: tuple = ()       # RecentOrder, newest first
+    taken_at: float = None   # time.time() of the reads; None until the first refresh
+
+    @classmethod
+    def from_figures(cls, figures, taken_at=None):
+        """Build a snapshot from POSRepository.get_dashboard_stats()."""
+        recent = tuple(
+            RecentOrder(
+                id=str(s["id"]), invoice_no=s.get("invoice_no") or "",
+                customer_id=str(s["customer_id"]) if s.get("customer_id") is not None else None,
+                customer_name=s.get("customer_name"),
+                order_date=str(s.get("order_date") or ""), net_amount=float(s.get("net_amount") or 0),
+                lab_status=s.get("lab_status"),
+            )
+            for s in figures["recent"]
+        )
+        return cls(
+            revenue=figures["revenue"], balance=figures["revenue"] - figures["paid"],
+            orders=figures["orders"], pending=figures["pending"],
+            customers=figures["customers"], products=figures["products"],
+            recent=recent, taken_at=taken_at,
+        )
+
+
+class DashboardSnapshot:
+    """
+    Keeps a DashboardStats current.
+
+    start() runs a daemon worker that refreshes at once, then every
+    `interval` seconds or sooner when request_refresh() wakes it - as
+    on_change(event) does for sale, payment, customer and product writes.
+    Several wake-ups before the worker gets to them cost one refresh.
+    Each new snapshot is passed to publish(stats) and to every subscriber
+    on the worker thread. Without either the worker pauses until one
+    subscribes, so a process whose sessions are all logged out stops polling.
+    """
+
+    def __init__(self, repo, publish=None, interval=DEFAULT_REFRESH_INTERVAL, recent=5):
+        self.repo = repo
+        self.interval = interval
+        self._publish = publish
+        self._recent = recent
+        self._current = DashboardStats()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = None
+
+    @property
+    def current(self):
+        """The latest snapshot (all zeros before the first refresh completes)."""
+        return self._current
+
+    # --- Worker ---
+    def start(self):
+        """Start the worker (once); returns at once."""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+                return self
+        self.request_refresh()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def set_interval(self, interval):
+        """Refresh every `interval` seconds from now on (the worker refreshes at once and restarts its wait)."""
+        if interval != self.interval:
+            self.interval = interval
+            self._wake.set()
+
+    def subscribe(self, publish):
+        """Pass new snapshots to publish(stats) too (starting the worker); returns an unsubscribe function."""
+        entry = [publish]   # its own identity, so one callable can subscribe twice
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers = [e for e in self._subscribers if e is not entry]
+        self.start()
+        return unsubscribe
+
+    def _listeners(self):
+        with self._lock:
+            listeners = [entry[0] for entry in self._subscribers]
+        return ([self._publish] if self._publish is not None else []) + listeners
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            if not self._listeners():
+                self._wake.wait()   # paused: no one to show the figures to
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[DASHBOARD] refresh failed: {e}")
+            self._wake.wait(self.interval)
+
+    def refresh(self):
+        """Read the figures now and publish the new snapshot."""
+        taken_at = time.time()
+        stats = DashboardStats.from_figures(self.repo.get_dashboard_stats(recent=self._recent), taken_at)
+        self._current = stats
+        for publish in self._listeners():
+            try:
+                publish(stats)
+            except Exception as e:
+                print(f"[DASHBOARD] publish error: {e}")
+        return stats
+
+    # --- Change events ---
+    def on_change(self, event):
+        # Any sale write (new order, payment, lab status) moves a figure;
+        # customers and products are only counted, so their inserts and
+        # deletes matter - plus renaming a customer shown in the recent orders
+        if event.entity == SALE or (event.entity in (CUSTOMER, PRODUCT) and event.op in (INSERT, DELETE)):
+            self.request_refresh()
+        elif event.entity == CUSTOMER and "name" in (event.data or {}):
+            if any(order.customer_id == event.id for order in self._current.recent):
+                self.request_refresh()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_dashboard(repo, interval=None):
+    """
+    The process's snapshot service, shared by every session; sessions subscribe() while logged in.
+
+    There is one instance whatever the arguments: the figures are the same for
+    every session, so the first session's repository serves them all. An
+    `interval` given by a later session (the refresh setting read as it opened)
+    replaces the current one, so a changed setting takes effect without a restart.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = DashboardSnapshot(repo, interval=interval or DEFAULT_REFRESH_INTERVAL)
+        elif interval:
+            _shared.set_interval(interval)
+        return _shared
@@ -0,0 +1,132 @@
+"""
+Lensy POS - Change notifications
+The repository publishes a ChangeEvent after each write. In the Flet app the
+events travel over page.pubsub, so every open terminal (web sessions and the
+desktop window alike) hears about a sale, a lab status change or a stock
+movement and can patch the affected rows instead of reloading whole tables.
+"""
+from dataclasses import dataclass, field
+
+CHANGES_TOPIC = "lensy.changes"
+
+# Entities
+SALE = "sale"
+PRODUCT = "product"
+STOCK = "stock"
+CUSTOMER = "customer"
+METADATA = "metadata"  # id is the table name: lens_types, frame_colors, ...
+PERMISSIONS = "permissions"  # roles, grants or overrides changed; id is the user, or empty for everyone
+DASHBOARD = "dashboard"  # a session's new DashboardStats (data), see app.core.dashboard_snapshot
+
+# Operations
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """
+    One write: `entity` (SALE, PRODUCT, ...), its `id` and the `op`.
+
+    `data` holds what changed - the full record for an insert, only the
+    written fields for an update, nothing for a delete or a STOCK event
+    (whose id is the product; subscribers read the new stock themselves).
+    """
+    entity: str
+    id: str
+    op: str
+    data: dict = field(default=None, compare=False)
+
+
+class ChangeFeed:
+    """
+    A session's fan-out of change events to the view on screen.
+
+    Flet's pubsub can only drop all of a session's handlers for a topic at
+    once, so each session subscribes one feed and views register with the
+    feed; clear() forgets them when the route changes, except those
+    subscribed with keep=True (session-wide state such as the dashboard),
+    and runs the teardown callbacks views registered with on_clear().
+    """
+
+    def __init__(self):
+        self._handlers = []
+        self._teardowns = []
+
+    def subscribe(self, handler, *entities, keep=False):
+        """Call handler(event) for events on `entities` (all if none given); returns an unsubscribe function."""
+        entry = (frozenset(entities), handler, keep)
+        self._handlers.append(entry)
+
+        def unsubscribe():
+            if entry in self._handlers:
+                self._handlers.remove(entry)
+        return unsubscribe
+
+    def on_clear(self, callback):
+        """Call callback() once, at the next clear() - when the view that registered it goes away."""
+        self._teardowns.append(callback)
+
+    def clear(self):
+        self._handlers = [entry for entry in self._handlers if entry[2]]
+        teardowns, self._teardowns = self._teardowns, []
+        for callback in teardowns:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[EVENTS] teardown error: {e}")
+
+    def dispatch(self, event):
+        for entities, handler, _ in list(self._handlers):
+            if entities and event.entity not in entities:
+                continue
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"[EVENTS] {event.entity} handler error: {e}")
+
+    def on_message(self, topic, message):
+        """pubsub topic handler."""
+        if isinstance(message, ChangeEvent):
+            self.dispatch(message)
+
+
+def connect_session(page, repo, shared=()):
+    """
+    Wire a Flet session: the repository publishes to every session over
+    page.pubsub, and this session's views listen through the returned feed
+    (also kept in page.data["changes"]).
+
+    `shared` handlers belong to process-wide state (the search index): they
+    are called with this session's own writes only, so each write reaches
+    them once however many sessions are open.
+    """
+    feed = ChangeFeed()
+    page.pubsub.subscribe_topic(CHANGES_TOPIC, feed.on_message)
+
+    def publish(event):
+        for handler in shared:
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"[EVENTS] {event.entity} handler error: {e}")
+        page.pubsub.send_all_on_topic(CHANGES_TOPIC, event)
+    repo.set_change_publisher(publish)
+    page.data["changes"] = feed
+    return feed
+
+
+def subscribe_changes(page, handler, *entities):
+    """Subscribe a view to its session's feed; a no-op when the session has none."""
+    feed = page.data.get("changes") if getattr(page, "data", None) else None
+    if feed is None:
+        return lambda: None
+    return feed.subscribe(handler, *entities)
+
+
+def on_view_closed(page, callback):
+    """Run callback() when the session leaves the current view (or ends); a no-op without a feed."""
+    feed = page.data.get("changes") if getattr(page, "data", None) else None
+    if feed is not None:
+        feed.on_clear(callback)
@@ -182,6 +182,9 @@ _translations = {
         'Orders': 'الطلبات',
         'View Prescriptions': 'عرض الوصفات',
         'New Order': 'طلب جديد',
+        'Sort by': 'ترتيب حسب',
+        'Last Visit': 'آخر زيارة',
+        'With balance only': 'المديونون فقط',
 
         # === Prescriptions ===
         'Prescriptions': 'الوصفات الطبية',
@@ -248,10 +251,18 @@ _translations = {
         'Status updated successfully': 'تم تحديث الحالة بنجاح',
         'Print Lab Copy': 'طباعة نسخة المختبر',
         'Lab copy sent to printer': 'تم إرسال نسخة المختبر للطابعة',
+        "Print today's lab copies": 'طباعة نسخ المختبر لطلبات اليوم',
+        "Today's lab copies sent to printer": 'تم إرسال نسخ المختبر لطلبات اليوم للطابعة',
         'No lab orders found': 'لم يتم العثور على طلبات مختبر',
         'Lab Order': 'طلب مختبر',
         'Filter by Status': 'تصفية حسب الحالة',
         'Lens': 'عدسة',
+        'Select': 'تحديد',
+        'Select All': 'تحديد الكل',
+        'selected': 'محدد',
+        'Set status to': 'تغيير الحالة إلى',
+        'Apply': 'تطبيق',
+        'Clear Selection': 'إلغاء التحديد',
 
         # === Sales History ===
         'Sales History': 'سجل المبيعات',
@@ -297,6 +308,7 @@ _translations = {
         'Full Name': 'الاسم الكامل',
         'Role': 'الدور',
         'No Role': 'بدون دور',
+        'Permissions': 'الصلاحيات',
         'Active': 'نشط',
         'Inactive': 'غير نشط',
         'Activate': 'تفعيل',
@@ -348,6 +360,8 @@ _translations = {
         '← Back to Examination': '← العودة للفحص',
         'added to cart': 'تمت الإضافة للسلة',
         'Stock': 'المخزون',
+        'Insufficient stock for': 'الكمية غير كافية لـ',
+        '{name} (need {requested}, have {available})': '{name} (المطلوب {requested}، المتوفر {available})',
 
         # === Print Copies ===
         'Shop Copy': 'نسخة المحل',
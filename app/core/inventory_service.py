@@ -4,17 +4,56 @@ Inventory Service - Handles stock movements, product management, and frame/lens
 Centralizes all complex inventory logic for the POS system.
 """
 
-from app.database.db_manager import get_session, get_engine
+from app.database.db_manager import get_session, get_engine, ensure_stock_balances
 from app.database.models import (
-    Product, StockMovement, Warehouse, LensType, OrderExamination
+    Product, StockMovement, StockBalance, Warehouse, LensType, OrderExamination
 )
+from app.core.stock import requested_quantities, find_shortfalls, split_deduction
 from sqlalchemy import func
 import datetime
 
+# SQLite allows a limited number of bound parameters per statement
+STOCK_QUERY_CHUNK = 500
+
+_default_warehouse_ids = {}
+
 
 class InventoryService:
     """Service for managing inventory operations including stock movements and product management."""
 
+    @staticmethod
+    def stock_subquery(session):
+        """
+        Per-product stock totals as a grouped subquery (columns: product_id, stock).
+
+        Outer-join it to Product to list a catalog with stock in one query
+        instead of one SUM per product.
+        """
+        return session.query(
+            StockMovement.product_id.label('product_id'),
+            func.sum(StockMovement.qty).label('stock')
+        ).group_by(StockMovement.product_id).subquery()
+
+    @staticmethod
+    def default_warehouse_id(session) -> int:
+        """
+        ID of the warehouse used when a caller doesn't name one (the first one).
+
+        Cached per engine once a warehouse exists; call
+        clear_default_warehouse_cache() after deleting warehouses.
+        """
+        bind = session.get_bind()
+        warehouse_id = _default_warehouse_ids.get(bind)
+        if warehouse_id is None:
+            warehouse_id = session.query(Warehouse.id).order_by(Warehouse.id).limit(1).scalar()
+            if warehouse_id is not None:
+                _default_warehouse_ids[bind] = warehouse_id
+        return warehouse_id
+
+    @staticmethod
+    def clear_default_warehouse_cache():
+        _default_warehouse_ids.clear()
+
     @staticmethod
     def get_available_stock(product_id: int, session=None) -> int:
         """
@@ -33,9 +72,40 @@ class InventoryService:
             close_session = True
 
         try:
-            movements = session.query(StockMovement).filter_by(product_id=product_id).all()
-            total_qty = sum(m.qty for m in movements)
-            return total_qty
+            return session.query(func.coalesce(func.sum(StockMovement.qty), 0))\
+                .filter(StockMovement.product_id == product_id)\
+                .scalar()
+        finally:
+            if close_session:
+                session.close()
+
+    @staticmethod
+    def get_available_stock_many(product_ids, session=None) -> dict:
+        """
+        Get the available stock of several products with one grouped query.
+
+        Args:
+            product_ids: Iterable of product IDs
+            session: Optional database session
+
+        Returns:
+            Dict of product ID -> stock quantity (0 for products without movements)
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        close_session = False
+        if session is None:
+            session = get_session(get_engine())
+            close_session = True
+
+        try:
+            stock = dict.fromkeys(product_ids, 0)
+            for start in range(0, len(product_ids), STOCK_QUERY_CHUNK):
+                chunk = product_ids[start:start + STOCK_QUERY_CHUNK]
+                rows = session.query(StockMovement.product_id, func.sum(StockMovement.qty))\
+                    .filter(StockMovement.product_id.in_(chunk))\
+                    .group_by(StockMovement.product_id)
+                stock.update({product_id: qty or 0 for product_id, qty in rows})
+            return stock
         finally:
             if close_session:
                 session.close()
@@ -57,6 +127,26 @@ class InventoryService:
         Returns:
             True if successful, False otherwise
         """
+        return InventoryService.deduct_stock_many(
+            {product_id: quantity}, warehouse_id=warehouse_id, ref_no=ref_no, note=note, session=session
+        )
+
+    @staticmethod
+    def deduct_stock_many(quantities: dict, warehouse_id: int = None,
+                          ref_no: str = "", note: str = "", session=None) -> bool:
+        """
+        Deduct stock for a whole order: all lines or none.
+
+        Args:
+            quantities: Dict of product ID -> quantity to deduct (positive numbers)
+            warehouse_id: Warehouse ID (uses first warehouse if not provided)
+            ref_no: Reference number (invoice, PO, etc.)
+            note: Additional note
+            session: Optional database session
+
+        Returns:
+            True if every line was deducted, False (and nothing added) otherwise
+        """
         close_session = False
         if session is None:
             session = get_session(get_engine())
@@ -64,31 +154,245 @@ class InventoryService:
 
         try:
             if warehouse_id is None:
-                wh = session.query(Warehouse).first()
-                warehouse_id = wh.id if wh else None
+                warehouse_id = InventoryService.default_warehouse_id(session)
 
             if warehouse_id is None:
                 return False
 
-            # Check available stock
-            available = InventoryService.get_available_stock(product_id, session)
-            if available < quantity:
-                return False
+            items = [{"product_id": pid, "qty": qty} for pid, qty in quantities.items()]
+            shortfalls = InventoryService.reserve_and_deduct(
+                items, warehouse_id=warehouse_id, ref_no=ref_no, note=note, session=session
+            )
+            if close_session and not shortfalls:
+                session.commit()
+            return not shortfalls
+        except Exception as e:
+            print(f"Error deducting stock: {e}")
+            return False
+        finally:
+            if close_session:
+                session.close()
 
-            # Create stock movement record
-            move = StockMovement(
-                product_id=product_id,
-                warehouse_id=warehouse_id,
-                qty=-int(quantity),
+    @staticmethod
+    def reserve_and_deduct(items: list, warehouse_id: int = None,
+                           ref_no: str = "", note: str = "", session=None) -> list:
+        """
+        Check and deduct stock for every order line as one locked step.
+
+        Takes the database write lock before reading stock (BEGIN IMMEDIATE on
+        SQLite, row locks on the products with SELECT ... FOR UPDATE elsewhere),
+        so two terminals selling the last frame can't both pass the check.
+        The lock is held until the caller commits or rolls back the session.
+
+        Args:
+            items: Order lines [{product_id, qty}]; lines for the same product are summed
+            warehouse_id: Warehouse to take the stock from first (the first warehouse if not
+                provided); other locations holding the product cover the rest
+            ref_no: Reference number (invoice, PO, etc.)
+            note: Additional note
+            session: Database session; required, since the caller commits it
+
+        Returns:
+            List of shortfalls [{product_id, requested, available}]; empty if
+            the movements were added, otherwise nothing was added
+        """
+        requested = requested_quantities(items)
+        if not requested:
+            return []
+
+        InventoryService._lock_stock(session, requested)
+        if warehouse_id is None:
+            warehouse_id = InventoryService.default_warehouse_id(session)
+        held = InventoryService._stock_by_location(session, requested, warehouse_id)
+        shortfalls = find_shortfalls(requested, {pid: sum(held[pid].values()) for pid in requested})
+        if shortfalls:
+            return shortfalls
+
+        # Take from `warehouse_id` first, then from the other locations holding stock
+        session.add_all([
+            StockMovement(
+                product_id=pid,
+                warehouse_id=location,
+                qty=-take,
                 type="sale",
                 ref_no=ref_no,
                 note=note or f"Sale: {ref_no}"
             )
-            session.add(move)
-            return True
-        except Exception as e:
-            print(f"Error deducting stock: {e}")
-            return False
+            for pid, qty in requested.items()
+            for location, take in split_deduction(int(qty), held[pid], warehouse_id).items()
+        ])
+        session.flush()
+        return []
+
+    @staticmethod
+    def _stock_by_location(session, product_ids, default_warehouse_id):
+        """
+        {product_id: {warehouse_id: qty}} summed from the ledger, warehouses in id order.
+
+        Movements recorded without a warehouse count towards the default one.
+        """
+        held = {pid: {} for pid in product_ids}
+        product_ids = list(held)
+        for start in range(0, len(product_ids), STOCK_QUERY_CHUNK):
+            chunk = product_ids[start:start + STOCK_QUERY_CHUNK]
+            rows = session.query(StockMovement.product_id, StockMovement.warehouse_id, func.sum(StockMovement.qty))\
+                .filter(StockMovement.product_id.in_(chunk))\
+                .group_by(StockMovement.product_id, StockMovement.warehouse_id)\
+                .order_by(StockMovement.warehouse_id)
+            for product_id, location, qty in rows:
+                location = default_warehouse_id if location is None else location
+                held[product_id][location] = held[product_id].get(location, 0) + (qty or 0)
+        return held
+
+    @staticmethod
+    def _lock_stock(session, product_ids):
+        """
+        Take the lock that serializes stock check-and-write on these products.
+
+        BEGIN IMMEDIATE on SQLite (the database write lock), row locks on the
+        products (in id order, so two orders can't deadlock) elsewhere. Held
+        until the session commits or rolls back.
+        """
+        conn = session.connection()
+        if conn.dialect.name == 'sqlite':
+            # pysqlite opens transactions lazily on the first write; an open one
+            # has written already and so holds the write lock
+            if not conn.connection.dbapi_connection.in_transaction:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            session.query(Product.id)\
+                .filter(Product.id.in_(sorted(product_ids)))\
+                .order_by(Product.id)\
+                .with_for_update()\
+                .all()
+
+    @staticmethod
+    def warehouse_stock_subquery(session, warehouse_id: int):
+        """
+        One warehouse's stock per product as a subquery (columns: product_id, stock).
+
+        Served from stock_balances, so listing a location costs one indexed
+        range scan instead of summing the whole ledger.
+        """
+        ensure_stock_balances(session.get_bind())
+        return session.query(
+            StockBalance.product_id.label('product_id'),
+            StockBalance.qty.label('stock')
+        ).filter(StockBalance.warehouse_id == warehouse_id).subquery()
+
+    @staticmethod
+    def get_stock_by_warehouse(product_id: int, session=None) -> dict:
+        """
+        Get a product's stock at each location.
+
+        Args:
+            product_id: The product ID
+            session: Optional database session
+
+        Returns:
+            Dict of warehouse ID -> stock quantity (UNASSIGNED_WAREHOUSE for
+            movements recorded without a warehouse)
+        """
+        close_session = False
+        if session is None:
+            session = get_session(get_engine())
+            close_session = True
+
+        try:
+            ensure_stock_balances(session.get_bind())
+            rows = session.query(StockBalance.warehouse_id, StockBalance.qty)\
+                .filter(StockBalance.product_id == product_id)
+            return {warehouse_id: qty for warehouse_id, qty in rows if qty}
+        finally:
+            if close_session:
+                session.close()
+
+    @staticmethod
+    def get_warehouse_inventory(warehouse_id: int, category: str = None, in_stock_only: bool = True,
+                                session=None) -> list:
+        """
+        List products with their stock at one location.
+
+        Args:
+            warehouse_id: Warehouse ID
+            category: Optional product category filter
+            in_stock_only: Leave out products with no stock there
+            session: Optional database session
+
+        Returns:
+            List of (Product, stock) tuples ordered by product name
+        """
+        close_session = False
+        if session is None:
+            session = get_session(get_engine())
+            close_session = True
+
+        try:
+            stock = InventoryService.warehouse_stock_subquery(session, warehouse_id)
+            qty = func.coalesce(stock.c.stock, 0)
+            if in_stock_only:
+                query = session.query(Product, qty).join(stock, stock.c.product_id == Product.id)\
+                    .filter(stock.c.stock > 0)
+            else:
+                query = session.query(Product, qty).outerjoin(stock, stock.c.product_id == Product.id)
+            if category:
+                query = query.filter(Product.category == category)
+            return [tuple(row) for row in query.order_by(Product.name, Product.id)]
+        finally:
+            if close_session:
+                session.close()
+
+    @staticmethod
+    def transfer_stock(product_id: int, from_wh: int, to_wh: int, qty: int,
+                       ref_no: str = "", note: str = "", session=None) -> list:
+        """
+        Move stock between locations as a pair of 'transfer' movements.
+
+        Both movements are written in one transaction after checking, under the
+        same lock as reserve_and_deduct(), that the source location has enough.
+
+        Args:
+            product_id: The product ID
+            from_wh: Warehouse ID to take the stock from
+            to_wh: Warehouse ID to put it in
+            qty: Quantity to move (positive)
+            ref_no: Reference number
+            note: Additional note
+            session: Optional database session (committed here if not provided)
+
+        Returns:
+            List of shortfalls [{product_id, requested, available}]; empty if
+            the stock was moved, otherwise nothing was written
+        """
+        if qty <= 0 or from_wh == to_wh:
+            raise ValueError("Transfer needs a positive quantity and two different warehouses")
+
+        close_session = False
+        if session is None:
+            session = get_session(get_engine())
+            close_session = True
+
+        try:
+            ensure_stock_balances(session.get_bind())
+            InventoryService._lock_stock(session, [product_id])
+            available = session.query(StockBalance.qty)\
+                .filter_by(product_id=product_id, warehouse_id=from_wh)\
+                .scalar() or 0
+            shortfalls = find_shortfalls({product_id: qty}, {product_id: available})
+            if shortfalls:
+                return shortfalls
+
+            note = note or f"Transfer {from_wh} -> {to_wh}"
+            session.add_all([
+                StockMovement(product_id=product_id, warehouse_id=from_wh, qty=-int(qty),
+                              type="transfer", ref_no=ref_no, note=note),
+                StockMovement(product_id=product_id, warehouse_id=to_wh, qty=int(qty),
+                              type="transfer", ref_no=ref_no, note=note),
+            ])
+            session.flush()
+            if close_session:
+                session.commit()
+            return []
         finally:
             if close_session:
                 session.close()
@@ -117,8 +421,7 @@ class InventoryService:
 
         try:
             if warehouse_id is None:
-                wh = session.query(Warehouse).first()
-                warehouse_id = wh.id if wh else None
+                warehouse_id = InventoryService.default_warehouse_id(session)
 
             if warehouse_id is None:
                 return False
@@ -180,10 +483,9 @@ class InventoryService:
             session.flush()
 
             # Create initial stock movement
-            wh = session.query(Warehouse).first()
             move = StockMovement(
                 product_id=product.id,
-                warehouse_id=wh.id if wh else None,
+                warehouse_id=InventoryService.default_warehouse_id(session),
                 qty=0,
                 type='initial',
                 note='Auto-created frame product'
@@ -229,12 +531,14 @@ class InventoryService:
                 session.close()
 
     @staticmethod
-    def cleanup_unused_lens_types(session=None) -> int:
+    def cleanup_unused_lens_types(session=None, names=None) -> int:
         """
         Delete lens types that are no longer used in any orders.
 
         Args:
             session: Optional database session
+            names: Only consider these lens type names (e.g. the ones an
+                edited order stopped using); all lens types if None
 
         Returns:
             Number of lens types deleted
@@ -245,17 +549,12 @@ class InventoryService:
             close_session = True
 
         try:
-            lens_types = session.query(LensType).all()
-            deleted_count = 0
-
-            for lens_type in lens_types:
-                # Check if this lens type is used by any order
-                count = session.query(OrderExamination).filter_by(lens_info=lens_type.name).count()
-                if count == 0:
-                    session.delete(lens_type)
-                    deleted_count += 1
-
-            return deleted_count
+            used = session.query(OrderExamination.lens_info)\
+                .filter(OrderExamination.lens_info.isnot(None))
+            query = session.query(LensType).filter(LensType.name.notin_(used))
+            if names is not None:
+                query = query.filter(LensType.name.in_(list(names)))
+            return query.delete(synchronize_session=False)
         finally:
             if close_session:
                 session.close()
@@ -0,0 +1,115 @@
+"""
+Lensy POS - Lab queue
+The lab orders held in memory, bucketed by status, so a status change is a
+move between two buckets and the counts are the bucket sizes - nothing is
+refetched or recounted when one order goes to the lab.
+"""
+
+NOT_STARTED = "Not Started"
+IN_LAB = "In Lab"
+READY = "Ready"
+RECEIVED = "Received"
+
+# In board order; orders with any other status are listed after these
+LAB_STATUSES = (NOT_STARTED, IN_LAB, READY, RECEIVED)
+
+
+class LabQueue:
+    """
+    Lab orders by id and by status.
+
+    Each bucket keeps its orders sorted by order date; the sorted list is
+    rebuilt lazily, only for a bucket that changed since it was last read.
+    Sales without a lab_status are not lab orders and are ignored.
+    """
+
+    def __init__(self, sales=()):
+        self._sales = {}
+        self._buckets = {}   # status -> {id: sale}
+        self._ordered = {}   # status -> cached sorted list
+        self.load(sales)
+
+    def load(self, sales):
+        self._sales.clear()
+        self._buckets = {status: {} for status in LAB_STATUSES}
+        self._ordered.clear()
+        for sale in sales:
+            self.add(sale)
+
+    # --- Reading ---
+    def __len__(self):
+        return len(self._sales)
+
+    def __contains__(self, sale_id):
+        return sale_id in self._sales
+
+    def get(self, sale_id):
+        return self._sales.get(sale_id)
+
+    def count(self, status):
+        return len(self._buckets.get(status, ()))
+
+    def counts(self):
+        return {status: len(bucket) for status, bucket in self._buckets.items()}
+
+    def ordered(self, status=None):
+        """The orders with `status` (all, in board order, if None), oldest first within a status."""
+        if status is not None:
+            return list(self._sorted(status))
+        statuses = list(LAB_STATUSES) + sorted(s for s in self._buckets if s not in LAB_STATUSES)
+        return [sale for s in statuses for sale in self._sorted(s)]
+
+    def _sorted(self, status):
+        if status not in self._ordered:
+            bucket = self._buckets.get(status, {})
+            self._ordered[status] = sorted(bucket.values(), key=lambda s: s.get("order_date") or "")
+        return self._ordered[status]
+
+    # --- Changes ---
+    def add(self, sale):
+        """Add or replace an order; returns False if it is not a lab order."""
+        self.remove(sale["id"])
+        status = sale.get("lab_status")
+        if not status:
+            return False
+        self._sales[sale["id"]] = sale
+        self._buckets.setdefault(status, {})[sale["id"]] = sale
+        self._ordered.pop(status, None)
+        return True
+
+    def remove(self, sale_id):
+        sale = self._sales.pop(sale_id, None)
+        if sale is not None:
+            self._buckets[sale["lab_status"]].pop(sale_id, None)
+            self._ordered.pop(sale["lab_status"], None)
+        return sale
+
+    def apply(self, sale_id, fields):
+        """
+        Merge written fields into an order, moving it to its new status bucket.
+
+        Returns True if the order changed (False for an unknown order or
+        fields it already has, such as the echo of this session's own write).
+        """
+        sale = self._sales.get(sale_id)
+        if sale is None or all(sale.get(k) == v for k, v in fields.items()):
+            return False
+        old_status = sale["lab_status"]
+        sale.update(fields)
+        new_status = sale.get("lab_status")
+        if new_status != old_status:
+            del self._buckets[old_status][sale_id]
+            self._ordered.pop(old_status, None)
+            if not new_status:
+                # No longer a lab order
+                del self._sales[sale_id]
+                return True
+            self._buckets.setdefault(new_status, {})[sale_id] = sale
+            self._ordered.pop(new_status, None)
+        elif "order_date" in fields:
+            self._ordered.pop(new_status, None)
+        return True
+
+    def move(self, sale_ids, status):
+        """Set the status of several orders; returns the ids that actually moved."""
+        return [sale_id for sale_id in sale_ids if self.apply(sale_id, {"lab_status": status})]
@@ -0,0 +1,123 @@
+"""
+Lensy POS - Search-as-you-type
+Runs a search callback off the UI thread for the latest of a burst of
+keystrokes. Results are cached per normalized query, so typing more
+letters narrows a result set already in hand instead of asking the
+backend again.
+"""
+import threading
+from collections import OrderedDict
+
+CUSTOMER_SEARCH_FIELDS = ("name", "phone", "city", "email")
+SEARCH_DELAY = 0.3  # seconds of quiet before a search box is acted on
+
+
+def normalize_query(query):
+    return " ".join((query or "").lower().split())
+
+
+def customer_matches(customer, term):
+    """True if the (lower-case) term appears in any of the searchable customer fields."""
+    return any(term in (customer.get(f) or "").lower() for f in CUSTOMER_SEARCH_FIELDS)
+
+
+class DebouncedSearch:
+    """
+    Debounced, cancellable background search with a prefix cache.
+
+    submit(query) waits `delay` seconds for the typing to settle and then
+    calls search(query, limit) on a worker thread. on_results(query, results)
+    is called with the outcome, and only if no newer query was submitted in
+    the meantime; a search still running when the user types again is left
+    to finish, but its results are dropped.
+
+    A cached result set that was not cut short by `limit` holds every match
+    for its query, and so every match for any longer query that starts with
+    it. Such queries are answered from the cache with `matches(item, query)`
+    and no delay.
+    """
+
+    def __init__(self, search, on_results, matches=None, delay=SEARCH_DELAY, limit=10, max_cached=64):
+        self.search = search
+        self.on_results = on_results
+        self.matches = matches
+        self.delay = delay
+        self.limit = limit
+        self.max_cached = max_cached
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._timer = None
+        self._cache = OrderedDict()  # query -> (results, complete)
+
+    def submit(self, query):
+        key = normalize_query(query)
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            cached = self._cached(key)
+            if cached is None:
+                self._timer = threading.Timer(self.delay, self._run, (generation, key, query))
+                self._timer.daemon = True
+                self._timer.start()
+        if cached is not None:
+            self._deliver(generation, query, cached)
+
+    def cancel(self):
+        """Forget the pending and running searches; nothing more is delivered for them."""
+        with self._lock:
+            self._generation += 1
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _cached(self, key):
+        """Results for `key` from the cache, or None. Call with the lock held."""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key][0]
+        if self.matches is None:
+            return None
+        # Longest complete result set for a prefix of the query
+        prefixes = [k for k, (_r, complete) in self._cache.items() if complete and key.startswith(k)]
+        if not prefixes:
+            return None
+        results = [item for item in self._cache[max(prefixes, key=len)][0] if self.matches(item, key)]
+        self._store(key, results, True)
+        return results
+
+    def _store(self, key, results, complete):
+        self._cache[key] = (results, complete)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _run(self, generation, key, query):
+        if generation != self._generation:
+            return
+        try:
+            # One extra row tells whether the result set is complete
+            results = list(self.search(key, self.limit + 1))
+        except Exception as e:
+            print(f"[SEARCH] {key!r} failed: {e}")
+            return
+        complete = len(results) <= self.limit
+        results = results[:self.limit]
+        with self._lock:
+            self._store(key, results, complete)
+        self._deliver(generation, query, results)
+
+    def _deliver(self, generation, query, results):
+        if generation != self._generation:
+            return
+        try:
+            self.on_results(query, results)
+        except Exception as e:
+            print(f"[SEARCH] result handler error: {e}")
@@ -0,0 +1,94 @@
+"""
+Lensy POS - Keyset (cursor) pagination
+Pages are addressed by the sort key of the last row shown, encoded as an
+opaque `?after=` token, so page N costs the same as page 1 and rows inserted
+meanwhile never shift or duplicate what the user has already seen.
+"""
+
+import json
+import base64
+import datetime
+
+from sqlalchemy import DateTime, and_, or_
+from sqlalchemy.engine import Row
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def _nullable(col):
+    return getattr(getattr(col, "expression", col), "nullable", True)
+
+
+def _equal(col, value):
+    return col.is_(None) if value is None else col == value
+
+
+def _beyond(col, value, descending):
+    """Rows strictly after `value` in `col`; NULLs sort last in both directions."""
+    if value is None:
+        return None
+    beyond = col < value if descending else col > value
+    return or_(beyond, col.is_(None)) if _nullable(col) else beyond
+
+
+def _after_clause(columns, values, descending):
+    """Lexicographic "comes after (values)" over the sort columns."""
+    clauses = []
+    for i, (col, value) in enumerate(zip(columns, values)):
+        beyond = _beyond(col, value, descending)
+        if beyond is not None:
+            clauses.append(and_(*[_equal(c, v) for c, v in zip(columns[:i], values[:i])], beyond))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns, after=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Fetch one page of `query` ordered by `columns` (which must end in a unique column).
+    Rows with a NULL sort key come last, whichever the direction.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises ValueError if `after` is not a cursor produced for these columns.
+    """
+    if after:
+        values = decode_cursor(after)
+        if len(values) != len(columns):
+            raise ValueError(f"Invalid cursor: {after!r}")
+        values = [
+            datetime.datetime.fromisoformat(v) if v is not None and isinstance(col.type, DateTime) else v
+            for col, v in zip(columns, values)
+        ]
+        query = query.filter(_after_clause(columns, values, descending))
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    order = [o.nulls_last() if _nullable(c) else o for o, c in zip(order, columns)]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0] if isinstance(rows[-1], Row) else rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
@@ -0,0 +1,28 @@
+"""
+Lensy POS - Payment state of a sale
+One definition of what is still owed on an order and whether it counts as
+paid, part-paid or unpaid, shared by the history filters and the backends
+that apply them.
+"""
+
+PAID = "Paid"
+PARTIAL = "Partial"
+UNPAID = "Unpaid"
+PAYMENT_STATES = (PAID, PARTIAL, UNPAID)
+
+
+def balance_due(sale):
+    """net_amount - amount_paid; negative for an overpaid order."""
+    return float(sale.get("net_amount") or 0) - float(sale.get("amount_paid") or 0)
+
+
+def payment_state(sale):
+    """
+    PAID once nothing is owed, UNPAID while nothing has been paid on an order
+    that costs something, PARTIAL in between.
+    """
+    if balance_due(sale) <= 0:
+        return PAID
+    if float(sale.get("amount_paid") or 0) == 0:
+        return UNPAID
+    return PARTIAL
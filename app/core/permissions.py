@@ -1,11 +1,20 @@
 # app/core/permissions.py
 """
 Seed permissions & roles; provide has_permission(session, user_id, permission_code)
+and compiled per-user permission maps ({code: value}) for O(1) checks.
 """
 
+import types
+
 from app.database.models import Permission, Role, RolePermission, UserPermission, User
 from sqlalchemy.exc import IntegrityError
 
+# Counter bumped whenever role grants, user overrides or user roles change;
+# sessions holding a compiled map recompile when it moves.
+PERMISSIONS_VERSION_KEY = "permissions"
+
+EMPTY_PERMISSIONS = types.MappingProxyType({})
+
 PERMISSIONS_LIST = [
     # code, category, description, value_type
     ("CREATE_SALE", "sales", "Create sale invoice", "bool"),
@@ -99,29 +108,87 @@ def seed_roles_and_bindings(session):
         session.commit()
         print("Assigned Admin role to 'admin' user.")
 
-def has_permission(session, user_id, permission_code):
+def build_permission_map(role_grants, overrides):
     """
-    Returns tuple (allowed: bool, value: str|None)
-    """
-    perm = session.query(Permission).filter_by(code=permission_code).first()
-    if not perm:
-        return False, None
-
-    # 1) user override
-    up = session.query(UserPermission).filter_by(user_id=user_id, permission_id=perm.id).first()
-    if up:
-        return bool(up.allow), up.value
-
-    # 2) role of user
-    user = session.query(User).filter_by(id=user_id).first()
-    if not user:
-        return False, None
-    if not user.role_id:
-        return False, None
-
-    rp = session.query(RolePermission).filter_by(role_id=user.role_id, permission_id=perm.id).first()
-    if rp:
-        return True, rp.value
+    Merge role grants and user overrides into a frozen {code: value} map.
 
+    role_grants: iterable of (code, value) granted by the user's role.
+    overrides: iterable of (code, allow, value) from user_permissions; these win.
+    Only allowed codes end up in the map.
+    """
+    perms = dict(role_grants)
+    for code, allow, value in overrides:
+        if allow:
+            perms[code] = value
+        else:
+            perms.pop(code, None)
+    return types.MappingProxyType(perms)
+
+def check_permission(perms, permission_code):
+    """Same (allowed, value) contract as has_permission(), against a compiled map."""
+    if permission_code in perms:
+        return True, perms[permission_code]
     return False, None
 
+def get_effective_permissions(session, user_ids):
+    """Compile permission maps for several users at once (three queries in total)."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    roles = dict(session.query(User.id, User.role_id).filter(User.id.in_(user_ids)))
+
+    grants_by_role = {}
+    role_ids = {r for r in roles.values() if r}
+    if role_ids:
+        rows = (session.query(RolePermission.role_id, Permission.code, RolePermission.value)
+                .join(Permission, Permission.id == RolePermission.permission_id)
+                .filter(RolePermission.role_id.in_(role_ids)))
+        for role_id, code, value in rows:
+            grants_by_role.setdefault(role_id, []).append((code, value))
+
+    overrides_by_user = {}
+    rows = (session.query(UserPermission.user_id, Permission.code, UserPermission.allow, UserPermission.value)
+            .join(Permission, Permission.id == UserPermission.permission_id)
+            .filter(UserPermission.user_id.in_(user_ids)))
+    for user_id, code, allow, value in rows:
+        overrides_by_user.setdefault(user_id, []).append((code, bool(allow), value))
+
+    return {
+        uid: build_permission_map(grants_by_role.get(roles.get(uid), []), overrides_by_user.get(uid, []))
+        for uid in user_ids if uid in roles
+    }
+
+def compile_permissions(session, user_id):
+    """Frozen {code: value} map of everything `user_id` is allowed to do."""
+    return get_effective_permissions(session, [user_id]).get(user_id, EMPTY_PERMISSIONS)
+
+# user_id -> (permissions version, compiled map), shared by the desktop windows
+_compiled_maps = {}
+
+def user_permissions(session, user_id):
+    """
+    compile_permissions() for the desktop windows, kept until a role edit
+    bumps the permissions version: a check costs one counter read.
+    """
+    version = get_permissions_version(session)
+    cached = _compiled_maps.get(user_id)
+    if cached is None or cached[0] != version:
+        cached = _compiled_maps[user_id] = (version, compile_permissions(session, user_id))
+    return cached[1]
+
+def get_permissions_version(session):
+    from app.database.db_manager import get_counter
+    return get_counter(session, PERMISSIONS_VERSION_KEY) or 0
+
+def bump_permissions_version(session):
+    """Call after changing roles, grants or overrides so compiled maps are refreshed."""
+    from app.database.db_manager import next_counter
+    return next_counter(session, PERMISSIONS_VERSION_KEY)
+
+def has_permission(session, user_id, permission_code):
+    """
+    Returns tuple (allowed: bool, value: str|None)
+
+    Prefer compile_permissions() + check_permission() when checking several codes.
+    """
+    return check_permission(compile_permissions(session, user_id), permission_code)
@@ -0,0 +1,168 @@
+"""
+Lensy POS - POS session context
+The lookup data an order needs - lens types, frame colors, the frame
+catalogue and the shop settings - read once in the background when the POS
+opens, shared by every examination row and the receipt, and patched from
+change events instead of being read again for each row.
+"""
+import threading
+
+from app.core.events import METADATA, PRODUCT, STOCK, INSERT, UPDATE, DELETE
+
+
+def _name_key(name):
+    return (name or "").strip().lower()
+
+
+class POSContext:
+    """
+    Cached lookup lists for one POS session.
+
+    start() loads them on a worker thread; the accessors wait for that load
+    (and read synchronously if it failed). on_change(event) keeps the lists
+    current - subscribe it to the session's METADATA, PRODUCT and STOCK
+    events. Settings follow the repository's settings subscription until
+    close().
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self._lock = threading.Lock()
+        self._settled = threading.Event()
+        self._loaded = False
+        self._lens_types = []
+        self._frame_colors = []
+        self._frames = {}  # str(product id) -> frame product, keyed like ChangeEvent.id
+        self._settings = {}
+        self._unsubscribe_settings = repo.subscribe_settings(self._on_settings_changed)
+
+    # --- Loading ---
+    def start(self):
+        """Load everything on a daemon thread; returns at once."""
+        threading.Thread(target=self._load_in_background, daemon=True).start()
+        return self
+
+    def load(self):
+        lens_types = list(self.repo.get_lens_types())
+        frame_colors = list(self.repo.get_frame_colors())
+        frames = {str(p["id"]): p for p in self.repo.get_inventory(category="Frame")}
+        settings = self.repo.get_settings()
+        with self._lock:
+            self._lens_types, self._frame_colors = lens_types, frame_colors
+            self._frames, self._settings = frames, settings
+            self._loaded = True
+        self._settled.set()
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"[POS] context load failed: {e}")
+        finally:
+            self._settled.set()
+
+    def _ensure_loaded(self):
+        self._settled.wait()
+        if not self._loaded:
+            self.load()
+
+    def close(self):
+        self._unsubscribe_settings()
+
+    # --- Lookups ---
+    @property
+    def lens_types(self):
+        self._ensure_loaded()
+        return list(self._lens_types)
+
+    @property
+    def frame_colors(self):
+        self._ensure_loaded()
+        return list(self._frame_colors)
+
+    @property
+    def frames(self):
+        """Frame products sorted by name."""
+        self._ensure_loaded()
+        with self._lock:
+            frames = list(self._frames.values())
+        return sorted(frames, key=lambda p: _name_key(p.get("name")))
+
+    @property
+    def settings(self):
+        self._ensure_loaded()
+        return self._settings
+
+    def find_frame(self, name):
+        key = _name_key(name)
+        if not key:
+            return None
+        return next((p for p in self.frames if _name_key(p.get("name")) == key), None)
+
+    def frame_product(self, name):
+        """The frame product called `name`, created in the repository if there is none."""
+        product = self.find_frame(name)
+        if product is None:
+            product = self.repo.create_frame_product_if_needed(name)
+            if product:
+                with self._lock:
+                    self._frames[str(product["id"])] = product
+        return product
+
+    def ensure_lens_type(self, name):
+        """Add `name` to the lens types unless it is already there."""
+        key = _name_key(name)
+        if not key:
+            return None
+        existing = next((lt for lt in self.lens_types if _name_key(lt.get("name")) == key), None)
+        if existing:
+            return existing
+        lens_type = self.repo.ensure_lens_type_exists(name)
+        if lens_type:
+            self._add_metadata("lens_types", lens_type)
+        return lens_type
+
+    # --- Change events ---
+    def on_change(self, event):
+        if event.entity == METADATA and event.op == INSERT and event.data:
+            self._add_metadata(event.id, event.data)
+        elif event.entity == PRODUCT:
+            self._on_product_change(event)
+        elif event.entity == STOCK:
+            self._on_stock_change(event)
+
+    def _add_metadata(self, table_name, item):
+        attr = {"lens_types": "_lens_types", "frame_colors": "_frame_colors"}.get(table_name)
+        if attr is None:
+            return
+        with self._lock:
+            items = getattr(self, attr)
+            if not any(i.get("id") == item.get("id") for i in items):
+                setattr(self, attr, items + [item])
+
+    def _on_product_change(self, event):
+        with self._lock:
+            current = self._frames.get(event.id)
+            if event.op == DELETE:
+                self._frames.pop(event.id, None)
+                return
+            product = dict(current or {}, **(event.data or {}))
+            if event.op == UPDATE and current is None and "name" not in product:
+                return  # a partial update for a product that is not a frame
+            if product.get("category") == "Frame" or (current and "category" not in (event.data or {})):
+                self._frames[event.id] = product
+            else:
+                self._frames.pop(event.id, None)
+
+    def _on_stock_change(self, event):
+        with self._lock:
+            current = self._frames.get(event.id)
+        if current is None:
+            return  # not a frame; STOCK events carry no data, so only cached frames are re-read
+        stock_qty = self.repo.get_product_stock(current["id"])
+        with self._lock:
+            if event.id in self._frames:
+                self._frames[event.id] = dict(self._frames[event.id], stock_qty=stock_qty)
+
+    def _on_settings_changed(self, snapshot):
+        self._settings = snapshot
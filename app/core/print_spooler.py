@@ -0,0 +1,286 @@
+"""
+Lensy POS - Print spooler
+Printing off the UI thread. Jobs wait in a durable file with one queue per
+printer. A worker thread sends each printer's waiting jobs in one device
+session, and backs off and retries a printer that fails.
+"""
+import base64
+import datetime
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from app.config import LOCAL_JSON_DB
+from app.core.i18n import _
+from app.core.receipts import (
+    LOGO_SETTING, open_printer, print_document, printer_profile, printer_target, render_escpos, render_text,
+    shop_context,
+)
+
+RAW = "raw"            # a rendered ESC/POS job
+LAB_DAY = "lab_day"    # the lab copies of one day's orders, rendered page by page as they print
+
+MAX_ATTEMPTS = 5       # tries before a job is set aside as failed
+RETRY_DELAY = 2        # seconds before the first retry, doubled after each failure
+MAX_RETRY_DELAY = 60
+MAX_BATCH = 20         # jobs sent in one device session
+LAB_DAY_PAGE = 50      # sales read per page by a LAB_DAY job
+
+
+def default_job_file():
+    # Next to the data file, but one per terminal: printers are attached to a terminal,
+    # while the data directory may be shared by several
+    directory = os.path.dirname(os.path.abspath(LOCAL_JSON_DB))
+    return os.path.join(directory, f"print_jobs.{socket.gethostname()}.json")
+
+
+class _ConsolePrinter:
+    """Where a job goes when no printer is set up: its text, on stdout."""
+
+    @contextmanager
+    def session(self):
+        yield sys.stdout
+
+
+class PrintSpooler:
+    """
+    Queues print jobs and prints them on a daemon worker.
+
+    submit() renders a template at once and queues the bytes for the printer
+    set up for its role. submit_lab_day() queues a job that reads one day's
+    orders a page at a time while it prints. Jobs are kept in `path` until
+    they print, so a restart resumes the queue, and a LAB_DAY job resumes
+    after its last printed page. Printers are served in turn. A printer's
+    waiting jobs (up to MAX_BATCH) go out in one session. When that fails,
+    the job that failed is retried after a growing delay, and the jobs
+    behind it wait. After MAX_ATTEMPTS it is set aside in failed_jobs().
+    """
+
+    def __init__(self, repo, path, on_error=None):
+        self.repo = repo
+        self.path = path
+        self._on_error = on_error
+        self._queues = OrderedDict()  # printer setting -> deque of jobs, oldest first
+        self._failed = []
+        self._lock = threading.Condition()
+        self._stopped = False
+        self._worker = None
+        jobs, self._failed = self._load()
+        for job in jobs:
+            self._queues.setdefault(job["target"], deque()).append(job)
+
+    # --- Worker ---
+    def start(self):
+        """Start the worker (once); returns at once."""
+        with self._lock:
+            if self._worker is None:
+                self._stopped = False
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        return self
+
+    def stop(self):
+        """Let the worker finish its current batch and exit; queued jobs stay in the file."""
+        with self._lock:
+            self._stopped = True
+            self._lock.notify_all()
+        if self._worker is not None and self._worker is not threading.current_thread():
+            self._worker.join(timeout=5)
+        self._worker = None
+
+    def _run(self):
+        while True:
+            with self._lock:
+                batch = self._next_batch()
+                while batch is None and not self._stopped:
+                    self._lock.wait(self._wait_time())
+                    batch = self._next_batch()
+                if self._stopped:
+                    return
+            self._print(*batch)
+
+    def _next_batch(self):
+        """(printer setting, jobs) for the next printer in turn with a job due, or None."""
+        now = time.time()
+        for target, jobs in list(self._queues.items()):
+            if jobs[0]["not_before"] <= now:
+                self._queues.move_to_end(target)
+                return target, [jobs[k] for k in range(min(len(jobs), MAX_BATCH))]
+        return None
+
+    def _wait_time(self):
+        due = [jobs[0]["not_before"] for jobs in self._queues.values()]
+        return max(min(due) - time.time(), 0) if due else None
+
+    def _print(self, target, batch):
+        printed = 0
+        try:
+            printer = open_printer(target) if target else _ConsolePrinter()
+            with printer.session() as out:
+                for job in batch:
+                    if job["kind"] == LAB_DAY:
+                        self._print_lab_day(job, out, text=not target)
+                    else:
+                        out.write(base64.b64decode(job["data"]))
+                    printed += 1
+        except Exception as e:
+            self._finished(target, batch[:printed])
+            if printed < len(batch):
+                self._retry_later(target, batch[printed], e)
+            else:
+                print(f"[PRINT] {target}: closing the printer failed: {e}")
+        else:
+            self._finished(target, batch)
+
+    def _print_lab_day(self, job, out, text):
+        settings = self.repo.get_settings()
+        profile, logo, shop = printer_profile(settings), settings.get(LOGO_SETTING), shop_context(settings)
+        while True:
+            sales, next_cursor = self.repo.search_sales(
+                date_range=(job["day"], job["day"]), limit=LAB_DAY_PAGE, cursor=job["cursor"])
+            exams = self.repo.get_examinations_for_sales([sale["id"] for sale in sales])
+            for sale in sales:
+                if not exams[str(sale["id"])]:
+                    continue  # nothing for the lab
+                context = dict(shop, sale=sale, customer={"name": sale.get("customer_name") or _("Walk-in")},
+                               examinations=exams[str(sale["id"])])
+                out.write(render_text("lab_ticket", context) + "\n" if text
+                          else render_escpos("lab_ticket", context, profile, logo))
+            if next_cursor is None:
+                return
+            # A restart picks up after the pages already printed
+            with self._lock:
+                job["cursor"] = next_cursor
+                self._save()
+
+    def _finished(self, target, jobs):
+        if not jobs:
+            return
+        with self._lock:
+            queue = self._queues[target]
+            for _job in jobs:
+                queue.popleft()
+            if not queue:
+                del self._queues[target]
+            self._save()
+
+    def _retry_later(self, target, job, error):
+        with self._lock:
+            job["attempts"] += 1
+            job["error"] = str(error)
+            if job["attempts"] >= MAX_ATTEMPTS:
+                queue = self._queues[target]
+                queue.popleft()
+                if not queue:
+                    del self._queues[target]
+                self._failed.append(job)
+            else:
+                job["not_before"] = time.time() + min(RETRY_DELAY * 2 ** (job["attempts"] - 1), MAX_RETRY_DELAY)
+            self._save()
+        print(f"[PRINT] {target or 'console'}: attempt {job['attempts']} failed: {error}")
+        if self._on_error is not None and job["attempts"] >= MAX_ATTEMPTS:
+            try:
+                self._on_error(job, error)
+            except Exception as e:
+                print(f"[PRINT] error handler failed: {e}")
+
+    # --- Jobs ---
+    def submit(self, name, context, settings, role="receipt"):
+        """
+        Queue template `name` for the printer set up for `role`; returns the job id.
+        Without a printer its text is written to stdout at once and None returned.
+        """
+        target = printer_target(settings, role)
+        if not target:
+            print(render_text(name, context))
+            return None
+        data = render_escpos(name, context, printer_profile(settings), logo=settings.get(LOGO_SETTING))
+        return self._enqueue({"kind": RAW, "target": target, "data": base64.b64encode(data).decode("ascii")})
+
+    def submit_lab_day(self, settings, day=None):
+        """Queue the lab copy of every order placed on `day` (default today) that has examinations."""
+        day = (day or datetime.date.today()).isoformat()
+        return self._enqueue({"kind": LAB_DAY, "target": printer_target(settings, "lab"), "day": day, "cursor": None})
+
+    def _enqueue(self, job):
+        job.update(id=uuid.uuid4().hex, attempts=0, not_before=0,
+                   created_at=datetime.datetime.now().isoformat(timespec="seconds"))
+        with self._lock:
+            self._queues.setdefault(job["target"], deque()).append(job)
+            self._save()
+            self._lock.notify_all()
+        return job["id"]
+
+    def pending(self):
+        """The queued jobs, per printer in queue order."""
+        with self._lock:
+            return [dict(job) for jobs in self._queues.values() for job in jobs]
+
+    def failed_jobs(self):
+        with self._lock:
+            return [dict(job) for job in self._failed]
+
+    def retry_failed(self):
+        """Queue the failed jobs again."""
+        with self._lock:
+            for job in self._failed:
+                job.update(attempts=0, not_before=0)
+                self._queues.setdefault(job["target"], deque()).append(job)
+            self._failed = []
+            self._save()
+            self._lock.notify_all()
+
+    # --- Job file ---
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data.get("jobs", []), data.get("failed", [])
+        except FileNotFoundError:
+            return [], []
+        except (OSError, ValueError) as e:
+            print(f"[PRINT] job file unreadable, starting empty: {e}")
+            return [], []
+
+    def _save(self):
+        # Same swap-in write as the data file, so a crash never leaves half a job file
+        data = {"jobs": [job for jobs in self._queues.values() for job in jobs], "failed": self._failed}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".print_jobs.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_spooler(repo, path=None):
+    """The process's spooler for `path` (default_job_file()), shared by every session and started on first use."""
+    path = path or default_job_file()
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = PrintSpooler(repo, path).start()
+        return _shared[path]
+
+
+def spool(page, name, context, settings, role="receipt"):
+    """Queue a document on the session's spooler, or print it now if the session has none."""
+    spooler = (page.data or {}).get("print_spooler")
+    if spooler is None:
+        print_document(name, context, settings, role)
+        return None
+    return spooler.submit(name, context, settings, role)
@@ -0,0 +1,817 @@
+"""
+Lensy POS - Receipts
+Shop, customer and lab copies, sale receipts and prescriptions as templates.
+A template is compiled once per language - labels translated, Arabic text
+shaped for the printer - and rendered either as preview text or as an
+ESC/POS byte stream for a thermal printer.
+
+Template lines:
+    ==  --                 a rule of that character across the paper
+    ^text  >text           centred / flush right (left by default); *text is bold
+    left | right           right part flush right, gap filled with spaces ('|.' fills with dots);
+                           a left part too long for the line is cut short
+    [[Label]]              translated when the template is compiled
+    {path:spec|default}    a context value: dotted path, format spec, text used when it is empty
+    @if path / @else / @end, @for name in path / @end  ({n} is the 1-based position in a loop)
+    @include name          another template's lines
+    @logo                  the shop logo (printed output only)
+A line whose values are all empty is left out.
+"""
+import functools
+import os
+import socket
+import string
+from collections import ChainMap
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from app.core.i18n import _, get_language
+
+# Settings read by printer_for() and printer_profile()
+RECEIPT_PRINTER_SETTING = "receipt_printer"   # device path, file path or tcp://host[:port]
+LAB_PRINTER_SETTING = "lab_printer"           # optional, else the receipt printer
+PRINTER_WIDTH_SETTING = "printer_width"       # characters per line
+LOGO_SETTING = "receipt_logo"                 # image path (PBM, or any format with Pillow)
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+
+@dataclass(frozen=True)
+class PrinterProfile:
+    width: int = 48          # characters per line (80 mm paper, font A; 32 for 58 mm)
+    dots: int = 576          # printable dots per line, the widest logo
+    encoding: str = "cp864"  # Arabic code page with presentation forms
+    codepage: int = 37       # ESC t number of that code page (Epson: PC864)
+    cut: bool = True
+
+
+DEFAULT_PROFILE = PrinterProfile()
+
+
+# --- Templates ---
+TEMPLATES = {
+    "shop_header": """
+@logo
+^{shop_name}
+@if shop_address
+^{shop_address}
+@end
+@if shop_phone
+^{shop_phone}
+@end
+==
+""",
+    "dates": """
+[[Invoice]]: #{invoice_no}
+[[Date]]: {date:%d/%m/%Y %H:%M}
+[[Delivery Date]]: {delivery_date:%d/%m/%Y|N/A}
+""",
+    "items": """
+@if items
+[[Items]]:
+@for item in items
+  {item.name} | x{item.qty:<3} {item.total_price:>9.2f}
+@end
+@end
+""",
+    "totals": """
+--
+[[Gross Total]] |. {totals.gross_total:.2f} {currency}
+[[Discount]] |. {totals.discount:.2f} {currency}
+[[Net Amount]] |. {totals.net_amount:.2f} {currency}
+[[Amount Paid]] |. {totals.amount_paid:.2f} {currency}
+[[Balance]] |. {totals.balance:.2f} {currency}
+==
+""",
+    "eyes": """
+  OD (Right Eye)
+    SPH: {exam.sphere_od:>8|-}
+    CYL: {exam.cylinder_od:>8|-}
+    AXIS: {exam.axis_od:>7|-}
+  OS (Left Eye)
+    SPH: {exam.sphere_os:>8|-}
+    CYL: {exam.cylinder_os:>8|-}
+    AXIS: {exam.axis_os:>7|-}
+""",
+    "shop_copy": """
+==
+*^نسخة المحل - SHOP COPY
+==
+@include shop_header
+@include dates
+--
+[[Customer]]: {customer.name}
+[[Phone]]: {customer.phone}
+[[Doctor]]: {doctor_name}
+--
+@include items
+@if examinations
+--
+[[Examinations]]:
+@for exam in examinations
+  [{n}] {exam.exam_type|N/A}
+      OD: {exam.sphere_od|-}/{exam.cylinder_od|-}x{exam.axis_od|-}
+      OS: {exam.sphere_os|-}/{exam.cylinder_os|-}x{exam.axis_os|-}
+      IPD: {exam.ipd|-}
+      [[Lens]]: {exam.lens_info|-}
+      [[Frame]]: {exam.frame_info|-} ({exam.frame_color|-})
+@end
+@end
+@include totals
+""",
+    "customer_copy": """
+==
+*^نسخة العميل - CUSTOMER COPY
+==
+@include shop_header
+@include dates
+--
+[[Customer]]: {customer.name}
+[[Phone]]: {customer.phone}
+--
+@include items
+@if examinations
+--
+[[Ordered Items]]:
+@for exam in examinations
+  [[Lens]]: {exam.lens_info}
+@if exam.frame_info
+  [[Frame]]: {exam.frame_info} ({exam.frame_color|-})
+@end
+@end
+@end
+@include totals
+^[[Thank you for your purchase!]]
+==
+""",
+    "lab_copy": """
+==
+*^نسخة المختبر - LAB COPY
+==
+[[Invoice]]: #{invoice_no}
+[[Date]]: {date:%d/%m/%Y}
+[[Delivery Date]]: {delivery_date:%d/%m/%Y|N/A}
+[[Doctor]]: {doctor_name}
+==
+@for exam in examinations
+--
+*[[Exam]] #{n}: {exam.exam_type|N/A}
+==
+@include eyes
+  IPD: {exam.ipd|-}
+--
+  [[Lens Type]]: {exam.lens_info|-}
+  [[Frame]]: {exam.frame_info|-}
+  [[Color]]: {exam.frame_color|-}
+  [[Frame Status]]: {exam.frame_status|-}
+@end
+@if not examinations
+[[No examination data]]
+@end
+==
+""",
+    "lab_ticket": """
+==
+*LAB COPY - {shop_name}
+==
+[[Invoice]]: #{sale.invoice_no}
+[[Date]]: {sale.order_date:.10}
+[[Delivery Date]]: {sale.delivery_date:.10|N/A}
+[[Customer]]: {customer.name} - [[Phone]]: {customer.phone}
+[[Doctor]]: {sale.doctor_name|N/A}
+--
+@for exam in examinations
+*[[Exam]] #{n} - {exam.exam_type|N/A}
+  OD: SPH {exam.sphere_od} CYL {exam.cylinder_od} AXIS {exam.axis_od}
+  OS: SPH {exam.sphere_os} CYL {exam.cylinder_os} AXIS {exam.axis_os}
+  IPD: {exam.ipd}
+  [[Lens]]: {exam.lens_info|N/A}
+  [[Frame]]: {exam.frame_info|N/A} ({exam.frame_color}) [{exam.frame_status}]
+@end
+==
+""",
+    "sale_receipt": """
+==
+@logo
+*^{shop_name}
+==
+[[Invoice]]: #{sale.invoice_no}
+[[Date]]: {sale.order_date:.16}
+[[Customer]]: {customer.name}
+--
+[[Total]] | {sale.net_amount:.2f}
+[[Paid]] | {sale.amount_paid:.2f}
+[[Balance]] | {balance:.2f}
+==
+""",
+    "prescription": """
+==
+*^{shop_name}
+==
+[[Prescription]]
+[[Customer]]: {customer.name}
+[[Date]]: {prescription.created_at:.10|N/A}
+[[Type]]: {prescription.type|N/A}
+[[Doctor]]: {prescription.doctor_name|N/A}
+==
+@include eyes
+==
+[[Notes]]: {prescription.notes}
+""",
+    "order_exam": """
+==
+*^{shop_name}
+==
+[[Order Exam]] - #{sale.invoice_no|N/A}
+[[Customer]]: {customer.name}
+[[Date]]: {sale.order_date:.10|N/A}
+[[Type]]: {exam.exam_type|N/A}
+==
+@include eyes
+
+IPD: {exam.ipd|-}
+==
+[[Lens Type]]: {exam.lens_info|-}
+[[Frame]]: {exam.frame_info|-}
+[[Color]]: {exam.frame_color|-}
+==
+""",
+}
+
+
+# --- Arabic shaping ---
+# Letter -> (first presentation form, number of forms). Forms run isolated,
+# final, initial, medial; two-form letters only join to the letter before.
+_ARABIC_FORMS = {
+    "ء": (0xFE80, 1), "آ": (0xFE81, 2), "أ": (0xFE83, 2), "ؤ": (0xFE85, 2),
+    "إ": (0xFE87, 2), "ئ": (0xFE89, 4), "ا": (0xFE8D, 2), "ب": (0xFE8F, 4),
+    "ة": (0xFE93, 2), "ت": (0xFE95, 4), "ث": (0xFE99, 4), "ج": (0xFE9D, 4),
+    "ح": (0xFEA1, 4), "خ": (0xFEA5, 4), "د": (0xFEA9, 2), "ذ": (0xFEAB, 2),
+    "ر": (0xFEAD, 2), "ز": (0xFEAF, 2), "س": (0xFEB1, 4), "ش": (0xFEB5, 4),
+    "ص": (0xFEB9, 4), "ض": (0xFEBD, 4), "ط": (0xFEC1, 4), "ظ": (0xFEC5, 4),
+    "ع": (0xFEC9, 4), "غ": (0xFECD, 4), "ف": (0xFED1, 4), "ق": (0xFED5, 4),
+    "ك": (0xFED9, 4), "ل": (0xFEDD, 4), "م": (0xFEE1, 4), "ن": (0xFEE5, 4),
+    "ه": (0xFEE9, 4), "و": (0xFEED, 2), "ى": (0xFEEF, 2), "ي": (0xFEF1, 4),
+}
+_LAM_ALEF = {"آ": 0xFEF5, "أ": 0xFEF7, "إ": 0xFEF9, "ا": 0xFEFB}
+_TATWEEL = "ـ"
+_ISOLATED, _FINAL, _INITIAL, _MEDIAL = range(4)
+
+
+def _is_harakah(ch):
+    return "ً" <= ch <= "ْ"
+
+
+def _joins_forward(ch):
+    return ch == _TATWEEL or _ARABIC_FORMS.get(ch, (0, 0))[1] == 4
+
+
+def _joins(ch):
+    return ch == _TATWEEL or ch in _ARABIC_FORMS and _ARABIC_FORMS[ch][1] > 1
+
+
+def shape_arabic(text):
+    """Arabic letters replaced by their contextual presentation forms (logical order kept)."""
+    letters = [ch for ch in text if not _is_harakah(ch)]
+    out = []
+    i = 0
+    while i < len(letters):
+        ch = letters[i]
+        if ch not in _ARABIC_FORMS:
+            out.append(ch)
+            i += 1
+            continue
+        joins_before = i > 0 and _joins_forward(letters[i - 1])
+        nxt = letters[i + 1] if i + 1 < len(letters) else ""
+        if ch == "ل" and nxt in _LAM_ALEF:
+            out.append(chr(_LAM_ALEF[nxt] + (1 if joins_before else 0)))
+            i += 2
+            continue
+        first, forms = _ARABIC_FORMS[ch]
+        joins_after = forms == 4 and _joins(nxt)
+        if forms == 1:
+            form = _ISOLATED
+        elif joins_before and joins_after:
+            form = _MEDIAL
+        elif joins_before:
+            form = _FINAL
+        elif joins_after:
+            form = _INITIAL
+        else:
+            form = _ISOLATED
+        out.append(chr(first + form))
+        i += 1
+    return "".join(out)
+
+
+@functools.lru_cache(maxsize=4096)
+def _shape_value(text):
+    return shape_arabic(text) if _has_rtl(text) else text
+
+
+def _has_rtl(text):
+    return any("؀" <= ch <= "ۿ" or "ﹰ" <= ch <= "﻿" for ch in text)
+
+
+def _direction(ch):
+    if "؀" <= ch <= "ۿ" or "ﹰ" <= ch <= "﻿":
+        return "R"
+    return "L" if ch.isalnum() else None
+
+
+_NUMBER_SIGNS = "#$%+-.,/"
+_MIRRORED = str.maketrans("()[]{}<>", ")(][}{><")
+
+
+def visual_order(text):
+    """
+    A shaped line in the left-to-right order a printer lays it out.
+
+    Runs of Arabic are reversed; a line that starts (by its first letter)
+    in Arabic is laid out right to left, keeping Latin words and numbers
+    readable within it. Neutral characters side with the runs around them.
+    """
+    if not _has_rtl(text):
+        return text
+    directions = [_direction(ch) for ch in text]
+    # Signs and terminators next to a digit (#12, 5%, -1.25) stay with the number
+    for i, ch in enumerate(text):
+        if ch in _NUMBER_SIGNS and any(0 <= j < len(text) and text[j].isdigit() for j in (i - 1, i + 1)):
+            directions[i] = "L"
+    runs = []  # [direction, chars]
+    for ch, d in zip(text, directions):
+        if runs and runs[-1][0] == d:
+            runs[-1][1].append(ch)
+        else:
+            runs.append([d, [ch]])
+    base = next(d for d, _chars in runs if d)
+    for k, run in enumerate(runs):
+        if run[0] is None:
+            before = next((r[0] for r in reversed(runs[:k]) if r[0]), base)
+            after = next((r[0] for r in runs[k + 1:] if r[0]), base)
+            run[0] = before if before == after else base
+    merged = []
+    for d, chars in runs:
+        if merged and merged[-1][0] == d:
+            merged[-1][1].extend(chars)
+        else:
+            merged.append([d, list(chars)])
+    pieces = ["".join(reversed(chars)).translate(_MIRRORED) if d == "R" else "".join(chars)
+              for d, chars in merged]
+    return "".join(reversed(pieces) if base == "R" else pieces)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding_table(encoding):
+    """Presentation forms the code page lacks, mapped to a form of the same letter it has."""
+    fallbacks = {_FINAL: (_ISOLATED,), _INITIAL: (_ISOLATED,), _MEDIAL: (_INITIAL, _FINAL, _ISOLATED)}
+    table = {}
+    for first, forms in _ARABIC_FORMS.values():
+        for form in range(forms):
+            for alternative in (form,) + fallbacks.get(form, ()):
+                try:
+                    chr(first + alternative).encode(encoding)
+                except UnicodeEncodeError:
+                    continue
+                if alternative != form:
+                    table[first + form] = first + alternative
+                break
+    for code in _LAM_ALEF.values():
+        try:
+            chr(code + 1).encode(encoding)
+        except UnicodeEncodeError:
+            table[code + 1] = code
+    return table
+
+
+def encode_for_printer(text, encoding):
+    return text.translate(_encoding_table(encoding)).encode(encoding, errors="replace")
+
+
+# --- Compiling ---
+_formatter = string.Formatter()
+
+
+class _Field:
+    __slots__ = ("path", "spec", "default")
+
+    def __init__(self, name, spec):
+        # The default may follow the name ({a|-}) or the spec ({a:>8|-})
+        name, _sep, default = name.partition("|")
+        spec, _sep, spec_default = (spec or "").partition("|")
+        self.path = name.strip().split(".")
+        self.spec = spec
+        self.default = default or spec_default
+
+    def value(self, context):
+        """The formatted value, or None when it is empty (and there is no default)."""
+        value = _resolve(context, self.path)
+        if value is None or value == "":
+            return self.default or None
+        if not self.spec:
+            return str(value)
+        try:
+            return format(value, self.spec)
+        except (ValueError, TypeError):
+            try:
+                return format(float(value), self.spec)
+            except (ValueError, TypeError):
+                return str(value)
+
+
+def _resolve(context, path):
+    value = context.get(path[0])
+    for part in path[1:]:
+        if value is None:
+            return None
+        value = value.get(part) if isinstance(value, dict) else getattr(value, part, None)
+    return value
+
+
+def _segments(text):
+    """Literal (logical, shaped) pairs and _Fields."""
+    segments = []
+    for literal, name, spec, _conversion in _formatter.parse(text):
+        if literal:
+            segments.append((literal, shape_arabic(literal)))
+        if name is not None:
+            segments.append(_Field(name, spec))
+    return segments
+
+
+class _Line:
+    __slots__ = ("align", "bold", "left", "right", "fill", "has_fields")
+
+    def __init__(self, text):
+        self.bold = text.startswith("*")
+        text = text[1:] if self.bold else text
+        self.align = text[0] if text[:1] in ("^", ">") else "<"
+        text = text[1:] if self.align != "<" else text
+        split = _leader_split(text)
+        if split is None:
+            self.left, self.right, self.fill = _segments(text), None, None
+        else:
+            left, right = text[:split].rstrip(), text[split + 1:]
+            self.fill = "." if right.startswith(".") else " "
+            self.left, self.right = _segments(left), _segments(right.lstrip(". "))
+        self.has_fields = any(isinstance(s, _Field) for s in self.left + (self.right or []))
+
+    def render(self, context, width, printer):
+        values = []
+        left = _join(self.left, context, printer, values)
+        right = _join(self.right, context, printer, values) if self.right is not None else None
+        if self.has_fields and not any(values):
+            return None
+        if right is not None:
+            # The left part gives way so the right one is never pushed off the paper
+            left = left[:max(width - len(right) - 1, 0)]
+        if printer:
+            left = visual_order(left)
+            right = visual_order(right) if right is not None else None
+        if right is not None:
+            return left + self.fill * max(width - len(left) - len(right), 1) + right
+        if self.align == "^":
+            return left.center(width).rstrip()
+        if self.align == ">":
+            return left.rjust(width)
+        return left
+
+
+def _leader_split(text):
+    """Index of the first '|' outside {...}, or None."""
+    depth = 0
+    for i, ch in enumerate(text):
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return i
+    return None
+
+
+def _join(segments, context, printer, values):
+    parts = []
+    for segment in segments:
+        if isinstance(segment, _Field):
+            value = segment.value(context)
+            values.append(value)
+            parts.append(_shape_value(value) if printer and value else value or "")
+        else:
+            parts.append(segment[1] if printer else segment[0])
+    return "".join(parts)
+
+
+class _Rule:
+    __slots__ = ("char",)
+
+    def __init__(self, char):
+        self.char = char
+
+
+class _Logo:
+    pass
+
+
+class _If:
+    __slots__ = ("path", "negate", "body", "orelse")
+
+    def __init__(self, expression):
+        self.negate = expression.startswith("not ")
+        self.path = expression[4:].strip().split(".") if self.negate else expression.split(".")
+        self.body, self.orelse = [], []
+
+
+class _For:
+    __slots__ = ("name", "path", "body")
+
+    def __init__(self, name, path):
+        self.name, self.path, self.body = name, path.split("."), []
+
+
+class ReceiptTemplate:
+    """A compiled template; see the module docstring for the syntax."""
+
+    def __init__(self, source, name="<template>", templates=None):
+        self.name = name
+        self.nodes = self._compile(source, templates or TEMPLATES, (name,))
+
+    def _compile(self, source, templates, including):
+        root = []
+        stack = [(None, root)]  # (block node, list being filled)
+        for number, raw in enumerate(source.strip("\n").split("\n"), 1):
+            line = raw.rstrip()
+            line = _translate_labels(line)
+            target = stack[-1][1]
+            if line.startswith("@"):
+                word, _sep, rest = line[1:].partition(" ")
+                rest = rest.strip()
+                if word == "if" and rest:
+                    node = _If(rest)
+                    target.append(node)
+                    stack.append((node, node.body))
+                elif word == "else" and isinstance(stack[-1][0], _If):
+                    stack[-1] = (stack[-1][0], stack[-1][0].orelse)
+                elif word == "for" and " in " in rest:
+                    name, _sep, path = rest.partition(" in ")
+                    node = _For(name.strip(), path.strip())
+                    target.append(node)
+                    stack.append((node, node.body))
+                elif word == "end" and len(stack) > 1:
+                    stack.pop()
+                elif word == "include" and rest in templates and rest not in including:
+                    target.extend(self._compile(templates[rest], templates, including + (rest,)))
+                elif word == "logo":
+                    target.append(_Logo())
+                else:
+                    raise ValueError(f"receipt template {self.name} line {number}: cannot read {line!r}")
+            elif line in ("==", "--"):
+                target.append(_Rule(line[0]))
+            else:
+                target.append(_Line(line))
+        if len(stack) > 1:
+            raise ValueError(f"receipt template {self.name}: @end missing")
+        return root
+
+    def rows(self, context, width, printer=False):
+        """The rendered lines (str) and, where the logo goes, the _Logo marker; bold lines come as (text,)."""
+        rows = []
+        self._render(self.nodes, context, width, printer, rows)
+        return rows
+
+    def _render(self, nodes, context, width, printer, rows):
+        for node in nodes:
+            if isinstance(node, _Line):
+                text = node.render(context, width, printer)
+                if text is not None:
+                    rows.append((text,) if node.bold else text)
+            elif isinstance(node, _Rule):
+                rows.append(node.char * width)
+            elif isinstance(node, _If):
+                truthy = bool(_resolve(context, node.path))
+                self._render(node.body if truthy != node.negate else node.orelse, context, width, printer, rows)
+            elif isinstance(node, _For):
+                for n, item in enumerate(_resolve(context, node.path) or (), 1):
+                    self._render(node.body, ChainMap({node.name: item, "n": n}, context), width, printer, rows)
+            elif isinstance(node, _Logo) and printer:
+                rows.append(node)
+
+    def render_text(self, context, width=DEFAULT_PROFILE.width):
+        return "\n".join(row if isinstance(row, str) else row[0] for row in self.rows(context, width))
+
+    def render_escpos(self, context, profile=DEFAULT_PROFILE, logo=None):
+        """The ESC/POS job: initialise, select the code page, the lines, feed and cut."""
+        out = bytearray(ESC + b"@" + ESC + b"t" + bytes([profile.codepage]))
+        for row in self.rows(context, profile.width, printer=True):
+            if isinstance(row, _Logo):
+                raster = load_logo(logo, profile.dots) if logo else b""
+                if raster:
+                    out += ESC + b"a\x01" + raster + ESC + b"a\x00"
+            elif isinstance(row, tuple):
+                out += ESC + b"E\x01" + encode_for_printer(row[0], profile.encoding) + b"\n" + ESC + b"E\x00"
+            else:
+                out += encode_for_printer(row, profile.encoding) + b"\n"
+        out += ESC + b"d\x03"
+        if profile.cut:
+            out += GS + b"V\x01"
+        return bytes(out)
+
+
+def _translate_labels(line):
+    while "[[" in line and "]]" in line:
+        start = line.index("[[")
+        end = line.index("]]", start)
+        line = line[:start] + _(line[start + 2:end]) + line[end + 2:]
+    return line
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled(name, language):
+    return ReceiptTemplate(TEMPLATES[name], name)
+
+
+def get_template(name):
+    """The compiled template `name` for the current language (compiled on first use)."""
+    return _compiled(name, get_language())
+
+
+def render_text(name, context, width=DEFAULT_PROFILE.width):
+    """Preview text of template `name`."""
+    return get_template(name).render_text(context, width)
+
+
+def render_escpos(name, context, profile=DEFAULT_PROFILE, logo=None):
+    """ESC/POS bytes of template `name`, with the logo at `logo` (a path) where the template has @logo."""
+    return get_template(name).render_escpos(context, profile, logo)
+
+
+# --- Logo ---
+def load_logo(path, max_dots=DEFAULT_PROFILE.dots):
+    """The image at `path` as a GS v 0 raster command (b"" if it cannot be read); cached per file version."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return b""
+    return _raster_logo(path, mtime, max_dots)
+
+
+@functools.lru_cache(maxsize=8)
+def _raster_logo(path, mtime, max_dots):
+    try:
+        width, height, rows = _read_bitmap(path, max_dots)
+    except Exception as e:
+        print(f"[RECEIPT] logo not loaded: {e}")
+        return b""
+    row_bytes = (width + 7) // 8
+    header = GS + b"v0\x00" + bytes([row_bytes & 0xFF, row_bytes >> 8, height & 0xFF, height >> 8])
+    return header + b"".join(rows)
+
+
+def _read_bitmap(path, max_dots):
+    """(width, height, packed rows with 1 = black), at most `max_dots` wide."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:2] in (b"P1", b"P4"):
+        return _read_pbm(data, max_dots)
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ValueError(f"{os.path.basename(path)}: only PBM logos can be read without Pillow")
+    image = Image.open(path)
+    if image.width > max_dots:
+        image = image.resize((max_dots, max(1, image.height * max_dots // image.width)))
+    image = image.convert("1")
+    row_bytes = (image.width + 7) // 8
+    # PIL's 1-bit packing uses 1 = white
+    packed = bytes(b ^ 0xFF for b in image.tobytes())
+    rows = [packed[r * row_bytes:(r + 1) * row_bytes] for r in range(image.height)]
+    return image.width, image.height, rows
+
+
+def _read_pbm(data, max_dots):
+    tokens, position = [], 2
+    # Header: magic, width, height, with '#' comments allowed between them
+    while len(tokens) < 2:
+        while data[position:position + 1].isspace():
+            position += 1
+        if data[position:position + 1] == b"#":
+            position = data.index(b"\n", position) + 1
+            continue
+        end = position
+        while not data[end:end + 1].isspace():
+            end += 1
+        tokens.append(int(data[position:end]))
+        position = end
+    width, height = tokens
+    row_bytes = (width + 7) // 8
+    if data[:2] == b"P4":
+        raster = data[position + 1:position + 1 + row_bytes * height]
+    else:
+        bits = [b for b in data[position:] if b in b"01"]
+        raster = bytearray()
+        for r in range(height):
+            row = bits[r * width:(r + 1) * width]
+            for k in range(0, width, 8):
+                chunk = row[k:k + 8]
+                byte = 0
+                for bit in chunk:
+                    byte = byte << 1 | (bit == ord("1"))
+                raster.append(byte << (8 - len(chunk)))
+        raster = bytes(raster)
+    keep = min(row_bytes, max_dots // 8)
+    rows = [raster[r * row_bytes:r * row_bytes + keep] for r in range(height)]
+    return min(width, keep * 8), height, rows
+
+
+# --- Printers ---
+class FilePrinter:
+    """
+    Appends jobs to a file or device node (/dev/usb/lp0, LPT1, ...);
+    pointed at a regular file it stands in for a printer in tests.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def session(self):
+        """The device opened once; write(data) any number of jobs to it."""
+        with open(self.path, "ab") as f:
+            yield f
+
+    def send(self, data):
+        with self.session() as out:
+            out.write(data)
+
+
+class NetworkPrinter:
+    """A printer listening for raw jobs on a TCP port (9100 on most thermal printers)."""
+
+    def __init__(self, host, port=9100, timeout=10):
+        self.host, self.port, self.timeout = host, port, timeout
+
+    @contextmanager
+    def session(self):
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as conn:
+            yield _SocketWriter(conn)
+
+    def send(self, data):
+        with self.session() as out:
+            out.write(data)
+
+
+class _SocketWriter:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, data):
+        self.conn.sendall(data)
+
+
+def printer_target(settings, role="receipt"):
+    """The printer setting for `role` ("receipt" or "lab"); "" if none is set up."""
+    target = settings.get(LAB_PRINTER_SETTING) if role == "lab" else None
+    return (target or settings.get(RECEIPT_PRINTER_SETTING) or "").strip()
+
+
+def open_printer(target):
+    """The printer for a setting value: tcp://host[:port], else a device or file path."""
+    if target.startswith("tcp://"):
+        host, _sep, port = target[len("tcp://"):].partition(":")
+        return NetworkPrinter(host, int(port or 9100))
+    return FilePrinter(target)
+
+
+def printer_for(settings, role="receipt"):
+    """The printer configured for `role`, or None if there is none."""
+    target = printer_target(settings, role)
+    return open_printer(target) if target else None
+
+
+def printer_profile(settings):
+    width = settings.get(PRINTER_WIDTH_SETTING)
+    try:
+        return PrinterProfile(width=int(width)) if width else DEFAULT_PROFILE
+    except (TypeError, ValueError):
+        return DEFAULT_PROFILE
+
+
+def print_document(name, context, settings, role="receipt"):
+    """Print template `name` on the printer for `role`, or write its text to stdout if none is set up."""
+    printer = printer_for(settings, role)
+    if printer is None:
+        print(render_text(name, context))
+        return
+    profile = printer_profile(settings)
+    printer.send(render_escpos(name, context, profile, logo=settings.get(LOGO_SETTING)))
+
+
+def shop_context(settings):
+    """The shop fields every template may use."""
+    return {
+        "shop_name": settings.get("shop_name", "Optical Shop"),
+        "shop_address": settings.get("store_address", ""),
+        "shop_phone": settings.get("store_phone", ""),
+        "currency": settings.get("currency", "EGP"),
+    }
@@ -0,0 +1,274 @@
+"""
+Lensy POS - Global search index
+Customers, products and invoices held in memory for the top bar search:
+a sorted key list answers exact and prefix matches by bisection, and an
+n-gram index narrows substring matches to a handful of candidates, so a
+search never scans the tables. Loaded once, then patched from change events;
+the Flet app keeps one per process (shared_search_index).
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+
+from app.core.events import CUSTOMER, PRODUCT, SALE, INSERT, UPDATE, DELETE
+
+# What each kind keeps (enough to show a result) and which fields are searched
+RECORD_FIELDS = {
+    CUSTOMER: ("id", "name", "phone", "phone2", "city"),
+    PRODUCT: ("id", "name", "sku", "barcode", "sale_price", "category"),
+    SALE: ("id", "invoice_no", "customer_id", "order_date", "net_amount"),
+}
+SEARCH_FIELDS = {
+    CUSTOMER: ("name", "phone", "phone2"),
+    PRODUCT: ("name", "sku", "barcode"),
+    SALE: ("invoice_no",),
+}
+SEARCH_KINDS = (CUSTOMER, PRODUCT, SALE)
+
+# Match classes, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """One result: the record of `kind`, ranked by (match class, matched key)."""
+    kind: str
+    id: str
+    record: dict = field(compare=False)
+    rank: tuple = field(compare=False)
+
+
+def _grams(text):
+    """The 2- and 3-character substrings of `text`."""
+    return {text[i:i + n] for n in (2, 3) for i in range(len(text) - n + 1)}
+
+
+def _query_grams(term):
+    if len(term) < 3:
+        return {term}
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def _match_class(key, term):
+    if key == term:
+        return EXACT
+    if key.startswith(term):
+        return PREFIX
+    position = key.find(term)
+    if position < 0:
+        return None
+    while position > 0:
+        if not key[position - 1].isalnum():
+            return WORD_PREFIX
+        position = key.find(term, position + 1)
+    return SUBSTRING
+
+
+class _KindIndex:
+    """The records of one kind with their sorted keys and n-gram postings."""
+
+    def __init__(self, kind, records=()):
+        self.fields = SEARCH_FIELDS[kind]
+        self.records = {}   # id -> record
+        self.keys = {}      # id -> searched values, lower-cased
+        self.sorted = []    # (key, id), for exact and prefix lookups
+        self.grams = {}     # gram -> {id}
+        # A bulk load sorts once instead of inserting each key in place
+        for record in records:
+            record_id = str(record["id"])
+            self.records[record_id] = record
+            self.keys[record_id] = keys = self._keys(record)
+            for key in keys:
+                self.sorted.append((key, record_id))
+                for gram in _grams(key):
+                    self.grams.setdefault(gram, set()).add(record_id)
+        self.sorted.sort()
+
+    def _keys(self, record):
+        return tuple(sorted({str(record.get(f)).strip().lower() for f in self.fields if record.get(f)}))
+
+    def put(self, record):
+        record_id = str(record["id"])
+        keys = self._keys(record)
+        if self.keys.get(record_id) != keys:
+            self.remove(record_id)
+            self.keys[record_id] = keys
+            for key in keys:
+                insort(self.sorted, (key, record_id))
+                for gram in _grams(key):
+                    self.grams.setdefault(gram, set()).add(record_id)
+        self.records[record_id] = record
+
+    def remove(self, record_id):
+        self.records.pop(record_id, None)
+        for key in self.keys.pop(record_id, ()):
+            position = bisect_left(self.sorted, (key, record_id))
+            if position < len(self.sorted) and self.sorted[position] == (key, record_id):
+                del self.sorted[position]
+            for gram in _grams(key):
+                ids = self.grams.get(gram)
+                if ids is not None:
+                    ids.discard(record_id)
+                    if not ids:
+                        del self.grams[gram]
+
+    def search(self, term, limit):
+        """The best `limit` (rank, id) pairs for `term`, best first."""
+        found = {}
+        # Exact and prefix matches rank first and come out of the sorted keys in order
+        position = bisect_left(self.sorted, (term,))
+        while position < len(self.sorted) and len(found) < limit:
+            key, record_id = self.sorted[position]
+            if not key.startswith(term):
+                break
+            found.setdefault(record_id, (EXACT if key == term else PREFIX, key))
+            position += 1
+        if len(found) >= limit:
+            return sorted((rank, record_id) for record_id, rank in found.items())
+
+        # Then matches inside a key, among the records holding every gram of the term
+        postings = sorted((self.grams.get(g, set()) for g in _query_grams(term)), key=len)
+        candidates = set.intersection(*postings) - found.keys()
+        ranked = []
+        for record_id in candidates:
+            best = None
+            for key in self.keys[record_id]:
+                match = _match_class(key, term)
+                if match is not None and (best is None or (match, key) < best):
+                    best = (match, key)
+            if best is not None:
+                ranked.append((best, record_id))
+        ranked = heapq.nsmallest(limit - len(found), ranked)
+        return sorted([(rank, record_id) for record_id, rank in found.items()] + ranked)
+
+
+class SearchIndex:
+    """
+    The global search over customers, products and invoices.
+
+    `fetch(kinds)` returns {kind: [record, ...]} for the kinds asked for
+    (POSRepository.get_search_records); start() calls it on a worker thread
+    and searches wait for that load (or load synchronously if there was none).
+    on_change(event) keeps the index current - subscribe it to the session's
+    CUSTOMER, PRODUCT and SALE events; those arriving during a load are
+    replayed onto the freshly loaded records.
+    """
+
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._loading = None
+        self._loaded = False
+        self._kinds = {kind: _KindIndex(kind) for kind in SEARCH_KINDS}
+        self._buffers = []   # one per load in progress: events seen since its fetch began
+
+    # --- Loading ---
+    def start(self):
+        """Load everything on a daemon thread; returns at once."""
+        self._loading = threading.Thread(target=self._load_in_background, daemon=True)
+        self._loading.start()
+        return self
+
+    def load(self, kinds=SEARCH_KINDS):
+        """(Re)build the index for `kinds` from fetch()."""
+        kinds = tuple(kinds)
+        # Events arriving while fetching may or may not be in the rows; they are
+        # replayed onto the new indexes (applying one twice changes nothing)
+        buffer = []
+        with self._lock:
+            self._buffers.append(buffer)
+        try:
+            rows = self._fetch(kinds)
+            indexes = {kind: _KindIndex(kind, [self._keep(kind, record) for record in rows.get(kind, ())])
+                       for kind in kinds}
+            with self._lock:
+                for event in buffer:
+                    if event.entity in indexes:
+                        self._apply(indexes[event.entity], event)
+                self._kinds.update(indexes)
+        finally:
+            with self._lock:
+                self._buffers = [b for b in self._buffers if b is not buffer]
+        self._loaded = True
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"[SEARCH] index load failed: {e}")
+
+    def _ensure_loaded(self):
+        loading = self._loading
+        if loading is not None and loading is not threading.current_thread():
+            loading.join()
+        if not self._loaded:
+            self.load()
+
+    @staticmethod
+    def _keep(kind, record):
+        return {f: record.get(f) for f in RECORD_FIELDS[kind] if f in record}
+
+    # --- Searching ---
+    def search(self, term, limits=None, limit=5):
+        """
+        Records matching `term` by kind: {kind: [SearchHit, ...]}, best first.
+
+        Exact matches rank above prefixes, prefixes above a match at the
+        start of a word, and those above any other substring. `limits`
+        caps a kind's hits ({kind: n}); other kinds get `limit`.
+        """
+        term = (term or "").strip().lower()
+        if not term:
+            return {kind: [] for kind in SEARCH_KINDS}
+        self._ensure_loaded()
+        limits = limits or {}
+        results = {}
+        with self._lock:
+            for kind, index in self._kinds.items():
+                ranked = index.search(term, limits.get(kind, limit))
+                results[kind] = [SearchHit(kind, record_id, index.records[record_id], rank)
+                                 for rank, record_id in ranked]
+        return results
+
+    def get(self, kind, record_id):
+        """The indexed record of `kind` with `record_id`, or None."""
+        if record_id is None:
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            return self._kinds[kind].records.get(str(record_id))
+
+    # --- Change events ---
+    def on_change(self, event):
+        if event.entity not in self._kinds:
+            return
+        with self._lock:
+            self._apply(self._kinds[event.entity], event)
+            for buffer in self._buffers:
+                buffer.append(event)
+
+    def _apply(self, index, event):
+        if event.op == DELETE:
+            index.remove(event.id)
+        elif event.op == INSERT and event.data:
+            index.put(self._keep(event.entity, dict(event.data, id=event.id)))
+        elif event.op == UPDATE and event.data and event.id in index.records:
+            index.put(dict(index.records[event.id], **self._keep(event.entity, event.data)))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_search_index(repo):
+    """
+    The process's search index, shared by every session and loaded once in the
+    background. Keep it current by passing its on_change to connect_session(),
+    which hands it each write once rather than once per open session.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SearchIndex(repo.get_search_records).start()
+        return _shared
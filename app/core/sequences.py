@@ -0,0 +1,105 @@
+"""
+Lensy POS - Document number sequences
+Pure helpers for building counter keys and formatting invoice numbers and SKUs.
+Storage (counter rows, local counter file) lives in the repository / db_manager.
+
+Invoice numbers are "<prefix>-<year>-<seq>" where the prefix and year parts
+are optional, so the default configuration keeps the historical "000123" form.
+"""
+
+import datetime
+
+INVOICE_SEQ_WIDTH = 6
+SKU_SEQ_WIDTH = 4
+
+# First digit of a generated SKU, by product category
+SKU_PREFIXES = {
+    'Frame': '2',
+    'Sunglasses': '3',
+    'Accessory': '4',
+    'ContactLens': '5',
+    'Lens': '1',
+    'Other': '0'
+}
+
+
+def _is_enabled(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def invoice_scope(settings, today=None):
+    """
+    Return (prefix, year) for the current invoice series.
+
+    `settings` is any mapping of shop settings; uses `invoice_prefix` for
+    per-branch series and `invoice_yearly_reset` to restart numbering each year.
+    """
+    prefix = str(settings.get("invoice_prefix") or "").strip()
+    year = None
+    if _is_enabled(settings.get("invoice_yearly_reset", "")):
+        year = (today or datetime.date.today()).year
+    return prefix, year
+
+
+def invoice_counter_key(prefix="", year=None):
+    return f"invoice:{prefix}:{year or ''}"
+
+
+def invoice_stem(prefix="", year=None):
+    """The text before the sequence in this series' numbers, e.g. "BR1-2026-"."""
+    parts = [p for p in (prefix, str(year) if year else "") if p]
+    return "".join(f"{p}-" for p in parts)
+
+
+def format_invoice_no(seq, prefix="", year=None):
+    return f"{invoice_stem(prefix, year)}{seq:0{INVOICE_SEQ_WIDTH}d}"
+
+
+def parse_invoice_seq(invoice_no, prefix="", year=None):
+    """Return the sequence part of `invoice_no` if it belongs to this series, else None."""
+    stem = invoice_stem(prefix, year)
+    invoice_no = str(invoice_no or "")
+    if not invoice_no.startswith(stem):
+        return None
+    tail = invoice_no[len(stem):]
+    return int(tail) if tail.isdigit() else None
+
+
+def max_invoice_seq(invoice_numbers, prefix="", year=None):
+    """Highest sequence already used in this series (0 if none), for seeding a new counter."""
+    seqs = (parse_invoice_seq(no, prefix, year) for no in invoice_numbers)
+    return max((s for s in seqs if s is not None), default=0)
+
+
+def sku_prefix(category):
+    return SKU_PREFIXES.get(category, '0')
+
+
+def sku_counter_key(prefix):
+    return f"sku:{prefix}"
+
+
+def format_sku(prefix, seq):
+    return f"{prefix}{seq:0{SKU_SEQ_WIDTH}d}"
+
+
+def sku_like(prefix):
+    """SQL LIKE pattern for SKUs shaped like generated ones: the prefix, then SKU_SEQ_WIDTH characters."""
+    return prefix + "_" * SKU_SEQ_WIDTH
+
+
+def max_sku_seq(skus, prefix):
+    """
+    Highest sequence among generated-looking SKUs with this prefix (0 if none).
+
+    Only the prefix followed by exactly SKU_SEQ_WIDTH digits counts, so a
+    hand-entered or scanned barcode that happens to start with the prefix
+    digit ("2012345678901") can't seed the counter.
+    """
+    best = 0
+    for sku in skus:
+        sku = str(sku or "")
+        tail = sku[len(prefix):]
+        if sku.startswith(prefix) and len(tail) == SKU_SEQ_WIDTH and tail.isdigit():
+            best = max(best, int(tail))
+    return best
@@ -0,0 +1,69 @@
+"""
+Lensy POS - Stock check helpers
+Backend-independent pieces of the check-and-deduct done when an order is
+saved; the locking itself lives with each backend (POSRepository for the
+JSON file / Supabase, InventoryService for SQLAlchemy).
+"""
+
+
+class InsufficientStockError(ValueError):
+    """Raised when an order asks for more than is in stock; nothing was deducted."""
+
+    def __init__(self, shortfalls):
+        super().__init__(shortfalls)
+        self.shortfalls = shortfalls
+
+    def __str__(self):
+        # For logs; the POS builds its own translated message from `shortfalls`
+        lines = ", ".join(f"{s['product_id']} (need {s['requested']}, have {s['available']})" for s in self.shortfalls)
+        return f"Insufficient stock for {lines}"
+
+
+def requested_quantities(items):
+    """
+    Total quantity per product for a list of order lines ({product_id, qty}).
+
+    Lines for the same product are added up, so a cart holding a frame twice
+    is checked against the stock once for both. Lines without a product
+    (services) or with no quantity are ignored.
+    """
+    requested = {}
+    for item in items:
+        product_id, qty = item.get("product_id"), int(item.get("qty") or 0)
+        if product_id is None or qty <= 0:
+            continue
+        requested[product_id] = requested.get(product_id, 0) + qty
+    return requested
+
+
+def find_shortfalls(requested, available):
+    """One {product_id, requested, available} entry per product that can't be covered."""
+    return [
+        {"product_id": product_id, "requested": qty, "available": available.get(product_id, 0)}
+        for product_id, qty in requested.items()
+        if available.get(product_id, 0) < qty
+    ]
+
+
+def split_deduction(qty, balances, default_warehouse):
+    """
+    Which locations to take `qty` of one product from: {warehouse_id: qty}.
+
+    `balances` is the product's stock per warehouse ({warehouse_id: qty}, in
+    warehouse order). The default warehouse is drawn on first, then the
+    others as far as each has stock, so a sale checked against the total is
+    never booked as a negative balance in one place while another holds the
+    units. Anything still missing is taken from the default warehouse.
+    """
+    order = [default_warehouse] + [wh for wh in balances if wh != default_warehouse]
+    taken = {}
+    for warehouse_id in order:
+        if qty <= 0:
+            break
+        take = min(qty, max(balances.get(warehouse_id, 0), 0))
+        if take:
+            taken[warehouse_id] = take
+            qty -= take
+    if qty > 0:
+        taken[default_warehouse] = taken.get(default_warehouse, 0) + qty
+    return taken
@@ -1,11 +1,13 @@
 # app/database/db_manager.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
 import sys
+import weakref
 from contextlib import contextmanager
 
-from app.config import DB_FILENAME
+from app.config import DB_FILENAME, IS_SERVER
 
 # Default database URL
 DB_FILENAME = DB_FILENAME
@@ -21,8 +23,75 @@ BASE_DIR = get_base_dir()
 DB_PATH = os.path.join(BASE_DIR, DB_FILENAME)
 DEFAULT_DB_URL = f'sqlite:///{DB_PATH}'
 
-def get_engine(db_url=DEFAULT_DB_URL):
-    engine = create_engine(db_url, connect_args={"check_same_thread": False})
+# SQLite tuning per kind of process sharing pos.db. All use WAL so readers
+# (reports, the web bridge) never block a POS write and vice versa.
+#   desktop      one till: modest cache, short busy wait so the UI stays responsive
+#   server       web bridge: bigger cache and mmap, more pooled connections
+#   bulk-import  seeding/imports: large cache, rare checkpoints, long busy wait
+SQLITE_PROFILES = {
+    'desktop': {
+        'synchronous': 'NORMAL', 'cache_size': -16000, 'mmap_size': 64 * 1024 * 1024,
+        'busy_timeout': 5000, 'wal_autocheckpoint': 1000, 'pool_size': 5, 'max_overflow': 10,
+    },
+    'server': {
+        'synchronous': 'NORMAL', 'cache_size': -64000, 'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 10000, 'wal_autocheckpoint': 1000, 'pool_size': 10, 'max_overflow': 20,
+    },
+    'bulk-import': {
+        'synchronous': 'NORMAL', 'cache_size': -256000, 'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 30000, 'wal_autocheckpoint': 10000, 'pool_size': 2, 'max_overflow': 0,
+    },
+}
+DEFAULT_PROFILE = os.environ.get('POS_DB_PROFILE') or ('server' if IS_SERVER else 'desktop')
+
+# One engine (and so one connection pool) per database URL and profile for the whole process
+_engines = {}
+
+def _is_sqlite_file(db_url):
+    return db_url.startswith("sqlite") and db_url not in ("sqlite://", "sqlite:///:memory:")
+
+def _sqlite_pragmas(profile):
+    settings = SQLITE_PROFILES[profile]
+    return [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={settings['synchronous']}",
+        f"PRAGMA cache_size={settings['cache_size']}",
+        f"PRAGMA mmap_size={settings['mmap_size']}",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA busy_timeout={settings['busy_timeout']}",
+        f"PRAGMA wal_autocheckpoint={settings['wal_autocheckpoint']}",
+    ]
+
+def _sqlite_on_connect(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return on_connect
+
+def get_engine(db_url=DEFAULT_DB_URL, profile=None):
+    profile = profile or DEFAULT_PROFILE
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown database profile: {profile!r}")
+    engine = _engines.get((db_url, profile))
+    if engine is not None:
+        return engine
+
+    if _is_sqlite_file(db_url):
+        settings = SQLITE_PROFILES[profile]
+        engine = create_engine(
+            db_url,
+            connect_args={"check_same_thread": False, "timeout": settings['busy_timeout'] / 1000},
+            poolclass=QueuePool,
+            pool_size=settings['pool_size'],
+            max_overflow=settings['max_overflow'],
+            pool_timeout=30,
+        )
+        event.listen(engine, "connect", _sqlite_on_connect(_sqlite_pragmas(profile)))
+    else:
+        engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    _engines[(db_url, profile)] = engine
     return engine
 
 from app.database.models import Setting
@@ -70,24 +139,379 @@ def set_setting(session, key, value):
         session.add(setting)
     session.commit()
 
-def get_next_invoice_no(session):
-    from app.database.models import Sale
+# Engines whose database is known to have the counters table
+_counter_engines = weakref.WeakSet()
+
+def _ensure_counters_table(session):
+    from app.database.models import Counter
+    # Databases created before the counters table existed; probed once per engine
+    engine = session.get_bind()
+    if engine in _counter_engines:
+        return
+    Counter.__table__.create(session.connection(), checkfirst=True)
+    _counter_engines.add(engine)
+
+def get_counter(session, key):
+    """Current value of a counter, or None if it has never been used."""
+    from app.database.models import Counter
+    _ensure_counters_table(session)
+    counter = session.get(Counter, key)
+    return counter.value if counter else None
+
+def next_counter(session, key, count=1, seed=None):
+    """
+    Advance a counter row by `count` and return its new value.
+
+    The UPDATE takes SQLite's write lock, so concurrent processes are serialized
+    until the caller's transaction ends. `seed` is called only when the counter
+    row does not exist yet.
+    """
+    from app.database.models import Counter
+    from sqlalchemy import update
+    from sqlalchemy.exc import IntegrityError
+
+    _ensure_counters_table(session)
+    stmt = (update(Counter).where(Counter.key == key)
+            .values(value=Counter.value + count).returning(Counter.value))
+    row = session.execute(stmt).first()
+    if row is not None:
+        return row[0]
+
+    value = (seed() if seed is not None else 0) + count
+    try:
+        with session.begin_nested():
+            session.add(Counter(key=key, value=value))
+        return value
+    except IntegrityError:
+        # Another process created it first
+        return session.execute(stmt).first()[0]
+
+# Tables whose writes bump a "table:<name>" counter (SQLite triggers), so
+# readers can tell cheaply whether anything changed, e.g. for HTTP ETags.
+VERSIONED_TABLES = ('products', 'stock_movements', 'customers', 'sales', 'sale_items', 'order_examinations')
+_versioned_engines = set()
+
+def table_version_key(table):
+    return f"table:{table}"
+
+def ensure_table_version_triggers(engine):
+    """Install the version-bumping triggers once per engine (SQLite only)."""
+    from app.database.models import Counter
+    if engine in _versioned_engines or engine.dialect.name != 'sqlite':
+        return
+    # Own transaction: DDL must commit even if the caller's session only reads
+    with engine.begin() as conn:
+        Counter.__table__.create(conn, checkfirst=True)
+        for table in VERSIONED_TABLES:
+            for op in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_version AFTER {op} ON {table} "
+                    f"BEGIN INSERT INTO counters (key, value) VALUES ('{table_version_key(table)}', 1) "
+                    f"ON CONFLICT(key) DO UPDATE SET value = value + 1; END"
+                )
+    _versioned_engines.add(engine)
+
+# Tables whose rows are logged in row_changes (SQLite triggers), so a cache of
+# them (the dashboard's search index) can re-read only the rows written since
+# it last looked. One log row per table row: the log never outgrows the table.
+ROW_LOGGED_TABLES = ('customers', 'products', 'sales')
+_row_logged_engines = set()
+
+_ROW_CHANGE_UPSERT = (
+    "INSERT INTO row_changes (table_name, row_id, version) VALUES ('{table}', {row}.id, "
+    "(SELECT COALESCE(MAX(version), 0) + 1 FROM row_changes WHERE table_name = '{table}')) "
+    "ON CONFLICT(table_name, row_id) DO UPDATE SET version = excluded.version;"
+)
+
+def ensure_row_change_log(engine):
+    """Install the row_changes triggers once per engine (SQLite only)."""
+    from app.database.models import RowChange
+    if engine in _row_logged_engines or engine.dialect.name != 'sqlite':
+        return
+    # Own transaction: DDL must commit even if the caller's session only reads
+    with engine.begin() as conn:
+        RowChange.__table__.create(conn, checkfirst=True)
+        for table in ROW_LOGGED_TABLES:
+            for op, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_row_change AFTER {op} ON {table} "
+                    f"BEGIN {_ROW_CHANGE_UPSERT.format(table=table, row=row)} END"
+                )
+    _row_logged_engines.add(engine)
+
+def get_row_changes(session, table, since=None):
+    """
+    (version, row ids) for `table`: its latest row_changes version and the
+    ids of the rows inserted, updated or deleted after version `since`
+    (none when `since` is None - the caller is about to read everything).
+    """
     from sqlalchemy import func
-    max_id = session.query(func.max(Sale.id)).scalar() or 0
-    return f"{max_id + 1:06d}"
+    from app.database.models import RowChange
+    ensure_row_change_log(session.get_bind())
+    version = session.query(func.coalesce(func.max(RowChange.version), 0))\
+        .filter(RowChange.table_name == table).scalar()
+    if since is None or since >= version:
+        return version, []
+    rows = session.query(RowChange.row_id)\
+        .filter(RowChange.table_name == table, RowChange.version > since)
+    return version, [row_id for (row_id,) in rows]
 
-def generate_sku(session, category):
+# Per-warehouse balances: one row per (product, warehouse), kept in step with
+# the ledger by triggers so every writer (windows, scripts, the web bridge) is
+# covered. Movements without a warehouse are given the default (first) one, as
+# the JSON and Supabase backends do; only while no warehouse exists do they
+# count under warehouse 0.
+UNASSIGNED_WAREHOUSE = 0
+_balanced_engines = set()
+
+_BALANCE_UPSERT = (
+    "INSERT INTO stock_balances (product_id, warehouse_id, qty) VALUES ({row}.product_id, "
+    "COALESCE({row}.warehouse_id, %d), {sign}{row}.qty) "
+    "ON CONFLICT(product_id, warehouse_id) DO UPDATE SET qty = qty + excluded.qty;" % UNASSIGNED_WAREHOUSE
+)
+
+def install_stock_balances(conn):
+    """
+    Create stock_balances and its triggers on `conn` if they are missing (SQLite).
+
+    When the triggers are first created the balances are rebuilt from the
+    ledger in the same transaction, so a database that predates them starts
+    out correct.
+    """
+    from app.database.models import StockBalance
+    StockBalance.__table__.create(conn, checkfirst=True)
+    installed = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'stock_movements_insert_balance'"
+    ).first()
+    if installed:
+        return
+    conn.exec_driver_sql("DELETE FROM stock_balances")
+    conn.exec_driver_sql(
+        "INSERT INTO stock_balances (product_id, warehouse_id, qty) "
+        f"SELECT product_id, COALESCE(warehouse_id, {UNASSIGNED_WAREHOUSE}), SUM(qty) "
+        "FROM stock_movements GROUP BY 1, 2"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER stock_movements_insert_balance AFTER INSERT ON stock_movements "
+        f"BEGIN {_BALANCE_UPSERT.format(row='NEW', sign='')} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER stock_movements_delete_balance AFTER DELETE ON stock_movements "
+        f"BEGIN {_BALANCE_UPSERT.format(row='OLD', sign='-')} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER stock_movements_update_balance "
+        "AFTER UPDATE OF product_id, warehouse_id, qty ON stock_movements "
+        f"BEGIN {_BALANCE_UPSERT.format(row='OLD', sign='-')} "
+        f"{_BALANCE_UPSERT.format(row='NEW', sign='')} END"
+    )
+
+_DEFAULT_WAREHOUSE = "(SELECT MIN(id) FROM warehouses)"
+
+def install_default_warehouse(conn):
+    """
+    Give warehouse-less movements the default warehouse, now and from here on (SQLite).
+
+    Existing ones are moved by an UPDATE (the balance triggers carry their
+    quantities over from warehouse 0); triggers place new ones, and those
+    saved before any warehouse existed once the first is created.
+    """
+    installed = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'stock_movements_default_warehouse'"
+    ).first()
+    if installed:
+        return
+    conn.exec_driver_sql(
+        f"UPDATE stock_movements SET warehouse_id = {_DEFAULT_WAREHOUSE} WHERE warehouse_id IS NULL"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER stock_movements_default_warehouse AFTER INSERT ON stock_movements "
+        f"WHEN NEW.warehouse_id IS NULL BEGIN "
+        f"UPDATE stock_movements SET warehouse_id = {_DEFAULT_WAREHOUSE} WHERE id = NEW.id; END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER warehouses_adopt_movements AFTER INSERT ON warehouses "
+        f"WHEN NEW.id = {_DEFAULT_WAREHOUSE} BEGIN "
+        "UPDATE stock_movements SET warehouse_id = NEW.id WHERE warehouse_id IS NULL; END"
+    )
+
+def ensure_stock_balances(engine):
+    """Install the stock_balances triggers once per engine (SQLite only)."""
+    if engine in _balanced_engines or engine.dialect.name != 'sqlite':
+        return
+    # Own transaction: DDL must commit even if the caller's session only reads
+    with engine.begin() as conn:
+        install_stock_balances(conn)
+        install_default_warehouse(conn)
+    _balanced_engines.add(engine)
+
+# Customer ledger: one row per customer with orders/prescriptions, adjusted by
+# triggers on sales and prescriptions in the writer's own transaction.
+_ledgered_engines = set()
+
+_CUSTOMER_STATS_COLUMNS = "customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count"
+
+_SALE_STATS_UPSERT = (
+    f"INSERT INTO customer_stats ({_CUSTOMER_STATS_COLUMNS}) "
+    "SELECT {row}.customer_id, {sign}1, {sign}COALESCE({row}.net_amount, 0), {sign}COALESCE({row}.amount_paid, 0), "
+    "{sign}(COALESCE({row}.net_amount, 0) - COALESCE({row}.amount_paid, 0)), "
+    "(SELECT MAX(order_date) FROM sales WHERE customer_id = {row}.customer_id), 0 "
+    "WHERE {row}.customer_id IS NOT NULL "
+    "ON CONFLICT(customer_id) DO UPDATE SET order_count = order_count + excluded.order_count, "
+    "total_net = total_net + excluded.total_net, total_paid = total_paid + excluded.total_paid, "
+    "balance_due = balance_due + excluded.balance_due, last_order_date = excluded.last_order_date;"
+)
+
+_RX_STATS_UPSERT = (
+    f"INSERT INTO customer_stats ({_CUSTOMER_STATS_COLUMNS}) "
+    "SELECT {row}.customer_id, 0, 0, 0, 0, NULL, {sign}1 WHERE {row}.customer_id IS NOT NULL "
+    "ON CONFLICT(customer_id) DO UPDATE SET rx_count = rx_count + excluded.rx_count;"
+)
+
+def rebuild_customer_stats(conn):
+    """Recompute customer_stats from sales and prescriptions."""
+    conn.exec_driver_sql("DELETE FROM customer_stats")
+    conn.exec_driver_sql(
+        f"INSERT INTO customer_stats ({_CUSTOMER_STATS_COLUMNS}) "
+        "SELECT c.id, COALESCE(s.n, 0), COALESCE(s.net, 0), COALESCE(s.paid, 0), "
+        "COALESCE(s.net, 0) - COALESCE(s.paid, 0), s.last_order_date, COALESCE(p.n, 0) "
+        "FROM customers c "
+        "LEFT JOIN (SELECT customer_id, COUNT(*) AS n, SUM(COALESCE(net_amount, 0)) AS net, "
+        "SUM(COALESCE(amount_paid, 0)) AS paid, MAX(order_date) AS last_order_date "
+        "FROM sales GROUP BY customer_id) s ON s.customer_id = c.id "
+        "LEFT JOIN (SELECT customer_id, COUNT(*) AS n FROM prescriptions GROUP BY customer_id) p "
+        "ON p.customer_id = c.id "
+        "WHERE s.customer_id IS NOT NULL OR p.customer_id IS NOT NULL"
+    )
+
+def install_customer_stats(conn):
+    """
+    Create customer_stats and its triggers on `conn` if they are missing (SQLite).
+
+    Like the stock balances, the ledger is rebuilt in the same transaction
+    the triggers are first created in.
+    """
+    from app.database.models import CustomerStats
+    CustomerStats.__table__.create(conn, checkfirst=True)
+    installed = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'sales_insert_customer_stats'"
+    ).first()
+    if installed:
+        return
+    rebuild_customer_stats(conn)
+    conn.exec_driver_sql(
+        "CREATE TRIGGER sales_insert_customer_stats AFTER INSERT ON sales "
+        f"BEGIN {_SALE_STATS_UPSERT.format(row='NEW', sign='')} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER sales_delete_customer_stats AFTER DELETE ON sales "
+        f"BEGIN {_SALE_STATS_UPSERT.format(row='OLD', sign='-')} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER sales_update_customer_stats "
+        "AFTER UPDATE OF customer_id, net_amount, amount_paid, order_date ON sales "
+        f"BEGIN {_SALE_STATS_UPSERT.format(row='OLD', sign='-')} "
+        f"{_SALE_STATS_UPSERT.format(row='NEW', sign='')} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER prescriptions_insert_customer_stats AFTER INSERT ON prescriptions "
+        f"BEGIN {_RX_STATS_UPSERT.format(row='NEW', sign='')} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER prescriptions_delete_customer_stats AFTER DELETE ON prescriptions "
+        f"BEGIN {_RX_STATS_UPSERT.format(row='OLD', sign='-')} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER customers_delete_customer_stats AFTER DELETE ON customers "
+        "BEGIN DELETE FROM customer_stats WHERE customer_id = OLD.id; END"
+    )
+
+def ensure_customer_stats(engine):
+    """Install the customer_stats triggers once per engine (SQLite only)."""
+    if engine in _ledgered_engines or engine.dialect.name != 'sqlite':
+        return
+    # Own transaction: DDL must commit even if the caller's session only reads
+    with engine.begin() as conn:
+        install_customer_stats(conn)
+    _ledgered_engines.add(engine)
+
+def get_table_versions(session, tables):
+    """Current write counters for `tables`, in order (0 for never-written tables)."""
+    from app.database.models import Counter
+    ensure_table_version_triggers(session.get_bind())
+    keys = [table_version_key(t) for t in tables]
+    found = dict(session.query(Counter.key, Counter.value).filter(Counter.key.in_(keys)))
+    return [found.get(k, 0) for k in keys]
+
+def get_search_records(session, kinds, ids=None):
+    """
+    The rows the global search index holds (app.core.search_index), {kind: [record, ...]};
+    with `ids` ({kind: [id, ...]}), only those rows of each kind.
+    """
+    from app.core.events import CUSTOMER, PRODUCT, SALE
+    from app.core.search_index import RECORD_FIELDS
+    from app.database.models import Customer, Product, Sale
+    models = {CUSTOMER: Customer, PRODUCT: Product, SALE: Sale}
+    records = {}
+    for kind in kinds:
+        model = models[kind]
+        fields = [f for f in RECORD_FIELDS[kind] if hasattr(model, f)]
+        rows = session.query(*(getattr(model, f) for f in fields))
+        if ids is not None:
+            rows = rows.filter(model.id.in_(ids.get(kind, ())))
+        records[kind] = [dict(zip(fields, row)) for row in rows]
+    return records
+
+def _invoice_series(session):
+    from app.core.sequences import invoice_scope
+    settings = {k: get_setting(session, k) for k in ("invoice_prefix", "invoice_yearly_reset")}
+    return invoice_scope(settings)
+
+def _max_invoice_seq(session, prefix, year):
+    from app.database.models import Sale
+    from app.core.sequences import max_invoice_seq
+    return max_invoice_seq((no for (no,) in session.query(Sale.invoice_no)), prefix, year)
+
+def peek_next_invoice_no(session):
+    """Preview the next invoice number without reserving it (for display only)."""
+    from app.core.sequences import invoice_counter_key, format_invoice_no
+    prefix, year = _invoice_series(session)
+    current = get_counter(session, invoice_counter_key(prefix, year))
+    if current is None:
+        current = _max_invoice_seq(session, prefix, year)
+    return format_invoice_no(current + 1, prefix, year)
+
+def get_next_invoice_no(session):
+    """Reserve the next invoice number; released again if the transaction rolls back."""
+    from app.core.sequences import invoice_counter_key, format_invoice_no
+    prefix, year = _invoice_series(session)
+    seq = next_counter(session, invoice_counter_key(prefix, year),
+                       seed=lambda: _max_invoice_seq(session, prefix, year))
+    return format_invoice_no(seq, prefix, year)
+
+def _max_sku_seq(session, prefix):
     from app.database.models import Product
-    # Map categories to prefix digits
-    prefix_map = {
-        'Frame': '2', 
-        'Sunglasses': '3', 
-        'Accessory': '4', 
-        'ContactLens': '5', 
-        'Lens': '1', 
-        'Other': '0'
-    }
-    prefix = prefix_map.get(category, '0')
-    count = session.query(Product).filter(Product.sku.ilike(f"{prefix}%")).count()
-    return f"{prefix}{count + 1:04d}"
+    from app.core.sequences import max_sku_seq, sku_like
+    skus = session.query(Product.sku).filter(Product.sku.like(sku_like(prefix)))
+    return max_sku_seq((sku for (sku,) in skus), prefix)
 
+def peek_sku(session, category):
+    """Preview the next SKU for a category without reserving it (for display only)."""
+    from app.core.sequences import sku_prefix, sku_counter_key, format_sku
+    prefix = sku_prefix(category)
+    current = get_counter(session, sku_counter_key(prefix))
+    if current is None:
+        current = _max_sku_seq(session, prefix)
+    return format_sku(prefix, current + 1)
+
+def reserve_skus(session, category, n):
+    """Reserve `n` consecutive SKUs for a category with a single counter update."""
+    from app.core.sequences import sku_prefix, sku_counter_key, format_sku
+    if n <= 0:
+        return []
+    prefix = sku_prefix(category)
+    last = next_counter(session, sku_counter_key(prefix), n, seed=lambda: _max_sku_seq(session, prefix))
+    return [format_sku(prefix, seq) for seq in range(last - n + 1, last + 1)]
+
+def generate_sku(session, category):
+    return reserve_skus(session, category, 1)[0]
@@ -0,0 +1,111 @@
+# app/database/migrations.py
+"""
+Versioned schema migrations for the SQLAlchemy (pos.db) schema.
+
+Each migration has a version number, a name and a function taking a
+connection. run_migrations() applies the ones not yet recorded in the
+`schema_migrations` table, in order, each in its own transaction, so an
+existing database is brought up to date in place and a failed step can be
+retried on the next start.
+
+To change the schema, append a migration; never edit or renumber one that
+has shipped. A migration spells out its own DDL (see schema_v1) rather than
+reading models.py, which describes the latest schema, not the one it shipped.
+"""
+import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, select
+
+from app.database import schema_v1, schema_v3, schema_v4, schema_v5
+
+_meta = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def _create_missing_tables(conn):
+    """Tables added to models.py since the database was first created."""
+    if conn.dialect.name == 'sqlite':
+        for ddl in schema_v1.TABLES:
+            conn.exec_driver_sql(ddl)
+
+
+def _create_declared_indexes(conn):
+    """Secondary indexes on the columns the windows filter and join on."""
+    if conn.dialect.name == 'sqlite':
+        for ddl in schema_v1.INDEXES:
+            conn.exec_driver_sql(ddl)
+        # Give the planner row counts for the new indexes
+        conn.exec_driver_sql("ANALYZE")
+
+
+def _install_once(conn, schema):
+    """Run a frozen schema module: its TABLES always, its INSTALL once."""
+    for ddl in schema.TABLES:
+        conn.exec_driver_sql(ddl)
+    installed = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (schema.INSTALLED_BY,)
+    ).first()
+    if not installed:
+        # A database the app has run on may have them already (db_manager installs them on use)
+        for ddl in schema.INSTALL:
+            conn.exec_driver_sql(ddl)
+
+
+def _stock_balances(conn):
+    """Per-warehouse balances kept by triggers, backfilled from the ledger."""
+    if conn.dialect.name == 'sqlite':
+        _install_once(conn, schema_v3)
+
+
+def _customer_stats(conn):
+    """Customer ledger kept by triggers, built from the existing sales."""
+    if conn.dialect.name == 'sqlite':
+        _install_once(conn, schema_v4)
+
+
+def _default_warehouse(conn):
+    """Movements saved without a warehouse belong to the default one."""
+    if conn.dialect.name == 'sqlite':
+        _install_once(conn, schema_v5)
+
+
+MIGRATIONS = [
+    (1, 'create missing tables', _create_missing_tables),
+    (2, 'declared secondary indexes', _create_declared_indexes),
+    (3, 'per-warehouse stock balances', _stock_balances),
+    (4, 'customer stats ledger', _customer_stats),
+    (5, 'default warehouse for unplaced movements', _default_warehouse),
+]
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return {row[0] for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def current_version(engine):
+    return max(applied_versions(engine), default=0)
+
+
+def run_migrations(engine, migrations=None):
+    """Apply pending migrations; returns the list of versions applied."""
+    migrations = MIGRATIONS if migrations is None else migrations
+    done = applied_versions(engine)
+    applied = []
+    for version, name, migrate in sorted(migrations, key=lambda m: m[0]):
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.datetime.utcnow()
+            ))
+        print(f"[MIGRATE] {version:03d} {name}")
+        applied.append(version)
+    return applied
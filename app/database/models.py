@@ -1,7 +1,7 @@
 # app/database/models.py
 from sqlalchemy import (
     Column, Integer, String, Float, DateTime, Text, ForeignKey,
-    Boolean, PrimaryKeyConstraint
+    Boolean, PrimaryKeyConstraint, Index
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -76,7 +76,7 @@ class Product(Base):
     lens_type = Column(String)
     frame_type = Column(String)
     frame_color = Column(String)
-    barcode = Column(String)
+    barcode = Column(String, index=True)
     
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
@@ -89,7 +89,7 @@ class Warehouse(Base):
 class StockMovement(Base):
     __tablename__ = 'stock_movements'
     id = Column(Integer, primary_key=True)
-    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False, index=True)
     warehouse_id = Column(Integer, ForeignKey('warehouses.id'), nullable=True)
     qty = Column(Integer, nullable=False)
     type = Column(String, nullable=False)  # 'purchase', 'sale', 'adjustment', 'transfer'
@@ -100,12 +100,28 @@ class StockMovement(Base):
     product = relationship('Product')
     warehouse = relationship('Warehouse')
 
+class StockBalance(Base):
+    """
+    Running stock per product and warehouse, kept by triggers on
+    stock_movements (see db_manager.ensure_stock_balances). Movements without
+    a warehouse are given the default one (see install_default_warehouse).
+    """
+    __tablename__ = 'stock_balances'
+    product_id = Column(Integer, nullable=False)
+    warehouse_id = Column(Integer, nullable=False)
+    qty = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        PrimaryKeyConstraint('product_id', 'warehouse_id', name='sb_pk'),
+        # Listing one location's stock
+        Index('ix_stock_balances_warehouse_product', 'warehouse_id', 'product_id'),
+    )
+
 class Sale(Base):
     __tablename__ = 'sales'
     id = Column(Integer, primary_key=True)
     invoice_no = Column(String, unique=True, nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=True)
+    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=True, index=True)
     
     total_amount = Column(Float, nullable=False)
     discount = Column(Float, default=0.0)
@@ -115,7 +131,7 @@ class Sale(Base):
     
     payment_method = Column(String, nullable=False)  # e.g. 'cash'
     is_received = Column(Boolean, default=False)
-    order_date = Column(DateTime, default=datetime.datetime.utcnow)
+    order_date = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     receiving_date = Column(DateTime, nullable=True)
     
     # Optical specific
@@ -131,6 +147,9 @@ class Sale(Base):
     lab_status = Column(String, default='Not Started')
     doctor_name = Column(String)
 
+    # Lab queue: filter by status, newest first
+    __table_args__ = (Index('ix_sales_lab_status_order_date', 'lab_status', 'order_date'),)
+
     user = relationship('User')
     customer = relationship('Customer')
     items = relationship('SaleItem', back_populates='sale')
@@ -139,7 +158,7 @@ class Sale(Base):
 class SaleItem(Base):
     __tablename__ = 'sale_items'
     id = Column(Integer, primary_key=True)
-    sale_id = Column(Integer, ForeignKey('sales.id'), nullable=False)
+    sale_id = Column(Integer, ForeignKey('sales.id'), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
     qty = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
@@ -151,7 +170,7 @@ class SaleItem(Base):
 class OrderExamination(Base):
     __tablename__ = 'order_examinations'
     id = Column(Integer, primary_key=True)
-    sale_id = Column(Integer, ForeignKey('sales.id'), nullable=False)
+    sale_id = Column(Integer, ForeignKey('sales.id'), nullable=False, index=True)
     
     exam_type = Column(String) # Distance/Reading
     
@@ -232,21 +251,50 @@ class Setting(Base):
     key = Column(String, primary_key=True)
     value = Column(String)
 
+class Counter(Base):
+    """Named monotonic counters (invoice series, SKU prefixes)."""
+    __tablename__ = 'counters'
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class RowChange(Base):
+    """The last write to each row of a logged table, numbered per table (see db_manager.get_row_changes)."""
+    __tablename__ = 'row_changes'
+    table_name = Column(String, primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    __table_args__ = (Index('ix_row_changes_table_version', 'table_name', 'version'),)
+
 class Customer(Base):
     __tablename__ = 'customers'
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    phone = Column(String)
+    phone = Column(String, index=True)
     phone2 = Column(String) # Second number
     email = Column(String)
     address = Column(Text)
     city = Column(String) # City Name
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+class CustomerStats(Base):
+    """
+    Running totals per customer, kept by triggers on sales and prescriptions
+    (see db_manager.ensure_customer_stats) so customer lists can show and
+    sort by them without counting sales.
+    """
+    __tablename__ = 'customer_stats'
+    customer_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_net = Column(Float, nullable=False, default=0.0)
+    total_paid = Column(Float, nullable=False, default=0.0)
+    balance_due = Column(Float, nullable=False, default=0.0, index=True)
+    last_order_date = Column(DateTime, index=True)
+    rx_count = Column(Integer, nullable=False, default=0)
+
 class Prescription(Base):
     __tablename__ = 'prescriptions'
     id = Column(Integer, primary_key=True)
-    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False)
+    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False, index=True)
     
     # Row: Dist (as requested)
     type = Column(String, default='Dist') 
@@ -1,12 +1,44 @@
 import json
 import os
+import time
+import heapq
 import uuid
+import types
+import weakref
+import tempfile
 import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from app.config import USE_SUPABASE, SUPABASE_URL, SUPABASE_KEY, LOCAL_JSON_DB
+from app.core.file_lock import file_lock
+from app.core.stock import InsufficientStockError, requested_quantities, find_shortfalls, split_deduction
+from app.core.live_search import CUSTOMER_SEARCH_FIELDS, customer_matches, normalize_query
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.search_index import RECORD_FIELDS, SEARCH_KINDS
+from app.core.customer_stats import (
+    STAT_FIELDS, CUSTOMER_SORTS, empty_stats, record_order, record_payment, build_customer_stats
+)
+from app.core.payments import PAYMENT_STATES, PAID, PARTIAL, UNPAID, balance_due, payment_state as sale_payment_state
+from app.core.events import ChangeEvent, SALE, PRODUCT, STOCK, CUSTOMER, METADATA, PERMISSIONS, INSERT, UPDATE, DELETE
+from app.core.sequences import (
+    INVOICE_SEQ_WIDTH, invoice_scope, invoice_counter_key, invoice_stem, format_invoice_no, max_invoice_seq,
+    sku_prefix, sku_counter_key, format_sku, sku_like, max_sku_seq
+)
+
+# Moved by a trigger on every write to the Supabase settings table
+SETTINGS_VERSION_KEY = "settings"
+# How long a Supabase settings snapshot is served before its version is checked
+SETTINGS_RECHECK_SECONDS = 5
 
 class POSRepository:
     def __init__(self):
         self.supabase = None
+        self._settings_snapshot = None
+        self._settings_mtime = None
+        self._settings_version = None
+        self._settings_checked = None
+        self._settings_subscribers = []
+        self._change_publisher = None
         if USE_SUPABASE:
             if SUPABASE_URL and SUPABASE_KEY:
                 try:
@@ -18,7 +50,8 @@ class POSRepository:
                     pass
 
         if not self.supabase:
-            self._ensure_local_db()
+            with file_lock(LOCAL_JSON_DB + ".lock"):
+                self._ensure_local_db()
 
     def _ensure_local_db(self):
         initial_data = {
@@ -40,6 +73,7 @@ class POSRepository:
             "sale_items": [],
             "prescriptions": [],
             "order_examinations": [],
+            "customer_stats": {},  # customer id -> ledger, see app.core.customer_stats
             "suppliers": [],
             "purchases": [],
             "purchase_items": [],
@@ -84,8 +118,36 @@ class POSRepository:
             return json.load(f)
 
     def _write_local(self, data):
-        with open(LOCAL_JSON_DB, 'w') as f:
-            json.dump(data, f, indent=4)
+        # Write to a sibling temp file and swap it in, so readers never see a half-written file
+        directory = os.path.dirname(os.path.abspath(LOCAL_JSON_DB))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".pos_data.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, LOCAL_JSON_DB)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _local_mtime(self):
+        try:
+            return os.stat(LOCAL_JSON_DB).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _local_transaction(self):
+        """
+        Read-modify-write the data file while holding its lock.
+
+        Writes that must not interleave with another terminal's (stock checks)
+        go through here; the data is only written back if the block succeeds.
+        """
+        with file_lock(LOCAL_JSON_DB + ".lock"):
+            data = self._read_local()
+            yield data
+            self._write_local(data)
 
     # --- Auth & Users ---
     def authenticate(self, username, password):
@@ -129,120 +191,222 @@ class POSRepository:
         if self.supabase:
             return self.supabase.table("users").insert(user_data).execute().data[0]
 
-        data = self._read_local()
-        user_data["id"] = str(uuid.uuid4())
-        data["users"].append(user_data)
-        self._write_local(data)
+        with self._local_transaction() as data:
+            user_data["id"] = str(uuid.uuid4())
+            data["users"].append(user_data)
         return user_data
 
     def update_user(self, user_id, user_data):
         """Update an existing user."""
         if self.supabase:
-            return self.supabase.table("users").update(user_data).eq("id", user_id).execute()
+            # Role changes bump the permissions version through a database trigger
+            result = self.supabase.table("users").update(user_data).eq("id", user_id).execute()
+            if "role_id" in user_data:
+                self._publish_change(PERMISSIONS, user_id, UPDATE)
+            return result
 
-        data = self._read_local()
-        for user in data["users"]:
-            if str(user["id"]) == str(user_id):
-                user.update(user_data)
-                break
-        self._write_local(data)
+        role_changed = False
+        with self._local_transaction() as data:
+            for user in data["users"]:
+                if str(user["id"]) == str(user_id):
+                    role_changed = "role_id" in user_data and user.get("role_id") != user_data["role_id"]
+                    user.update(user_data)
+                    break
+        if role_changed:
+            self.bump_permissions_version()
+            self._publish_change(PERMISSIONS, user_id, UPDATE)
+
+    # --- Permissions ---
+    def get_effective_permissions(self, user_ids):
+        """
+        Compile {user_id: frozen {code: value}} for several users at once.
+
+        Role grants are merged with user overrides (overrides win); only allowed
+        codes are kept. Costs three queries (or one file read) regardless of count.
+        """
+        from app.core.permissions import build_permission_map
+
+        user_ids = [str(u) for u in user_ids]
+        if not user_ids:
+            return {}
+
+        if self.supabase:
+            users = self.supabase.table("users").select("id, role_id").in_("id", user_ids).execute().data
+            role_ids = list({u["role_id"] for u in users if u.get("role_id")})
+            role_rows = []
+            if role_ids:
+                role_rows = (self.supabase.table("role_permissions").select("role_id, value, permissions(code)")
+                             .in_("role_id", role_ids).execute().data)
+            user_rows = (self.supabase.table("user_permissions").select("user_id, allow, value, permissions(code)")
+                         .in_("user_id", user_ids).execute().data)
+            for row in role_rows + user_rows:
+                row["code"] = (row.get("permissions") or {}).get("code")
+        else:
+            data = self._read_local()
+            codes = {p["id"]: p["code"] for p in data["permissions"]}
+            wanted = set(user_ids)
+            users = [u for u in data["users"] if str(u["id"]) in wanted]
+            role_ids = {u.get("role_id") for u in users}
+            role_rows = [dict(r, code=codes.get(r["permission_id"]))
+                         for r in data["role_permissions"] if r["role_id"] in role_ids]
+            user_rows = [dict(r, code=codes.get(r["permission_id"]))
+                         for r in data["user_permissions"] if str(r["user_id"]) in wanted]
+
+        grants_by_role = {}
+        for r in role_rows:
+            if r["code"]:
+                grants_by_role.setdefault(r["role_id"], []).append((r["code"], r.get("value")))
+        overrides_by_user = {}
+        for r in user_rows:
+            if r["code"]:
+                overrides_by_user.setdefault(str(r["user_id"]), []).append(
+                    (r["code"], bool(r.get("allow", True)), r.get("value"))
+                )
+
+        return {
+            str(u["id"]): build_permission_map(
+                grants_by_role.get(u.get("role_id"), []), overrides_by_user.get(str(u["id"]), [])
+            )
+            for u in users
+        }
+
+    def compile_permissions(self, user_id):
+        """Frozen {code: value} map for one user; store it in the session at login."""
+        from app.core.permissions import EMPTY_PERMISSIONS
+        return self.get_effective_permissions([user_id]).get(str(user_id), EMPTY_PERMISSIONS)
+
+    def get_permissions_version(self):
+        """Moves whenever roles, grants or overrides change; recompile maps when it does."""
+        from app.core.permissions import PERMISSIONS_VERSION_KEY
+        return self._peek_counter(PERMISSIONS_VERSION_KEY) or 0
+
+    def bump_permissions_version(self):
+        from app.core.permissions import PERMISSIONS_VERSION_KEY
+        return self._next_counter(PERMISSIONS_VERSION_KEY)
 
     def has_permission(self, user_id, permission_code):
+        """
+        Returns tuple (allowed, value).
+
+        Compiles the user's full map on every call; for repeated checks keep the
+        result of compile_permissions() and use check_permission() on it.
+        """
+        from app.core.permissions import check_permission
+        return check_permission(self.compile_permissions(user_id), permission_code)
+
+    # --- Counters ---
+    def _counters_path(self):
+        # Kept beside the main data file but separate from it, so allocating a
+        # number never rewrites (or waits on) the whole database file.
+        return f"{os.path.splitext(LOCAL_JSON_DB)[0]}.counters.json"
+
+    def _read_counters(self):
+        try:
+            with open(self._counters_path(), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _peek_counter(self, key):
+        """Current value of a counter, or None if it has never been used."""
         if self.supabase:
-            # This would require complex joins in Supabase. 
-            # Simplified version:
-            res = self.supabase.table("permissions").select("*").eq("code", permission_code).execute()
-            if not res.data: return False, None
-            perm_id = res.data[0]["id"]
-            
-            # 1. User override
-            up = self.supabase.table("user_permissions").select("*").eq("user_id", user_id).eq("permission_id", perm_id).execute()
-            if up.data:
-                return up.data[0]["allow"], up.data[0].get("value")
-            
-            # 2. Role
-            user = self.supabase.table("users").select("role_id").eq("id", user_id).execute().data[0]
-            if not user.get("role_id"): return False, None
-            
-            rp = self.supabase.table("role_permissions").select("*").eq("role_id", user["role_id"]).eq("permission_id", perm_id).execute()
-            if rp.data:
-                return True, rp.data[0].get("value")
-            
-            return False, None
+            res = self.supabase.table("counters").select("value").eq("key", key).execute()
+            return res.data[0]["value"] if res.data else None
+        return self._read_counters().get(key)
 
-        data = self._read_local()
-        perm = next((p for p in data["permissions"] if p["code"] == permission_code), None)
-        if not perm: return False, None
-        
-        # 1. User override
-        up = next((u for u in data["user_permissions"] if u["user_id"] == user_id and u["permission_id"] == perm["id"]), None)
-        if up:
-            return up["allow"], up.get("value")
-        
-        # 2. Role
-        user = next((u for u in data["users"] if u["id"] == user_id), None)
-        if not user or not user.get("role_id"): return False, None
-        
-        rp = next((r for r in data["role_permissions"] if r["role_id"] == user["role_id"] and r["permission_id"] == perm["id"]), None)
-        if rp:
-            return True, rp.get("value")
-            
-        return False, None
+    def _next_counter(self, key, count=1, seed=None):
+        """
+        Atomically advance a counter by `count` and return its new value.
 
-    # --- Utility ---
-    def get_next_invoice_no(self):
+        `seed` is called (at most once per counter) to start a brand new counter
+        from data that predates it, e.g. the highest invoice already issued.
+        """
         if self.supabase:
+            floor = 0
+            if seed is not None and self._peek_counter(key) is None:
+                floor = seed()
+            res = self.supabase.rpc("next_counter", {"p_key": key, "p_count": count, "p_floor": floor}).execute()
+            return int(res.data)
+
+        path = self._counters_path()
+        with file_lock(path + ".lock"):
+            counters = self._read_counters()
+            if key not in counters:
+                counters[key] = seed() if seed is not None else 0
+            counters[key] += count
+            directory = os.path.dirname(os.path.abspath(path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".counters.", suffix=".tmp")
             try:
-                res = self.supabase.table("sales").select("invoice_no").order("invoice_no", desc=True).limit(1).execute()
-                if res.data and res.data[0].get("invoice_no"):
-                    last_no = res.data[0]["invoice_no"]
-                    try:
-                        return f"{int(last_no) + 1:06d}"
-                    except ValueError:
-                        pass
-                # Fallback to count
-                res = self.supabase.table("sales").select("id", count="exact").execute()
-                count = res.count or 0
-                return f"{count + 1:06d}"
-            except Exception:
-                res = self.supabase.table("sales").select("id", count="exact").execute()
-                count = res.count or 0
-                return f"{count + 1:06d}"
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(counters, f, indent=4)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            return counters[key]
+
+    # --- Utility ---
+    def _max_invoice_seq(self, prefix, year):
+        """Highest invoice sequence already stored for a series (used to seed its counter)."""
+        if self.supabase:
+            # Compared as numbers on the server, so other series in the table ("B-...",
+            # legacy "INV-...") can't crowd the real maximum out of a text-ordered page
+            return int(self.supabase.rpc("max_invoice_seq", {"p_stem": invoice_stem(prefix, year)}).execute().data or 0)
 
         data = self._read_local()
-        sales = data.get("sales", [])
-        if sales:
-            # Find the maximum invoice number
-            max_no = 0
-            for s in sales:
-                try:
-                    no = int(s.get("invoice_no", "0"))
-                    if no > max_no:
-                        max_no = no
-                except (ValueError, TypeError):
-                    pass
-            return f"{max_no + 1:06d}"
-        return f"{1:06d}"
+        return max_invoice_seq((s.get("invoice_no") for s in data.get("sales", [])), prefix, year)
 
-    def generate_sku(self, category):
-        prefix_map = {
-            'Frame': '2', 
-            'Sunglasses': '3', 
-            'Accessory': '4', 
-            'ContactLens': '5', 
-            'Lens': '1', 
-            'Other': '0'
-        }
-        prefix = prefix_map.get(category, '0')
-        
+    def get_next_invoice_no(self):
+        """
+        Preview the number the next sale will most likely get.
+
+        Does not reserve anything: another terminal may take it first. Use
+        allocate_invoice_no() when the sale is actually being saved.
+        """
+        prefix, year = invoice_scope(self.get_settings())
+        current = self._peek_counter(invoice_counter_key(prefix, year))
+        if current is None:
+            current = self._max_invoice_seq(prefix, year)
+        return format_invoice_no(current + 1, prefix, year)
+
+    def allocate_invoice_no(self):
+        """Reserve and return a unique invoice number for the current branch/year series."""
+        prefix, year = invoice_scope(self.get_settings())
+        seq = self._next_counter(
+            invoice_counter_key(prefix, year),
+            seed=lambda: self._max_invoice_seq(prefix, year),
+        )
+        return format_invoice_no(seq, prefix, year)
+
+    def _max_sku_seq(self, prefix):
         if self.supabase:
-            res = self.supabase.table("inventory").select("sku").ilike("sku", f"{prefix}%").execute()
-            count = len(res.data)
-            return f"{prefix}{count + 1:04d}"
-        
+            res = self.supabase.table("inventory").select("sku").like("sku", sku_like(prefix)).execute()
+            return max_sku_seq((r.get("sku") for r in res.data), prefix)
+
         data = self._read_local()
-        count = len([i for i in data["inventory"] if i.get("sku", "").startswith(prefix)])
-        return f"{prefix}{count + 1:04d}"
+        return max_sku_seq((i.get("sku") for i in data["inventory"]), prefix)
+
+    def peek_sku(self, category):
+        """Preview the next SKU for a category without reserving it."""
+        prefix = sku_prefix(category)
+        key = sku_counter_key(prefix)
+        current = self._peek_counter(key)
+        if current is None:
+            # Create the counter (without advancing it) so the catalog is scanned only once
+            current = self._next_counter(key, 0, seed=lambda: self._max_sku_seq(prefix))
+        return format_sku(prefix, current + 1)
+
+    def reserve_skus(self, category, n):
+        """Reserve `n` consecutive SKUs for a category in one counter update (for imports)."""
+        if n <= 0:
+            return []
+        prefix = sku_prefix(category)
+        last = self._next_counter(sku_counter_key(prefix), n, seed=lambda: self._max_sku_seq(prefix))
+        return [format_sku(prefix, seq) for seq in range(last - n + 1, last + 1)]
+
+    def generate_sku(self, category):
+        return self.reserve_skus(category, 1)[0]
 
     # --- Generic Metadata ---
     def get_metadata(self, table_name):
@@ -252,11 +416,12 @@ class POSRepository:
 
     def add_metadata(self, table_name, name):
         if self.supabase:
-            return self.supabase.table(table_name).insert({"name": name}).execute().data[0]
-        data = self._read_local()
-        new_item = {"id": str(uuid.uuid4()), "name": name}
-        data[table_name].append(new_item)
-        self._write_local(data)
+            new_item = self.supabase.table(table_name).insert({"name": name}).execute().data[0]
+        else:
+            new_item = {"id": str(uuid.uuid4()), "name": name}
+            with self._local_transaction() as data:
+                data[table_name].append(new_item)
+        self._publish_change(METADATA, table_name, INSERT, new_item)
         return new_item
 
     # --- Customers ---
@@ -265,44 +430,162 @@ class POSRepository:
             return self.supabase.table("customers").select("*").execute().data
         return self._read_local()["customers"]
 
+    def get_customer(self, customer_id):
+        if self.supabase:
+            rows = self.supabase.table("customers").select("*").eq("id", customer_id).limit(1).execute().data
+            return rows[0] if rows else None
+        return next((c for c in self._read_local()["customers"] if c["id"] == customer_id), None)
+
     def add_customer(self, customer_data):
         if self.supabase:
-            return self.supabase.table("customers").insert(customer_data).execute().data[0]
+            customer = self.supabase.table("customers").insert(customer_data).execute().data[0]
+            self._publish_change(CUSTOMER, customer["id"], INSERT, customer)
+            return customer
         
-        data = self._read_local()
-        customer_data["id"] = str(uuid.uuid4())
-        data["customers"].append(customer_data)
-        self._write_local(data)
+        with self._local_transaction() as data:
+            customer_data["id"] = str(uuid.uuid4())
+            data["customers"].append(customer_data)
+        self._publish_change(CUSTOMER, customer_data["id"], INSERT, customer_data)
         return customer_data
 
     def update_customer(self, customer_id, customer_data):
         if self.supabase:
-            return self.supabase.table("customers").update(customer_data).eq("id", customer_id).execute()
+            res = self.supabase.table("customers").update(customer_data).eq("id", customer_id).execute()
+            self._publish_change(CUSTOMER, customer_id, UPDATE, customer_data)
+            return res
         
-        data = self._read_local()
-        for c in data["customers"]:
-            if str(c["id"]) == str(customer_id):
-                c.update(customer_data)
-                break
-        self._write_local(data)
+        with self._local_transaction() as data:
+            for c in data["customers"]:
+                if str(c["id"]) == str(customer_id):
+                    c.update(customer_data)
+                    break
+        self._publish_change(CUSTOMER, customer_id, UPDATE, customer_data)
 
     def delete_customer(self, customer_id):
         """Delete a customer by ID."""
         if self.supabase:
-            return self.supabase.table("customers").delete().eq("id", customer_id).execute()
+            res = self.supabase.table("customers").delete().eq("id", customer_id).execute()
+            self._publish_change(CUSTOMER, customer_id, DELETE)
+            return res
+
+        with self._local_transaction() as data:
+            data["customers"] = [c for c in data["customers"] if str(c["id"]) != str(customer_id)]
+            self._local_customer_stats(data).pop(str(customer_id), None)
+        self._publish_change(CUSTOMER, customer_id, DELETE)
+
+    def get_customers_page(self, offset=0, limit=50, search=None, sort="name", with_balance=False):
+        """
+        One page of customers matching `search` (name, phone, city or email),
+        each with its ledger fields (STAT_FIELDS) merged in.
+
+        Args:
+            sort: "name", "balance" (largest first) or "recent" (the customers
+                who have ordered, latest order first)
+            with_balance: only customers who still owe something
 
+        Returns:
+            (customers, next_offset); next_offset is None after the last page
+        """
+        column, descending = CUSTOMER_SORTS[sort]
+        if self.supabase:
+            # customer_ledger is customers joined with customer_stats
+            query = self.supabase.table("customer_ledger").select("*")
+            if search:
+                query = query.or_(",".join(f"{col}.ilike.%{search}%" for col in CUSTOMER_SEARCH_FIELDS))
+            if with_balance:
+                query = query.gt("balance_due", 0)
+            if sort == "recent":
+                query = query.not_.is_("last_order_date", "null")
+            query = query.order(column, desc=descending)
+            if column != "name":
+                query = query.order("name")
+            rows = query.range(offset, offset + limit).execute().data
+            return self._page(rows, offset, limit, fetched_from=offset)
+
+        data = self._read_local_ledger()
+        ledger = data["customer_stats"]
+        customers = data["customers"]
+        if search:
+            term = search.lower()
+            customers = [c for c in customers if customer_matches(c, term)]
+        customers = [dict(c, **ledger.get(c["id"], empty_stats())) for c in customers]
+        if with_balance:
+            customers = [c for c in customers if c["balance_due"] > 0]
+        if sort == "recent":
+            customers = [c for c in customers if c["last_order_date"]]
+        # By name, which also breaks ties in the other orders (the sorts are stable)
+        customers.sort(key=lambda c: (c.get("name") or "").casefold())
+        if column != "name":
+            customers.sort(key=lambda c: c[column], reverse=descending)
+        return self._page(customers, offset, limit)
+
+    def get_customer_stats(self, customer_ids):
+        """Ledger fields per customer: {id: {order_count, total_net, ..., rx_count}}."""
+        stats = {cid: empty_stats() for cid in customer_ids}
+        if not stats:
+            return stats
+        if self.supabase:
+            rows = self.supabase.table("customer_stats").select("*").in_("customer_id", list(stats)).execute().data
+            for row in rows:
+                stats[row["customer_id"]] = {f: row.get(f) for f in STAT_FIELDS}
+            return stats
+        ledger = self._read_local_ledger()["customer_stats"]
+        stats.update((cid, ledger[cid]) for cid in stats if cid in ledger)
+        return stats
+
+    def rebuild_customer_stats(self):
+        """Recompute the whole customer ledger from sales and prescriptions."""
+        if self.supabase:
+            return self.supabase.rpc("rebuild_customer_stats").execute()
+        with self._local_transaction() as data:
+            data["customer_stats"] = build_customer_stats(data["sales"], data["prescriptions"])
+
+    def _read_local_ledger(self):
+        """The data file, with the customer ledger saved to it first if it predates it."""
         data = self._read_local()
-        data["customers"] = [c for c in data["customers"] if str(c["id"]) != str(customer_id)]
-        self._write_local(data)
+        if "customer_stats" not in data:
+            self.rebuild_customer_stats()
+            data = self._read_local()
+        return data
+
+    def _local_customer_stats(self, data):
+        """The ledger in `data`, built from the sales first if the file predates it."""
+        if "customer_stats" not in data:
+            data["customer_stats"] = build_customer_stats(data["sales"], data.get("prescriptions", []))
+        return data["customer_stats"]
+
+    @staticmethod
+    def _page(rows, offset, limit, fetched_from=0):
+        """
+        Cut one page out of `rows` (which start at position `fetched_from`) as
+        (page, next_offset). Supabase queries ask for limit + 1 rows so a
+        fuller page than `limit` tells us there is another one.
+        """
+        start = offset - fetched_from
+        page = rows[start:start + limit + 1]
+        return page[:limit], (offset + limit if len(page) > limit else None)
 
     # --- Inventory ---
-    def get_inventory(self, category=None, search_term=None):
-        """Get inventory with stock calculated from movements."""
+    def get_inventory(self, category=None, search_term=None, warehouse_id=None):
+        """
+        Get inventory with stock calculated from movements.
+
+        With `warehouse_id`, only the products held at that location, with
+        the stock there (read from the per-warehouse balances).
+        """
         if self.supabase:
             query = self.supabase.table("inventory").select("*")
             if category:
                 query = query.eq("category", category)
             items = query.execute().data
+            if warehouse_id:
+                res = self.supabase.table("stock_balances").select("product_id, qty")\
+                    .eq("warehouse_id", warehouse_id).neq("qty", 0).execute()
+                stock = {b["product_id"]: b["qty"] for b in res.data}
+                items = [i for i in items if i["id"] in stock]
+                for item in items:
+                    item["stock_qty"] = stock[item["id"]]
+                return items
             # Calculate stock for each item
             for item in items:
                 item["stock_qty"] = self.get_product_stock(item["id"])
@@ -310,12 +593,23 @@ class POSRepository:
 
         data = self._read_local()
         items = data["inventory"]
-        movements = data.get("stock_movements", [])
 
-        # Calculate stock from movements
-        for item in items:
-            item["stock_qty"] = sum(m["qty"] for m in movements if m.get("product_id") == item["id"])
+        if warehouse_id:
+            stock = {b["product_id"]: b["qty"] for b in self._stock_balances(data)
+                     if str(b["warehouse_id"]) == str(warehouse_id) and b["qty"]}
+            items = [i for i in items if i["id"] in stock]
+            for item in items:
+                item["stock_qty"] = stock[item["id"]]
+        else:
+            # Calculate stock from movements
+            stock = self._local_stock(data, [i["id"] for i in items])
+            for item in items:
+                item["stock_qty"] = stock[item["id"]]
+
+        return self._filter_inventory(items, category, search_term)
 
+    @staticmethod
+    def _filter_inventory(items, category=None, search_term=None):
         # Filter by category if provided
         if category:
             items = [i for i in items if i.get("category") == category]
@@ -330,6 +624,38 @@ class POSRepository:
 
         return items
 
+    def get_inventory_page(self, offset=0, limit=50, category=None, search_term=None):
+        """
+        One page of get_inventory(); stock is only worked out for the rows returned.
+
+        Returns:
+            (items, next_offset); next_offset is None after the last page
+        """
+        if self.supabase:
+            query = self.supabase.table("inventory").select("*")
+            if category:
+                query = query.eq("category", category)
+            if search_term:
+                query = query.or_(",".join(f"{col}.ilike.%{search_term}%" for col in ("name", "sku", "barcode")))
+            rows = query.order("name").range(offset, offset + limit).execute().data
+            items, next_offset = self._page(rows, offset, limit, fetched_from=offset)
+            stock = dict.fromkeys((i["id"] for i in items), 0)
+            if stock:
+                res = self.supabase.table("stock_balances").select("product_id, qty")\
+                    .in_("product_id", list(stock)).execute()
+                for b in res.data:
+                    stock[b["product_id"]] += b["qty"]
+            for item in items:
+                item["stock_qty"] = stock[item["id"]]
+            return items, next_offset
+
+        data = self._read_local()
+        items, next_offset = self._page(self._filter_inventory(data["inventory"], category, search_term), offset, limit)
+        stock = self._local_stock(data, [i["id"] for i in items])
+        for item in items:
+            item["stock_qty"] = stock[item["id"]]
+        return items, next_offset
+
     def get_products_by_category(self, category):
         """Get products filtered by category."""
         return self.get_inventory(category=category)
@@ -337,45 +663,39 @@ class POSRepository:
     def add_inventory_item(self, item_data):
         """Add inventory item with optional initial stock movement."""
         initial_qty = item_data.pop("stock_qty", 0)
+        if not item_data.get("sku"):
+            item_data["sku"] = self.generate_sku(item_data.get("category", "Other"))
 
         if self.supabase:
             result = self.supabase.table("inventory").insert(item_data).execute().data[0]
             if initial_qty > 0:
                 self.add_stock_movement(result["id"], initial_qty, "initial", note="Initial stock")
+            self._publish_change(PRODUCT, result["id"], INSERT, dict(result, stock_qty=initial_qty))
             return result
 
-        data = self._read_local()
-        item_data["id"] = str(uuid.uuid4())
-        if "sku" not in item_data or not item_data["sku"]:
-            item_data["sku"] = self.generate_sku(item_data.get("category", "Other"))
-        data["inventory"].append(item_data)
-
-        # Create initial stock movement if qty > 0
-        if initial_qty > 0:
-            movement = {
-                "id": str(uuid.uuid4()),
-                "product_id": item_data["id"],
-                "qty": initial_qty,
-                "type": "initial",
-                "ref_no": "",
-                "note": "Initial stock",
-                "created_at": datetime.datetime.utcnow().isoformat()
-            }
-            data["stock_movements"].append(movement)
+        with self._local_transaction() as data:
+            item_data["id"] = str(uuid.uuid4())
+            data["inventory"].append(item_data)
+
+            # Create initial stock movement if qty > 0
+            if initial_qty > 0:
+                self._append_movements(data, {item_data["id"]: initial_qty}, "initial", note="Initial stock")
 
-        self._write_local(data)
+        self._publish_change(PRODUCT, item_data["id"], INSERT, dict(item_data, stock_qty=initial_qty))
         return item_data
 
     def update_inventory_item(self, item_id, item_data):
         if self.supabase:
-            return self.supabase.table("inventory").update(item_data).eq("id", item_id).execute()
+            res = self.supabase.table("inventory").update(item_data).eq("id", item_id).execute()
+            self._publish_change(PRODUCT, item_id, UPDATE, item_data)
+            return res
         
-        data = self._read_local()
-        for item in data["inventory"]:
-            if str(item["id"]) == str(item_id):
-                item.update(item_data)
-                break
-        self._write_local(data)
+        with self._local_transaction() as data:
+            for item in data["inventory"]:
+                if str(item["id"]) == str(item_id):
+                    item.update(item_data)
+                    break
+        self._publish_change(PRODUCT, item_id, UPDATE, item_data)
 
     def update_inventory_stock(self, item_id, new_qty):
         """Update stock by creating an adjustment movement."""
@@ -401,81 +721,240 @@ class POSRepository:
             sale["sale_items"] = [item for item in items if item["sale_id"] == sale["id"]]
         return sales
 
+    def get_search_records(self, kinds=SEARCH_KINDS):
+        """
+        The rows the global search index holds, {kind: [record, ...]}: only
+        the columns in RECORD_FIELDS, without stock or sale items.
+        """
+        tables = {CUSTOMER: "customers", PRODUCT: "inventory", SALE: "sales"}
+        records = {}
+        if self.supabase:
+            for kind in kinds:
+                query = self.supabase.table(tables[kind]).select(", ".join(RECORD_FIELDS[kind])).order("id")
+                # Batches of 1000, PostgREST's default cap on one response
+                rows, offset = [], 0
+                while True:
+                    batch = query.range(offset, offset + 999).execute().data
+                    rows += batch
+                    if len(batch) < 1000:
+                        break
+                    offset += 1000
+                records[kind] = rows
+            return records
+
+        data = self._read_local()
+        for kind in kinds:
+            fields = RECORD_FIELDS[kind]
+            records[kind] = [{f: row[f] for f in fields if f in row} for row in data[tables[kind]]]
+        return records
+
+    def get_sales_page(self, offset=0, limit=50, lab_only=False):
+        """
+        One page of sales with their items, newest first. `lab_only` keeps the
+        orders that have a lab status.
+
+        Returns:
+            (sales, next_offset); next_offset is None after the last page
+        """
+        if self.supabase:
+            query = self.supabase.table("sales").select("*, sale_items(*)")
+            if lab_only:
+                query = query.not_.is_("lab_status", "null")
+            rows = query.order("order_date", desc=True).range(offset, offset + limit).execute().data
+            return self._page(rows, offset, limit, fetched_from=offset)
+
+        data = self._read_local()
+        sales = [s for s in data["sales"] if s.get("lab_status") or not lab_only]
+        sales.sort(key=lambda s: s.get("order_date") or "", reverse=True)
+        sales, next_offset = self._page(sales, offset, limit)
+        by_sale = {s["id"]: s for s in sales}
+        for sale in sales:
+            sale["sale_items"] = []
+        for item in data["sale_items"]:
+            if item["sale_id"] in by_sale:
+                by_sale[item["sale_id"]]["sale_items"].append(item)
+        return sales, next_offset
+
+    def search_sales(self, term=None, lab_status=None, payment_state=None, date_range=None,
+                     limit=50, cursor=None):
+        """
+        One page of the sales history, newest first, with every filter applied
+        by the backend and the customer's name joined.
+
+        Args:
+            term: substring of the invoice number, customer name or doctor
+            lab_status: exact lab status
+            payment_state: PAID, PARTIAL or UNPAID (app.core.payments)
+            date_range: (date_from, date_to) order dates, inclusive; either may be None
+            cursor: the next_cursor of the previous page
+
+        Returns:
+            (sales, next_cursor); each sale carries sale_items, customer_name and
+            balance_due. next_cursor is None after the last page.
+
+        Raises:
+            ValueError: for an unknown payment_state or a malformed cursor
+        """
+        if payment_state and payment_state not in PAYMENT_STATES:
+            raise ValueError(f"Unknown payment state: {payment_state!r}")
+        after = decode_cursor(cursor) if cursor else None
+        date_from, date_to = date_range or (None, None)
+        term = normalize_query(term)
+
+        if self.supabase:
+            # sales_search is sales plus customer_name; balance_due is a stored column
+            query = self.supabase.table("sales_search").select("*, sale_items(*)")
+            if lab_status:
+                query = query.eq("lab_status", lab_status)
+            if payment_state == PAID:
+                query = query.lte("balance_due", 0)
+            elif payment_state == PARTIAL:
+                query = query.gt("amount_paid", 0).gt("balance_due", 0)
+            elif payment_state == UNPAID:
+                query = query.eq("amount_paid", 0).gt("balance_due", 0)
+            if date_from:
+                query = query.gte("order_date", str(date_from)[:10])
+            if date_to:
+                next_day = datetime.date.fromisoformat(str(date_to)[:10]) + datetime.timedelta(days=1)
+                query = query.lt("order_date", next_day.isoformat())
+
+            # PostgREST takes one `or` filter; the term and the cursor are AND-ed inside it
+            conditions = []
+            if term:
+                pattern = '"*' + term.replace('"', "") + '*"'
+                conditions.append(f"or(invoice_no.ilike.{pattern},customer_name.ilike.{pattern},"
+                                  f"doctor_name.ilike.{pattern})")
+            if after:
+                order_date, sale_id = after
+                conditions.append(f"or(order_date.lt.\"{order_date}\","
+                                  f"and(order_date.eq.\"{order_date}\",id.lt.{sale_id}))")
+            if conditions:
+                query = query.or_(f"and({','.join(conditions)})")
+
+            rows = query.order("order_date", desc=True).order("id", desc=True).limit(limit + 1).execute().data
+            for sale in rows:
+                sale["balance_due"] = float(sale.get("balance_due") or 0)
+            return self._keyset_page(rows, limit)
+
+        data = self._read_local()
+        names = {c["id"]: c.get("name", "") for c in data["customers"]}
+        date_from = str(date_from)[:10] if date_from else None
+        date_to = str(date_to)[:10] if date_to else None
+
+        def matches(sale):
+            day = (sale.get("order_date") or "")[:10]
+            if lab_status and sale.get("lab_status") != lab_status:
+                return False
+            if (date_from and day < date_from) or (date_to and day > date_to):
+                return False
+            if payment_state and sale_payment_state(sale) != payment_state:
+                return False
+            if after and (sale.get("order_date") or "", str(sale["id"])) >= tuple(after):
+                return False
+            return not term or any(term in (value or "").lower() for value in (
+                sale.get("invoice_no"), names.get(sale.get("customer_id")), sale.get("doctor_name")))
+
+        sales = [s for s in data["sales"] if matches(s)]
+        sales.sort(key=lambda s: (s.get("order_date") or "", str(s["id"])), reverse=True)
+        sales, next_cursor = self._keyset_page(sales[:limit + 1], limit)
+        by_sale = {}
+        for sale in sales:
+            sale.update(sale_items=[], customer_name=names.get(sale.get("customer_id")),
+                        balance_due=balance_due(sale))
+            by_sale[sale["id"]] = sale
+        for item in data["sale_items"]:
+            if item["sale_id"] in by_sale:
+                by_sale[item["sale_id"]]["sale_items"].append(item)
+        return sales, next_cursor
+
+    @staticmethod
+    def _keyset_page(rows, limit):
+        """(page, next_cursor) from up to limit + 1 rows sorted by (order_date, id) descending."""
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor([rows[-1].get("order_date") or "", str(rows[-1]["id"])])
+
     def add_sale(self, sale_data, items, exam_data=None, examinations=None):
         """
         Create a complete sale with items, stock movements, and examinations.
 
+        Stock for all items is checked and deducted as one locked step, and
+        the invoice number is only reserved once that has succeeded. On
+        Supabase the whole sale is the create_sale() function, one transaction.
+
         Args:
             sale_data: Sale header data
             items: List of sale items [{product_id, qty, unit_price, total_price, name}]
             exam_data: Single examination data (legacy support)
             examinations: List of examination data (for multiple exams per order)
+
+        Raises:
+            InsufficientStockError: if any item is short; nothing is saved
         """
+        all_exams = [exam for exam in examinations or ([exam_data] if exam_data else []) if exam]
         if self.supabase:
-            res = self.supabase.table("sales").insert(sale_data).execute()
-            sale_id = res.data[0]["id"]
-            invoice_no = sale_data.get("invoice_no", sale_id)
-
+            # One create_sale() call: the stock check, invoice number, movements,
+            # sale, items and examinations commit together or not at all
+            requested = requested_quantities(items)
+            prefix, year = invoice_scope(self.get_settings())
+            res = self.supabase.rpc("create_sale", {
+                "p_sale": sale_data,
+                "p_items": items,
+                "p_exams": all_exams,
+                "p_stock": [{"product_id": pid, "qty": qty} for pid, qty in requested.items()],
+                "p_counter_key": invoice_counter_key(prefix, year),
+                "p_stem": invoice_stem(prefix, year),
+                "p_width": INVOICE_SEQ_WIDTH,
+            }).execute()
+            if res.data["shortfalls"]:
+                raise InsufficientStockError(res.data["shortfalls"])
+            sale = res.data["sale"]
+            sale_data["invoice_no"] = sale["invoice_no"]
             for item in items:
-                item["sale_id"] = sale_id
-                # Deduct stock
-                self.add_stock_movement(
-                    item["product_id"],
-                    -item["qty"],
-                    "sale",
-                    ref_no=invoice_no,
-                    note=f"POS Sale: {invoice_no}"
-                )
-            self.supabase.table("sale_items").insert(items).execute()
-            
-            # Handle examinations (multiple or single)
-            all_exams = examinations or ([exam_data] if exam_data else [])
-            for exam in all_exams:
-                if exam:
-                    exam["sale_id"] = sale_id
-                    self.supabase.table("order_examinations").insert(exam).execute()
+                item["sale_id"] = sale["id"]
 
-            return res.data[0]
-        
-        data = self._read_local()
-        sale_id = str(uuid.uuid4())
-        sale_data["id"] = sale_id
-        invoice_no = sale_data.get("invoice_no", sale_id)
+            self._publish_stock_changes(requested)
+            self._publish_change(SALE, sale["id"], INSERT, dict(sale, sale_items=items))
+            return sale
 
-        # Add order_date if not present
-        if "order_date" not in sale_data:
-            sale_data["order_date"] = datetime.datetime.utcnow().isoformat()
+        with self._local_transaction() as data:
+            requested = requested_quantities(items)
+            shortfalls = find_shortfalls(requested, self._local_stock(data, requested))
+            if shortfalls:
+                raise InsufficientStockError(shortfalls)
 
-        data["sales"].append(sale_data)
+            if not sale_data.get("invoice_no"):
+                sale_data["invoice_no"] = self.allocate_invoice_no()
+            sale_id = str(uuid.uuid4())
+            sale_data["id"] = sale_id
+            invoice_no = sale_data["invoice_no"]
 
-        for item in items:
-            item_record = {
-                "id": str(uuid.uuid4()),
-                "sale_id": sale_id,
-                "product_id": item["product_id"],
-                "qty": item["qty"],
-                "unit_price": item.get("unit_price", 0),
-                "total_price": item.get("total_price", 0),
-                "name": item.get("name", "")
-            }
-            data["sale_items"].append(item_record)
-
-            # Create stock movement for sale (negative qty)
-            movement = {
-                "id": str(uuid.uuid4()),
-                "product_id": item["product_id"],
-                "qty": -item["qty"],
-                "type": "sale",
-                "ref_no": invoice_no,
-                "note": f"POS Sale: {invoice_no}",
-                "created_at": datetime.datetime.utcnow().isoformat()
-            }
-            data["stock_movements"].append(movement)
+            # Stock movements for the sale (negative qty), at the locations holding the stock
+            self._deduct_local(data, requested, invoice_no, f"POS Sale: {invoice_no}")
+
+            # Add order_date if not present
+            if "order_date" not in sale_data:
+                sale_data["order_date"] = datetime.datetime.utcnow().isoformat()
+
+            data["sales"].append(sale_data)
+
+            sale_items = []
+            for item in items:
+                item_record = {
+                    "id": str(uuid.uuid4()),
+                    "sale_id": sale_id,
+                    "product_id": item["product_id"],
+                    "qty": item["qty"],
+                    "unit_price": item.get("unit_price", 0),
+                    "total_price": item.get("total_price", 0),
+                    "name": item.get("name", "")
+                }
+                data["sale_items"].append(item_record)
+                sale_items.append(item_record)
 
-        # Handle examinations (multiple or single)
-        all_exams = examinations or ([exam_data] if exam_data else [])
-        for exam in all_exams:
-            if exam:
+            # Handle examinations (multiple or single)
+            for exam in all_exams:
                 exam_record = {
                     "id": str(uuid.uuid4()),
                     "sale_id": sale_id,
@@ -483,58 +962,228 @@ class POSRepository:
                 }
                 data["order_examinations"].append(exam_record)
 
-        self._write_local(data)
+            if sale_data.get("customer_id"):
+                ledger = self._local_customer_stats(data)
+                record_order(ledger.setdefault(sale_data["customer_id"], empty_stats()), sale_data)
+
+        self._publish_stock_changes(requested)
+        self._publish_change(SALE, sale_id, INSERT, dict(sale_data, sale_items=sale_items))
         return sale_data
 
     def update_sale_lab_status(self, sale_id, status):
+        return self.update_sales_lab_status([sale_id], status)
+
+    def update_sales_lab_status(self, sale_ids, status):
+        """
+        Set the lab status of several orders in one write (a single UPDATE ...
+        WHERE id IN on Supabase, one locked read-modify-write locally).
+        """
+        sale_ids = list(sale_ids)
+        if not sale_ids:
+            return None
+        res = None
         if self.supabase:
-            return self.supabase.table("sales").update({"lab_status": status}).eq("id", sale_id).execute()
-        
-        data = self._read_local()
-        for sale in data["sales"]:
-            if sale["id"] == sale_id:
-                sale["lab_status"] = status
-                break
-        self._write_local(data)
+            res = self.supabase.table("sales").update({"lab_status": status}).in_("id", sale_ids).execute()
+        else:
+            wanted = set(sale_ids)
+            with self._local_transaction() as data:
+                for sale in data["sales"]:
+                    if sale["id"] in wanted:
+                        sale["lab_status"] = status
+        for sale_id in sale_ids:
+            self._publish_change(SALE, sale_id, UPDATE, {"lab_status": status})
+        return res
 
     def update_sale_payment(self, sale_id, amount_paid):
         """Update the amount paid for a sale."""
         if self.supabase:
-            return self.supabase.table("sales").update({"amount_paid": amount_paid}).eq("id", sale_id).execute()
+            res = self.supabase.table("sales").update({"amount_paid": amount_paid}).eq("id", sale_id).execute()
+            self._publish_change(SALE, sale_id, UPDATE, {"amount_paid": amount_paid})
+            return res
+
+        with self._local_transaction() as data:
+            sale = next((s for s in data["sales"] if s["id"] == sale_id), None)
+            if sale is not None:
+                if sale.get("customer_id"):
+                    ledger = self._local_customer_stats(data)
+                    stats = ledger.setdefault(sale["customer_id"], empty_stats())
+                    record_payment(stats, sale.get("amount_paid"), amount_paid)
+                sale["amount_paid"] = amount_paid
+        self._publish_change(SALE, sale_id, UPDATE, {"amount_paid": amount_paid})
+
+    # --- Dashboard ---
+    def get_dashboard_stats(self, recent=5):
+        """
+        The dashboard figures: orders, revenue, paid and pending-lab totals
+        over all sales, customer and product counts, and the `recent` newest
+        sales with their customer_name.
+
+        Supabase runs the four reads concurrently; the local backend makes
+        one pass over one read of the data file.
+        """
+        recent_fields = ("id", "invoice_no", "customer_id", "order_date", "net_amount", "lab_status")
+        if self.supabase:
+            def count(table):
+                return self.supabase.table(table).select("id", count="exact").limit(1).execute().count or 0
+
+            reads = {
+                "totals": lambda: self.supabase.rpc("dashboard_sales_totals").execute().data[0],
+                "customers": lambda: count("customers"),
+                "products": lambda: count("inventory"),
+                "recent": lambda: self.supabase.table("sales_search")
+                    .select(", ".join(recent_fields + ("customer_name",)))
+                    .order("order_date", desc=True).order("id", desc=True).limit(recent).execute().data,
+            }
+            with ThreadPoolExecutor(max_workers=len(reads)) as pool:
+                futures = {name: pool.submit(read) for name, read in reads.items()}
+                results = {name: future.result() for name, future in futures.items()}
+            totals = results["totals"]
+            return {
+                "orders": totals["orders"], "revenue": float(totals["revenue"] or 0),
+                "paid": float(totals["paid"] or 0), "pending": totals["pending"],
+                "customers": results["customers"], "products": results["products"],
+                "recent": results["recent"],
+            }
 
         data = self._read_local()
-        for sale in data["sales"]:
-            if sale["id"] == sale_id:
-                sale["amount_paid"] = amount_paid
-                break
-        self._write_local(data)
+        sales = data["sales"]
+        revenue = paid = 0.0
+        pending = 0
+        for sale in sales:
+            revenue += float(sale.get("net_amount") or 0)
+            paid += float(sale.get("amount_paid") or 0)
+            if sale.get("lab_status") and sale["lab_status"] != "Received":
+                pending += 1
+        newest = heapq.nlargest(recent, sales, key=lambda s: (s.get("order_date") or "", str(s["id"])))
+        names = {s.get("customer_id") for s in newest}
+        names = {c["id"]: c.get("name") for c in data["customers"] if c["id"] in names}
+        return {
+            "orders": len(sales), "revenue": revenue, "paid": paid, "pending": pending,
+            "customers": len(data["customers"]), "products": len(data["inventory"]),
+            "recent": [dict({f: s.get(f) for f in recent_fields}, customer_name=names.get(s.get("customer_id")))
+                       for s in newest],
+        }
 
     # --- Settings ---
-    def get_setting(self, key, default=None):
+    def get_settings(self, refresh=False):
+        """
+        Return an immutable {key: value} snapshot of all settings.
+
+        The snapshot is loaded with a single query/file read and cached. The local
+        backend revalidates it against the file's modification time; on Supabase
+        the settings version counter is checked at most every
+        SETTINGS_RECHECK_SECONDS, so other terminals' changes show up within that.
+        """
         if self.supabase:
-            res = self.supabase.table("settings").select("value").eq("key", key).execute()
-            return res.data[0]["value"] if res.data else default
-        
-        data = self._read_local()
-        setting = next((s for s in data["settings"] if s["key"] == key), None)
-        return setting["value"] if setting else default
+            now = time.monotonic()
+            if (refresh or self._settings_snapshot is None
+                    or now - self._settings_checked >= SETTINGS_RECHECK_SECONDS):
+                # Read the version first: a write landing after it only costs another reload
+                version = self._peek_counter(SETTINGS_VERSION_KEY)
+                if refresh or self._settings_snapshot is None or version != self._settings_version:
+                    rows = self.supabase.table("settings").select("key, value").execute().data
+                    self._settings_snapshot = types.MappingProxyType({r["key"]: r["value"] for r in rows})
+                    self._settings_version = version
+                self._settings_checked = now
+            return self._settings_snapshot
+
+        # The modification time from before the read: a write landing during it
+        # leaves the cached one stale, so the next call reads again
+        mtime = self._local_mtime()
+        if refresh or self._settings_snapshot is None or mtime != self._settings_mtime:
+            data = self._read_local()
+            self._settings_snapshot = types.MappingProxyType(
+                {s["key"]: s["value"] for s in data.get("settings", [])}
+            )
+            self._settings_mtime = mtime
+        return self._settings_snapshot
+
+    def set_settings(self, mapping):
+        """
+        Write several settings at once and notify subscribers.
 
-    def set_setting(self, key, value):
+        Supabase receives a single upsert; the local backend does one atomic
+        read-modify-write of the data file.
+        """
+        if not mapping:
+            return self.get_settings()
+
+        current = self.get_settings()
         if self.supabase:
-            # Upsert
-            res = self.supabase.table("settings").select("*").eq("key", key).execute()
-            if res.data:
-                return self.supabase.table("settings").update({"value": value}).eq("key", key).execute()
-            else:
-                return self.supabase.table("settings").insert({"key": key, "value": value}).execute()
-        
-        data = self._read_local()
-        setting = next((s for s in data["settings"] if s["key"] == key), None)
-        if setting:
-            setting["value"] = value
+            rows = [{"key": key, "value": value} for key, value in mapping.items()]
+            self.supabase.table("settings").upsert(rows, on_conflict="key").execute()
+        else:
+            with self._local_transaction() as data:
+                settings = data.setdefault("settings", [])
+                by_key = {s["key"]: s for s in settings}
+                for key, value in mapping.items():
+                    if key in by_key:
+                        by_key[key]["value"] = value
+                    else:
+                        settings.append({"key": key, "value": value})
+            # Another terminal may write before the file can be stat'ed again;
+            # the next get_settings() re-reads rather than trust this snapshot
+            self._settings_mtime = None
+
+        snapshot = types.MappingProxyType({**current, **mapping})
+        self._settings_snapshot = snapshot
+        if any(current.get(key) != value or key not in current for key, value in mapping.items()):
+            self._notify_settings(snapshot)
+        return snapshot
+
+    def subscribe_settings(self, callback):
+        """
+        Call callback(snapshot) whenever settings change through this repository.
+
+        Bound methods are held weakly so a closed view does not stay alive just
+        because it subscribed. Returns a function that removes the subscription.
+        """
+        if hasattr(callback, "__self__") and hasattr(callback, "__func__"):
+            ref = weakref.WeakMethod(callback)
         else:
-            data["settings"].append({"key": key, "value": value})
-        self._write_local(data)
+            ref = lambda: callback
+        self._settings_subscribers.append(ref)
+
+        def unsubscribe():
+            if ref in self._settings_subscribers:
+                self._settings_subscribers.remove(ref)
+        return unsubscribe
+
+    def _notify_settings(self, snapshot):
+        for ref in list(self._settings_subscribers):
+            callback = ref()
+            if callback is None:
+                self._settings_subscribers.remove(ref)
+                continue
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"[REPO] settings subscriber error: {e}")
+
+    def set_change_publisher(self, publish):
+        """
+        Call publish(ChangeEvent) after every write to sales, products, stock,
+        customers and metadata lists (the Flet app sends them to all sessions over pubsub).
+        """
+        self._change_publisher = publish
+
+    def _publish_change(self, entity, entity_id, op, data=None):
+        if self._change_publisher is None:
+            return
+        try:
+            self._change_publisher(ChangeEvent(entity, str(entity_id), op, data))
+        except Exception as e:
+            print(f"[REPO] change publisher error: {e}")
+
+    def _publish_stock_changes(self, product_ids):
+        for product_id in product_ids:
+            self._publish_change(STOCK, product_id, UPDATE)
+
+    def get_setting(self, key, default=None):
+        return self.get_settings().get(key, default)
+
+    def set_setting(self, key, value):
+        return self.set_settings({key: value})
 
     # --- Prescriptions ---
     def get_prescriptions(self, customer_id=None):
@@ -553,10 +1202,11 @@ class POSRepository:
         if self.supabase:
             return self.supabase.table("prescriptions").insert(p_data).execute().data[0]
         
-        data = self._read_local()
-        p_data["id"] = str(uuid.uuid4())
-        data["prescriptions"].append(p_data)
-        self._write_local(data)
+        with self._local_transaction() as data:
+            p_data["id"] = str(uuid.uuid4())
+            data["prescriptions"].append(p_data)
+            if p_data.get("customer_id"):
+                self._local_customer_stats(data).setdefault(p_data["customer_id"], empty_stats())["rx_count"] += 1
         return p_data
 
     # --- Order Examinations ---
@@ -579,6 +1229,27 @@ class POSRepository:
             exams = [e for e in exams if e.get("sale_id") == sale_id]
         return exams
 
+    def get_examinations_for_sales(self, sale_ids) -> dict:
+        """
+        {sale_id: [examinations]} for a page of sales, in one read.
+
+        Read errors are raised, not turned into empty lists: the print spooler
+        would take those for orders with nothing for the lab and skip them.
+        """
+        sale_ids = [str(s) for s in sale_ids]
+        by_sale = {sale_id: [] for sale_id in sale_ids}
+        if not sale_ids:
+            return by_sale
+        if self.supabase:
+            rows = self.supabase.table("order_examinations").select("*").in_("sale_id", sale_ids).execute().data
+        else:
+            rows = self._read_local().get("order_examinations", [])
+        for exam in rows:
+            exams = by_sale.get(str(exam.get("sale_id")))
+            if exams is not None:
+                exams.append(exam)
+        return by_sale
+
     # --- POS-Specific Operations ---
     def get_customer_past_examinations(self, customer_id: str) -> list:
         """Get past examinations for a customer with sale info."""
@@ -645,26 +1316,21 @@ class POSRepository:
 
         return customer_exams[:10]
 
-    def search_customers(self, query: str) -> list:
-        """Search customers by name, phone, city, etc."""
+    def search_customers(self, query: str, limit: int = 10) -> list:
+        """Search customers by name, phone, city or email (case-insensitive substring)."""
         if self.supabase:
             # Supabase doesn't have great full-text search, so we do multiple OR queries
             return self.supabase.table("customers")\
                 .select("*")\
-                .ilike("name", f"%{query}%")\
-                .limit(10)\
+                .or_(",".join(f"{f}.ilike.%{query}%" for f in CUSTOMER_SEARCH_FIELDS))\
+                .limit(limit)\
                 .execute().data
 
         data = self._read_local()
         customers = data.get("customers", [])
         query_lower = query.lower()
 
-        return [c for c in customers if (
-            query_lower in c.get("name", "").lower() or
-            query_lower in c.get("phone", "").lower() or
-            query_lower in c.get("city", "").lower() or
-            query_lower in c.get("email", "").lower()
-        )][:10]
+        return [c for c in customers if customer_matches(c, query_lower)][:limit]
 
     def create_sale_order(self, customer_id: str, items: list, exam_data: dict = None,
                          totals: dict = None, doctor_name: str = "", user_id: str = None) -> dict:
@@ -681,18 +1347,12 @@ class POSRepository:
 
         Returns:
             Sale data with ID
-        """
-        invoice_no = self.get_next_invoice_no()
-
-        # Validate stock for each item (don't deduct yet - add_sale handles that)
-        for item in items:
-            current_stock = self.get_product_stock(item["product_id"])
-            if current_stock < item["qty"]:
-                raise ValueError(f"Insufficient stock for product {item['product_id']}")
 
+        Raises:
+            InsufficientStockError: (a ValueError) if any item is short
+        """
         import datetime
         sale_data = {
-            "invoice_no": invoice_no,
             "customer_id": customer_id,
             "user_id": user_id,
             "total_amount": totals.get("total_amount", 0.0) if totals else 0.0,
@@ -705,7 +1365,7 @@ class POSRepository:
             "lab_status": "Not Started"
         }
 
-        # add_sale handles stock movements internally
+        # add_sale checks and deducts stock and reserves the invoice number
         return self.add_sale(sale_data, items, exam_data)
 
     def get_product_stock(self, product_id: str) -> int:
@@ -715,14 +1375,173 @@ class POSRepository:
             return sum(m["qty"] for m in res.data)
 
         data = self._read_local()
-        movements = data.get("stock_movements", [])
-        return sum(m["qty"] for m in movements if m["product_id"] == product_id)
+        return self._local_stock(data, [product_id])[product_id]
+
+    def _local_stock(self, data, product_ids):
+        """Stock per product for `product_ids`, summed over its warehouse balances."""
+        stock = dict.fromkeys(product_ids, 0)
+        for b in self._stock_balances(data):
+            if b["product_id"] in stock:
+                stock[b["product_id"]] += b["qty"]
+        return stock
+
+    def _default_warehouse_id(self, data):
+        warehouses = data.get("warehouses") or []
+        return warehouses[0]["id"] if warehouses else None
+
+    def _stock_balances(self, data):
+        """
+        The per-warehouse balances [{product_id, warehouse_id, qty}] in `data`.
+
+        Files written before balances existed get them rebuilt from the ledger
+        once, with warehouse-less movements assigned to the default warehouse.
+        """
+        if "stock_balances" not in data:
+            default_wh = self._default_warehouse_id(data)
+            totals = {}
+            for m in data.get("stock_movements", []):
+                m.setdefault("warehouse_id", default_wh)
+                key = (m["product_id"], m["warehouse_id"])
+                totals[key] = totals.get(key, 0) + m["qty"]
+            data["stock_balances"] = [
+                {"product_id": pid, "warehouse_id": wh, "qty": qty} for (pid, wh), qty in totals.items()
+            ]
+        return data["stock_balances"]
+
+    def _append_movements(self, data, quantities, movement_type, ref_no="", note="", warehouse_id=None):
+        """Add one movement per product and keep the per-warehouse balances in step."""
+        balances = self._stock_balances(data)
+        if warehouse_id is None:
+            warehouse_id = self._default_warehouse_id(data)
+        now = datetime.datetime.utcnow().isoformat()
+        movements = [{
+            "id": str(uuid.uuid4()),
+            "product_id": product_id,
+            "warehouse_id": warehouse_id,
+            "qty": qty,
+            "type": movement_type,
+            "ref_no": ref_no,
+            "note": note,
+            "created_at": now
+        } for product_id, qty in quantities.items()]
+        data.setdefault("stock_movements", []).extend(movements)
+
+        index = {(b["product_id"], b["warehouse_id"]): b for b in balances}
+        for m in movements:
+            balance = index.get((m["product_id"], warehouse_id))
+            if balance is None:
+                balance = {"product_id": m["product_id"], "warehouse_id": warehouse_id, "qty": 0}
+                balances.append(balance)
+                index[(m["product_id"], warehouse_id)] = balance
+            balance["qty"] += m["qty"]
+        return movements
+
+    def get_warehouses(self):
+        if self.supabase:
+            return self.supabase.table("warehouses").select("*").order("created_at").execute().data
+        return self._read_local().get("warehouses", [])
+
+    def get_stock_by_warehouse(self, product_id: str) -> dict:
+        """A product's stock at each location: {warehouse_id: qty}."""
+        if self.supabase:
+            res = self.supabase.table("stock_balances").select("warehouse_id, qty")\
+                .eq("product_id", product_id).neq("qty", 0).execute()
+            return {b["warehouse_id"]: b["qty"] for b in res.data}
+
+        data = self._read_local()
+        return {b["warehouse_id"]: b["qty"] for b in self._stock_balances(data)
+                if b["product_id"] == product_id and b["qty"]}
+
+    def transfer_stock(self, product_id: str, from_wh: str, to_wh: str, qty: int, note: str = "") -> list:
+        """
+        Move stock between locations as a pair of 'transfer' movements, atomically.
+
+        Returns:
+            List of shortfalls [{product_id, requested, available}]; empty if
+            the stock was moved, otherwise nothing was written
+        """
+        if qty <= 0 or str(from_wh) == str(to_wh):
+            raise ValueError("Transfer needs a positive quantity and two different warehouses")
+        note = note or f"Transfer {from_wh} -> {to_wh}"
+
+        if self.supabase:
+            res = self.supabase.rpc("transfer_stock", {
+                "p_product_id": product_id, "p_from": from_wh, "p_to": to_wh, "p_qty": qty, "p_note": note
+            }).execute()
+            shortfalls = res.data or []
+        else:
+            with self._local_transaction() as data:
+                available = sum(b["qty"] for b in self._stock_balances(data)
+                                if b["product_id"] == product_id and str(b["warehouse_id"]) == str(from_wh))
+                shortfalls = find_shortfalls({product_id: qty}, {product_id: available})
+                if not shortfalls:
+                    self._append_movements(data, {product_id: -qty}, "transfer", note=note, warehouse_id=from_wh)
+                    self._append_movements(data, {product_id: qty}, "transfer", note=note, warehouse_id=to_wh)
+        if not shortfalls:
+            self._publish_stock_changes([product_id])
+        return shortfalls
+
+    def reserve_and_deduct(self, items: list, ref_no: str = "", note: str = "") -> list:
+        """
+        Check and deduct stock for every order line as one locked step.
+
+        On Supabase this is the reserve_and_deduct() function, which locks the
+        products' rows; locally it runs under the data file's lock. Either way
+        two terminals selling the last frame can't both pass the check.
+
+        Args:
+            items: Order lines [{product_id, qty}]; lines for the same product are summed
+            ref_no: Reference number for the movements (invoice)
+            note: Note for the movements
+
+        Returns:
+            List of shortfalls [{product_id, requested, available}]; empty if
+            the stock was deducted, otherwise nothing was deducted
+        """
+        requested = requested_quantities(items)
+        if not requested:
+            return []
+        note = note or f"Sale: {ref_no}"
+
+        if self.supabase:
+            lines = [{"product_id": pid, "qty": qty} for pid, qty in requested.items()]
+            res = self.supabase.rpc("reserve_and_deduct", {"p_items": lines, "p_ref_no": ref_no, "p_note": note}).execute()
+            shortfalls = res.data or []
+        else:
+            with self._local_transaction() as data:
+                shortfalls = self._deduct_local(data, requested, ref_no, note)
+        if not shortfalls:
+            self._publish_stock_changes(requested)
+        return shortfalls
+
+    def _deduct_local(self, data, requested, ref_no, note):
+        """
+        Check `requested` ({product_id: qty}) against the total stock and, if it
+        is covered, book 'sale' movements at the locations holding it.
+
+        Returns the shortfalls; nothing is written when there are any.
+        """
+        shortfalls = find_shortfalls(requested, self._local_stock(data, requested))
+        if shortfalls:
+            return shortfalls
+
+        default_wh = self._default_warehouse_id(data)
+        order = {wh["id"]: n for n, wh in enumerate(data.get("warehouses") or [])}
+        balances = sorted(self._stock_balances(data), key=lambda b: order.get(b["warehouse_id"], len(order)))
+        by_warehouse = {}
+        for product_id, qty in requested.items():
+            held = {b["warehouse_id"]: b["qty"] for b in balances if b["product_id"] == product_id}
+            for warehouse_id, take in split_deduction(qty, held, default_wh).items():
+                by_warehouse.setdefault(warehouse_id, {})[product_id] = -take
+        for warehouse_id, quantities in by_warehouse.items():
+            self._append_movements(data, quantities, "sale", ref_no, note, warehouse_id=warehouse_id)
+        return []
 
     def add_stock_movement(self, product_id: str, qty: int, movement_type: str,
                           ref_no: str = "", note: str = ""):
         """Record a stock movement."""
         if self.supabase:
-            return self.supabase.table("stock_movements").insert({
+            movement = self.supabase.table("stock_movements").insert({
                 "product_id": product_id,
                 "qty": qty,
                 "type": movement_type,
@@ -730,21 +1549,10 @@ class POSRepository:
                 "note": note,
                 "created_at": datetime.datetime.utcnow().isoformat()
             }).execute().data[0]
-
-        data = self._read_local()
-        movement = {
-            "id": str(uuid.uuid4()),
-            "product_id": product_id,
-            "qty": qty,
-            "type": movement_type,
-            "ref_no": ref_no,
-            "note": note,
-            "created_at": datetime.datetime.utcnow().isoformat()
-        }
-        if "stock_movements" not in data:
-            data["stock_movements"] = []
-        data["stock_movements"].append(movement)
-        self._write_local(data)
+        else:
+            with self._local_transaction() as data:
+                movement, = self._append_movements(data, {product_id: qty}, movement_type, ref_no, note)
+        self._publish_stock_changes([product_id])
         return movement
 
     # --- Lens Types, Frame Types, Frame Colors ---
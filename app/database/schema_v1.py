@@ -0,0 +1,251 @@
+# app/database/schema_v1.py
+"""
+The pos.db schema as migrations 1 and 2 shipped it, written out as SQLite DDL.
+
+These statements are frozen: models.py keeps changing, these do not. Later
+tables and indexes are added by their own numbered migrations.
+"""
+
+TABLES = (
+    """CREATE TABLE IF NOT EXISTS contact_lens_types (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS counters (
+        "key" VARCHAR NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY ("key")
+    )""",
+    """CREATE TABLE IF NOT EXISTS customers (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        phone VARCHAR,
+        phone2 VARCHAR,
+        email VARCHAR,
+        address TEXT,
+        city VARCHAR,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS frame_colors (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS frame_types (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS lens_types (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS permissions (
+        id INTEGER NOT NULL,
+        code VARCHAR NOT NULL,
+        category VARCHAR,
+        description VARCHAR,
+        value_type VARCHAR,
+        PRIMARY KEY (id),
+        UNIQUE (code)
+    )""",
+    """CREATE TABLE IF NOT EXISTS products (
+        id INTEGER NOT NULL,
+        sku VARCHAR,
+        name VARCHAR NOT NULL,
+        description TEXT,
+        cost_price FLOAT,
+        sale_price FLOAT,
+        unit VARCHAR,
+        category VARCHAR,
+        lens_type VARCHAR,
+        frame_type VARCHAR,
+        frame_color VARCHAR,
+        barcode VARCHAR,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (sku)
+    )""",
+    """CREATE TABLE IF NOT EXISTS roles (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS settings (
+        "key" VARCHAR NOT NULL,
+        value VARCHAR,
+        PRIMARY KEY ("key")
+    )""",
+    """CREATE TABLE IF NOT EXISTS suppliers (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        phone VARCHAR,
+        email VARCHAR,
+        address TEXT,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_permissions (
+        user_id INTEGER NOT NULL,
+        permission_id INTEGER NOT NULL,
+        allow BOOLEAN NOT NULL,
+        value VARCHAR,
+        CONSTRAINT up_pk PRIMARY KEY (user_id, permission_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS warehouses (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        location VARCHAR,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS prescriptions (
+        id INTEGER NOT NULL,
+        customer_id INTEGER NOT NULL,
+        type VARCHAR,
+        sphere_od VARCHAR,
+        cylinder_od VARCHAR,
+        axis_od VARCHAR,
+        ipd_od VARCHAR,
+        sphere_os VARCHAR,
+        cylinder_os VARCHAR,
+        axis_os VARCHAR,
+        ipd_os VARCHAR,
+        doctor_name VARCHAR,
+        image_path VARCHAR,
+        notes TEXT,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(customer_id) REFERENCES customers (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS purchases (
+        id INTEGER NOT NULL,
+        supplier_id INTEGER,
+        invoice_no VARCHAR,
+        total_amount FLOAT,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(supplier_id) REFERENCES suppliers (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS role_permissions (
+        role_id INTEGER NOT NULL,
+        permission_id INTEGER NOT NULL,
+        value VARCHAR,
+        CONSTRAINT rp_pk PRIMARY KEY (role_id, permission_id),
+        FOREIGN KEY(role_id) REFERENCES roles (id),
+        FOREIGN KEY(permission_id) REFERENCES permissions (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS stock_movements (
+        id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        warehouse_id INTEGER,
+        qty INTEGER NOT NULL,
+        type VARCHAR NOT NULL,
+        ref_no VARCHAR,
+        note TEXT,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(product_id) REFERENCES products (id),
+        FOREIGN KEY(warehouse_id) REFERENCES warehouses (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        username VARCHAR NOT NULL,
+        password_hash VARCHAR NOT NULL,
+        role_id INTEGER,
+        full_name VARCHAR,
+        is_active BOOLEAN,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (username),
+        FOREIGN KEY(role_id) REFERENCES roles (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS purchase_items (
+        id INTEGER NOT NULL,
+        purchase_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL,
+        unit_cost FLOAT,
+        PRIMARY KEY (id),
+        FOREIGN KEY(purchase_id) REFERENCES purchases (id),
+        FOREIGN KEY(product_id) REFERENCES products (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER NOT NULL,
+        invoice_no VARCHAR NOT NULL,
+        user_id INTEGER,
+        customer_id INTEGER,
+        total_amount FLOAT NOT NULL,
+        discount FLOAT,
+        offer FLOAT,
+        net_amount FLOAT NOT NULL,
+        amount_paid FLOAT,
+        payment_method VARCHAR NOT NULL,
+        is_received BOOLEAN,
+        order_date DATETIME,
+        receiving_date DATETIME,
+        lens_type VARCHAR,
+        frame_type VARCHAR,
+        frame_color VARCHAR,
+        customer_type VARCHAR,
+        frame_source VARCHAR,
+        created_at DATETIME,
+        delivery_date DATETIME,
+        lab_status VARCHAR,
+        doctor_name VARCHAR,
+        PRIMARY KEY (id),
+        UNIQUE (invoice_no),
+        FOREIGN KEY(user_id) REFERENCES users (id),
+        FOREIGN KEY(customer_id) REFERENCES customers (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS order_examinations (
+        id INTEGER NOT NULL,
+        sale_id INTEGER NOT NULL,
+        exam_type VARCHAR,
+        sphere_od VARCHAR,
+        cylinder_od VARCHAR,
+        axis_od VARCHAR,
+        sphere_os VARCHAR,
+        cylinder_os VARCHAR,
+        axis_os VARCHAR,
+        ipd VARCHAR,
+        lens_info VARCHAR,
+        frame_info VARCHAR,
+        frame_color VARCHAR,
+        frame_status VARCHAR,
+        image_path VARCHAR,
+        doctor_name VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(sale_id) REFERENCES sales (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS sale_items (
+        id INTEGER NOT NULL,
+        sale_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL,
+        unit_price FLOAT NOT NULL,
+        total_price FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(sale_id) REFERENCES sales (id),
+        FOREIGN KEY(product_id) REFERENCES products (id)
+    )""",
+)
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_customers_phone ON customers (phone)",
+    "CREATE INDEX IF NOT EXISTS ix_products_barcode ON products (barcode)",
+    "CREATE INDEX IF NOT EXISTS ix_prescriptions_customer_id ON prescriptions (customer_id)",
+    "CREATE INDEX IF NOT EXISTS ix_stock_movements_product_id ON stock_movements (product_id)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_lab_status_order_date ON sales (lab_status, order_date)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_order_date ON sales (order_date)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_customer_id ON sales (customer_id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_examinations_sale_id ON order_examinations (sale_id)",
+    "CREATE INDEX IF NOT EXISTS ix_sale_items_sale_id ON sale_items (sale_id)",
+)
@@ -0,0 +1,45 @@
+# app/database/schema_v3.py
+"""
+Per-warehouse stock balances as migration 3 shipped them, in SQLite DDL.
+
+Frozen like schema_v1: db_manager.install_stock_balances() may move on,
+these statements do not. TABLES are safe to re-run; INSTALL (the backfill
+from the ledger and the triggers) runs only while INSTALLED_BY is missing.
+"""
+
+INSTALLED_BY = "stock_movements_insert_balance"
+
+TABLES = (
+    """CREATE TABLE IF NOT EXISTS stock_balances (
+        product_id INTEGER NOT NULL,
+        warehouse_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL,
+        CONSTRAINT sb_pk PRIMARY KEY (product_id, warehouse_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_stock_balances_warehouse_product ON stock_balances (warehouse_id, product_id)",
+)
+
+INSTALL = (
+    "DELETE FROM stock_balances",
+    """INSERT INTO stock_balances (product_id, warehouse_id, qty)
+    SELECT product_id, COALESCE(warehouse_id, 0), SUM(qty) FROM stock_movements GROUP BY 1, 2""",
+    """CREATE TRIGGER stock_movements_insert_balance AFTER INSERT ON stock_movements BEGIN
+        INSERT INTO stock_balances (product_id, warehouse_id, qty)
+        VALUES (NEW.product_id, COALESCE(NEW.warehouse_id, 0), NEW.qty)
+        ON CONFLICT(product_id, warehouse_id) DO UPDATE SET qty = qty + excluded.qty;
+    END""",
+    """CREATE TRIGGER stock_movements_delete_balance AFTER DELETE ON stock_movements BEGIN
+        INSERT INTO stock_balances (product_id, warehouse_id, qty)
+        VALUES (OLD.product_id, COALESCE(OLD.warehouse_id, 0), -OLD.qty)
+        ON CONFLICT(product_id, warehouse_id) DO UPDATE SET qty = qty + excluded.qty;
+    END""",
+    """CREATE TRIGGER stock_movements_update_balance
+    AFTER UPDATE OF product_id, warehouse_id, qty ON stock_movements BEGIN
+        INSERT INTO stock_balances (product_id, warehouse_id, qty)
+        VALUES (OLD.product_id, COALESCE(OLD.warehouse_id, 0), -OLD.qty)
+        ON CONFLICT(product_id, warehouse_id) DO UPDATE SET qty = qty + excluded.qty;
+        INSERT INTO stock_balances (product_id, warehouse_id, qty)
+        VALUES (NEW.product_id, COALESCE(NEW.warehouse_id, 0), NEW.qty)
+        ON CONFLICT(product_id, warehouse_id) DO UPDATE SET qty = qty + excluded.qty;
+    END""",
+)
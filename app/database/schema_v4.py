@@ -0,0 +1,92 @@
+# app/database/schema_v4.py
+"""
+The customer ledger as migration 4 shipped it, in SQLite DDL.
+
+Frozen like schema_v1: db_manager.install_customer_stats() may move on,
+these statements do not. TABLES are safe to re-run; INSTALL (the rebuild
+from sales and prescriptions and the triggers) runs only while INSTALLED_BY
+is missing.
+"""
+
+INSTALLED_BY = "sales_insert_customer_stats"
+
+TABLES = (
+    """CREATE TABLE IF NOT EXISTS customer_stats (
+        customer_id INTEGER NOT NULL,
+        order_count INTEGER NOT NULL,
+        total_net FLOAT NOT NULL,
+        total_paid FLOAT NOT NULL,
+        balance_due FLOAT NOT NULL,
+        last_order_date DATETIME,
+        rx_count INTEGER NOT NULL,
+        PRIMARY KEY (customer_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_customer_stats_balance_due ON customer_stats (balance_due)",
+    "CREATE INDEX IF NOT EXISTS ix_customer_stats_last_order_date ON customer_stats (last_order_date)",
+)
+
+INSTALL = (
+    "DELETE FROM customer_stats",
+    """INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+    SELECT c.id, COALESCE(s.n, 0), COALESCE(s.net, 0), COALESCE(s.paid, 0),
+           COALESCE(s.net, 0) - COALESCE(s.paid, 0), s.last_order_date, COALESCE(p.n, 0)
+    FROM customers c
+    LEFT JOIN (SELECT customer_id, COUNT(*) AS n, SUM(COALESCE(net_amount, 0)) AS net,
+                      SUM(COALESCE(amount_paid, 0)) AS paid, MAX(order_date) AS last_order_date
+               FROM sales GROUP BY customer_id) s ON s.customer_id = c.id
+    LEFT JOIN (SELECT customer_id, COUNT(*) AS n FROM prescriptions GROUP BY customer_id) p
+           ON p.customer_id = c.id
+    WHERE s.customer_id IS NOT NULL OR p.customer_id IS NOT NULL""",
+    """CREATE TRIGGER sales_insert_customer_stats AFTER INSERT ON sales BEGIN
+        INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+        SELECT NEW.customer_id, 1, COALESCE(NEW.net_amount, 0), COALESCE(NEW.amount_paid, 0),
+               (COALESCE(NEW.net_amount, 0) - COALESCE(NEW.amount_paid, 0)),
+               (SELECT MAX(order_date) FROM sales WHERE customer_id = NEW.customer_id), 0
+        WHERE NEW.customer_id IS NOT NULL
+        ON CONFLICT(customer_id) DO UPDATE SET order_count = order_count + excluded.order_count,
+            total_net = total_net + excluded.total_net, total_paid = total_paid + excluded.total_paid,
+            balance_due = balance_due + excluded.balance_due, last_order_date = excluded.last_order_date;
+    END""",
+    """CREATE TRIGGER sales_delete_customer_stats AFTER DELETE ON sales BEGIN
+        INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+        SELECT OLD.customer_id, -1, -COALESCE(OLD.net_amount, 0), -COALESCE(OLD.amount_paid, 0),
+               -(COALESCE(OLD.net_amount, 0) - COALESCE(OLD.amount_paid, 0)),
+               (SELECT MAX(order_date) FROM sales WHERE customer_id = OLD.customer_id), 0
+        WHERE OLD.customer_id IS NOT NULL
+        ON CONFLICT(customer_id) DO UPDATE SET order_count = order_count + excluded.order_count,
+            total_net = total_net + excluded.total_net, total_paid = total_paid + excluded.total_paid,
+            balance_due = balance_due + excluded.balance_due, last_order_date = excluded.last_order_date;
+    END""",
+    """CREATE TRIGGER sales_update_customer_stats
+    AFTER UPDATE OF customer_id, net_amount, amount_paid, order_date ON sales BEGIN
+        INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+        SELECT OLD.customer_id, -1, -COALESCE(OLD.net_amount, 0), -COALESCE(OLD.amount_paid, 0),
+               -(COALESCE(OLD.net_amount, 0) - COALESCE(OLD.amount_paid, 0)),
+               (SELECT MAX(order_date) FROM sales WHERE customer_id = OLD.customer_id), 0
+        WHERE OLD.customer_id IS NOT NULL
+        ON CONFLICT(customer_id) DO UPDATE SET order_count = order_count + excluded.order_count,
+            total_net = total_net + excluded.total_net, total_paid = total_paid + excluded.total_paid,
+            balance_due = balance_due + excluded.balance_due, last_order_date = excluded.last_order_date;
+        INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+        SELECT NEW.customer_id, 1, COALESCE(NEW.net_amount, 0), COALESCE(NEW.amount_paid, 0),
+               (COALESCE(NEW.net_amount, 0) - COALESCE(NEW.amount_paid, 0)),
+               (SELECT MAX(order_date) FROM sales WHERE customer_id = NEW.customer_id), 0
+        WHERE NEW.customer_id IS NOT NULL
+        ON CONFLICT(customer_id) DO UPDATE SET order_count = order_count + excluded.order_count,
+            total_net = total_net + excluded.total_net, total_paid = total_paid + excluded.total_paid,
+            balance_due = balance_due + excluded.balance_due, last_order_date = excluded.last_order_date;
+    END""",
+    """CREATE TRIGGER prescriptions_insert_customer_stats AFTER INSERT ON prescriptions BEGIN
+        INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+        SELECT NEW.customer_id, 0, 0, 0, 0, NULL, 1 WHERE NEW.customer_id IS NOT NULL
+        ON CONFLICT(customer_id) DO UPDATE SET rx_count = rx_count + excluded.rx_count;
+    END""",
+    """CREATE TRIGGER prescriptions_delete_customer_stats AFTER DELETE ON prescriptions BEGIN
+        INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+        SELECT OLD.customer_id, 0, 0, 0, 0, NULL, -1 WHERE OLD.customer_id IS NOT NULL
+        ON CONFLICT(customer_id) DO UPDATE SET rx_count = rx_count + excluded.rx_count;
+    END""",
+    """CREATE TRIGGER customers_delete_customer_stats AFTER DELETE ON customers BEGIN
+        DELETE FROM customer_stats WHERE customer_id = OLD.id;
+    END""",
+)
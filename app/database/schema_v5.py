@@ -0,0 +1,24 @@
+# app/database/schema_v5.py
+"""
+Default-warehouse placement as migration 5 shipped it, in SQLite DDL.
+
+Frozen like schema_v1: db_manager.install_default_warehouse() may move on,
+these statements do not. INSTALL (moving existing warehouse-less movements
+and the triggers) runs only while INSTALLED_BY is missing.
+"""
+
+INSTALLED_BY = "stock_movements_default_warehouse"
+
+TABLES = ()
+
+INSTALL = (
+    "UPDATE stock_movements SET warehouse_id = (SELECT MIN(id) FROM warehouses) WHERE warehouse_id IS NULL",
+    """CREATE TRIGGER stock_movements_default_warehouse AFTER INSERT ON stock_movements
+    WHEN NEW.warehouse_id IS NULL BEGIN
+        UPDATE stock_movements SET warehouse_id = (SELECT MIN(id) FROM warehouses) WHERE id = NEW.id;
+    END""",
+    """CREATE TRIGGER warehouses_adopt_movements AFTER INSERT ON warehouses
+    WHEN NEW.id = (SELECT MIN(id) FROM warehouses) BEGIN
+        UPDATE stock_movements SET warehouse_id = NEW.id WHERE warehouse_id IS NULL;
+    END""",
+)
@@ -2,6 +2,8 @@ import flet as ft
 import subprocess
 import os
 from app.core.i18n import _
+from app.core.events import CUSTOMER, PRODUCT, SALE
+from app.core.search_index import shared_search_index
 
 
 def create_top_bar(page: ft.Page, repo, current_route: str = "/"):
@@ -39,24 +41,13 @@ def create_top_bar(page: ft.Page, repo, current_route: str = "/"):
         if not term or len(term) < 2:
             return
 
-        term_lower = term.lower()
         results_content = ft.Column([], spacing=5, scroll=ft.ScrollMode.AUTO)
 
-        # Search customers
-        customers = repo.get_customers()
-        matching_customers = [c for c in customers if
-            term_lower in c.get("name", "").lower() or
-            term_lower in (c.get("phone") or "").lower()][:5]
-
-        # Search products
-        products = repo.get_inventory()
-        matching_products = [p for p in products if
-            term_lower in p.get("name", "").lower() or
-            term_lower in (p.get("sku") or "").lower()][:5]
-
-        # Search invoices
-        sales = repo.get_sales()
-        matching_sales = [s for s in sales if term_lower in s.get("invoice_no", "").lower()][:5]
+        index = shared_search_index(repo)
+        hits = index.search(term, limit=5)
+        matching_customers = [h.record for h in hits[CUSTOMER]]
+        matching_products = [h.record for h in hits[PRODUCT]]
+        matching_sales = [h.record for h in hits[SALE]]
 
         def go_to_and_close(route):
             search_dialog.open = False
@@ -130,7 +121,7 @@ def create_top_bar(page: ft.Page, repo, current_route: str = "/"):
             for s in matching_sales:
                 cust_name = _("Walk-in")
                 if s.get("customer_id"):
-                    cust = next((c for c in customers if c.get("id") == s.get("customer_id")), None)
+                    cust = index.get(CUSTOMER, s["customer_id"])
                     if cust:
                         cust_name = cust.get("name", _("Walk-in"))
                 results_content.controls.append(
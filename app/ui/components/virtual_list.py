@@ -0,0 +1,170 @@
+import math
+
+import flet as ft
+
+
+class VirtualList:
+    """
+    A scrolling list that only builds the rows in view.
+
+    Every row has the same height (item_extent), so the rows under any scroll
+    offset are known without laying anything out. The ListView holds a spacer
+    for the rows above the window, a small pool of row slots, and a spacer for
+    the rows below. Scrolling rebinds the slots to other items instead of
+    adding controls, so the client only ever receives a screenful of rows.
+
+    Items come from fetch_page(cursor, limit) -> (items, next_cursor), one
+    page at a time as the window nears the end of what has been loaded; a
+    next_cursor of None means there is nothing more. Lists held in memory
+    can be shown with set_items() instead.
+
+    Args:
+        build_row: build_row(item) -> control for one row
+        fetch_page: optional page source, see above
+        item_extent: height of each row in pixels, including any gap
+        page_size: items requested per fetch
+        overscan: rows built beyond each edge of the viewport
+        key: key(item) -> identity used by refresh() / remove()
+        update_row: optional update_row(control, item) that rebinds an existing
+            row control in place; without it a recycled slot gets a new row
+        empty_text: shown when there are no items
+    """
+
+    def __init__(self, build_row, fetch_page=None, item_extent=80, page_size=50, overscan=5,
+                 key=lambda item: item["id"], update_row=None, empty_text=""):
+        self.build_row = build_row
+        self.fetch_page = fetch_page
+        self.item_extent = item_extent
+        self.page_size = page_size
+        self.overscan = overscan
+        self.key = key
+        self.update_row = update_row
+
+        self.items = []
+        self._keys = set()
+        self._cursor = None
+        self._exhausted = True
+        self._first = 0
+        self._visible_rows = 12  # until the first scroll event reports the viewport
+        self._slots = []  # [(key, container)] for the rows in the window
+
+        self._top = ft.Container(height=0)
+        self._bottom = ft.Container(height=0)
+        self._empty = ft.ListTile(title=ft.Text(empty_text, italic=True, color=ft.colors.GREY_700))
+        self.control = ft.ListView(
+            [self._top, self._bottom], expand=True, spacing=0,
+            on_scroll=self._on_scroll, on_scroll_interval=50
+        )
+
+    # --- Loading ---
+    def load(self, cursor=0):
+        """Drop what is loaded and start again from the first page."""
+        self.items, self._keys = [], set()
+        self._cursor, self._exhausted = cursor, self.fetch_page is None
+        self._first = 0
+        self._slots.clear()
+        self._fill(self._visible_rows + self.overscan)
+        self._render()
+        if self.control.page:
+            self.control.scroll_to(offset=0)
+
+    def set_items(self, items, changed=()):
+        """
+        Show an in-memory list, keeping the scroll position. Rows whose key is
+        still in the window keep their control unless listed in `changed`.
+        """
+        self.items = list(items)
+        self._keys = {self.key(i) for i in self.items}
+        self._exhausted = True
+        self._first = min(self._first, max(0, len(self.items) - self._visible_rows))
+        self._drop_slots(changed)
+        self._render()
+
+    def _fill(self, count):
+        """Fetch pages until `count` items are loaded or the source runs out."""
+        while not self._exhausted and len(self.items) < count:
+            page, self._cursor = self.fetch_page(self._cursor, self.page_size)
+            for item in page:
+                # Rows inserted since the cursor was taken can come back in a later page
+                if self.key(item) not in self._keys:
+                    self._keys.add(self.key(item))
+                    self.items.append(item)
+            self._exhausted = self._cursor is None or not page
+
+    @property
+    def has_more(self):
+        """True while fetch_page has pages that are not loaded yet."""
+        return not self._exhausted
+
+    # --- Editing ---
+    def get(self, key):
+        return next((i for i in self.items if self.key(i) == key), None)
+
+    def refresh(self, *keys):
+        """Rebuild the rows for `keys` (after their items were changed in place)."""
+        keys = set(keys) & self._keys
+        if keys:
+            self._drop_slots(keys)
+            self._render()
+
+    def insert(self, index, item):
+        if self.key(item) in self._keys:
+            return self.refresh(self.key(item))
+        self.items.insert(index, item)
+        self._keys.add(self.key(item))
+        self._render()
+
+    def remove(self, key):
+        if key in self._keys:
+            self.items = [i for i in self.items if self.key(i) != key]
+            self._keys.discard(key)
+            self._drop_slots([key])
+            self._render()
+
+    def _drop_slots(self, keys):
+        keys = set(keys)
+        self._slots = [(k, c) if k not in keys else (None, c) for k, c in self._slots]
+
+    # --- Window ---
+    def _on_scroll(self, e):
+        window = (self._first, self._visible_rows, len(self.items))
+        if e.viewport_dimension:
+            self._visible_rows = math.ceil(e.viewport_dimension / self.item_extent)
+        self._first = int(max(e.pixels or 0, 0) // self.item_extent)
+        last = self._first + self._visible_rows + self.overscan
+        if last >= len(self.items):
+            # Keep a page loaded beyond the window so the next scroll rarely waits
+            self._fill(last + self.page_size)
+        if (self._first, self._visible_rows, len(self.items)) != window:
+            self._render()
+
+    def _render(self):
+        start = max(0, self._first - self.overscan)
+        end = min(len(self.items), self._first + self._visible_rows + self.overscan)
+        start = min(start, end)
+
+        # Reuse slots already bound to one of the items, then recycle the rest
+        window = self.items[start:end]
+        wanted = {self.key(i) for i in window}
+        bound = {k: c for k, c in self._slots if k in wanted}
+        spare = [c for k, c in self._slots if k not in bound]
+
+        slots = []
+        for item in window:
+            k = self.key(item)
+            container = bound.get(k)
+            if container is None:
+                container = spare.pop() if spare else ft.Container(height=self.item_extent)
+                if self.update_row and container.content is not None:
+                    self.update_row(container.content, item)
+                else:
+                    container.content = self.build_row(item)
+            slots.append((k, container))
+        self._slots = slots
+
+        self._top.height = start * self.item_extent
+        self._bottom.height = (len(self.items) - end) * self.item_extent
+        rows = [c for _k, c in slots] if self.items else [self._empty]
+        self.control.controls = [self._top, *rows, self._bottom]
+        if self.control.page:
+            self.control.update()
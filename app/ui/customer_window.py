@@ -4,8 +4,8 @@ from PySide6.QtWidgets import (
     QPushButton, QLabel, QHeaderView, QMessageBox, QLineEdit, QGridLayout
 )
 from PySide6.QtCore import Qt
-from app.database.db_manager import get_engine, get_session
-from app.database.models import Customer, Prescription
+from app.database.db_manager import get_engine, get_session, ensure_customer_stats
+from app.database.models import Customer, CustomerStats
 from app.core.i18n import _
 
 class CustomerWindow(QWidget):
@@ -82,9 +82,13 @@ class CustomerWindow(QWidget):
 
     def load_data(self):
         query_text = self.search_input.text().strip()
-        session = get_session(get_engine())
+        engine = get_engine()
+        ensure_customer_stats(engine)
+        session = get_session(engine)
         try:
-            query = session.query(Customer)
+            # Record counts come from the customer ledger in the same query
+            query = session.query(Customer, CustomerStats).outerjoin(
+                CustomerStats, CustomerStats.customer_id == Customer.id)
             if query_text:
                 query = query.filter(
                     (Customer.name.ilike(f"%{query_text}%")) | 
@@ -97,18 +101,14 @@ class CustomerWindow(QWidget):
             customers = query.all()
             self.table.setRowCount(0)
             self.customer_ids = []
-            for row_idx, c in enumerate(customers):
+            for row_idx, (c, stats) in enumerate(customers):
                 self.table.insertRow(row_idx)
                 self.table.setItem(row_idx, 0, QTableWidgetItem(c.name))
                 self.table.setItem(row_idx, 1, QTableWidgetItem(c.phone or ""))
                 self.table.setItem(row_idx, 2, QTableWidgetItem(c.phone2 or ""))
                 self.table.setItem(row_idx, 3, QTableWidgetItem(c.city or ""))
-                
-                from app.database.models import OrderExamination, Sale
-                rx_count = session.query(Prescription).filter_by(customer_id=c.id).count()
-                pos_orders_count = session.query(Sale).filter_by(customer_id=c.id).join(OrderExamination).distinct().count()
-                
-                total_records = rx_count + pos_orders_count
+
+                total_records = (stats.rx_count + stats.order_count) if stats else 0
                 self.table.setItem(row_idx, 4, QTableWidgetItem(f"{total_records} سجلات"))
                 self.customer_ids.append(c.id)
         finally:
@@ -149,8 +149,8 @@ class CustomerWindow(QWidget):
 
         session = get_session(get_engine())
         try:
-            from app.core.permissions import has_permission
-            allowed, _v = has_permission(session, self.user.id, "VIEW_PRESCRIPTIONS")
+            from app.core.permissions import check_permission, user_permissions
+            allowed, _v = check_permission(user_permissions(session, self.user.id), "VIEW_PRESCRIPTIONS")
 
             if not allowed:
                 QMessageBox.warning(self, _("Permission Denied"), _("You do not have permission to view prescriptions."))
@@ -4,9 +4,14 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, Signal
 from app.core.i18n import _
-from app.core.permissions import has_permission
-from app.database.db_manager import get_engine, get_session
-from app.database.models import Sale, Customer, Product
+from app.core.permissions import user_permissions
+from app.core.events import ChangeEvent, CUSTOMER, PRODUCT, SALE, INSERT, DELETE
+from app.core.search_index import SearchIndex, SEARCH_KINDS
+from app.database.db_manager import get_engine, get_session, get_search_records, get_row_changes
+from app.database.models import Product
+
+# Table behind each lookup kind; only its rows written since the last lookup are re-read
+_LOOKUP_TABLES = {CUSTOMER: 'customers', PRODUCT: 'products', SALE: 'sales'}
 
 class Dashboard(QWidget):
     # Signals to notify MainWindow to change view
@@ -28,6 +33,8 @@ class Dashboard(QWidget):
     def __init__(self, user):
         super().__init__()
         self.user = user
+        self.search_index = SearchIndex(self._search_records)
+        self._search_versions = {}
         self.init_ui()
 
     def init_ui(self):
@@ -70,14 +77,15 @@ class Dashboard(QWidget):
         grid.setContentsMargins(10, 30, 10, 30)
 
         session = get_session(get_engine())
-        can_create_sale, _v = has_permission(session, self.user.id, "CREATE_SALE")
-        can_view_inventory, _v = has_permission(session, self.user.id, "VIEW_PRODUCTS")
-        can_view_customers, _v = has_permission(session, self.user.id, "VIEW_PRESCRIPTIONS")
-        can_view_lab, _v = has_permission(session, self.user.id, "VIEW_LAB")
-        can_manage_users, _v = has_permission(session, self.user.id, "MANAGE_USERS")
-        can_manage_settings, _v = has_permission(session, self.user.id, "MANAGE_SETTINGS")
-        can_view_reports, _v = has_permission(session, self.user.id, "REPORT_DAILY_SALES")
+        perms = user_permissions(session, self.user.id)
         session.close()
+        can_create_sale = "CREATE_SALE" in perms
+        can_view_inventory = "VIEW_PRODUCTS" in perms
+        can_view_customers = "VIEW_PRESCRIPTIONS" in perms
+        can_view_lab = "VIEW_LAB" in perms
+        can_manage_users = "MANAGE_USERS" in perms
+        can_manage_settings = "MANAGE_SETTINGS" in perms
+        can_view_reports = "REPORT_DAILY_SALES" in perms
 
         row, col = 0, 0
         if can_create_sale:
@@ -196,57 +204,75 @@ class Dashboard(QWidget):
         # Very simple lighten for hover effect
         return hex_color # Could implement real logic if needed
 
+    def _search_records(self, kinds):
+        session = get_session(get_engine())
+        try:
+            return get_search_records(session, kinds)
+        finally:
+            session.close()
+
+    def _refresh_search_index(self, session):
+        # Other windows and processes write the same database; their rows reach
+        # the index as change events. Before the first search loads everything
+        # only the versions are noted.
+        changed = {}
+        for kind in SEARCH_KINDS:
+            self._search_versions[kind], changed[kind] = get_row_changes(
+                session, _LOOKUP_TABLES[kind], self._search_versions.get(kind))
+        if not any(changed.values()):
+            return
+        rows = get_search_records(session, [k for k in SEARCH_KINDS if changed[k]], ids=changed)
+        for kind, records in rows.items():
+            for record in records:
+                self.search_index.on_change(ChangeEvent(kind, str(record['id']), INSERT, record))
+            found = {record['id'] for record in records}
+            for row_id in changed[kind]:
+                if row_id not in found:
+                    self.search_index.on_change(ChangeEvent(kind, str(row_id), DELETE))
+
     def perform_lookup(self):
         val = self.lookup_input.text().strip()
         if not val: return
         
         session = get_session(get_engine())
         try:
-            results = []
-            
-            # 1. Check Invoice No
-            sales = session.query(Sale).filter(Sale.invoice_no.ilike(f"%{val}%")).all()
-            for s in sales:
-                results.append({'type': 'sale', 'id': s.id, 'details': f"{_('Invoice')}: {s.invoice_no} ({s.customer.name if s.customer else 'N/A'})"})
-
-            # 2. Check Customer ID, Name or Phone
-            cust_query = session.query(Customer).filter(
-                (Customer.phone.ilike(f"%{val}%")) | 
-                (Customer.phone2.ilike(f"%{val}%")) | 
-                (Customer.name.ilike(f"%{val}%"))
-            )
-            if val.isdigit():
-                cust_by_id = session.query(Customer).get(int(val))
-                if cust_by_id and cust_by_id not in cust_query.all():
-                    results.append({'type': 'customer', 'id': cust_by_id.id, 'details': f"{_('Customer')} ID {cust_by_id.id}: {cust_by_id.name}"})
-
-            for c in cust_query.all():
-                results.append({'type': 'customer', 'id': c.id, 'details': f"{_('Customer')}: {c.name} ({c.phone})"})
-
-            # 3. Check Product Barcode, SKU or Name
-            prods = session.query(Product).filter(
-                (Product.barcode.ilike(f"%{val}%")) | 
-                (Product.sku.ilike(f"%{val}%")) |
-                (Product.name.ilike(f"%{val}%"))
-            ).all()
-            for p in prods:
-                results.append({'type': 'product', 'id': p.id, 'details': f"{_('Product')}: {p.name} ({p.barcode or p.sku or 'N/A'})"})
-
-            if not results:
-                QMessageBox.information(self, _("Lookup"), _("No matching record found."))
-                return
-
-            if len(results) == 1:
-                self.handle_lookup_result(results[0]['type'], results[0]['id'])
-            else:
-                from app.ui.search_results_dialog import SearchResultsDialog
-                dialog = SearchResultsDialog(results, self)
-                dialog.result_selected.connect(self.handle_lookup_result)
-                dialog.exec()
-                
+            self._refresh_search_index(session)
         finally:
             session.close()
 
+        hits = self.search_index.search(val, limit=20)
+        results = []
+
+        # 1. Check Invoice No
+        for h in hits[SALE]:
+            customer = self.search_index.get(CUSTOMER, h.record.get('customer_id'))
+            results.append({'type': 'sale', 'id': int(h.id), 'details': f"{_('Invoice')}: {h.record['invoice_no']} ({customer['name'] if customer else 'N/A'})"})
+
+        # 2. Check Customer ID, Name or Phone
+        cust_by_id = self.search_index.get(CUSTOMER, val) if val.isdigit() else None
+        if cust_by_id and not any(h.id == val for h in hits[CUSTOMER]):
+            results.append({'type': 'customer', 'id': int(val), 'details': f"{_('Customer')} ID {val}: {cust_by_id['name']}"})
+
+        for h in hits[CUSTOMER]:
+            results.append({'type': 'customer', 'id': int(h.id), 'details': f"{_('Customer')}: {h.record['name']} ({h.record.get('phone')})"})
+
+        # 3. Check Product Barcode, SKU or Name
+        for h in hits[PRODUCT]:
+            p = h.record
+            results.append({'type': 'product', 'id': int(h.id), 'details': f"{_('Product')}: {p['name']} ({p.get('barcode') or p.get('sku') or 'N/A'})"})
+
+        if not results:
+            QMessageBox.information(self, _("Lookup"), _("No matching record found."))
+            return
+
+        if len(results) == 1:
+            self.handle_lookup_result(results[0]['type'], results[0]['id'])
+        else:
+            from app.ui.search_results_dialog import SearchResultsDialog
+            dialog = SearchResultsDialog(results, self)
+            dialog.result_selected.connect(self.handle_lookup_result)
+            dialog.exec()
+
     def handle_lookup_result(self, r_type, r_id):
         if r_type == 'sale':
             from app.ui.invoice_detail_dialog import InvoiceDetailDialog
@@ -1,82 +1,71 @@
 import flet as ft
 from app.core.i18n import _
+from app.ui.components.virtual_list import VirtualList
+
+CUSTOMER_CARD_HEIGHT = 140
+
 
 def CustomersView(page: ft.Page, repo):
-    cust_list = ft.ListView(expand=True, spacing=5)
+    def fetch_customers(offset, limit):
+        """One page of customers, with their ledger totals, in the chosen order."""
+        return repo.get_customers_page(offset, limit, search=search_input.value or None,
+                                       sort=sort_by.value, with_balance=owing_only.value)
 
-    def load_customers(term=""):
-        cust_list.controls.clear()
-        customers = repo.get_customers()
-        sales = repo.get_sales()
+    def load_customers():
+        cust_list.load()
 
-        if term:
-            term = term.lower()
-            customers = [c for c in customers if
-                term in c.get("name", "").lower() or
-                term in (c.get("phone") or "").lower() or
-                term in (c.get("city") or "").lower() or
-                term in (c.get("email") or "").lower()]
-
-        if not customers:
-            cust_list.controls.append(
-                ft.ListTile(title=ft.Text(_("No customers found"), italic=True, color=ft.colors.GREY_700))
-            )
-        else:
-            for c in customers:
-                # Count orders for this customer
-                order_count = len([s for s in sales if s.get("customer_id") == c.get("id")])
-                total_spent = sum(float(s.get("net_amount", 0)) for s in sales if s.get("customer_id") == c.get("id"))
-                balance = sum(float(s.get("net_amount", 0)) - float(s.get("amount_paid", 0)) for s in sales if s.get("customer_id") == c.get("id"))
-
-                balance_color = ft.colors.RED_700 if balance > 0 else ft.colors.GREEN_700
-
-                cust_list.controls.append(
-                    ft.Card(
-                        content=ft.Container(
-                            content=ft.Column([
-                                ft.ListTile(
-                                    leading=ft.Icon(ft.icons.PERSON, size=40),
-                                    title=ft.Text(c.get("name", "Unknown"), weight=ft.FontWeight.BOLD),
-                                    subtitle=ft.Text(f"📱 {c.get('phone', 'N/A')} | 📍 {c.get('city', 'N/A')}"),
-                                    trailing=ft.PopupMenuButton(
-                                        items=[
-                                            ft.PopupMenuItem(text=_("View Prescriptions"), icon=ft.icons.ASSIGNMENT, on_click=lambda e, cid=c["id"]: page.go(f"/prescription/{cid}")),
-                                            ft.PopupMenuItem(text=_("Edit"), icon=ft.icons.EDIT, on_click=lambda e, cust=c: show_customer_dialog(cust)),
-                                            ft.PopupMenuItem(text=_("New Order"), icon=ft.icons.SHOPPING_CART, on_click=lambda e: page.go("/pos")),
-                                            ft.PopupMenuItem(),  # Divider
-                                            ft.PopupMenuItem(text=_("Delete"), icon=ft.icons.DELETE, on_click=lambda e, cust=c: confirm_delete_customer(cust)),
-                                        ]
-                                    )
-                                ),
-                                ft.Row([
-                                    ft.Container(
-                                        ft.Column([
-                                            ft.Text(str(order_count), size=18, weight=ft.FontWeight.BOLD),
-                                            ft.Text(_("Orders"), size=10)
-                                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                                        expand=True
-                                    ),
-                                    ft.Container(
-                                        ft.Column([
-                                            ft.Text(f"{total_spent:.0f}", size=18, weight=ft.FontWeight.BOLD),
-                                            ft.Text(_("Total Spent"), size=10)
-                                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                                        expand=True
-                                    ),
-                                    ft.Container(
-                                        ft.Column([
-                                            ft.Text(f"{balance:.0f}", size=18, weight=ft.FontWeight.BOLD, color=balance_color),
-                                            ft.Text(_("Balance"), size=10)
-                                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                                        expand=True
-                                    ),
-                                ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
-                            ]),
-                            padding=10
+    def build_card(c):
+        order_count = c.get("order_count") or 0
+        total_spent = float(c.get("total_net") or 0)
+        balance = float(c.get("balance_due") or 0)
+        last_visit = (c.get("last_order_date") or "")[:10] or "-"
+
+        balance_color = ft.colors.RED_700 if balance > 0 else ft.colors.GREEN_700
+
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Column([
+                    ft.ListTile(
+                        leading=ft.Icon(ft.icons.PERSON, size=40),
+                        title=ft.Text(c.get("name", "Unknown"), weight=ft.FontWeight.BOLD),
+                        subtitle=ft.Text(f"📱 {c.get('phone', 'N/A')} | 📍 {c.get('city', 'N/A')} | 🕒 {last_visit}"),
+                        trailing=ft.PopupMenuButton(
+                            items=[
+                                ft.PopupMenuItem(text=_("View Prescriptions"), icon=ft.icons.ASSIGNMENT, on_click=lambda e, cid=c["id"]: page.go(f"/prescription/{cid}")),
+                                ft.PopupMenuItem(text=_("Edit"), icon=ft.icons.EDIT, on_click=lambda e, cust=c: show_customer_dialog(cust)),
+                                ft.PopupMenuItem(text=_("New Order"), icon=ft.icons.SHOPPING_CART, on_click=lambda e: page.go("/pos")),
+                                ft.PopupMenuItem(),  # Divider
+                                ft.PopupMenuItem(text=_("Delete"), icon=ft.icons.DELETE, on_click=lambda e, cust=c: confirm_delete_customer(cust)),
+                            ]
                         )
-                    )
-                )
-        page.update()
+                    ),
+                    ft.Row([
+                        ft.Container(
+                            ft.Column([
+                                ft.Text(str(order_count), size=18, weight=ft.FontWeight.BOLD),
+                                ft.Text(_("Orders"), size=10)
+                            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                            expand=True
+                        ),
+                        ft.Container(
+                            ft.Column([
+                                ft.Text(f"{total_spent:.0f}", size=18, weight=ft.FontWeight.BOLD),
+                                ft.Text(_("Total Spent"), size=10)
+                            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                            expand=True
+                        ),
+                        ft.Container(
+                            ft.Column([
+                                ft.Text(f"{balance:.0f}", size=18, weight=ft.FontWeight.BOLD, color=balance_color),
+                                ft.Text(_("Balance"), size=10)
+                            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                            expand=True
+                        ),
+                    ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
+                ]),
+                padding=10
+            )
+        )
 
     def show_customer_dialog(cust=None):
         def save_customer(e):
@@ -103,7 +92,7 @@ def CustomersView(page: ft.Page, repo):
 
             dialog.open = False
             page.snack_bar.open = True
-            load_customers(search_input.value)
+            load_customers()
             page.update()
 
         name_field = ft.TextField(label=_("Name") + " *", value=cust.get("name", "") if cust else "", autofocus=True)
@@ -156,7 +145,7 @@ def CustomersView(page: ft.Page, repo):
             dialog.open = False
             page.snack_bar = ft.SnackBar(ft.Text(_("Customer deleted successfully")))
             page.snack_bar.open = True
-            load_customers(search_input.value)
+            load_customers()
             page.update()
 
         dialog = ft.AlertDialog(
@@ -184,9 +173,27 @@ def CustomersView(page: ft.Page, repo):
         label=_("Search by name, phone, city or email..."),
         prefix_icon=ft.icons.SEARCH,
         expand=True,
-        on_change=lambda e: load_customers(e.control.value)
+        on_change=lambda e: load_customers()
     )
 
+    # Ordered and filtered by the customer ledger, without reading sales
+    sort_by = ft.Dropdown(
+        label=_("Sort by"),
+        value="name",
+        options=[
+            ft.dropdown.Option("name", _("Name")),
+            ft.dropdown.Option("balance", _("Balance")),
+            ft.dropdown.Option("recent", _("Last Visit")),
+        ],
+        width=160,
+        on_change=lambda e: load_customers()
+    )
+    owing_only = ft.Switch(label=_("With balance only"), value=False, on_change=lambda e: load_customers())
+
+    # Only the cards in view are built; pages are fetched as the list scrolls
+    cust_list = VirtualList(build_card, fetch_customers, item_extent=CUSTOMER_CARD_HEIGHT,
+                            empty_text=_("No customers found"))
+
     load_customers()
 
     return ft.View(
@@ -203,12 +210,12 @@ def CustomersView(page: ft.Page, repo):
                     ft.Row([
                         ft.Text(_("Customers"), size=25, weight=ft.FontWeight.BOLD),
                         ft.Row([
-                            ft.IconButton(ft.icons.REFRESH, tooltip=_("Refresh"), on_click=lambda _: load_customers(search_input.value)),
+                            ft.IconButton(ft.icons.REFRESH, tooltip=_("Refresh"), on_click=lambda _: load_customers()),
                             ft.ElevatedButton(_("+ Add Customer"), icon=ft.icons.PERSON_ADD, on_click=lambda _: show_customer_dialog()),
                         ]),
                     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                    search_input,
-                    cust_list,
+                    ft.Row([search_input, sort_by, owing_only]),
+                    cust_list.control,
                 ], expand=True),
                 padding=20,
                 expand=True,
@@ -1,36 +1,14 @@
 import flet as ft
 from app.core.i18n import _
+from app.core.events import DASHBOARD, subscribe_changes
+from app.core.dashboard_snapshot import DashboardSnapshot
 
 def DashboardView(page: ft.Page, repo):
     """Dashboard view with stats, navigation, and global search."""
 
-    # --- Get Stats Data ---
-    def get_stats():
-        try:
-            sales = repo.get_sales()
-            customers = repo.get_customers()
-            products = repo.get_inventory()
-
-            total_revenue = sum(float(s.get("net_amount", 0)) for s in sales)
-            total_paid = sum(float(s.get("amount_paid", 0)) for s in sales)
-            pending_orders = len([s for s in sales if s.get("lab_status") and s.get("lab_status") != "Received"])
-
-            return {
-                "revenue": total_revenue,
-                "orders": len(sales),
-                "customers": len(customers),
-                "products": len(products),
-                "pending": pending_orders,
-                "balance": total_revenue - total_paid,
-                "sales": sales,
-                "all_customers": customers
-            }
-        except Exception as e:
-            print(f"Error loading stats: {e}")
-            return {
-                "revenue": 0, "orders": 0, "customers": 0, "products": 0,
-                "pending": 0, "balance": 0, "sales": [], "all_customers": []
-            }
+    # The shared snapshot service keeps the figures current in the background;
+    # this view only renders the snapshots it publishes
+    snapshot = page.data.get("dashboard") if hasattr(page, 'data') and page.data else None
 
     # --- Navigation ---
     def navigate(route):
@@ -40,6 +18,10 @@ def DashboardView(page: ft.Page, repo):
     def logout(e):
         if hasattr(page, 'data') and page.data:
             page.data["user"] = None
+            # Stop receiving dashboard snapshots; the shared worker pauses once no session is logged in
+            end_subscription = page.data.get("end_dashboard_subscription")
+            if end_subscription is not None:
+                end_subscription()
         page.go("/login")
 
     # --- User Info ---
@@ -60,25 +42,25 @@ def DashboardView(page: ft.Page, repo):
 
     def refresh_dashboard(e=None):
         """Refresh all dashboard data."""
-        stats = get_stats()
-
-        stat_values["revenue"].value = f"{stats['revenue']:.0f}"
-        stat_values["orders"].value = str(stats["orders"])
-        stat_values["customers"].value = str(stats["customers"])
-        stat_values["products"].value = str(stats["products"])
-        stat_values["pending"].value = str(stats["pending"])
-        stat_values["balance"].value = f"{stats['balance']:.0f}"
+        if snapshot is not None:
+            snapshot.request_refresh()
+        else:
+            render(DashboardSnapshot(repo).refresh())
+
+    def render(stats):
+        stat_values["revenue"].value = f"{stats.revenue:.0f}"
+        stat_values["orders"].value = str(stats.orders)
+        stat_values["customers"].value = str(stats.customers)
+        stat_values["products"].value = str(stats.products)
+        stat_values["pending"].value = str(stats.pending)
+        stat_values["balance"].value = f"{stats.balance:.0f}"
 
         # Rebuild recent orders
         recent_orders_container.controls.clear()
-        for s in sorted(stats["sales"], key=lambda x: x.get("order_date", ""), reverse=True)[:5]:
-            cust_name = _("Walk-in")
-            if s.get("customer_id"):
-                cust = next((c for c in stats["all_customers"] if c.get("id") == s.get("customer_id")), None)
-                if cust:
-                    cust_name = cust.get("name", _("Walk-in"))
-
-            status = s.get("lab_status", "N/A")
+        for order in stats.recent:
+            cust_name = order.customer_name or _("Walk-in")
+
+            status = order.lab_status or "N/A"
             status_color = ft.colors.GREY_500
             if status == "Ready": status_color = ft.colors.GREEN_500
             elif status == "In Lab": status_color = ft.colors.ORANGE_500
@@ -87,8 +69,8 @@ def DashboardView(page: ft.Page, repo):
             recent_orders_container.controls.append(
                 ft.ListTile(
                     leading=ft.Icon(ft.icons.RECEIPT, color=status_color),
-                    title=ft.Text(f"#{s.get('invoice_no', '')} - {cust_name}", size=14),
-                    subtitle=ft.Text(f"{s.get('order_date', '')[:10] if s.get('order_date') else ''} | {float(s.get('net_amount', 0)):.2f}", size=12),
+                    title=ft.Text(f"#{order.invoice_no} - {cust_name}", size=14),
+                    subtitle=ft.Text(f"{order.order_date[:10]} | {order.net_amount:.2f}", size=12),
                     trailing=ft.Container(
                         ft.Text(status, size=11, color=ft.colors.WHITE),
                         bgcolor=status_color,
@@ -109,8 +91,12 @@ def DashboardView(page: ft.Page, repo):
             )
         page.update()
 
-    # Initial load
-    refresh_dashboard()
+    # Subscribe before reading the current snapshot so a refresh finishing in between is not missed
+    subscribe_changes(page, lambda event: render(event.data), DASHBOARD)
+    if snapshot is not None:
+        render(snapshot.current)
+    else:
+        refresh_dashboard()
 
     # --- Stat Card Builder ---
     def stat_card(title, value_text, icon, color, route):
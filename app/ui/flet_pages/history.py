@@ -1,8 +1,18 @@
+import threading
+
 import flet as ft
 from app.core.i18n import _
+from app.core.events import SALE, CUSTOMER, INSERT, DELETE, subscribe_changes, on_view_closed
+from app.core.payments import balance_due, payment_state
+from app.core.live_search import SEARCH_DELAY
+from app.core.receipts import shop_context
+from app.core.print_spooler import spool
+from app.ui.components.virtual_list import VirtualList
+
+SALE_CARD_HEIGHT = 140
+
 
 def HistoryView(page: ft.Page, repo):
-    items_list = ft.ListView(expand=True, spacing=5)
 
     # Filter controls
     status_filter = ft.Dropdown(
@@ -16,7 +26,7 @@ def HistoryView(page: ft.Page, repo):
             ft.dropdown.Option("Received", _("Received")),
         ],
         width=150,
-        on_change=lambda e: load_history(search_input.value)
+        on_change=lambda e: load_history()
     )
 
     payment_filter = ft.Dropdown(
@@ -29,136 +39,151 @@ def HistoryView(page: ft.Page, repo):
             ft.dropdown.Option("Unpaid", _("Unpaid")),
         ],
         width=150,
-        on_change=lambda e: load_history(search_input.value)
+        on_change=lambda e: load_history()
     )
 
-    def load_history(term=""):
-        items_list.controls.clear()
-        sales = repo.get_sales()
-        customers = repo.get_customers()
-        
-        # Apply filters
-        filtered_sales = sales
-
-        # Text search
-        if term:
-            term = term.lower()
-            filtered = []
-            for s in filtered_sales:
-                cust_name = ""
-                if s.get("customer_id"):
-                    cust = next((c for c in customers if c["id"] == s["customer_id"]), None)
-                    if cust: cust_name = cust.get("name", "")
-
-                if (term in s.get("invoice_no", "").lower() or
-                    term in cust_name.lower() or
-                    term in (s.get("doctor_name") or "").lower()):
-                    filtered.append(s)
-            filtered_sales = filtered
-
-        # Status filter
-        if status_filter.value != "All":
-            filtered_sales = [s for s in filtered_sales if s.get("lab_status") == status_filter.value]
-
-        # Payment filter
-        if payment_filter.value != "All":
-            if payment_filter.value == "Paid":
-                filtered_sales = [s for s in filtered_sales if float(s.get("amount_paid", 0) or 0) >= float(s.get("net_amount", 0) or 0)]
-            elif payment_filter.value == "Partial":
-                filtered_sales = [s for s in filtered_sales if 0 < float(s.get("amount_paid", 0) or 0) < float(s.get("net_amount", 0) or 0)]
-            elif payment_filter.value == "Unpaid":
-                filtered_sales = [s for s in filtered_sales if float(s.get("amount_paid", 0) or 0) == 0]
-
-        if not filtered_sales:
-            items_list.controls.append(
-                ft.ListTile(title=ft.Text(_("No orders found"), italic=True, color=ft.colors.GREY_700))
-            )
+    def load_history():
+        cancel_pending_search()
+        items_list.load(cursor=None)
+
+    # The term is searched once the typing settles, not on every keystroke
+    pending_search = []
+
+    def cancel_pending_search():
+        while pending_search:
+            pending_search.pop().cancel()
+
+    def on_search_change(e):
+        cancel_pending_search()
+        timer = threading.Timer(SEARCH_DELAY, load_history)
+        timer.daemon = True
+        pending_search.append(timer)
+        timer.start()
+
+    def filters():
+        return {
+            "term": search_input.value,
+            "lab_status": None if status_filter.value == "All" else status_filter.value,
+            "payment_state": None if payment_filter.value == "All" else payment_filter.value,
+        }
+
+    def fetch_sales(cursor, limit):
+        """One page of the sales passing the filters, filtered and joined by the repository."""
+        return repo.search_sales(limit=limit, cursor=cursor, **filters())
+
+    def patch_sale(sale_id, fields):
+        sale = items_list.get(sale_id)
+        if sale is not None:
+            sale.update(fields)
+            sale["balance_due"] = balance_due(sale)
+            items_list.refresh(sale_id)
+            page.update()
+
+    def on_sale_change(event):
+        if event.op == INSERT:
+            sale = dict(event.data or {}, id=event.id)
+            customer = repo.get_customer(sale["customer_id"]) if sale.get("customer_id") else None
+            sale.update(customer_name=customer.get("name") if customer else None, balance_due=balance_due(sale))
+            if matches(sale):
+                items_list.insert(0, sale)
+        elif event.op == DELETE:
+            items_list.remove(event.id)
         else:
-            for s in sorted(filtered_sales, key=lambda x: x.get("order_date", ""), reverse=True):
-                cust_name = _("Walk-in")
-                if s.get("customer_id"):
-                    cust = next((c for c in customers if c["id"] == s["customer_id"]), None)
-                    if cust: cust_name = cust.get("name", "")
-
-                net_amount = float(s.get('net_amount', 0))
-                paid = float(s.get('amount_paid', 0))
-                balance = net_amount - paid
-
-                # Status colors
-                status = s.get('lab_status', 'N/A')
-                status_color = ft.colors.GREY_500
-                if status == "Ready": status_color = ft.colors.GREEN_500
-                elif status == "In Lab": status_color = ft.colors.ORANGE_500
-                elif status == "Not Started": status_color = ft.colors.RED_500
-                elif status == "Received": status_color = ft.colors.BLUE_500
-
-                # Payment indicator
-                payment_color = ft.colors.GREEN_700 if balance <= 0 else ft.colors.RED_700
-
-                items_list.controls.append(
-                    ft.Card(
-                        content=ft.Container(
-                            content=ft.Column([
-                                ft.ListTile(
-                                    leading=ft.Icon(ft.icons.RECEIPT, color=status_color, size=35),
-                                    title=ft.Text(f"#{s['invoice_no']} - {cust_name}", weight=ft.FontWeight.BOLD),
-                                    subtitle=ft.Text(f"{s.get('order_date', '')[:16]} | {_('Doctor')}: {s.get('doctor_name', 'N/A')}"),
-                                    trailing=ft.PopupMenuButton(
-                                        items=[
-                                            ft.PopupMenuItem(text=_("View Details"), icon=ft.icons.VISIBILITY, on_click=lambda e, sale=s: show_sale_details(sale)),
-                                            ft.PopupMenuItem(text=_("Record Payment"), icon=ft.icons.PAYMENT, on_click=lambda e, sale=s: show_payment_dialog(sale)),
-                                            ft.PopupMenuItem(text=_("Print"), icon=ft.icons.PRINT, on_click=lambda e, sale=s: print_receipt(sale)),
-                                        ]
-                                    )
-                                ),
-                                ft.Row([
-                                    ft.Container(
-                                        ft.Column([
-                                            ft.Text(f"{net_amount:.2f}", size=16, weight=ft.FontWeight.BOLD),
-                                            ft.Text(_("Total"), size=10)
-                                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                                        expand=True
-                                    ),
-                                    ft.Container(
-                                        ft.Column([
-                                            ft.Text(f"{paid:.2f}", size=16, weight=ft.FontWeight.BOLD, color=ft.colors.GREEN_700),
-                                            ft.Text(_("Paid"), size=10)
-                                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                                        expand=True
-                                    ),
-                                    ft.Container(
-                                        ft.Column([
-                                            ft.Text(f"{balance:.2f}", size=16, weight=ft.FontWeight.BOLD, color=payment_color),
-                                            ft.Text(_("Balance"), size=10)
-                                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                                        expand=True
-                                    ),
-                                    ft.Container(
-                                        ft.Column([
-                                            ft.Container(
-                                                ft.Text(status, size=12, color=ft.colors.WHITE),
-                                                bgcolor=status_color,
-                                                padding=ft.padding.symmetric(horizontal=10, vertical=5),
-                                                border_radius=15
-                                            )
-                                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                                        expand=True
-                                    ),
-                                ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
-                            ]),
-                            padding=10
+            patch_sale(event.id, event.data or {})
+
+    def on_customer_change(event):
+        name = None if event.op == DELETE else (event.data or {}).get("name")
+        if event.op == DELETE or name is not None:
+            changed = [s for s in items_list.items if str(s.get("customer_id")) == event.id]
+            for sale in changed:
+                sale["customer_name"] = name
+            items_list.refresh(*[s["id"] for s in changed])
+
+    def matches(s):
+        """The repository's filters, for a sale that arrived as a change event."""
+        f = filters()
+        term = (f["term"] or "").lower().strip()
+        if term and not any(term in (s.get(k) or "").lower() for k in ("invoice_no", "customer_name", "doctor_name")):
+            return False
+        if f["lab_status"] and s.get("lab_status") != f["lab_status"]:
+            return False
+        return not f["payment_state"] or payment_state(s) == f["payment_state"]
+
+    def build_card(s):
+        cust_name = s.get("customer_name") or _("Walk-in")
+
+        net_amount = float(s.get('net_amount', 0))
+        paid = float(s.get('amount_paid', 0))
+        balance = balance_due(s)
+
+        # Status colors
+        status = s.get('lab_status', 'N/A')
+        status_color = ft.colors.GREY_500
+        if status == "Ready": status_color = ft.colors.GREEN_500
+        elif status == "In Lab": status_color = ft.colors.ORANGE_500
+        elif status == "Not Started": status_color = ft.colors.RED_500
+        elif status == "Received": status_color = ft.colors.BLUE_500
+
+        # Payment indicator
+        payment_color = ft.colors.GREEN_700 if balance <= 0 else ft.colors.RED_700
+
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Column([
+                    ft.ListTile(
+                        leading=ft.Icon(ft.icons.RECEIPT, color=status_color, size=35),
+                        title=ft.Text(f"#{s['invoice_no']} - {cust_name}", weight=ft.FontWeight.BOLD),
+                        subtitle=ft.Text(f"{s.get('order_date', '')[:16]} | {_('Doctor')}: {s.get('doctor_name', 'N/A')}"),
+                        trailing=ft.PopupMenuButton(
+                            items=[
+                                ft.PopupMenuItem(text=_("View Details"), icon=ft.icons.VISIBILITY, on_click=lambda e, sale=s: show_sale_details(sale)),
+                                ft.PopupMenuItem(text=_("Record Payment"), icon=ft.icons.PAYMENT, on_click=lambda e, sale=s: show_payment_dialog(sale)),
+                                ft.PopupMenuItem(text=_("Print"), icon=ft.icons.PRINT, on_click=lambda e, sale=s: print_receipt(sale)),
+                            ]
                         )
-                    )
-                )
-        page.update()
+                    ),
+                    ft.Row([
+                        ft.Container(
+                            ft.Column([
+                                ft.Text(f"{net_amount:.2f}", size=16, weight=ft.FontWeight.BOLD),
+                                ft.Text(_("Total"), size=10)
+                            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                            expand=True
+                        ),
+                        ft.Container(
+                            ft.Column([
+                                ft.Text(f"{paid:.2f}", size=16, weight=ft.FontWeight.BOLD, color=ft.colors.GREEN_700),
+                                ft.Text(_("Paid"), size=10)
+                            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                            expand=True
+                        ),
+                        ft.Container(
+                            ft.Column([
+                                ft.Text(f"{balance:.2f}", size=16, weight=ft.FontWeight.BOLD, color=payment_color),
+                                ft.Text(_("Balance"), size=10)
+                            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                            expand=True
+                        ),
+                        ft.Container(
+                            ft.Column([
+                                ft.Container(
+                                    ft.Text(status, size=12, color=ft.colors.WHITE),
+                                    bgcolor=status_color,
+                                    padding=ft.padding.symmetric(horizontal=10, vertical=5),
+                                    border_radius=15
+                                )
+                            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                            expand=True
+                        ),
+                    ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
+                ]),
+                padding=10
+            )
+        )
 
     def show_sale_details(sale):
         """Show sale details in a dialog."""
-        customers = repo.get_customers()
-        cust_name = _("Walk-in")
-        if sale.get("customer_id"):
-            cust = next((c for c in customers if c["id"] == sale["customer_id"]), None)
-            if cust: cust_name = cust.get("name", "")
+        cust_name = sale.get("customer_name") or _("Walk-in")
 
         # Get sale items
         sale_items = sale.get("sale_items", [])
@@ -265,14 +290,11 @@ def HistoryView(page: ft.Page, repo):
                     new_total_paid = total
 
                 repo.update_sale_payment(sale["id"], new_total_paid)
-                # Update the local sale object so the list reflects the change
-                sale["amount_paid"] = new_total_paid
 
                 dialog.open = False
                 page.snack_bar = ft.SnackBar(ft.Text(_("Payment recorded successfully")))
                 page.snack_bar.open = True
-                load_history(search_input.value)
-                page.update()
+                patch_sale(sale["id"], {"amount_paid": new_total_paid})
             except Exception as ex:
                 page.snack_bar = ft.SnackBar(ft.Text(f"{_('Error')}: {str(ex)}"))
                 page.snack_bar.open = True
@@ -305,28 +327,14 @@ def HistoryView(page: ft.Page, repo):
 
     def print_receipt(sale):
         """Print receipt for a sale."""
-        customers = repo.get_customers()
-        cust_name = _("Walk-in")
-        if sale.get("customer_id"):
-            cust = next((c for c in customers if c["id"] == sale["customer_id"]), None)
-            if cust: cust_name = cust.get("name", "")
-
-        shop_name = repo.get_setting("shop_name", "Optical Shop")
-
-        receipt = f"""
-{'='*40}
-{shop_name}
-{'='*40}
-{_('Invoice')}: #{sale.get('invoice_no', '')}
-{_('Date')}: {sale.get('order_date', '')[:16]}
-{_('Customer')}: {cust_name}
-{'-'*40}
-{_('Total')}: {sale.get('net_amount', 0):.2f}
-{_('Paid')}: {sale.get('amount_paid', 0):.2f}
-{_('Balance')}: {float(sale.get('net_amount', 0)) - float(sale.get('amount_paid', 0)):.2f}
-{'='*40}
-"""
-        print(receipt)
+        settings = repo.get_settings()
+        receipt = dict(
+            shop_context(settings),
+            sale=sale,
+            customer={"name": sale.get("customer_name") or _("Walk-in")},
+            balance=balance_due(sale),
+        )
+        spool(page, "sale_receipt", receipt, settings)
         page.snack_bar = ft.SnackBar(ft.Text(_("Receipt sent to printer")))
         page.snack_bar.open = True
         page.update()
@@ -335,10 +343,16 @@ def HistoryView(page: ft.Page, repo):
         label=_("Search by Invoice, Customer or Doctor..."),
         prefix_icon=ft.icons.SEARCH,
         expand=True,
-        on_change=lambda e: load_history(e.control.value)
+        on_change=on_search_change
     )
 
+    # Only the cards in view are built
+    items_list = VirtualList(build_card, fetch_sales, item_extent=SALE_CARD_HEIGHT, empty_text=_("No orders found"))
+
     load_history()
+    subscribe_changes(page, on_sale_change, SALE)
+    subscribe_changes(page, on_customer_change, CUSTOMER)
+    on_view_closed(page, cancel_pending_search)
 
     return ft.View(
         "/history",
@@ -353,10 +367,10 @@ def HistoryView(page: ft.Page, repo):
                 content=ft.Column([
                     ft.Row([
                         ft.Text(_("Sales History & Invoices"), size=25, weight=ft.FontWeight.BOLD),
-                        ft.IconButton(ft.icons.REFRESH, tooltip=_("Refresh"), on_click=lambda _: load_history(search_input.value)),
+                        ft.IconButton(ft.icons.REFRESH, tooltip=_("Refresh"), on_click=lambda _: load_history()),
                     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
                     ft.Row([search_input, status_filter, payment_filter]),
-                    items_list,
+                    items_list.control,
                 ], expand=True),
                 padding=20,
                 expand=True
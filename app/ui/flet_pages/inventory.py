@@ -1,45 +1,78 @@
 import flet as ft
 from app.core.i18n import _
+from app.core.events import PRODUCT, STOCK, INSERT, DELETE, subscribe_changes
+from app.ui.components.virtual_list import VirtualList
+
+PRODUCT_ROW_HEIGHT = 82
+
 
 def InventoryView(page: ft.Page, repo):
     
     # --- Products Tab ---
-    items_list = ft.ListView(expand=True, spacing=10)
-
-    def load_inventory(term="", category=None):
-        items_list.controls.clear()
-        inventory = repo.get_inventory(category=category, search_term=term if term else None)
+    def fetch_products(offset, limit):
+        return repo.get_inventory_page(offset, limit, category=get_selected_category(),
+                                       search_term=search_input.value or None)
+
+    def load_inventory():
+        """Start the list again from the first page of the current filter."""
+        items_list.load()
+
+    def product_tile(item):
+        stock = item.get("stock_qty", 0)
+        stock_color = ft.colors.GREEN_700 if stock > 0 else ft.colors.RED_700
+
+        return ft.ListTile(
+            leading=ft.Icon(ft.icons.INVENTORY_2),
+            title=ft.Text(item.get("name", "Unknown")),
+            subtitle=ft.Text(
+                f"SKU: {item.get('sku')} | {_('Category')}: {item.get('category', 'N/A')} | "
+                f"{_('Price')}: {item.get('sale_price', 0):.2f}"
+            ),
+            trailing=ft.Row([
+                ft.Container(
+                    ft.Text(f"{stock}", weight=ft.FontWeight.BOLD, color=stock_color),
+                    bgcolor=ft.colors.GREY_200,
+                    padding=ft.padding.symmetric(horizontal=10, vertical=5),
+                    border_radius=5
+                ),
+                ft.IconButton(ft.icons.ADD_CIRCLE, tooltip=_("Adjust Stock"), on_click=lambda e, i=item: show_adjust_stock_dialog(i)),
+                ft.IconButton(ft.icons.EDIT, tooltip=_("Edit"), on_click=lambda e, i=item: show_product_dialog(i)),
+            ], tight=True),
+        )
 
-        if not inventory:
-            items_list.controls.append(
-                ft.ListTile(title=ft.Text(_("No products found"), italic=True, color=ft.colors.GREY_700))
-            )
+    def matches_filter(item):
+        """Same test get_inventory applies, for rows added by another terminal."""
+        category = get_selected_category()
+        term = (search_input.value or "").lower()
+        if category and item.get("category") != category:
+            return False
+        return not term or any(term in (item.get(k) or "").lower() for k in ("name", "sku", "barcode"))
+
+    def add_row(item):
+        # New products sort last; until the last page is loaded they arrive with it
+        if matches_filter(item) and not items_list.has_more:
+            items_list.insert(len(items_list.items), item)
+
+    def patch_row(product_id, fields):
+        item = items_list.get(product_id)
+        if item is not None:
+            item.update(fields)
+            items_list.refresh(product_id)
+
+    def refresh_stock(product_id):
+        """Re-read one product's stock; the rest of the list is left alone."""
+        if items_list.get(product_id) is not None:
+            patch_row(product_id, {"stock_qty": repo.get_product_stock(product_id)})
+
+    def on_product_change(event):
+        if event.entity == STOCK:
+            refresh_stock(event.id)
+        elif event.op == INSERT:
+            add_row(dict(event.data or {}, id=event.id))
+        elif event.op == DELETE:
+            items_list.remove(event.id)
         else:
-            for item in inventory:
-                stock = item.get("stock_qty", 0)
-                stock_color = ft.colors.GREEN_700 if stock > 0 else ft.colors.RED_700
-
-                items_list.controls.append(
-                    ft.ListTile(
-                        leading=ft.Icon(ft.icons.INVENTORY_2),
-                        title=ft.Text(item.get("name", "Unknown")),
-                        subtitle=ft.Text(
-                            f"SKU: {item.get('sku')} | {_('Category')}: {item.get('category', 'N/A')} | "
-                            f"{_('Price')}: {item.get('sale_price', 0):.2f}"
-                        ),
-                        trailing=ft.Row([
-                            ft.Container(
-                                ft.Text(f"{stock}", weight=ft.FontWeight.BOLD, color=stock_color),
-                                bgcolor=ft.colors.GREY_200,
-                                padding=ft.padding.symmetric(horizontal=10, vertical=5),
-                                border_radius=5
-                            ),
-                            ft.IconButton(ft.icons.ADD_CIRCLE, tooltip=_("Adjust Stock"), on_click=lambda e, i=item: show_adjust_stock_dialog(i)),
-                            ft.IconButton(ft.icons.EDIT, tooltip=_("Edit"), on_click=lambda e, i=item: show_product_dialog(i)),
-                        ], tight=True),
-                    )
-                )
-        page.update()
+            patch_row(event.id, event.data or {})
 
     def show_product_dialog(item=None):
         def save_product(e):
@@ -57,13 +90,16 @@ def InventoryView(page: ft.Page, repo):
 
                 if item:
                     repo.update_inventory_item(item["id"], data)
+                    patch_row(item["id"], data)
                 else:
+                    if data["sku"] == suggested_sku["value"]:
+                        # Untouched suggestion: let the repository reserve the real SKU on insert
+                        data["sku"] = ""
                     initial_stock = int(qty_field.value or 0)
                     data["stock_qty"] = initial_stock
-                    repo.add_inventory_item(data)
+                    add_row(dict(repo.add_inventory_item(data), stock_qty=initial_stock))
 
                 dialog.open = False
-                load_inventory(search_input.value, get_selected_category())
                 page.snack_bar = ft.SnackBar(ft.Text(_("Product saved successfully!")))
                 page.snack_bar.open = True
                 page.update()
@@ -73,7 +109,9 @@ def InventoryView(page: ft.Page, repo):
                 page.update()
 
         name_field = ft.TextField(label=_("Name"), value=item.get("name", "") if item else "", expand=True)
-        sku_field = ft.TextField(label=_("SKU"), value=item.get("sku", "") if item else repo.generate_sku("Other"), width=150)
+        # New products show a preview of the next SKU; it is only reserved when saved
+        suggested_sku = {"value": None if item else repo.peek_sku("Other")}
+        sku_field = ft.TextField(label=_("SKU"), value=item.get("sku", "") if item else suggested_sku["value"], width=150)
         barcode_field = ft.TextField(label=_("Barcode"), value=item.get("barcode", "") if item else "", width=150)
 
         cat_dropdown = ft.Dropdown(
@@ -91,8 +129,10 @@ def InventoryView(page: ft.Page, repo):
         )
 
         def update_sku():
-            if not item:
-                sku_field.value = repo.generate_sku(cat_dropdown.value)
+            # Only replace the SKU if the user hasn't typed their own
+            if not item and sku_field.value in ("", suggested_sku["value"]):
+                suggested_sku["value"] = repo.peek_sku(cat_dropdown.value)
+                sku_field.value = suggested_sku["value"]
                 page.update()
 
         price_field = ft.TextField(
@@ -182,7 +222,7 @@ def InventoryView(page: ft.Page, repo):
                 )
 
                 dialog.open = False
-                load_inventory(search_input.value, get_selected_category())
+                refresh_stock(item["id"])
                 page.snack_bar = ft.SnackBar(ft.Text(_("Stock adjusted successfully!")))
                 page.snack_bar.open = True
                 page.update()
@@ -234,7 +274,7 @@ def InventoryView(page: ft.Page, repo):
         label=_("Search by name or SKU..."),
         prefix_icon=ft.icons.SEARCH,
         expand=True,
-        on_change=lambda e: load_inventory(e.control.value, get_selected_category())
+        on_change=lambda e: load_inventory()
     )
 
     category_filter = ft.Dropdown(
@@ -249,22 +289,26 @@ def InventoryView(page: ft.Page, repo):
             ft.dropdown.Option("Other", _("Others"))
         ],
         width=180,
-        on_change=lambda e: load_inventory(search_input.value, get_selected_category())
+        on_change=lambda e: load_inventory()
     )
 
     def get_selected_category():
         return None if category_filter.value == "All" else category_filter.value
 
+    # Only the rows in view are built; pages are fetched as the list scrolls
+    items_list = VirtualList(product_tile, fetch_products, item_extent=PRODUCT_ROW_HEIGHT,
+                             empty_text=_("No products found"))
+
     products_content = ft.Column([
         ft.Row([
             ft.Text(_("Products"), size=22, weight=ft.FontWeight.BOLD),
             ft.Row([
-                ft.IconButton(ft.icons.REFRESH, tooltip=_("Refresh"), on_click=lambda _: load_inventory(search_input.value, get_selected_category())),
+                ft.IconButton(ft.icons.REFRESH, tooltip=_("Refresh"), on_click=lambda _: load_inventory()),
                 ft.ElevatedButton(_("+ Add New Product"), icon=ft.icons.ADD, on_click=lambda _: show_product_dialog()),
             ]),
         ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
         ft.Row([search_input, category_filter]),
-        items_list
+        items_list.control
     ], spacing=10, expand=True)
 
     # --- Suppliers Tab ---
@@ -471,6 +515,7 @@ def InventoryView(page: ft.Page, repo):
 
     load_inventory()
     load_suppliers()
+    subscribe_changes(page, on_product_change, PRODUCT, STOCK)
 
     return ft.View(
         "/inventory",
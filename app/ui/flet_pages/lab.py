@@ -1,8 +1,15 @@
 import flet as ft
 from app.core.i18n import _
+from app.core.events import SALE, CUSTOMER, INSERT, DELETE, subscribe_changes
+from app.core.lab_queue import LabQueue, LAB_STATUSES, NOT_STARTED, IN_LAB, READY
+from app.core.receipts import shop_context
+from app.core.print_spooler import shared_spooler, spool
+from app.ui.components.virtual_list import VirtualList
+
+LAB_CARD_HEIGHT = 150
+
 
 def LabView(page: ft.Page, repo):
-    lab_list = ft.ListView(expand=True, spacing=5)
 
     # Filter controls
     status_filter = ft.Dropdown(
@@ -16,7 +23,7 @@ def LabView(page: ft.Page, repo):
             ft.dropdown.Option("Received", _("Received")),
         ],
         width=180,
-        on_change=lambda e: load_data(search_input.value)
+        on_change=lambda e: render(search_input.value)
     )
 
     # Dynamic summary badge texts
@@ -24,146 +31,201 @@ def LabView(page: ft.Page, repo):
     in_lab_text = ft.Text("0 " + _("In Lab"), weight=ft.FontWeight.BOLD)
     ready_text = ft.Text("0 " + _("Ready"), weight=ft.FontWeight.BOLD)
 
+    # Loaded once and then kept current by change events
+    queue = LabQueue()
+    customers = {}
+    selected = set()
+
     def update_status(sale_id, status):
-        repo.update_sale_lab_status(sale_id, status)
-        load_data(search_input.value)
+        move_orders([sale_id], status)
+
+    def move_orders(sale_ids, status):
+        """Write the new status for all the orders at once, then move just their cards."""
+        sale_ids = [sid for sid in sale_ids if sid in queue]
+        if not sale_ids:
+            return
+        repo.update_sales_lab_status(sale_ids, status)
+        render(search_input.value, changed=queue.move(sale_ids, status))
         page.snack_bar = ft.SnackBar(ft.Text(_("Status updated successfully")))
         page.snack_bar.open = True
         page.update()
 
     def load_data(term=""):
-        lab_list.controls.clear()
-        sales = repo.get_sales()
-        customers = repo.get_customers()
+        """Fetch all lab orders and customers, then render."""
+        customers.clear()
+        # Only sales with optical components have a lab_status
+        queue.load(repo.get_sales())
+        customers.update((c["id"], c) for c in repo.get_customers())
+        selected.intersection_update(s["id"] for s in queue.ordered())
+        render(term)
+
+    def patch_sale(sale_id, fields):
+        if queue.apply(sale_id, fields):
+            if sale_id not in queue:
+                selected.discard(sale_id)
+            render(search_input.value, changed=[sale_id])
+
+    def on_sale_change(event):
+        if event.op == INSERT:
+            if queue.add(dict(event.data or {}, id=event.id)):
+                render(search_input.value)
+        elif event.op == DELETE:
+            if queue.remove(event.id):
+                selected.discard(event.id)
+                render(search_input.value)
+        else:
+            patch_sale(event.id, event.data or {})
 
-        # Filter sales that have optical components (lab_status is not None)
-        lab_sales = [s for s in sales if s.get("lab_status")]
+    # --- Selection and bulk changes ---
+    def toggle_selected(sale_id, checked):
+        if checked:
+            selected.add(sale_id)
+        else:
+            selected.discard(sale_id)
+        update_bulk_bar()
+        page.update()
 
-        # Update summary badges from ALL lab sales (before applying filters)
-        not_started_count = len([s for s in lab_sales if s.get("lab_status") == "Not Started"])
-        in_lab_count = len([s for s in lab_sales if s.get("lab_status") == "In Lab"])
-        ready_count = len([s for s in lab_sales if s.get("lab_status") == "Ready"])
-        not_started_text.value = f"{not_started_count} {_('Not Started')}"
-        in_lab_text.value = f"{in_lab_count} {_('In Lab')}"
-        ready_text.value = f"{ready_count} {_('Ready')}"
+    def select_shown(e):
+        shown = [s["id"] for s in lab_list.items if s["id"] not in selected]
+        selected.update(shown)
+        render(search_input.value, changed=shown)
+
+    def clear_selection(e=None):
+        changed = list(selected)
+        selected.clear()
+        render(search_input.value, changed=changed)
+
+    def apply_to_selected(e):
+        ids = list(selected)
+        selected.clear()
+        move_orders(ids, bulk_status.value)
+        # Cards that did not move still show a ticked box
+        render(search_input.value, changed=ids)
+
+    def update_bulk_bar():
+        selection_text.value = f"{len(selected)} {_('selected')}"
+        bulk_bar.visible = bool(selected)
+
+    def on_customer_change(event):
+        if event.op == DELETE:
+            customers.pop(event.id, None)
+        else:
+            customers.setdefault(event.id, {"id": event.id}).update(event.data or {})
+        stale = [s["id"] for s in queue.ordered() if str(s.get("customer_id")) == event.id]
+        if stale:
+            render(search_input.value, changed=stale)
+
+    def customer_of(sale):
+        return customers.get(sale.get("customer_id")) if sale.get("customer_id") else None
+
+    def render(term="", changed=()):
+        # Summary badges are the bucket sizes, over ALL lab sales (before applying filters)
+        not_started_text.value = f"{queue.count(NOT_STARTED)} {_('Not Started')}"
+        in_lab_text.value = f"{queue.count(IN_LAB)} {_('In Lab')}"
+        ready_text.value = f"{queue.count(READY)} {_('Ready')}"
 
-        # Apply status filter
-        if status_filter.value != "All":
-            lab_sales = [s for s in lab_sales if s.get("lab_status") == status_filter.value]
+        # Status filter, already in board order: Not Started > In Lab > Ready > Received, oldest first
+        visible = queue.ordered(None if status_filter.value == "All" else status_filter.value)
 
         # Apply search filter
         if term:
             term = term.lower()
             filtered = []
-            for s in lab_sales:
-                cust_name = ""
-                if s.get("customer_id"):
-                    cust = next((c for c in customers if c.get("id") == s["customer_id"]), None)
-                    if cust: cust_name = cust.get("name", "")
+            for s in visible:
+                cust = customer_of(s)
+                cust_name = cust.get("name", "") if cust else ""
 
                 if (term in s.get("invoice_no", "").lower() or
                     term in cust_name.lower() or
                     term in (s.get("doctor_name") or "").lower()):
                     filtered.append(s)
-            lab_sales = filtered
+            visible = filtered
 
-        # Sort by status priority: Not Started > In Lab > Ready > Received
-        status_order = {"Not Started": 0, "In Lab": 1, "Ready": 2, "Received": 3}
-        lab_sales.sort(key=lambda x: (status_order.get(x.get("lab_status", ""), 99), x.get("order_date", "")))
+        lab_list.set_items(visible, changed)
+        update_bulk_bar()
+        page.update()
 
-        if not lab_sales:
-            lab_list.controls.append(
-                ft.ListTile(title=ft.Text(_("No lab orders found"), italic=True, color=ft.colors.GREY_700))
+    def build_card(s):
+        cust_name = _("Walk-in")
+        cust_phone = ""
+        cust = customer_of(s)
+        if cust:
+            cust_name = cust.get("name", "")
+            cust_phone = cust.get("phone", "")
+
+        status = s.get("lab_status", "N/A")
+        status_color = ft.colors.GREY_500
+        if status == "Not Started": status_color = ft.colors.RED_500
+        elif status == "In Lab": status_color = ft.colors.ORANGE_500
+        elif status == "Ready": status_color = ft.colors.GREEN_500
+        elif status == "Received": status_color = ft.colors.BLUE_500
+
+        # Delivery date
+        delivery = s.get("delivery_date", "N/A")
+        if delivery and delivery != "N/A":
+            delivery = delivery[:10]
+
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Column([
+                    ft.ListTile(
+                        leading=ft.Container(
+                            ft.Icon(ft.icons.SCIENCE, color=ft.colors.WHITE, size=25),
+                            bgcolor=status_color,
+                            border_radius=25,
+                            padding=10,
+                            width=50,
+                            height=50
+                        ),
+                        title=ft.Text(f"#{s['invoice_no']} - {cust_name}", weight=ft.FontWeight.BOLD),
+                        subtitle=ft.Text(f"📱 {cust_phone} | 👨‍⚕️ {s.get('doctor_name', 'N/A')}"),
+                        trailing=ft.Checkbox(
+                            value=s["id"] in selected,
+                            tooltip=_("Select"),
+                            on_change=lambda e, sid=s["id"]: toggle_selected(sid, e.control.value)
+                        ),
+                    ),
+                    ft.Row([
+                        ft.Column([
+                            ft.Text(_("Order Date"), size=10, color=ft.colors.GREY_700),
+                            ft.Text(s.get("order_date", "")[:10], size=12, weight=ft.FontWeight.BOLD)
+                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, expand=True),
+                        ft.Column([
+                            ft.Text(_("Delivery Date"), size=10, color=ft.colors.GREY_700),
+                            ft.Text(delivery, size=12, weight=ft.FontWeight.BOLD, color=ft.colors.BLUE_700)
+                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, expand=True),
+                        ft.Column([
+                            ft.Text(_("Status"), size=10, color=ft.colors.GREY_700),
+                            ft.Dropdown(
+                                value=status,
+                                options=[ft.dropdown.Option(st, _(st)) for st in LAB_STATUSES],
+                                on_change=lambda e, sid=s["id"]: update_status(sid, e.control.value),
+                                width=140,
+                                dense=True
+                            )
+                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, expand=True),
+                        ft.Column([
+                            ft.IconButton(
+                                ft.icons.PRINT,
+                                tooltip=_("Print Lab Copy"),
+                                on_click=lambda e, sale=s: print_lab_copy(sale)
+                            ),
+                            ft.IconButton(
+                                ft.icons.VISIBILITY,
+                                tooltip=_("View Details"),
+                                on_click=lambda e, sale=s: show_details(sale)
+                            )
+                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
+                    ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
+                ]),
+                padding=10
             )
-        else:
-            for s in lab_sales:
-                cust_name = _("Walk-in")
-                cust_phone = ""
-                if s.get("customer_id"):
-                    cust = next((c for c in customers if c.get("id") == s["customer_id"]), None)
-                    if cust:
-                        cust_name = cust.get("name", "")
-                        cust_phone = cust.get("phone", "")
-
-                status = s.get("lab_status", "N/A")
-                status_color = ft.colors.GREY_500
-                if status == "Not Started": status_color = ft.colors.RED_500
-                elif status == "In Lab": status_color = ft.colors.ORANGE_500
-                elif status == "Ready": status_color = ft.colors.GREEN_500
-                elif status == "Received": status_color = ft.colors.BLUE_500
-
-                # Delivery date
-                delivery = s.get("delivery_date", "N/A")
-                if delivery and delivery != "N/A":
-                    delivery = delivery[:10]
-
-                lab_list.controls.append(
-                    ft.Card(
-                        content=ft.Container(
-                            content=ft.Column([
-                                ft.ListTile(
-                                    leading=ft.Container(
-                                        ft.Icon(ft.icons.SCIENCE, color=ft.colors.WHITE, size=25),
-                                        bgcolor=status_color,
-                                        border_radius=25,
-                                        padding=10,
-                                        width=50,
-                                        height=50
-                                    ),
-                                    title=ft.Text(f"#{s['invoice_no']} - {cust_name}", weight=ft.FontWeight.BOLD),
-                                    subtitle=ft.Text(f"📱 {cust_phone} | 👨‍⚕️ {s.get('doctor_name', 'N/A')}"),
-                                ),
-                                ft.Row([
-                                    ft.Column([
-                                        ft.Text(_("Order Date"), size=10, color=ft.colors.GREY_700),
-                                        ft.Text(s.get("order_date", "")[:10], size=12, weight=ft.FontWeight.BOLD)
-                                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, expand=True),
-                                    ft.Column([
-                                        ft.Text(_("Delivery Date"), size=10, color=ft.colors.GREY_700),
-                                        ft.Text(delivery, size=12, weight=ft.FontWeight.BOLD, color=ft.colors.BLUE_700)
-                                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, expand=True),
-                                    ft.Column([
-                                        ft.Text(_("Status"), size=10, color=ft.colors.GREY_700),
-                                        ft.Dropdown(
-                                            value=status,
-                                            options=[
-                                                ft.dropdown.Option("Not Started", _("Not Started")),
-                                                ft.dropdown.Option("In Lab", _("In Lab")),
-                                                ft.dropdown.Option("Ready", _("Ready")),
-                                                ft.dropdown.Option("Received", _("Received")),
-                                            ],
-                                            on_change=lambda e, sid=s["id"]: update_status(sid, e.control.value),
-                                            width=140,
-                                            dense=True
-                                        )
-                                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, expand=True),
-                                    ft.Column([
-                                        ft.IconButton(
-                                            ft.icons.PRINT,
-                                            tooltip=_("Print Lab Copy"),
-                                            on_click=lambda e, sale=s: print_lab_copy(sale)
-                                        ),
-                                        ft.IconButton(
-                                            ft.icons.VISIBILITY,
-                                            tooltip=_("View Details"),
-                                            on_click=lambda e, sale=s: show_details(sale)
-                                        )
-                                    ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
-                                ], alignment=ft.MainAxisAlignment.SPACE_AROUND),
-                            ]),
-                            padding=10
-                        )
-                    )
-                )
-        page.update()
+        )
 
     def show_details(sale):
         """Show examination details for a lab order."""
-        customers = repo.get_customers()
-        cust_name = _("Walk-in")
-        if sale.get("customer_id"):
-            cust = next((c for c in customers if c["id"] == sale["customer_id"]), None)
-            if cust: cust_name = cust.get("name", "")
+        cust = customer_of(sale)
+        cust_name = cust.get("name", "") if cust else _("Walk-in")
 
         # Get examinations for this sale
         exams = repo.get_order_examinations(sale.get("id"))
@@ -212,55 +274,59 @@ def LabView(page: ft.Page, repo):
 
     def print_lab_copy(sale):
         """Print lab copy for technicians."""
-        customers = repo.get_customers()
-        cust_name = _("Walk-in")
-        cust_phone = ""
-        if sale.get("customer_id"):
-            cust = next((c for c in customers if c["id"] == sale["customer_id"]), None)
-            if cust:
-                cust_name = cust.get("name", "")
-                cust_phone = cust.get("phone", "")
-
-        shop_name = repo.get_setting("shop_name", "Optical Shop")
-
-        # Get examinations
-        exams = repo.get_order_examinations(sale.get("id"))
-
-        lab_copy = f"""
-{'='*50}
-LAB COPY - {shop_name}
-{'='*50}
-Invoice: #{sale.get('invoice_no', '')}
-Date: {sale.get('order_date', '')[:10]}
-Delivery: {sale.get('delivery_date', 'N/A')[:10] if sale.get('delivery_date') else 'N/A'}
-Customer: {cust_name} | Phone: {cust_phone}
-Doctor: {sale.get('doctor_name', 'N/A')}
-{'-'*50}
-"""
-        for i, exam in enumerate(exams, 1):
-            lab_copy += f"""
-Exam #{i} - {exam.get('exam_type', 'N/A')}
-  OD: SPH {exam.get('sphere_od', '')} CYL {exam.get('cylinder_od', '')} AXIS {exam.get('axis_od', '')}
-  OS: SPH {exam.get('sphere_os', '')} CYL {exam.get('cylinder_os', '')} AXIS {exam.get('axis_os', '')}
-  IPD: {exam.get('ipd', '')}
-  Lens: {exam.get('lens_info', 'N/A')}
-  Frame: {exam.get('frame_info', 'N/A')} ({exam.get('frame_color', '')}) [{exam.get('frame_status', '')}]
-"""
-        lab_copy += f"\n{'='*50}\n"
-
-        print(lab_copy)
+        cust = customer_of(sale)
+        cust_name = cust.get("name", "") if cust else _("Walk-in")
+        cust_phone = cust.get("phone", "") if cust else ""
+
+        settings = repo.get_settings()
+        lab_copy = dict(
+            shop_context(settings),
+            sale=sale,
+            customer={"name": cust_name, "phone": cust_phone},
+            examinations=repo.get_order_examinations(sale.get("id")),
+        )
+        spool(page, "lab_ticket", lab_copy, settings, role="lab")
         page.snack_bar = ft.SnackBar(ft.Text(_("Lab copy sent to printer")))
         page.snack_bar.open = True
         page.update()
 
+    def print_todays_lab_copies(e):
+        """Queue the lab copies of today's orders; the spooler reads them page by page."""
+        spooler = (page.data or {}).get("print_spooler") or shared_spooler(repo)
+        spooler.submit_lab_day(repo.get_settings())
+        page.snack_bar = ft.SnackBar(ft.Text(_("Today's lab copies sent to printer")))
+        page.snack_bar.open = True
+        page.update()
+
+    # Only the cards in view are built
+    lab_list = VirtualList(build_card, item_extent=LAB_CARD_HEIGHT, empty_text=_("No lab orders found"))
+
+    # Bulk status change for the ticked orders, shown while any are ticked
+    selection_text = ft.Text("", weight=ft.FontWeight.BOLD)
+    bulk_status = ft.Dropdown(
+        value=IN_LAB,
+        options=[ft.dropdown.Option(st, _(st)) for st in LAB_STATUSES],
+        width=160,
+        dense=True
+    )
+    bulk_bar = ft.Row([
+        selection_text,
+        ft.Text(_("Set status to")),
+        bulk_status,
+        ft.ElevatedButton(_("Apply"), icon=ft.icons.DONE_ALL, on_click=apply_to_selected),
+        ft.TextButton(_("Clear Selection"), on_click=clear_selection),
+    ], visible=False, spacing=10)
+
     search_input = ft.TextField(
         label=_("Search by Invoice, Customer or Doctor..."),
         prefix_icon=ft.icons.SEARCH,
         expand=True,
-        on_change=lambda e: load_data(e.control.value)
+        on_change=lambda e: render(e.control.value)
     )
 
     load_data()
+    subscribe_changes(page, on_sale_change, SALE)
+    subscribe_changes(page, on_customer_change, CUSTOMER)
 
     return ft.View(
         "/lab",
@@ -275,11 +341,18 @@ Exam #{i} - {exam.get('exam_type', 'N/A')}
                 content=ft.Column([
                     ft.Row([
                         ft.Text(_("Lab Orders"), size=28, weight=ft.FontWeight.BOLD),
-                        ft.IconButton(
-                            ft.icons.REFRESH,
-                            tooltip=_("Refresh"),
-                            on_click=lambda _: load_data(search_input.value)
-                        ),
+                        ft.Row([
+                            ft.IconButton(
+                                ft.icons.PRINT,
+                                tooltip=_("Print today's lab copies"),
+                                on_click=print_todays_lab_copies
+                            ),
+                            ft.IconButton(
+                                ft.icons.REFRESH,
+                                tooltip=_("Refresh"),
+                                on_click=lambda _: load_data(search_input.value)
+                            ),
+                        ]),
                     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
                     # Summary badges (dynamic)
                     ft.Row([
@@ -312,8 +385,13 @@ Exam #{i} - {exam.get('exam_type', 'N/A')}
                         ),
                     ], spacing=10),
                     ft.Divider(),
-                    ft.Row([search_input, status_filter]),
-                    lab_list,
+                    ft.Row([
+                        search_input,
+                        status_filter,
+                        ft.TextButton(_("Select All"), icon=ft.icons.CHECKLIST, on_click=select_shown),
+                    ]),
+                    bulk_bar,
+                    lab_list.control,
                 ], expand=True, spacing=10),
                 padding=20,
                 expand=True
@@ -1,5 +1,11 @@
 import flet as ft
 from app.core.i18n import _
+from app.core.stock import InsufficientStockError
+from app.core.live_search import DebouncedSearch, customer_matches
+from app.core.pos_context import POSContext
+from app.core.events import subscribe_changes, on_view_closed, METADATA, PRODUCT, STOCK
+from app.core.receipts import render_text, shop_context
+from app.core.print_spooler import spool
 import datetime
 
 
@@ -45,6 +51,12 @@ class _POSController:
         self.delivery_date = datetime.date.today() + datetime.timedelta(days=3)
         self.doctor_name = ""
 
+        # Lookup lists and shop settings, loaded once in the background and
+        # shared by every exam row and the receipt
+        self.context = POSContext(self.repo).start()
+        subscribe_changes(self._page, self.context.on_change, METADATA, PRODUCT, STOCK)
+        on_view_closed(self._page, self.context.close)
+
         # UI Components
         self.app_bar = ft.AppBar(
             title=ft.Text(_("Sales POS")),
@@ -122,7 +134,15 @@ class _POSController:
         self.c_email = ft.TextField(label=_("Email"), expand=True)
         self.c_address = ft.TextField(label=_("Address"), expand=True)
 
-        # Debounced search
+        # Debounced search off the UI thread; a fresh cache each time the step opens
+        if getattr(self, "customer_search", None):
+            self.customer_search.cancel()
+        self.customer_search = DebouncedSearch(
+            lambda query, limit: self.repo.search_customers(query, limit=limit),
+            self.show_customer_results,
+            matches=customer_matches,
+        )
+
         def on_field_change(e):
             self.perform_customer_search()
 
@@ -198,8 +218,6 @@ class _POSController:
 
     def perform_customer_search(self):
         """Search customers by name, phone, city."""
-        self.customer_results.controls.clear()
-
         # Build search term from filled fields
         terms = []
         if self.c_name.value and self.c_name.value.strip():
@@ -211,6 +229,8 @@ class _POSController:
 
         # If no search term, show prompt
         if not terms:
+            self.customer_search.cancel()
+            self.customer_results.controls.clear()
             self.customer_results.controls.append(
                 ft.Container(
                     ft.Text(_("Start typing to search for existing customers..."), italic=True, color=ft.colors.GREY_500),
@@ -220,8 +240,14 @@ class _POSController:
             self._page.update()
             return
 
-        search_term = " ".join(terms)
-        customers = self.repo.search_customers(search_term)
+        # Results arrive in show_customer_results, on the search worker
+        self.customer_search.submit(" ".join(terms))
+
+    def show_customer_results(self, search_term, customers):
+        """Render the matches for the latest search term."""
+        if self.current_step != 1:
+            return
+        self.customer_results.controls.clear()
 
         # Remove duplicates by customer ID
         seen_ids = set()
@@ -303,7 +329,7 @@ class _POSController:
         """Proceed to next step after customer selection."""
         self.selected_customer = customer
 
-        # Generate invoice number
+        # Preview the invoice number; the real one is reserved in finish_order
         self.invoice_no = self.repo.get_next_invoice_no()
 
         # For Glasses/Contact Lenses, show examination form
@@ -534,10 +560,10 @@ class _POSController:
         """Add an examination row to the form."""
         row_index = len(self.exam_rows_container.controls)
 
-        # Get metadata for dropdowns
-        lens_types = self.repo.get_lens_types()
-        frame_colors = self.repo.get_frame_colors()
-        frame_products = self.repo.get_inventory(category="Frame")
+        # Metadata for dropdowns, from the session context
+        lens_types = self.context.lens_types
+        frame_colors = self.context.frame_colors
+        frame_products = self.context.frames
 
         # Store all text fields for navigation
         field_list = []
@@ -740,17 +766,9 @@ class _POSController:
                 # Add frame to cart if it's a "New" frame
                 if exam["frame_status"] == "New" and exam["frame_info"]:
                     frame_name = exam["frame_info"].split(" (")[0]
-                    frame_product = None
 
                     # Find or create frame product
-                    inventory = self.repo.get_inventory(category="Frame")
-                    for p in inventory:
-                        if p.get("name", "").lower() == frame_name.lower():
-                            frame_product = p
-                            break
-
-                    if not frame_product:
-                        frame_product = self.repo.create_frame_product_if_needed(frame_name)
+                    frame_product = self.context.frame_product(frame_name)
 
                     if frame_product:
                         # Check if already in cart
@@ -766,7 +784,7 @@ class _POSController:
 
                 # Ensure lens type exists in metadata
                 if exam["lens_info"]:
-                    self.repo.ensure_lens_type_exists(exam["lens_info"])
+                    self.context.ensure_lens_type(exam["lens_info"])
 
         self.show_step_4()
 
@@ -1153,27 +1171,13 @@ class _POSController:
             return
 
         try:
-            # Validate stock for all cart items before proceeding
-            insufficient_items = []
-            for item in self.cart_items:
-                current_stock = self.repo.get_product_stock(item["product_id"])
-                if current_stock < item["qty"]:
-                    insufficient_items.append(f"{item['name']} (need {item['qty']}, have {current_stock})")
-
-            if insufficient_items:
-                msg = _("Insufficient stock for") + ":\n" + "\n".join(insufficient_items)
-                self._page.snack_bar = ft.SnackBar(ft.Text(msg), duration=5000)
-                self._page.snack_bar.open = True
-                self._page.update()
-                return
-
             # Prepare sale data
             # Get user ID safely
             user = self._page.data.get("user") if hasattr(self._page, 'data') and self._page.data else None
             user_id = user.get("id") if user else None
 
+            # No invoice_no: add_sale reserves one once the stock is secured
             sale_data = {
-                "invoice_no": self.invoice_no,
                 "customer_id": self.selected_customer.get("id") if self.selected_customer else None,
                 "total_amount": self.totals["gross_total"],
                 "discount": self.totals["discount"],
@@ -1187,13 +1191,31 @@ class _POSController:
                 "delivery_date": self.delivery_date.isoformat() if hasattr(self, 'delivery_date') else None
             }
 
-            # Save sale with items and examinations
-            sale_response = self.repo.add_sale(
-                sale_data,
-                self.cart_items,
-                exam_data=None,
-                examinations=self.examinations if self.examinations else None
-            )
+            # Save sale with items and examinations; stock for every cart line is
+            # checked and deducted in one locked step, so two terminals can't both
+            # sell the last frame
+            try:
+                sale_response = self.repo.add_sale(
+                    sale_data,
+                    self.cart_items,
+                    exam_data=None,
+                    examinations=self.examinations if self.examinations else None
+                )
+            except InsufficientStockError as ex:
+                names = {item["product_id"]: item["name"] for item in self.cart_items}
+                insufficient_items = [
+                    _("{name} (need {requested}, have {available})").format(
+                        name=names.get(s["product_id"], s["product_id"]),
+                        requested=s["requested"], available=s["available"])
+                    for s in ex.shortfalls
+                ]
+                msg = _("Insufficient stock for") + ":\n" + "\n".join(insufficient_items)
+                self._page.snack_bar = ft.SnackBar(ft.Text(msg), duration=5000)
+                self._page.snack_bar.open = True
+                self._page.update()
+                return
+
+            self.invoice_no = sale_data["invoice_no"]
 
             # Show success and receipt preview
             self.show_receipt_preview(sale_data)
@@ -1207,148 +1229,21 @@ class _POSController:
         """Show receipt preview dialog with 3 print options: Shop, Customer, Lab."""
         customer_name = self.selected_customer.get("name", _("Walk-in")) if self.selected_customer else _("Walk-in")
         customer_phone = self.selected_customer.get("phone", "") if self.selected_customer else ""
-        shop_name = self.repo.get_setting("shop_name", "Optical Shop")
-        shop_address = self.repo.get_setting("store_address", "")
-        shop_phone = self.repo.get_setting("store_phone", "")
-        currency = self.repo.get_setting("currency", "EGP")
-
-        # ========== SHOP COPY (Full Details) ==========
-        def build_shop_copy():
-            lines = [
-                f"{'='*44}",
-                f"{'نسخة المحل - SHOP COPY':^44}",
-                f"{'='*44}",
-                f"{shop_name:^44}",
-                f"{shop_address:^44}" if shop_address else "",
-                f"{shop_phone:^44}" if shop_phone else "",
-                f"{'='*44}",
-                f"{_('Invoice')}: #{self.invoice_no}",
-                f"{_('Date')}: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}",
-                f"{_('Delivery Date')}: {self.delivery_date.strftime('%d/%m/%Y') if hasattr(self, 'delivery_date') else 'N/A'}",
-                f"{'-'*44}",
-                f"{_('Customer')}: {customer_name}",
-                f"{_('Phone')}: {customer_phone}" if customer_phone else "",
-                f"{_('Doctor')}: {self.doctor_name}" if self.doctor_name else "",
-                f"{'-'*44}",
-            ]
-
-            # Items
-            if self.cart_items:
-                lines.append(f"{_('Items')}:")
-                for item in self.cart_items:
-                    lines.append(f"  {item['name'][:28]:<28} x{item['qty']} {item['total_price']:>8.2f}")
-
-            # Examinations (Full details for shop)
-            if self.examinations:
-                lines.append(f"{'-'*44}")
-                lines.append(f"{_('Examinations')}:")
-                for i, exam in enumerate(self.examinations, 1):
-                    lines.append(f"  [{i}] {exam.get('exam_type', 'N/A')}")
-                    lines.append(f"      OD: {exam.get('sphere_od', '-')}/{exam.get('cylinder_od', '-')}x{exam.get('axis_od', '-')}")
-                    lines.append(f"      OS: {exam.get('sphere_os', '-')}/{exam.get('cylinder_os', '-')}x{exam.get('axis_os', '-')}")
-                    lines.append(f"      IPD: {exam.get('ipd', '-')}")
-                    lines.append(f"      {_('Lens')}: {exam.get('lens_info', '-')}")
-                    lines.append(f"      {_('Frame')}: {exam.get('frame_info', '-')} ({exam.get('frame_color', '-')})")
-
-            lines.extend([
-                f"{'-'*44}",
-                f"{_('Gross Total'):.<30} {self.totals['gross_total']:>10.2f} {currency}",
-                f"{_('Discount'):.<30} {self.totals['discount']:>10.2f} {currency}",
-                f"{_('Net Amount'):.<30} {self.totals['net_amount']:>10.2f} {currency}",
-                f"{_('Amount Paid'):.<30} {self.totals['amount_paid']:>10.2f} {currency}",
-                f"{_('Balance'):.<30} {self.totals['balance']:>10.2f} {currency}",
-                f"{'='*44}",
-            ])
-            return "\n".join([l for l in lines if l])
-
-        # ========== CUSTOMER COPY (No Prescriptions) ==========
-        def build_customer_copy():
-            lines = [
-                f"{'='*44}",
-                f"{'نسخة العميل - CUSTOMER COPY':^44}",
-                f"{'='*44}",
-                f"{shop_name:^44}",
-                f"{shop_address:^44}" if shop_address else "",
-                f"{shop_phone:^44}" if shop_phone else "",
-                f"{'='*44}",
-                f"{_('Invoice')}: #{self.invoice_no}",
-                f"{_('Date')}: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}",
-                f"{_('Delivery Date')}: {self.delivery_date.strftime('%d/%m/%Y') if hasattr(self, 'delivery_date') else 'N/A'}",
-                f"{'-'*44}",
-                f"{_('Customer')}: {customer_name}",
-                f"{_('Phone')}: {customer_phone}" if customer_phone else "",
-                f"{'-'*44}",
-            ]
-
-            # Items (all items for customer)
-            if self.cart_items:
-                lines.append(f"{_('Items')}:")
-                for item in self.cart_items:
-                    lines.append(f"  {item['name'][:28]:<28} x{item['qty']} {item['total_price']:>8.2f}")
-
-            # Only show lens/frame info (no prescription details)
-            if self.examinations:
-                lines.append(f"{'-'*44}")
-                lines.append(f"{_('Ordered Items')}:")
-                for i, exam in enumerate(self.examinations, 1):
-                    if exam.get('lens_info'):
-                        lines.append(f"  {_('Lens')}: {exam.get('lens_info', '-')}")
-                    if exam.get('frame_info'):
-                        lines.append(f"  {_('Frame')}: {exam.get('frame_info', '-')} ({exam.get('frame_color', '-')})")
-
-            lines.extend([
-                f"{'-'*44}",
-                f"{_('Gross Total'):.<30} {self.totals['gross_total']:>10.2f} {currency}",
-                f"{_('Discount'):.<30} {self.totals['discount']:>10.2f} {currency}",
-                f"{_('Net Amount'):.<30} {self.totals['net_amount']:>10.2f} {currency}",
-                f"{_('Amount Paid'):.<30} {self.totals['amount_paid']:>10.2f} {currency}",
-                f"{_('Balance'):.<30} {self.totals['balance']:>10.2f} {currency}",
-                f"{'='*44}",
-                f"{_('Thank you for your purchase!'):^44}",
-                f"{'='*44}",
-            ])
-            return "\n".join([l for l in lines if l])
-
-        # ========== LAB COPY (Invoice + Prescriptions Only, No Customer Info, No Accessories) ==========
-        def build_lab_copy():
-            lines = [
-                f"{'='*44}",
-                f"{'نسخة المختبر - LAB COPY':^44}",
-                f"{'='*44}",
-                f"{_('Invoice')}: #{self.invoice_no}",
-                f"{_('Date')}: {datetime.datetime.now().strftime('%d/%m/%Y')}",
-                f"{_('Delivery Date')}: {self.delivery_date.strftime('%d/%m/%Y') if hasattr(self, 'delivery_date') else 'N/A'}",
-                f"{_('Doctor')}: {self.doctor_name}" if self.doctor_name else "",
-                f"{'='*44}",
-            ]
-
-            # Only Examinations/Prescriptions (no accessories, no customer info)
-            if self.examinations:
-                for i, exam in enumerate(self.examinations, 1):
-                    lines.append(f"{'-'*44}")
-                    lines.append(f"{_('Exam')} #{i}: {exam.get('exam_type', 'N/A')}")
-                    lines.append(f"{'='*44}")
-                    lines.append(f"  {'OD (Right Eye)':}")
-                    lines.append(f"    SPH: {exam.get('sphere_od', '-'):>8}")
-                    lines.append(f"    CYL: {exam.get('cylinder_od', '-'):>8}")
-                    lines.append(f"    AXIS: {exam.get('axis_od', '-'):>7}")
-                    lines.append(f"  {'OS (Left Eye)':}")
-                    lines.append(f"    SPH: {exam.get('sphere_os', '-'):>8}")
-                    lines.append(f"    CYL: {exam.get('cylinder_os', '-'):>8}")
-                    lines.append(f"    AXIS: {exam.get('axis_os', '-'):>7}")
-                    lines.append(f"  IPD: {exam.get('ipd', '-')}")
-                    lines.append(f"{'-'*44}")
-                    lines.append(f"  {_('Lens Type')}: {exam.get('lens_info', '-')}")
-                    lines.append(f"  {_('Frame')}: {exam.get('frame_info', '-')}")
-                    lines.append(f"  {_('Color')}: {exam.get('frame_color', '-')}")
-                    lines.append(f"  {_('Frame Status')}: {exam.get('frame_status', '-')}")
-            else:
-                lines.append(f"{_('No examination data')}")
-
-            lines.extend([
-                f"{'='*44}",
-            ])
-            return "\n".join([l for l in lines if l])
+        settings = self.context.settings
+        receipt = dict(
+            shop_context(settings),
+            invoice_no=self.invoice_no,
+            date=datetime.datetime.now(),
+            delivery_date=getattr(self, "delivery_date", None),
+            customer={"name": customer_name, "phone": customer_phone},
+            doctor_name=self.doctor_name,
+            items=self.cart_items,
+            examinations=self.examinations,
+            totals=self.totals,
+        )
+        # Shop copy: full details; customer copy: no prescriptions;
+        # lab copy: invoice and prescriptions only, no customer info or accessories
+        templates = {"shop": "shop_copy", "customer": "customer_copy", "lab": "lab_copy"}
 
         # Preview display
         preview_text = ft.Text("", font_family="Courier New", size=11)
@@ -1363,32 +1258,18 @@ class _POSController:
         )
 
         def show_preview(copy_type):
-            if copy_type == "shop":
-                preview_text.value = build_shop_copy()
-            elif copy_type == "customer":
-                preview_text.value = build_customer_copy()
-            elif copy_type == "lab":
-                preview_text.value = build_lab_copy()
+            preview_text.value = render_text(templates[copy_type], receipt)
             self._page.update()
 
         def print_copy(copy_type):
-            if copy_type == "shop":
-                content = build_shop_copy()
-            elif copy_type == "customer":
-                content = build_customer_copy()
-            elif copy_type == "lab":
-                content = build_lab_copy()
-            print(content)
+            spool(self._page, templates[copy_type], receipt, settings, role="lab" if copy_type == "lab" else "receipt")
             self._page.snack_bar = ft.SnackBar(ft.Text(f"✓ {_('Sent to printer')}"))
             self._page.snack_bar.open = True
             self._page.update()
 
         def print_all(e):
-            print(build_shop_copy())
-            print("\n" + "="*50 + "\n")
-            print(build_customer_copy())
-            print("\n" + "="*50 + "\n")
-            print(build_lab_copy())
+            for copy_type in ("shop", "customer", "lab"):
+                spool(self._page, templates[copy_type], receipt, settings, role="lab" if copy_type == "lab" else "receipt")
             self._page.snack_bar = ft.SnackBar(ft.Text(f"✓ {_('All copies sent to printer')}"))
             self._page.snack_bar.open = True
             self._page.update()
@@ -1,5 +1,7 @@
 import flet as ft
 from app.core.i18n import _
+from app.core.receipts import shop_context
+from app.core.print_spooler import spool
 import datetime
 import subprocess
 import os
@@ -20,65 +22,14 @@ def PrescriptionView(page: ft.Page, repo, customer_id):
 
     def print_prescription(record):
         """Print a prescription record."""
-        shop_name = repo.get_setting("shop_name", "Optical Shop")
-
+        settings = repo.get_settings()
+        document = dict(shop_context(settings), customer={"name": customer_name}, exam=record["data"])
         if record["type"] == "prescription":
-            p = record["data"]
-            lines = [
-                f"{'='*44}",
-                f"{shop_name:^44}",
-                f"{'='*44}",
-                f"{_('Prescription')}",
-                f"{_('Customer')}: {customer_name}",
-                f"{_('Date')}: {p.get('created_at', '')[:10] if p.get('created_at') else 'N/A'}",
-                f"{_('Type')}: {p.get('type', 'N/A')}",
-                f"{_('Doctor')}: {p.get('doctor_name', 'N/A')}",
-                f"{'='*44}",
-                f"OD (Right Eye):",
-                f"  SPH: {p.get('sphere_od', '-')}",
-                f"  CYL: {p.get('cylinder_od', '-')}",
-                f"  AXIS: {p.get('axis_od', '-')}",
-                f"",
-                f"OS (Left Eye):",
-                f"  SPH: {p.get('sphere_os', '-')}",
-                f"  CYL: {p.get('cylinder_os', '-')}",
-                f"  AXIS: {p.get('axis_os', '-')}",
-                f"{'='*44}",
-            ]
-            if p.get('notes'):
-                lines.append(f"{_('Notes')}: {p.get('notes')}")
+            document["prescription"] = record["data"]
+            spool(page, "prescription", document, settings)
         else:
-            e = record["data"]
-            sale = record.get("sale", {})
-            lines = [
-                f"{'='*44}",
-                f"{shop_name:^44}",
-                f"{'='*44}",
-                f"{_('Order Exam')} - #{sale.get('invoice_no', 'N/A')}",
-                f"{_('Customer')}: {customer_name}",
-                f"{_('Date')}: {sale.get('order_date', '')[:10] if sale.get('order_date') else 'N/A'}",
-                f"{_('Type')}: {e.get('exam_type', 'N/A')}",
-                f"{'='*44}",
-                f"OD (Right Eye):",
-                f"  SPH: {e.get('sphere_od', '-')}",
-                f"  CYL: {e.get('cylinder_od', '-')}",
-                f"  AXIS: {e.get('axis_od', '-')}",
-                f"",
-                f"OS (Left Eye):",
-                f"  SPH: {e.get('sphere_os', '-')}",
-                f"  CYL: {e.get('cylinder_os', '-')}",
-                f"  AXIS: {e.get('axis_os', '-')}",
-                f"",
-                f"IPD: {e.get('ipd', '-')}",
-                f"{'='*44}",
-                f"{_('Lens Type')}: {e.get('lens_info', '-')}",
-                f"{_('Frame')}: {e.get('frame_info', '-')}",
-                f"{_('Color')}: {e.get('frame_color', '-')}",
-                f"{'='*44}",
-            ]
-
-        content = "\n".join(lines)
-        print(content)
+            document["sale"] = record.get("sale", {})
+            spool(page, "order_exam", document, settings)
         page.snack_bar = ft.SnackBar(ft.Text(f"✓ {_('Sent to printer')}"))
         page.snack_bar.open = True
         page.update()
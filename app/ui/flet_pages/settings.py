@@ -9,16 +9,19 @@ def SettingsView(page: ft.Page, repo):
 
     # --- Shop Settings Tab ---
     def create_shop_settings():
-        shop_name = ft.TextField(label=_("Shop Name"), value=repo.get_setting("shop_name", "Lensy Optical"), expand=True)
-        shop_address = ft.TextField(label=_("Address"), value=repo.get_setting("store_address", ""), expand=True, multiline=True, min_lines=2)
-        shop_phone = ft.TextField(label=_("Phone"), value=repo.get_setting("store_phone", ""), expand=True)
-        currency = ft.TextField(label=_("Currency"), value=repo.get_setting("currency", "EGP"), width=100)
+        settings = repo.get_settings()
+        shop_name = ft.TextField(label=_("Shop Name"), value=settings.get("shop_name", "Lensy Optical"), expand=True)
+        shop_address = ft.TextField(label=_("Address"), value=settings.get("store_address", ""), expand=True, multiline=True, min_lines=2)
+        shop_phone = ft.TextField(label=_("Phone"), value=settings.get("store_phone", ""), expand=True)
+        currency = ft.TextField(label=_("Currency"), value=settings.get("currency", "EGP"), width=100)
 
         def save_settings(e):
-            repo.set_setting("shop_name", shop_name.value)
-            repo.set_setting("store_address", shop_address.value)
-            repo.set_setting("store_phone", shop_phone.value)
-            repo.set_setting("currency", currency.value)
+            repo.set_settings({
+                "shop_name": shop_name.value,
+                "store_address": shop_address.value,
+                "store_phone": shop_phone.value,
+                "currency": currency.value,
+            })
             page.snack_bar = ft.SnackBar(ft.Text(_("Settings saved successfully!")))
             page.snack_bar.open = True
             page.update()
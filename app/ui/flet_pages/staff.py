@@ -15,6 +15,9 @@ def StaffView(page: ft.Page, repo):
                 term in u.get("username", "").lower() or
                 term in (u.get("full_name") or "").lower()]
 
+        # One bulk compile for the whole list instead of per-user lookups
+        effective = repo.get_effective_permissions([u["id"] for u in users])
+
         if not users:
             items_list.controls.append(
                 ft.ListTile(title=ft.Text(_("No staff members found"), italic=True, color=ft.colors.GREY_700))
@@ -23,6 +26,7 @@ def StaffView(page: ft.Page, repo):
             for u in users:
                 role_name = u.get("role", {}).get("name") if u.get("role") else _("No Role")
                 is_active = u.get("is_active", True)
+                perm_count = len(effective.get(str(u["id"]), {}))
 
                 items_list.controls.append(
                     ft.Card(
@@ -37,7 +41,7 @@ def StaffView(page: ft.Page, repo):
                                     height=50
                                 ),
                                 title=ft.Text(u.get("username", ""), weight=ft.FontWeight.BOLD),
-                                subtitle=ft.Text(f"{u.get('full_name', 'N/A')} | {_('Role')}: {role_name}"),
+                                subtitle=ft.Text(f"{u.get('full_name', 'N/A')} | {_('Role')}: {role_name} | {_('Permissions')}: {perm_count}"),
                                 trailing=ft.Row([
                                     ft.Container(
                                         ft.Text(_("Active") if is_active else _("Inactive"), size=12, color=ft.colors.WHITE),
@@ -7,7 +7,7 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, QTimer
 from app.database.db_manager import get_engine, get_session
 from app.database.models import Product, StockMovement, Supplier, Purchase, LensType, FrameType, FrameColor, ContactLensType, SaleItem
-from app.core.permissions import has_permission
+from app.core.permissions import check_permission, user_permissions
 from app.ui.product_dialog import ProductDialog
 from app.ui.supplier_dialog import SupplierDialog
 from app.ui.purchase_dialog import PurchaseDialog
@@ -22,7 +22,7 @@ class InventoryWindow(QWidget):
         
         # Permission check
         session = get_session(get_engine())
-        allowed, _v = has_permission(session, self.user.id, "VIEW_PRODUCTS")
+        allowed, _v = check_permission(user_permissions(session, self.user.id), "VIEW_PRODUCTS")
         session.close()
         
         if not allowed:
@@ -8,7 +8,6 @@ from PySide6.QtCore import Qt
 from app.database.db_manager import get_engine, get_session
 from app.database.models import Sale, Customer, OrderExamination
 from app.core.i18n import _
-from app.core.permissions import has_permission
 from app.core.state import state
 
 class LabWindow(QWidget):
@@ -10,11 +10,12 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, QDate, Signal, QTimer, QUrl
 from PySide6.QtGui import QStandardItemModel, QStandardItem, QIntValidator, QDesktopServices
-from app.database.db_manager import get_engine, get_session, get_setting, get_next_invoice_no
+from app.database.db_manager import get_engine, get_session, get_setting, get_next_invoice_no, peek_next_invoice_no
 from app.database.models import (
     Product, Sale, SaleItem, StockMovement, Customer, OrderExamination, Warehouse, Prescription, LensType
 )
 from app.core.i18n import _
+from app.core.inventory_service import InventoryService
 from app.core.state import state
 
 class SearchableComboBox(QComboBox):
@@ -977,7 +978,7 @@ class POSWindow(QWidget):
         if self.current_customer:
             self.title_label.setText(f"{_('Order & Examination')} - {self.current_customer.name}")
             session = get_session(get_engine())
-            self.invoice_label.setText(f"{_('Invoice:')} {get_next_invoice_no(session)}")
+            self.invoice_label.setText(f"{_('Invoice:')} {peek_next_invoice_no(session)}")
             self.update_past_exams(session)
             session.close()
         
@@ -1192,8 +1193,7 @@ class POSWindow(QWidget):
                 # Deduct frame from inventory (if it's a new frame - status "New")
                 status = self.exam_table.cellWidget(row, 11).currentText()
                 if status == _("New") and frame_product_id:
-                    wh = session.query(Warehouse).first()
-                    move = StockMovement(product_id=frame_product_id, warehouse_id=wh.id if wh else None, qty=-1, type="sale", ref_no=invoice_no, note=f"POS Sale: {invoice_no}")
+                    move = StockMovement(product_id=frame_product_id, warehouse_id=InventoryService.default_warehouse_id(session), qty=-1, type="sale", ref_no=invoice_no, note=f"POS Sale: {invoice_no}")
                     session.add(move)
                     affected_product_ids.add(frame_product_id)
                     if frame_prod:
@@ -1232,16 +1232,9 @@ class POSWindow(QWidget):
 
             session.commit()
             
-            # Cleanup unused lens types
+            # Cleanup lens types this edit left unused
             if old_lens_names:
-                for old_name in old_lens_names:
-                    # Check if this lens name is used by any other order
-                    count = session.query(OrderExamination).filter_by(lens_info=old_name).count()
-                    if count == 0:
-                        # Not used anymore, delete from LensType
-                        lens_type = session.query(LensType).filter_by(name=old_name).first()
-                        if lens_type:
-                            session.delete(lens_type)
+                InventoryService.cleanup_unused_lens_types(session, names=old_lens_names)
                 session.commit()
 
             self.current_sale = sale
@@ -268,10 +268,11 @@ class ProductDialog(QDialog):
         self.sku_auto_generated = False
 
     def generate_sku_for_category(self, cat, force=False):
-        from app.database.db_manager import generate_sku
+        # Preview only; the SKU is reserved in save_product if the user keeps it
+        from app.database.db_manager import peek_sku
         session = get_session(get_engine())
         try:
-            new_sku = generate_sku(session, cat)
+            new_sku = peek_sku(session, cat)
             current = self.sku_input.text().strip()
             if force or (not current) or getattr(self, 'sku_auto_generated', False):
                 self.sku_input.setText(new_sku)
@@ -364,7 +365,10 @@ class ProductDialog(QDialog):
             if self.product:
                 p = session.query(Product).get(self.product.id)
             else:
-                if sku:
+                if not sku or self.sku_auto_generated:
+                    from app.database.db_manager import generate_sku
+                    sku = generate_sku(session, self.category_input.currentData() or self.category_input.currentText())
+                else:
                     exists = session.query(Product).filter_by(sku=sku).first()
                     if exists:
                         QMessageBox.warning(self, _("Error"), f"{_('SKU')} '{sku}' {_('already exists.')}")
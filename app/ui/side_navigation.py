@@ -6,7 +6,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, Q
 from PySide6.QtCore import Qt, Signal
 from app.core.i18n import _
 from app.database.db_manager import get_engine, session_scope
-from app.core.permissions import has_permission
+from app.core.permissions import user_permissions
 from app.database.models import Customer, Product
 
 logger = logging.getLogger(__name__)
@@ -98,13 +98,14 @@ class TopNavigation(QWidget):
         # permission checks using session_scope
         engine = get_engine()
         with session_scope(engine) as session:
-            can_create_sale, _v = has_permission(session, self.user.id, "CREATE_SALE")
-            can_view_products, _v = has_permission(session, self.user.id, "VIEW_PRODUCTS")
-            can_view_prescriptions, _v = has_permission(session, self.user.id, "VIEW_PRESCRIPTIONS")
-            can_view_reports, _v = has_permission(session, self.user.id, "REPORT_DAILY_SALES")
-            can_view_lab, _v = has_permission(session, self.user.id, "VIEW_LAB")
-            can_manage_users, _v = has_permission(session, self.user.id, "MANAGE_USERS")
-            can_manage_settings, _v = has_permission(session, self.user.id, "MANAGE_SETTINGS")
+            perms = user_permissions(session, self.user.id)
+        can_create_sale = "CREATE_SALE" in perms
+        can_view_products = "VIEW_PRODUCTS" in perms
+        can_view_prescriptions = "VIEW_PRESCRIPTIONS" in perms
+        can_view_reports = "REPORT_DAILY_SALES" in perms
+        can_view_lab = "VIEW_LAB" in perms
+        can_manage_users = "MANAGE_USERS" in perms
+        can_manage_settings = "MANAGE_SETTINGS" in perms
 
         nav_items = [("dashboard", _("Dashboard"))]
         
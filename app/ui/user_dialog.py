@@ -119,6 +119,9 @@ class UserDialog(QDialog):
                         QMessageBox.warning(self, _("Error"), f"{_('Username')} '{username}' {_('already exists.')}")
                         return
                 
+                if u.role_id != role_id:
+                    from app.core.permissions import bump_permissions_version
+                    bump_permissions_version(session)
                 u.username = username
                 u.full_name = full_name
                 u.role_id = role_id
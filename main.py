@@ -5,6 +5,10 @@ import flet as ft
 import os
 
 from app.database.repository import POSRepository
+from app.core.events import connect_session, ChangeEvent, CUSTOMER, PRODUCT, SALE, DASHBOARD, UPDATE
+from app.core.search_index import shared_search_index
+from app.core.dashboard_snapshot import shared_dashboard, DEFAULT_REFRESH_INTERVAL, REFRESH_INTERVAL_SETTING
+from app.core.print_spooler import shared_spooler
 from app.ui.flet_pages.dashboard import DashboardView
 from app.ui.flet_pages.inventory import InventoryView
 from app.ui.flet_pages.customers import CustomersView
@@ -46,6 +50,32 @@ def main(page: ft.Page):
     # Initialize Repository
     repo = POSRepository()
 
+    # Top bar search: one index per process, loaded once and patched with each write
+    search_index = shared_search_index(repo)
+
+    # Writes are broadcast to every session; views patch the rows they show
+    changes = connect_session(page, repo, shared=[search_index.on_change])
+
+    # Dashboard figures: one worker per process, refreshed off the UI thread; a logged-in
+    # session subscribes and gets each snapshot through its feed
+    dashboard = shared_dashboard(
+        repo, interval=float(repo.get_setting(REFRESH_INTERVAL_SETTING) or DEFAULT_REFRESH_INTERVAL)
+    )
+    changes.subscribe(dashboard.on_change, SALE, CUSTOMER, PRODUCT, keep=True)
+    page.data["dashboard"] = dashboard
+
+    def publish_dashboard(stats):
+        changes.dispatch(ChangeEvent(DASHBOARD, "stats", UPDATE, stats))
+
+    def end_dashboard_subscription():
+        unsubscribe = page.data.pop("dashboard_subscription", None)
+        if unsubscribe is not None:
+            unsubscribe()
+    page.data["end_dashboard_subscription"] = end_dashboard_subscription
+
+    # Printing: one spooler per process, so sessions sharing a printer share its queue
+    page.data["print_spooler"] = shared_spooler(repo)
+
     # Initialize License Manager (for desktop builds)
     license_manager = None
     if ENABLE_LICENSING and not is_web:
@@ -58,6 +88,8 @@ def main(page: ft.Page):
 
     def on_login_success(user):
         page.data["user"] = user
+        end_dashboard_subscription()
+        page.data["dashboard_subscription"] = dashboard.subscribe(publish_dashboard)
         page.go("/")
 
     def on_license_activated():
@@ -88,6 +120,7 @@ def main(page: ft.Page):
 
     def route_change(e):
         page.views.clear()
+        changes.clear()
         
         # License Guard (for desktop builds with licensing enabled)
         if license_manager and page.route != "/activate":
@@ -144,6 +177,11 @@ def main(page: ft.Page):
             page.go(top_view.route)
 
     page.on_route_change = route_change
+    def on_session_close(e):
+        end_dashboard_subscription()
+        changes.clear()
+
+    page.on_close = on_session_close
     page.on_view_pop = view_pop
 
     # Initial Navigation - check license first (for desktop), then login
@@ -13,7 +13,9 @@ def run():
     os.chdir(current_dir)
     
     try:
-        from web_app import app
+        from web_app import app, engine
+        from app.database.migrations import run_migrations
+        run_migrations(engine)
         app.run(host='0.0.0.0', port=5000)
     except ImportError:
         print("❌ Error: Flask not found. Please run: pip install Flask")
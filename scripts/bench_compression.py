@@ -0,0 +1,65 @@
+# scripts/bench_compression.py
+"""
+Print the bytes sent per page by the web bridge for identity, gzip and brotli
+encodings, against a throwaway SQLite database seeded with sample rows.
+
+Usage: python scripts/bench_compression.py [rows]
+"""
+import os, sys, tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import web_app
+from app.core.permissions import seed_permissions, seed_roles_and_bindings
+from app.database.db_manager import get_engine
+from app.database.models import Base, User, Product, StockMovement, Customer, Sale, SaleItem
+
+PAGES = ['/', '/inventory', '/customers', '/sales', '/lab', '/api/inventory', '/api/customers']
+ENCODINGS = ['identity', 'gzip', 'br']
+
+
+def seed(session, rows):
+    session.add(User(username='admin', password_hash='x', full_name='Admin'))
+    session.commit()
+    seed_permissions(session)
+    seed_roles_and_bindings(session)
+    for i in range(rows):
+        customer = Customer(name=f'Customer {i:04d}', phone=f'010{i:07d}', city='Cairo')
+        product = Product(name=f'Frame Model {i:04d}', sku=f'2{i:04d}', category='Frame', sale_price=450)
+        session.add_all([customer, product])
+        session.flush()
+        session.add(StockMovement(product_id=product.id, qty=5, type='purchase'))
+        sale = Sale(invoice_no=f'{i + 1:06d}', customer_id=customer.id, total_amount=450,
+                    net_amount=450, payment_method='Cash')
+        session.add(sale)
+        session.flush()
+        session.add(SaleItem(sale_id=sale.id, product_id=product.id, qty=1, unit_price=450, total_price=450))
+    session.commit()
+    return session.query(User).filter_by(username='admin').one().id
+
+
+def main(rows=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = get_engine(f"sqlite:///{os.path.join(tmp, 'pos.db')}")
+        Base.metadata.create_all(engine)
+        web_app.engine = engine
+        web_app.SessionLocal.configure(bind=engine)
+        with web_app.SessionLocal() as s:
+            admin_id = seed(s, rows)
+
+        client = web_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+
+        print(f"{'page':<18}" + ''.join(f'{e:>12}' for e in ENCODINGS))
+        for page in PAGES:
+            sizes = []
+            for encoding in ENCODINGS:
+                response = client.get(page, headers={'Accept-Encoding': encoding})
+                sent = response.headers.get('Content-Encoding', 'identity')
+                sizes.append(f'{len(response.get_data()):,}' if sent == encoding else 'n/a')
+            print(f'{page:<18}' + ''.join(f'{s:>12}' for s in sizes))
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
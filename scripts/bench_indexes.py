@@ -0,0 +1,108 @@
+# scripts/bench_indexes.py
+"""
+Time the lookups the windows run most, on a database laid out like an
+existing pos.db (no secondary indexes), then again after run_migrations().
+
+Usage: python scripts/bench_indexes.py [sales]
+"""
+import os, sys, time, random, tempfile, datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+
+from app.database.db_manager import get_engine
+from app.database.migrations import run_migrations
+from app.database.models import (
+    Base, Product, StockMovement, Customer, Sale, SaleItem, OrderExamination, Prescription
+)
+from sqlalchemy.orm import sessionmaker
+
+REPEAT = 50
+
+
+def build(engine, n_sales):
+    Base.metadata.create_all(engine)
+    # Old databases were created before the indexes were declared
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(conn)
+
+    rnd = random.Random(7)
+    start = datetime.datetime(2024, 1, 1)
+    n_products, n_customers = n_sales // 10, n_sales // 3
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), [
+            {"id": i, "name": f"Product {i}", "sku": f"2{i:06d}", "barcode": f"622{i:09d}", "category": "Frame"}
+            for i in range(1, n_products + 1)])
+        conn.execute(Customer.__table__.insert(), [
+            {"id": i, "name": f"Customer {i}", "phone": f"010{i:08d}"} for i in range(1, n_customers + 1)])
+        conn.execute(Prescription.__table__.insert(), [
+            {"customer_id": rnd.randint(1, n_customers)} for _ in range(n_customers)])
+        conn.execute(Sale.__table__.insert(), [
+            {"id": i, "invoice_no": f"{i:06d}", "customer_id": rnd.randint(1, n_customers),
+             "total_amount": 100, "net_amount": 100, "payment_method": "Cash",
+             "order_date": start + datetime.timedelta(minutes=10 * i),
+             "lab_status": rnd.choice(["Not Started", "In Lab", "Ready", "Delivered", "Delivered", "Delivered"])}
+            for i in range(1, n_sales + 1)])
+        conn.execute(SaleItem.__table__.insert(), [
+            {"sale_id": i, "product_id": rnd.randint(1, n_products), "qty": 1, "unit_price": 100, "total_price": 100}
+            for i in range(1, n_sales + 1) for _ in range(2)])
+        conn.execute(OrderExamination.__table__.insert(), [
+            {"sale_id": i, "exam_type": "Distance"} for i in range(1, n_sales + 1)])
+        conn.execute(StockMovement.__table__.insert(), [
+            {"product_id": rnd.randint(1, n_products), "qty": rnd.choice([5, -1]), "type": "sale"}
+            for _ in range(n_sales * 3)])
+    return n_products, n_customers
+
+
+def queries(n_products, n_customers):
+    rnd = random.Random(11)
+    day = datetime.datetime(2024, 6, 1)
+    return {
+        "stock of one product": lambda s: s.query(func.sum(StockMovement.qty)).filter(
+            StockMovement.product_id == rnd.randint(1, n_products)).scalar(),
+        "customer's sales": lambda s: s.query(Sale).filter(Sale.customer_id == rnd.randint(1, n_customers)).all(),
+        "one day's sales": lambda s: s.query(Sale).filter(
+            Sale.order_date >= day, Sale.order_date < day + datetime.timedelta(days=1)).all(),
+        "lab queue": lambda s: s.query(Sale).filter(Sale.lab_status == "In Lab").order_by(
+            Sale.order_date.desc()).limit(50).all(),
+        "sale items": lambda s: s.query(SaleItem).filter(SaleItem.sale_id == rnd.randint(1, 1000)).all(),
+        "sale exams": lambda s: s.query(OrderExamination).filter(OrderExamination.sale_id == rnd.randint(1, 1000)).all(),
+        "customer prescriptions": lambda s: s.query(Prescription).filter(
+            Prescription.customer_id == rnd.randint(1, n_customers)).all(),
+        "customer by phone": lambda s: s.query(Customer).filter(
+            Customer.phone == f"010{rnd.randint(1, n_customers):08d}").first(),
+        "product by barcode": lambda s: s.query(Product).filter(
+            Product.barcode == f"622{rnd.randint(1, n_products):09d}").first(),
+    }
+
+
+def measure(engine, sizes):
+    timings = {}
+    with sessionmaker(bind=engine)() as s:
+        for name, run in queries(*sizes).items():
+            t0 = time.perf_counter()
+            for _ in range(REPEAT):
+                run(s)
+            timings[name] = (time.perf_counter() - t0) / REPEAT * 1000
+    return timings
+
+
+def main(n_sales=30000):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = get_engine(f"sqlite:///{os.path.join(tmp, 'pos.db')}")
+        print(f"Seeding {n_sales:,} sales...")
+        sizes = build(engine, n_sales)
+        before = measure(engine, sizes)
+        run_migrations(engine)
+        after = measure(engine, sizes)
+        engine.dispose()
+
+    print(f"\n{'query':<26}{'before ms':>12}{'after ms':>12}")
+    for name in before:
+        print(f"{name:<26}{before[name]:>12.3f}{after[name]:>12.3f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30000)
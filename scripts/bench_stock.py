@@ -0,0 +1,103 @@
+# scripts/bench_stock.py
+"""
+Compare the old row-by-row stock code in InventoryService with the
+set-based queries, on a throwaway database with 1M stock movements.
+
+Usage: python scripts/bench_stock.py [movements]
+"""
+import os, sys, time, random, tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.inventory_service import InventoryService
+from app.database.db_manager import get_engine
+from app.database.migrations import run_migrations
+from app.database.models import Base, Product, Warehouse, StockMovement, LensType, OrderExamination, Sale
+
+N_PRODUCTS = 2000
+N_LENS_TYPES = 300
+ORDER_LINES = 20
+
+
+def seed(engine, n_movements):
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    rnd = random.Random(3)
+    with engine.begin() as conn:
+        conn.execute(Warehouse.__table__.insert(), [{"id": 1, "name": "Main"}])
+        conn.execute(Product.__table__.insert(), [
+            {"id": i, "name": f"P{i}", "sku": f"0{i:05d}"} for i in range(1, N_PRODUCTS + 1)])
+        batch = []
+        for _ in range(n_movements):
+            batch.append({"product_id": rnd.randint(1, N_PRODUCTS), "warehouse_id": 1,
+                          "qty": rnd.choice([10, -1, -1, -2]), "type": "sale"})
+            if len(batch) == 50000:
+                conn.execute(StockMovement.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(StockMovement.__table__.insert(), batch)
+        conn.execute(LensType.__table__.insert(), [{"name": f"Lens {i}"} for i in range(N_LENS_TYPES)])
+        conn.execute(Sale.__table__.insert(), [{"id": 1, "invoice_no": "000001", "total_amount": 0,
+                                                "net_amount": 0, "payment_method": "Cash"}])
+        conn.execute(OrderExamination.__table__.insert(), [
+            {"sale_id": 1, "lens_info": f"Lens {rnd.randrange(N_LENS_TYPES // 2)}"} for _ in range(50000)])
+
+
+# The implementations this replaced, kept here for comparison
+def old_available_stock(session, product_id):
+    return sum(m.qty for m in session.query(StockMovement).filter_by(product_id=product_id).all())
+
+
+def old_deduct_order(session, lines):
+    for product_id, qty in lines.items():
+        wh = session.query(Warehouse).first()
+        if old_available_stock(session, product_id) < qty:
+            return False
+        session.add(StockMovement(product_id=product_id, warehouse_id=wh.id, qty=-qty, type="sale"))
+    return True
+
+
+def old_cleanup(session):
+    deleted = 0
+    for lens_type in session.query(LensType).all():
+        if session.query(OrderExamination).filter_by(lens_info=lens_type.name).count() == 0:
+            session.delete(lens_type)
+            deleted += 1
+    return deleted
+
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:<44}{(time.perf_counter() - t0) * 1000:>10.1f} ms")
+    return result
+
+
+def main(n_movements=1_000_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = get_engine(f"sqlite:///{os.path.join(tmp, 'pos.db')}", profile='bulk-import')
+        print(f"Seeding {n_movements:,} movements...")
+        seed(engine, n_movements)
+        Session = sessionmaker(bind=engine)
+        lines = {pid: 1 for pid in random.Random(5).sample(range(1, N_PRODUCTS + 1), ORDER_LINES)}
+
+        with Session() as s:
+            timed("old: stock of one product", lambda: old_available_stock(s, 1))
+            timed("new: stock of one product", lambda: InventoryService.get_available_stock(1, s))
+            timed(f"old: stock of {ORDER_LINES} products", lambda: [old_available_stock(s, p) for p in lines])
+            timed(f"new: stock of {ORDER_LINES} products (bulk)",
+                  lambda: InventoryService.get_available_stock_many(lines, s))
+            timed(f"old: deduct {ORDER_LINES}-line order", lambda: old_deduct_order(s, lines))
+            s.rollback()
+            timed(f"new: deduct {ORDER_LINES}-line order", lambda: InventoryService.deduct_stock_many(lines, session=s))
+            s.rollback()
+            timed(f"old: cleanup {N_LENS_TYPES} lens types", lambda: old_cleanup(s) and s.flush())
+            s.rollback()
+            timed(f"new: cleanup {N_LENS_TYPES} lens types", lambda: InventoryService.cleanup_unused_lens_types(s))
+            s.rollback()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
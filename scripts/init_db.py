@@ -9,12 +9,14 @@ from app.database.models import (
     LensType, FrameType, FrameColor, ContactLensType
 )
 from app.database.db_manager import get_engine, get_session, set_setting
+from app.database.migrations import run_migrations
 from app.core.permissions import seed_permissions, seed_roles_and_bindings
 from passlib.hash import bcrypt
 
 def init_db():
     engine = get_engine()
     Base.metadata.create_all(engine)
+    run_migrations(engine)
     return engine
 
 def seed_core(engine):
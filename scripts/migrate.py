@@ -0,0 +1,19 @@
+# scripts/migrate.py
+"""
+Bring an existing database up to the current schema version in place.
+
+Usage: python scripts/migrate.py [db_url]    (defaults to the app's pos.db)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.db_manager import get_engine, DEFAULT_DB_URL
+from app.database.migrations import run_migrations, current_version
+
+if __name__ == '__main__':
+    engine = get_engine(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_URL)
+    applied = run_migrations(engine)
+    if not applied:
+        print("Schema already up to date.")
+    print(f"✓ Schema version {current_version(engine)}")
@@ -15,7 +15,7 @@ from app.database.db_manager import get_engine, get_session, set_setting
 from app.core.permissions import seed_permissions, seed_roles_and_bindings
 
 def reset_and_seed():
-    engine = get_engine()
+    engine = get_engine(profile='bulk-import')
     
     # Close any existing connections if possible (SQLite might lock)
     # Since we are running as a separate script, it should be fine unless the main app is open.
@@ -1,4 +1,5 @@
-const CACHE_NAME = 'lensypos-v1';
+const CACHE_NAME = 'lensypos-v2';
+const API_CACHE = 'lensypos-api-v2';  // v1 was kept across sign-outs
 const ASSETS = [
   '/',
   '/login',
@@ -12,7 +13,65 @@ self.addEventListener('install', event => {
   );
 });
 
+self.addEventListener('activate', event => {
+  // Drop caches from older versions of this worker
+  event.waitUntil(
+    caches.keys().then(keys => Promise.all(
+      keys.filter(key => key !== CACHE_NAME && key !== API_CACHE).map(key => caches.delete(key))
+    ))
+  );
+});
+
+// Cached API answers belong to whoever was signed in; signing out or in
+// (any navigation to /logout or /login) starts over with an empty cache.
+function clearApiCache() {
+  return caches.delete(API_CACHE);
+}
+
+// Signed out: login_required answers with a redirect to /login, the API with 401/403.
+function isUnauthorized(response) {
+  return response.redirected || response.status === 401 || response.status === 403;
+}
+
+// Stale-while-revalidate for the JSON API: answer from cache at once, then
+// refresh it in the background. The refresh is a conditional request (the
+// server sends ETags), so an unchanged list costs a bodiless 304. A refresh
+// that finds the session gone drops the cache instead.
+function staleWhileRevalidate(event) {
+  return caches.open(API_CACHE).then(cache =>
+    cache.match(event.request).then(cached => {
+      const network = fetch(event.request).then(response => {
+        if (isUnauthorized(response)) {
+          return clearApiCache().then(() => response);
+        }
+        if (response.ok) {
+          cache.put(event.request, response.clone());
+        }
+        return response;
+      }).catch(() => cached);
+
+      if (cached) {
+        event.waitUntil(network);
+        return cached;
+      }
+      return network;
+    })
+  );
+}
+
 self.addEventListener('fetch', event => {
+  const url = new URL(event.request.url);
+  const sameOrigin = url.origin === self.location.origin;
+  if (event.request.method === 'GET' && sameOrigin && url.pathname.startsWith('/api/')) {
+    event.respondWith(staleWhileRevalidate(event));
+    return;
+  }
+  if (event.request.mode === 'navigate' && sameOrigin && (url.pathname === '/logout' || url.pathname === '/login')) {
+    event.respondWith(
+      clearApiCache().then(() => fetch(event.request)).catch(() => caches.match(event.request))
+    );
+    return;
+  }
   event.respondWith(
     fetch(event.request).catch(() => caches.match(event.request))
   );
@@ -254,6 +254,498 @@ CREATE TABLE IF NOT EXISTS settings (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- ============================================
+-- COUNTERS (invoice numbers, SKUs)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Atomically advance a counter and return its new value. The row lock taken by
+-- ON CONFLICT DO UPDATE serializes concurrent terminals; p_floor only applies
+-- when the counter is created (to continue from numbers issued before it existed).
+CREATE OR REPLACE FUNCTION next_counter(p_key TEXT, p_count BIGINT DEFAULT 1, p_floor BIGINT DEFAULT 0)
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+    INSERT INTO counters (key, value, updated_at)
+    VALUES (p_key, p_floor + p_count, NOW())
+    ON CONFLICT (key) DO UPDATE
+        SET value = counters.value + p_count, updated_at = NOW()
+    RETURNING value;
+$$;
+
+-- Highest sequence already used by an invoice series, to seed its counter.
+-- A series' numbers are p_stem followed by digits only; other series and
+-- legacy numbers are skipped, and sequences compare as numbers, not text.
+CREATE OR REPLACE FUNCTION max_invoice_seq(p_stem TEXT DEFAULT '')
+RETURNS BIGINT
+LANGUAGE sql STABLE
+AS $$
+    SELECT COALESCE(MAX(substr(invoice_no, length(p_stem) + 1)::BIGINT), 0)
+    FROM sales
+    WHERE left(invoice_no, length(p_stem)) = p_stem
+      AND substr(invoice_no, length(p_stem) + 1) ~ '^[0-9]{1,18}$';
+$$;
+
+-- ============================================
+-- STOCK CHECK-AND-DEDUCT
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements(product_id);
+
+-- Lock the products' rows and report what a cart can't be given. The rows are
+-- locked FOR UPDATE (in id order, so two carts can't deadlock) until the end
+-- of the caller's transaction, so a second terminal selling the same product
+-- waits until this one has written its movements and then sees them. Lines are
+-- [{product_id, qty}], one per product with qty > 0; returns the shortfalls as
+-- [{product_id, requested, available}].
+CREATE OR REPLACE FUNCTION stock_shortfalls(p_items JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_product_ids UUID[];
+    v_shortfalls JSONB;
+BEGIN
+    SELECT array_agg((line->>'product_id')::UUID) INTO v_product_ids
+    FROM jsonb_array_elements(p_items) AS line;
+
+    PERFORM 1 FROM inventory
+    WHERE id = ANY(v_product_ids)
+    ORDER BY id
+    FOR UPDATE;
+
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+               'product_id', r.product_id, 'requested', r.qty, 'available', r.stock)), '[]'::JSONB)
+    INTO v_shortfalls
+    FROM (
+        SELECT (line->>'product_id')::UUID AS product_id,
+               (line->>'qty')::INTEGER AS qty,
+               (SELECT COALESCE(SUM(m.qty), 0) FROM stock_movements m
+                WHERE m.product_id = (line->>'product_id')::UUID) AS stock
+        FROM jsonb_array_elements(p_items) AS line
+    ) r
+    WHERE r.stock < r.qty;
+
+    RETURN v_shortfalls;
+END;
+$$;
+
+-- Book 'sale' movements for lines stock_shortfalls() has passed: from the
+-- default (first) warehouse, then from the other locations holding stock, so
+-- no location goes negative.
+CREATE OR REPLACE FUNCTION deduct_stock(p_items JSONB, p_ref_no TEXT DEFAULT '', p_note TEXT DEFAULT '')
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_line RECORD;
+    v_held RECORD;
+    v_left INTEGER;
+    v_take INTEGER;
+BEGIN
+    FOR v_line IN
+        SELECT (line->>'product_id')::UUID AS product_id, (line->>'qty')::INTEGER AS qty
+        FROM jsonb_array_elements(p_items) AS line
+    LOOP
+        v_left := v_line.qty;
+        FOR v_held IN
+            SELECT b.warehouse_id, b.qty FROM stock_balances b
+            JOIN warehouses w ON w.id = b.warehouse_id
+            WHERE b.product_id = v_line.product_id AND b.qty > 0
+            ORDER BY w.created_at, w.id
+        LOOP
+            EXIT WHEN v_left <= 0;
+            v_take := LEAST(v_left, v_held.qty);
+            INSERT INTO stock_movements (product_id, warehouse_id, qty, type, ref_no, note)
+            VALUES (v_line.product_id, v_held.warehouse_id, -v_take, 'sale', p_ref_no, p_note);
+            v_left := v_left - v_take;
+        END LOOP;
+        IF v_left > 0 THEN
+            -- No warehouse given: the default-warehouse trigger places it
+            INSERT INTO stock_movements (product_id, qty, type, ref_no, note)
+            VALUES (v_line.product_id, -v_left, 'sale', p_ref_no, p_note);
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- Check and deduct stock for a whole cart in one transaction. Returns the
+-- shortfalls; when it is non-empty nothing was deducted.
+CREATE OR REPLACE FUNCTION reserve_and_deduct(p_items JSONB, p_ref_no TEXT DEFAULT '', p_note TEXT DEFAULT '')
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_shortfalls JSONB;
+BEGIN
+    v_shortfalls := stock_shortfalls(p_items);
+    IF jsonb_array_length(v_shortfalls) = 0 THEN
+        PERFORM deduct_stock(p_items, p_ref_no, p_note);
+    END IF;
+    RETURN v_shortfalls;
+END;
+$$;
+
+-- Save a whole sale in one transaction: lock and check the stock, allocate the
+-- invoice number (unless p_sale carries one), book the stock movements and
+-- insert the sale with its items and examinations. A short cart writes
+-- nothing and uses up no invoice number; a failure anywhere rolls it all back.
+--   p_stock: [{product_id, qty}] as for stock_shortfalls()
+--   p_counter_key / p_stem: the invoice series' counter and the text before the
+--   sequence, which is zero-padded to p_width
+-- Returns {"shortfalls": [...], "sale": the inserted row or null}.
+CREATE OR REPLACE FUNCTION create_sale(p_sale JSONB, p_items JSONB, p_exams JSONB, p_stock JSONB,
+                                       p_counter_key TEXT, p_stem TEXT DEFAULT '', p_width INTEGER DEFAULT 6)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_shortfalls JSONB;
+    v_invoice_no TEXT := NULLIF(p_sale->>'invoice_no', '');
+    v_floor BIGINT := 0;
+    v_seq BIGINT;
+    v_sale sales;
+BEGIN
+    v_shortfalls := stock_shortfalls(p_stock);
+    IF jsonb_array_length(v_shortfalls) > 0 THEN
+        RETURN jsonb_build_object('shortfalls', v_shortfalls, 'sale', NULL);
+    END IF;
+
+    IF v_invoice_no IS NULL THEN
+        -- A new counter continues from the numbers issued before it existed
+        IF NOT EXISTS (SELECT 1 FROM counters WHERE key = p_counter_key) THEN
+            v_floor := max_invoice_seq(p_stem);
+        END IF;
+        v_seq := next_counter(p_counter_key, 1, v_floor);
+        v_invoice_no := p_stem || lpad(v_seq::TEXT, GREATEST(p_width, length(v_seq::TEXT)), '0');
+    END IF;
+
+    PERFORM deduct_stock(p_stock, v_invoice_no, 'POS Sale: ' || v_invoice_no);
+
+    INSERT INTO sales (invoice_no, customer_id, user_id, total_amount, discount, net_amount, amount_paid,
+                       payment_method, doctor_name, lab_status, order_date, delivery_date)
+    SELECT v_invoice_no, s.customer_id, s.user_id, COALESCE(s.total_amount, 0), COALESCE(s.discount, 0),
+           COALESCE(s.net_amount, 0), COALESCE(s.amount_paid, 0), COALESCE(s.payment_method, 'Cash'),
+           s.doctor_name, COALESCE(s.lab_status, 'Not Started'), COALESCE(s.order_date, NOW()), s.delivery_date
+    FROM jsonb_populate_record(NULL::sales, p_sale) AS s
+    RETURNING * INTO v_sale;
+
+    INSERT INTO sale_items (sale_id, product_id, name, qty, unit_price, total_price)
+    SELECT v_sale.id, i.product_id, i.name, COALESCE(i.qty, 1), COALESCE(i.unit_price, 0), COALESCE(i.total_price, 0)
+    FROM jsonb_populate_recordset(NULL::sale_items, p_items) AS i;
+
+    INSERT INTO order_examinations (sale_id, exam_type, sphere_od, cylinder_od, axis_od, sphere_os, cylinder_os,
+                                    axis_os, ipd, lens_info, frame_info, frame_color, frame_status, doctor_name,
+                                    image_path)
+    SELECT v_sale.id, e.exam_type, e.sphere_od, e.cylinder_od, e.axis_od, e.sphere_os, e.cylinder_os,
+           e.axis_os, e.ipd, e.lens_info, e.frame_info, e.frame_color, e.frame_status, e.doctor_name,
+           e.image_path
+    FROM jsonb_populate_recordset(NULL::order_examinations, p_exams) AS e;
+
+    RETURN jsonb_build_object('shortfalls', '[]'::JSONB, 'sale', to_jsonb(v_sale));
+END;
+$$;
+
+-- ============================================
+-- PER-WAREHOUSE STOCK
+-- ============================================
+
+ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS warehouse_id UUID REFERENCES warehouses(id);
+
+-- Running stock per product and location, kept by the trigger below, so
+-- per-location lists never sum the ledger
+CREATE TABLE IF NOT EXISTS stock_balances (
+    product_id UUID NOT NULL REFERENCES inventory(id) ON DELETE CASCADE,
+    warehouse_id UUID NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
+    qty INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, warehouse_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_balances_warehouse ON stock_balances(warehouse_id, product_id);
+
+-- Movements saved without a location go to the first warehouse
+CREATE OR REPLACE FUNCTION stock_movements_default_warehouse()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.warehouse_id IS NULL THEN
+        SELECT id INTO NEW.warehouse_id FROM warehouses ORDER BY created_at, id LIMIT 1;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS stock_movements_default_warehouse ON stock_movements;
+CREATE TRIGGER stock_movements_default_warehouse
+    BEFORE INSERT ON stock_movements
+    FOR EACH ROW EXECUTE FUNCTION stock_movements_default_warehouse();
+
+CREATE OR REPLACE FUNCTION stock_movements_balance()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.warehouse_id IS NOT NULL THEN
+        INSERT INTO stock_balances (product_id, warehouse_id, qty)
+        VALUES (OLD.product_id, OLD.warehouse_id, -OLD.qty)
+        ON CONFLICT (product_id, warehouse_id) DO UPDATE SET qty = stock_balances.qty + EXCLUDED.qty;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.warehouse_id IS NOT NULL THEN
+        INSERT INTO stock_balances (product_id, warehouse_id, qty)
+        VALUES (NEW.product_id, NEW.warehouse_id, NEW.qty)
+        ON CONFLICT (product_id, warehouse_id) DO UPDATE SET qty = stock_balances.qty + EXCLUDED.qty;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS stock_movements_balance ON stock_movements;
+CREATE TRIGGER stock_movements_balance
+    AFTER INSERT OR UPDATE OR DELETE ON stock_movements
+    FOR EACH ROW EXECUTE FUNCTION stock_movements_balance();
+
+-- Existing ledgers: give old movements the default location, then set every
+-- balance from the ledger (safe to re-run)
+UPDATE stock_movements
+SET warehouse_id = (SELECT id FROM warehouses ORDER BY created_at, id LIMIT 1)
+WHERE warehouse_id IS NULL;
+INSERT INTO stock_balances (product_id, warehouse_id, qty)
+SELECT product_id, warehouse_id, SUM(qty) FROM stock_movements
+WHERE warehouse_id IS NOT NULL
+GROUP BY product_id, warehouse_id
+ON CONFLICT (product_id, warehouse_id) DO UPDATE SET qty = EXCLUDED.qty;
+
+-- Move stock between locations: two 'transfer' movements in one transaction,
+-- under the same product row lock as reserve_and_deduct(). Returns the
+-- shortfall (same shape as reserve_and_deduct) or '[]' when moved.
+CREATE OR REPLACE FUNCTION transfer_stock(p_product_id UUID, p_from UUID, p_to UUID, p_qty INTEGER, p_note TEXT DEFAULT '')
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_available INTEGER;
+BEGIN
+    PERFORM 1 FROM inventory WHERE id = p_product_id FOR UPDATE;
+
+    SELECT COALESCE((SELECT qty FROM stock_balances
+                     WHERE product_id = p_product_id AND warehouse_id = p_from), 0)
+    INTO v_available;
+
+    IF v_available < p_qty THEN
+        RETURN jsonb_build_array(jsonb_build_object(
+            'product_id', p_product_id, 'requested', p_qty, 'available', v_available));
+    END IF;
+
+    INSERT INTO stock_movements (product_id, warehouse_id, qty, type, note) VALUES
+        (p_product_id, p_from, -p_qty, 'transfer', p_note),
+        (p_product_id, p_to, p_qty, 'transfer', p_note);
+    RETURN '[]'::JSONB;
+END;
+$$;
+
+-- Permission maps are compiled once per login; any change to grants, overrides
+-- or a user's role bumps this version so open sessions recompile theirs.
+CREATE OR REPLACE FUNCTION bump_permissions_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM next_counter('permissions');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS role_permissions_version ON role_permissions;
+CREATE TRIGGER role_permissions_version
+    AFTER INSERT OR UPDATE OR DELETE ON role_permissions
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_permissions_version();
+
+DROP TRIGGER IF EXISTS user_permissions_version ON user_permissions;
+CREATE TRIGGER user_permissions_version
+    AFTER INSERT OR UPDATE OR DELETE ON user_permissions
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_permissions_version();
+
+DROP TRIGGER IF EXISTS users_role_version ON users;
+CREATE TRIGGER users_role_version
+    AFTER UPDATE OF role_id ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_permissions_version();
+
+-- Terminals cache the settings and re-read them when this version moves
+CREATE OR REPLACE FUNCTION bump_settings_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM next_counter('settings');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS settings_version ON settings;
+CREATE TRIGGER settings_version
+    AFTER INSERT OR UPDATE OR DELETE ON settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_settings_version();
+
+-- ============================================
+-- SALES HISTORY SEARCH
+-- ============================================
+
+-- What is still owed, stored so the payment filters can use an index
+ALTER TABLE sales ADD COLUMN IF NOT EXISTS balance_due DECIMAL(10,2)
+    GENERATED ALWAYS AS (COALESCE(net_amount, 0) - COALESCE(amount_paid, 0)) STORED;
+
+-- The history list filters on the customer's name as well as the sale's own
+-- columns; PostgREST can only OR filters over one relation, so search a view.
+CREATE OR REPLACE VIEW sales_search AS
+SELECT s.*, c.name AS customer_name
+FROM sales s
+LEFT JOIN customers c ON c.id = s.customer_id;
+
+-- Newest first, with id breaking ties for the keyset cursor
+CREATE INDEX IF NOT EXISTS idx_sales_order_date ON sales(order_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_sales_lab_status ON sales(lab_status, order_date DESC);
+CREATE INDEX IF NOT EXISTS idx_sales_balance_due ON sales(order_date DESC) WHERE balance_due > 0;
+
+-- Substring (ILIKE '%term%') search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_sales_invoice_trgm ON sales USING gin (invoice_no gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_sales_doctor_trgm ON sales USING gin (doctor_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_name_trgm ON customers USING gin (name gin_trgm_ops);
+
+-- ============================================
+-- CUSTOMER LEDGER
+-- ============================================
+
+-- Running totals per customer, kept by the triggers below in the same
+-- transaction as the sale, payment or prescription that changes them
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id UUID PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    total_net DECIMAL(12,2) NOT NULL DEFAULT 0,
+    total_paid DECIMAL(12,2) NOT NULL DEFAULT 0,
+    balance_due DECIMAL(12,2) NOT NULL DEFAULT 0,
+    last_order_date TIMESTAMP WITH TIME ZONE,
+    rx_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id, order_date DESC);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_customer ON prescriptions(customer_id);
+
+-- Add (p_sign = 1) or take away (p_sign = -1) one sale
+CREATE OR REPLACE FUNCTION customer_stats_apply_sale(p_sale sales, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date)
+    SELECT p_sale.customer_id, p_sign,
+           p_sign * COALESCE(p_sale.net_amount, 0),
+           p_sign * COALESCE(p_sale.amount_paid, 0),
+           p_sign * (COALESCE(p_sale.net_amount, 0) - COALESCE(p_sale.amount_paid, 0)),
+           (SELECT MAX(order_date) FROM sales WHERE customer_id = p_sale.customer_id)
+    WHERE p_sale.customer_id IS NOT NULL
+    ON CONFLICT (customer_id) DO UPDATE SET
+        order_count = customer_stats.order_count + EXCLUDED.order_count,
+        total_net = customer_stats.total_net + EXCLUDED.total_net,
+        total_paid = customer_stats.total_paid + EXCLUDED.total_paid,
+        balance_due = customer_stats.balance_due + EXCLUDED.balance_due,
+        last_order_date = EXCLUDED.last_order_date;
+$$;
+
+CREATE OR REPLACE FUNCTION sales_customer_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM customer_stats_apply_sale(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM customer_stats_apply_sale(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS sales_customer_stats ON sales;
+CREATE TRIGGER sales_customer_stats
+    AFTER INSERT OR DELETE OR UPDATE OF customer_id, net_amount, amount_paid, order_date ON sales
+    FOR EACH ROW EXECUTE FUNCTION sales_customer_stats();
+
+CREATE OR REPLACE FUNCTION prescriptions_customer_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE customer_stats SET rx_count = rx_count - 1 WHERE customer_id = OLD.customer_id;
+    ELSIF NEW.customer_id IS NOT NULL THEN
+        INSERT INTO customer_stats (customer_id, rx_count) VALUES (NEW.customer_id, 1)
+        ON CONFLICT (customer_id) DO UPDATE SET rx_count = customer_stats.rx_count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS prescriptions_customer_stats ON prescriptions;
+CREATE TRIGGER prescriptions_customer_stats
+    AFTER INSERT OR DELETE ON prescriptions
+    FOR EACH ROW EXECUTE FUNCTION prescriptions_customer_stats();
+
+-- Recompute the whole ledger (after a bulk import, or to check the triggers)
+CREATE OR REPLACE FUNCTION rebuild_customer_stats()
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    DELETE FROM customer_stats;
+    INSERT INTO customer_stats (customer_id, order_count, total_net, total_paid, balance_due, last_order_date, rx_count)
+    SELECT c.id, COALESCE(s.n, 0), COALESCE(s.net, 0), COALESCE(s.paid, 0),
+           COALESCE(s.net, 0) - COALESCE(s.paid, 0), s.last_order_date, COALESCE(p.n, 0)
+    FROM customers c
+    LEFT JOIN (SELECT customer_id, COUNT(*) AS n, SUM(COALESCE(net_amount, 0)) AS net,
+                      SUM(COALESCE(amount_paid, 0)) AS paid, MAX(order_date) AS last_order_date
+               FROM sales GROUP BY customer_id) s ON s.customer_id = c.id
+    LEFT JOIN (SELECT customer_id, COUNT(*) AS n FROM prescriptions GROUP BY customer_id) p ON p.customer_id = c.id
+    WHERE s.customer_id IS NOT NULL OR p.customer_id IS NOT NULL;
+$$;
+
+SELECT rebuild_customer_stats();
+
+-- The customer list: sortable and filterable by balance or last visit
+CREATE OR REPLACE VIEW customer_ledger AS
+SELECT c.*,
+       COALESCE(st.order_count, 0) AS order_count,
+       COALESCE(st.total_net, 0) AS total_net,
+       COALESCE(st.total_paid, 0) AS total_paid,
+       COALESCE(st.balance_due, 0) AS balance_due,
+       st.last_order_date,
+       COALESCE(st.rx_count, 0) AS rx_count
+FROM customers c
+LEFT JOIN customer_stats st ON st.customer_id = c.id;
+
+CREATE INDEX IF NOT EXISTS idx_customer_stats_balance ON customer_stats(balance_due DESC) WHERE balance_due > 0;
+CREATE INDEX IF NOT EXISTS idx_customer_stats_last_order ON customer_stats(last_order_date DESC);
+
+-- ============================================
+-- DASHBOARD
+-- ============================================
+
+-- Sales KPIs in one aggregate instead of shipping every sale to the client
+CREATE OR REPLACE FUNCTION dashboard_sales_totals()
+RETURNS TABLE (orders BIGINT, revenue NUMERIC, paid NUMERIC, pending BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT COUNT(*),
+           COALESCE(SUM(net_amount), 0),
+           COALESCE(SUM(amount_paid), 0),
+           COUNT(*) FILTER (WHERE lab_status IS NOT NULL AND lab_status <> 'Received')
+    FROM sales;
+$$;
+
 -- ============================================
 -- SEED DATA
 -- ============================================
@@ -276,6 +768,12 @@ INSERT INTO settings (key, value) VALUES
     ('store_phone', '000-000-0000')
 ON CONFLICT (key) DO NOTHING;
 
+-- Continue the default invoice series from existing numeric invoice numbers
+INSERT INTO counters (key, value)
+SELECT 'invoice::', COALESCE(MAX(invoice_no::BIGINT), 0)
+FROM sales WHERE invoice_no ~ '^[0-9]+$'
+ON CONFLICT (key) DO NOTHING;
+
 -- Insert default lens types
 INSERT INTO lens_types (name) VALUES ('Single Vision'), ('Bifocal'), ('Progressive')
 ON CONFLICT (name) DO NOTHING;
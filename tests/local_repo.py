@@ -0,0 +1,29 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.database import repository
+from app.database.repository import POSRepository
+
+
+class LocalRepositoryTestCase(unittest.TestCase):
+    """
+    Base for tests on the local JSON backend: self.repo (a repository_class)
+    works on its own data file, self.db_path, in a temporary directory that
+    is removed after each test. Repositories made during the test use it too.
+    """
+
+    repository_class = POSRepository
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_path = self.path("pos_data.json")
+        patcher = mock.patch.object(repository, "LOCAL_JSON_DB", self.db_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.repo = self.repository_class()
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
@@ -0,0 +1,134 @@
+import types
+import unittest
+from unittest import mock
+
+from app.core.events import (
+    ChangeEvent, ChangeFeed, connect_session, subscribe_changes, CHANGES_TOPIC,
+    SALE, STOCK, PRODUCT, CUSTOMER, INSERT, UPDATE, DELETE
+)
+from app.core.stock import InsufficientStockError
+from app.database.repository import POSRepository
+
+from local_repo import LocalRepositoryTestCase
+
+
+class FakeHub:
+    """Delivers synchronously to every session, like Flet's hub does across threads."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def client(self):
+        hub = self
+        return types.SimpleNamespace(
+            subscribe_topic=lambda topic, handler: hub.handlers.append((topic, handler)),
+            send_all_on_topic=lambda topic, message: [h(topic, message) for t, h in hub.handlers if t == topic],
+        )
+
+
+class TestChangeFeed(unittest.TestCase):
+    def test_dispatch_filters_by_entity_and_unsubscribes(self):
+        feed, seen = ChangeFeed(), []
+        unsubscribe = feed.subscribe(seen.append, SALE)
+        feed.subscribe(lambda e: seen.append(("any", e.entity)))
+
+        feed.on_message(CHANGES_TOPIC, ChangeEvent(SALE, "s1", UPDATE, {"lab_status": "Ready"}))
+        feed.on_message(CHANGES_TOPIC, ChangeEvent(STOCK, "p1", UPDATE))
+        feed.on_message(CHANGES_TOPIC, "not an event")
+        self.assertEqual(seen, [ChangeEvent(SALE, "s1", UPDATE), ("any", SALE), ("any", STOCK)])
+
+        unsubscribe()
+        feed.clear()
+        feed.dispatch(ChangeEvent(SALE, "s1", DELETE))
+        self.assertEqual(len(seen), 3)
+
+    def test_failing_handler_does_not_stop_others(self):
+        feed, seen = ChangeFeed(), []
+        feed.subscribe(lambda e: 1 / 0)
+        feed.subscribe(seen.append)
+        with mock.patch("builtins.print"):
+            feed.dispatch(ChangeEvent(CUSTOMER, "c1", DELETE))
+        self.assertEqual(len(seen), 1)
+
+    def test_subscribe_without_feed_is_a_noop(self):
+        page = types.SimpleNamespace(data={})
+        subscribe_changes(page, print)()
+
+
+class TestRepositoryEvents(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+
+        # Two terminals, each with its own repository, on one hub
+        hub = FakeHub()
+        self.pages, self.seen = [], []
+        for _ in range(2):
+            page = types.SimpleNamespace(data={}, pubsub=hub.client())
+            repo = POSRepository()
+            connect_session(page, repo)
+            seen = []
+            subscribe_changes(page, seen.append)
+            self.pages.append((page, repo))
+            self.seen.append(seen)
+
+    def events(self, terminal=1):
+        events = [(e.entity, e.id, e.op) for e in self.seen[terminal]]
+        self.seen[terminal].clear()
+        return events
+
+    def test_writes_reach_the_other_terminal(self):
+        _page, repo = self.pages[0]
+        item = repo.add_inventory_item({"name": "Frame", "category": "Frame", "sale_price": 450, "stock_qty": 5})
+        pid = item["id"]
+        self.assertEqual(self.seen[1][-1].data["stock_qty"], 5)
+        self.assertEqual(self.events(), [(PRODUCT, pid, INSERT)])
+
+        sale = repo.add_sale({"net_amount": 450, "lab_status": "Not Started"},
+                             [{"product_id": pid, "qty": 2, "unit_price": 450, "total_price": 900}])
+        inserted = self.seen[1][-1]
+        self.assertEqual(inserted.data["invoice_no"], sale["invoice_no"])
+        self.assertEqual(inserted.data["sale_items"][0]["qty"], 2)
+        self.assertEqual(self.events(), [(STOCK, pid, UPDATE), (SALE, sale["id"], INSERT)])
+
+        repo.update_sale_lab_status(sale["id"], "Ready")
+        repo.update_sale_payment(sale["id"], 200)
+        self.assertEqual([e.data for e in self.seen[1]], [{"lab_status": "Ready"}, {"amount_paid": 200}])
+        self.assertEqual(self.events(), [(SALE, sale["id"], UPDATE)] * 2)
+
+        customer = repo.add_customer({"name": "Mona"})
+        repo.delete_customer(customer["id"])
+        self.assertEqual(self.events(), [(CUSTOMER, customer["id"], INSERT), (CUSTOMER, customer["id"], DELETE)])
+        # The writer's own session hears the same events
+        self.assertEqual(len(self.events(terminal=0)), 7)
+
+    def test_rejected_sale_publishes_nothing(self):
+        _page, repo = self.pages[0]
+        pid = repo.add_inventory_item({"name": "Frame", "category": "Frame", "stock_qty": 1})["id"]
+        self.events()
+        with self.assertRaises(InsufficientStockError):
+            repo.add_sale({"net_amount": 900}, [{"product_id": pid, "qty": 2}])
+        self.assertEqual(repo.reserve_and_deduct([{"product_id": pid, "qty": 3}]),
+                         [{"product_id": pid, "requested": 3, "available": 1}])
+        self.assertEqual(self.events(), [])
+
+    def test_shared_handlers_hear_each_write_once(self):
+        hub, shared = FakeHub(), []
+        repos = []
+        for _ in range(3):
+            repo = POSRepository()
+            connect_session(types.SimpleNamespace(data={}, pubsub=hub.client()), repo, shared=[shared.append])
+            repos.append(repo)
+        customer = repos[0].add_customer({"name": "Mona"})
+        repos[2].update_customer(customer["id"], {"name": "Mona Samir"})
+        self.assertEqual([(e.id, e.op) for e in shared], [(customer["id"], INSERT), (customer["id"], UPDATE)])
+
+    def test_publisher_error_does_not_fail_the_write(self):
+        _page, repo = self.pages[0]
+        repo.set_change_publisher(lambda event: 1 / 0)
+        with mock.patch("builtins.print"):
+            customer = repo.add_customer({"name": "Mona"})
+        self.assertEqual(repo.get_customers()[-1]["id"], customer["id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
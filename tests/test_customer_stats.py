@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy.orm import sessionmaker
+
+from app.database.db_manager import get_engine, ensure_customer_stats, rebuild_customer_stats
+from app.database.models import Base, Customer, CustomerStats, Prescription, Sale
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestLocalCustomerLedger(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mona = self.repo.add_customer({"name": "Mona"})["id"]
+        self.ali = self.repo.add_customer({"name": "Ali"})["id"]
+        self.sid = self.repo.add_sale({"customer_id": self.mona, "net_amount": 500, "amount_paid": 100,
+                                       "order_date": "2026-02-01T10:00:00"}, [])["id"]
+        self.repo.add_sale({"customer_id": self.mona, "net_amount": 200, "amount_paid": 200,
+                            "order_date": "2026-01-15T10:00:00"}, [])
+        self.repo.add_sale({"customer_id": self.ali, "net_amount": 300, "amount_paid": 0,
+                            "order_date": "2026-03-01T10:00:00"}, [])
+        self.repo.add_prescription({"customer_id": self.mona, "sphere_od": "-1.00"})
+
+    def test_writes_keep_the_ledger(self):
+        self.repo.update_sale_payment(self.sid, 350)
+        stats = self.repo.get_customer_stats([self.mona, "nobody"])
+        self.assertEqual(stats[self.mona], {
+            "order_count": 2, "total_net": 700.0, "total_paid": 550.0, "balance_due": 150.0,
+            "last_order_date": "2026-02-01T10:00:00", "rx_count": 1,
+        })
+        self.assertEqual(stats["nobody"]["order_count"], 0)
+
+        incremental = self.repo.get_customer_stats([self.mona, self.ali])
+        self.repo.rebuild_customer_stats()
+        self.assertEqual(self.repo.get_customer_stats([self.mona, self.ali]), incremental)
+
+        self.repo.delete_customer(self.ali)
+        self.assertNotIn(self.ali, self.repo._read_local()["customer_stats"])
+
+    def test_sort_and_filter_by_ledger(self):
+        def names(**kwargs):
+            return [c["name"] for c in self.repo.get_customers_page(0, 10, **kwargs)[0]]
+
+        self.repo.add_customer({"name": "Walk-in regular"})
+        self.repo.add_customer({"name": "bassem"})
+        self.assertEqual(names(), ["Ali", "bassem", "Mona", "Walk-in regular"])
+        self.assertEqual(names(sort="balance"), ["Mona", "Ali", "bassem", "Walk-in regular"])
+        self.assertEqual(names(sort="recent"), ["Ali", "Mona"])
+        self.repo.update_sale_payment(self.sid, 500)
+        self.assertEqual(names(with_balance=True), ["Ali"])
+        customer = self.repo.get_customers_page(0, 1, search="mona")[0][0]
+        self.assertEqual((customer["order_count"], customer["rx_count"]), (2, 1))
+
+    def test_file_from_before_the_ledger_is_built_once(self):
+        with open(self.db_path) as f:
+            data = json.load(f)
+        del data["customer_stats"]
+        with open(self.db_path, "w") as f:
+            json.dump(data, f)
+
+        self.assertEqual(self.repo.get_customer_stats([self.ali])[self.ali]["balance_due"], 300.0)
+        self.assertIn("customer_stats", self.repo._read_local())
+
+
+class TestSqliteCustomerLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'pos.db')}")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.customer = Customer(name="Mona")
+        self.session.add(self.customer)
+        self.session.commit()
+        # A sale from before the triggers existed is counted by the first build
+        self.session.add(self.sale("OLD-1", 100, 100))
+        self.session.commit()
+        ensure_customer_stats(self.engine)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def sale(self, invoice_no, net, paid):
+        return Sale(invoice_no=invoice_no, customer_id=self.customer.id, total_amount=net,
+                    net_amount=net, amount_paid=paid, payment_method="cash")
+
+    def stats(self):
+        self.session.expire_all()
+        row = self.session.get(CustomerStats, self.customer.id)
+        return row.order_count, row.total_net, row.total_paid, row.balance_due, row.rx_count
+
+    def test_triggers_follow_sales_payments_and_prescriptions(self):
+        self.assertEqual(self.stats(), (1, 100.0, 100.0, 0.0, 0))
+        sale = self.sale("S-1", 400, 50)
+        self.session.add_all([sale, Prescription(customer_id=self.customer.id)])
+        self.session.commit()
+        self.assertEqual(self.stats(), (2, 500.0, 150.0, 350.0, 1))
+
+        sale.amount_paid = 400
+        self.session.commit()
+        self.assertEqual(self.stats(), (2, 500.0, 500.0, 0.0, 1))
+
+        self.session.delete(sale)
+        self.session.commit()
+        self.assertEqual(self.stats(), (1, 100.0, 100.0, 0.0, 1))
+
+        with self.engine.begin() as conn:
+            rebuild_customer_stats(conn)
+        self.assertEqual(self.stats(), (1, 100.0, 100.0, 0.0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
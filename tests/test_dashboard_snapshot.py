@@ -0,0 +1,95 @@
+import queue
+import time
+import unittest
+from unittest import mock
+
+from app.core import dashboard_snapshot
+from app.core.dashboard_snapshot import DashboardSnapshot, DashboardStats
+from app.core.events import ChangeEvent, ChangeFeed, SALE, CUSTOMER, PRODUCT, STOCK, INSERT, UPDATE
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestDashboardSnapshot(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mona = self.repo.add_customer({"name": "Mona"})["id"]
+        self.repo.add_customer({"name": "Ali"})
+        self.repo.add_inventory_item({"name": "Aviator", "category": "Frame"})
+        for day, (net, paid, status) in enumerate([(500, 500, "Received"), (300, 100, "In Lab"), (200, 0, None)], 1):
+            self.repo.add_sale({"invoice_no": f"2026-0000{day}", "customer_id": self.mona if day < 3 else None,
+                                "net_amount": net, "amount_paid": paid, "lab_status": status,
+                                "order_date": f"2026-05-0{day}T09:00:00"}, [])
+
+    def test_figures(self):
+        stats = DashboardSnapshot(self.repo, recent=2).refresh()
+        self.assertEqual((stats.revenue, stats.balance, stats.orders, stats.pending), (1000.0, 400.0, 3, 1))
+        self.assertEqual((stats.customers, stats.products), (2, 1))
+        self.assertEqual([(o.invoice_no, o.customer_name) for o in stats.recent],
+                         [("2026-00003", None), ("2026-00002", "Mona")])
+        with self.assertRaises(AttributeError):
+            stats.revenue = 0
+
+    def test_events_that_wake_the_worker(self):
+        snapshot = DashboardSnapshot(self.repo)
+        snapshot._current = DashboardStats.from_figures(self.repo.get_dashboard_stats())
+        with mock.patch.object(snapshot, "request_refresh") as wake:
+            for event in [ChangeEvent(SALE, "s1", UPDATE, {"amount_paid": 10}),
+                          ChangeEvent(PRODUCT, "p1", INSERT, {"name": "Lens"}),
+                          ChangeEvent(CUSTOMER, self.mona, UPDATE, {"name": "Mona Adel"})]:
+                snapshot.on_change(event)
+            self.assertEqual(wake.call_count, 3)
+            for event in [ChangeEvent(PRODUCT, "p1", UPDATE, {"sale_price": 10}),
+                          ChangeEvent(STOCK, "p1", UPDATE),
+                          ChangeEvent(CUSTOMER, "someone-else", UPDATE, {"name": "X"})]:
+                snapshot.on_change(event)
+            self.assertEqual(wake.call_count, 3)
+
+    def test_worker_publishes_after_a_sale(self):
+        published = queue.Queue()
+        feed = ChangeFeed()
+        snapshot = DashboardSnapshot(self.repo, publish=published.put, interval=3600)
+        feed.subscribe(snapshot.on_change, SALE, CUSTOMER, PRODUCT, keep=True)
+        self.repo.set_change_publisher(feed.dispatch)
+        snapshot.start()
+        try:
+            self.assertEqual(published.get(timeout=5).orders, 3)
+            self.repo.update_sale_payment(self.repo.get_sales()[1]["id"], 300)
+            self.assertEqual(published.get(timeout=5).balance, 200.0)
+            self.assertEqual(snapshot.current.balance, 200.0)
+        finally:
+            snapshot.stop()
+
+    def test_one_worker_serves_every_session_and_pauses_without_them(self):
+        with mock.patch.object(dashboard_snapshot, "_shared", None):
+            snapshot = dashboard_snapshot.shared_dashboard(self.repo, interval=3600)
+            self.assertIs(dashboard_snapshot.shared_dashboard(self.repo), snapshot)
+            self.assertEqual(snapshot.interval, 3600)
+            self.assertIs(dashboard_snapshot.shared_dashboard(self.repo, interval=30), snapshot)
+            self.assertEqual(snapshot.interval, 30)   # a later session's setting is applied
+        first, second = queue.Queue(), queue.Queue()
+        leave_first = snapshot.subscribe(first.put)
+        leave_second = snapshot.subscribe(second.put)
+        try:
+            self.assertEqual(first.get(timeout=5).orders, 3)
+            self.assertEqual(second.get(timeout=5).orders, 3)
+
+            leave_first()
+            leave_second()
+            time.sleep(0.1)   # let a refresh already under way finish
+            while not first.empty():
+                first.get()
+            with mock.patch.object(self.repo, "get_dashboard_stats", wraps=self.repo.get_dashboard_stats) as read:
+                snapshot.request_refresh()
+                time.sleep(0.2)
+                read.assert_not_called()
+
+                snapshot.subscribe(first.put)
+                self.assertEqual(first.get(timeout=5).orders, 3)
+                read.assert_called()
+        finally:
+            snapshot.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import text
+
+from app.database import db_manager
+from app.database.models import Base, Customer
+
+
+class TestSqliteProfiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'pos.db')}"
+
+    def tearDown(self):
+        for key in [k for k in db_manager._engines if k[0] == self.url]:
+            db_manager._engines.pop(key).dispose()
+        self.tmp_dir.cleanup()
+
+    def pragma(self, engine, name):
+        with engine.connect() as conn:
+            return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    def test_profile_pragmas_are_applied(self):
+        desktop = db_manager.get_engine(self.url, profile='desktop')
+        server = db_manager.get_engine(self.url, profile='server')
+        self.assertIsNot(desktop, server)
+        self.assertIs(db_manager.get_engine(self.url, profile='desktop'), desktop)
+
+        self.assertEqual(self.pragma(desktop, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(desktop, "synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma(desktop, "temp_store"), 2)  # MEMORY
+        self.assertEqual(self.pragma(desktop, "busy_timeout"), 5000)
+        self.assertEqual(self.pragma(server, "cache_size"), -64000)
+        self.assertEqual(self.pragma(server, "busy_timeout"), 10000)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            db_manager.get_engine(self.url, profile='turbo')
+
+    def test_open_reader_does_not_block_writer(self):
+        server = db_manager.get_engine(self.url, profile='server')
+        desktop = db_manager.get_engine(self.url, profile='desktop')
+        Base.metadata.create_all(desktop)
+        with desktop.begin() as conn:
+            conn.execute(Customer.__table__.insert().values(name="First"))
+
+        with server.connect() as reader:
+            reader.exec_driver_sql("BEGIN")
+            self.assertEqual(reader.execute(text("SELECT count(*) FROM customers")).scalar(), 1)
+            # A report holding a read transaction open while the till saves
+            with desktop.begin() as writer:
+                writer.execute(Customer.__table__.insert().values(name="Second"))
+            # The reader keeps its snapshot until it ends its transaction
+            self.assertEqual(reader.execute(text("SELECT count(*) FROM customers")).scalar(), 1)
+            reader.exec_driver_sql("COMMIT")
+            self.assertEqual(reader.execute(text("SELECT count(*) FROM customers")).scalar(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.inventory_service import InventoryService
+from app.database.models import Base, Product, Warehouse, StockMovement, LensType, OrderExamination, Sale
+
+
+class TestSetBasedStock(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        s = self.session
+        s.add(Warehouse(name="Main"))
+        self.products = [Product(name=f"P{i}", sku=f"0{i:04d}") for i in range(3)]
+        s.add_all(self.products)
+        s.flush()
+        self.a, self.b, self.c = (p.id for p in self.products)
+        s.add_all([
+            StockMovement(product_id=self.a, qty=5, type="purchase"),
+            StockMovement(product_id=self.a, qty=-2, type="sale"),
+            StockMovement(product_id=self.b, qty=1, type="purchase"),
+        ])
+        s.commit()
+        InventoryService.clear_default_warehouse_cache()
+
+    def tearDown(self):
+        self.session.close()
+        InventoryService.clear_default_warehouse_cache()
+
+    def count_queries(self):
+        statements = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        return statements
+
+    def test_sum_aggregates(self):
+        self.assertEqual(InventoryService.get_available_stock(self.a, self.session), 3)
+        self.assertEqual(InventoryService.get_available_stock(self.c, self.session), 0)
+        self.assertEqual(
+            InventoryService.get_available_stock_many([self.a, self.b, self.c], self.session),
+            {self.a: 3, self.b: 1, self.c: 0}
+        )
+
+    def test_order_deduction_is_all_or_nothing(self):
+        self.assertFalse(InventoryService.deduct_stock_many({self.a: 2, self.b: 2}, session=self.session))
+        self.assertEqual(self.session.query(StockMovement).count(), 3)
+
+        self.assertTrue(InventoryService.deduct_stock_many({self.a: 2, self.b: 1}, ref_no="000001", session=self.session))
+        self.session.flush()
+        self.assertEqual(InventoryService.get_available_stock_many([self.a, self.b], self.session), {self.a: 1, self.b: 0})
+
+    def test_warehouse_lookup_is_cached(self):
+        InventoryService.deduct_stock(self.a, 1, session=self.session)
+        self.session.flush()
+        statements = self.count_queries()
+        self.assertTrue(InventoryService.deduct_stock(self.a, 1, session=self.session))
+        self.assertFalse([sql for sql in statements if "warehouses" in sql])
+
+    def test_cleanup_unused_lens_types_in_one_statement(self):
+        self.session.add_all([LensType(name=n) for n in ("Single Vision", "Bifocal", "Progressive")])
+        sale = Sale(invoice_no="000001", total_amount=0, net_amount=0, payment_method="Cash")
+        self.session.add(sale)
+        self.session.flush()
+        self.session.add_all([
+            OrderExamination(sale_id=sale.id, lens_info="Single Vision"),
+            OrderExamination(sale_id=sale.id, lens_info=None),
+        ])
+        self.session.commit()
+
+        self.assertEqual(InventoryService.cleanup_unused_lens_types(self.session, names=["Bifocal"]), 1)
+        statements = self.count_queries()
+        self.assertEqual(InventoryService.cleanup_unused_lens_types(self.session), 1)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([t.name for t in self.session.query(LensType)], ["Single Vision"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import multiprocessing
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.sequences import format_invoice_no, parse_invoice_seq, invoice_scope
+from app.database import repository, db_manager
+from app.database.models import Base, Sale, Setting
+from app.database.repository import POSRepository
+
+from local_repo import LocalRepositoryTestCase
+
+
+def _allocate_many(db_path, n, queue):
+    with mock.patch.object(repository, "LOCAL_JSON_DB", db_path):
+        repo = POSRepository()
+        queue.put([repo.allocate_invoice_no() for _ in range(n)])
+
+
+class TestInvoiceFormat(unittest.TestCase):
+    def test_default_series_keeps_plain_numbers(self):
+        self.assertEqual(format_invoice_no(42), "000042")
+        self.assertEqual(invoice_scope({}), ("", None))
+
+    def test_prefix_and_yearly_reset(self):
+        import datetime
+        prefix, year = invoice_scope(
+            {"invoice_prefix": "BR2", "invoice_yearly_reset": "true"}, today=datetime.date(2026, 3, 1)
+        )
+        self.assertEqual(format_invoice_no(7, prefix, year), "BR2-2026-000007")
+        self.assertEqual(parse_invoice_seq("BR2-2026-000007", prefix, year), 7)
+        self.assertIsNone(parse_invoice_seq("BR1-2026-000007", prefix, year))
+
+
+class TestRepositoryInvoiceAllocator(LocalRepositoryTestCase):
+    def test_peek_does_not_reserve(self):
+        self.assertEqual(self.repo.get_next_invoice_no(), "000001")
+        self.assertEqual(self.repo.get_next_invoice_no(), "000001")
+        self.assertEqual(self.repo.allocate_invoice_no(), "000001")
+        self.assertEqual(self.repo.get_next_invoice_no(), "000002")
+
+    def test_counter_continues_from_existing_sales(self):
+        data = self.repo._read_local()
+        data["sales"].append({"id": "s1", "invoice_no": "000120"})
+        self.repo._write_local(data)
+
+        self.assertEqual(self.repo.allocate_invoice_no(), "000121")
+        # Seeding happens once; later allocations do not rescan sales
+        with mock.patch.object(self.repo, "_read_local") as read:
+            self.assertEqual(self.repo.allocate_invoice_no(), "000122")
+        read.assert_not_called()
+
+    def test_series_are_independent(self):
+        self.repo.allocate_invoice_no()
+        self.repo.set_settings({"invoice_prefix": "BR2"})
+        self.assertEqual(self.repo.allocate_invoice_no(), "BR2-000001")
+        self.repo.set_settings({"invoice_prefix": ""})
+        self.assertEqual(self.repo.allocate_invoice_no(), "000002")
+
+    def test_add_sale_allocates_missing_number(self):
+        sale = self.repo.add_sale({"customer_id": None}, [])
+        self.assertEqual(sale["invoice_no"], "000001")
+
+    def test_concurrent_processes_get_unique_numbers(self):
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        procs = [ctx.Process(target=_allocate_many, args=(self.db_path, 20, queue)) for _ in range(4)]
+        for p in procs:
+            p.start()
+        numbers = [no for _ in procs for no in queue.get(timeout=60)]
+        for p in procs:
+            p.join()
+        self.assertEqual(len(numbers), 80)
+        self.assertEqual(sorted(numbers), [f"{i:06d}" for i in range(1, 81)])
+
+
+class TestSqlAlchemyInvoiceCounter(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_allocates_from_counter_and_seeds_from_sales(self):
+        self.session.add(Sale(invoice_no="000009", total_amount=0, net_amount=0, payment_method="Cash"))
+        self.session.commit()
+
+        self.assertEqual(db_manager.peek_next_invoice_no(self.session), "000010")
+        self.assertEqual(db_manager.get_next_invoice_no(self.session), "000010")
+        self.assertEqual(db_manager.get_next_invoice_no(self.session), "000011")
+        self.session.commit()
+        self.assertEqual(db_manager.peek_next_invoice_no(self.session), "000012")
+
+    def test_rollback_releases_number(self):
+        self.session.add(Setting(key="invoice_prefix", value="BR1"))
+        self.session.commit()
+        self.assertEqual(db_manager.get_next_invoice_no(self.session), "BR1-000001")
+        self.session.commit()
+        self.assertEqual(db_manager.get_next_invoice_no(self.session), "BR1-000002")
+        self.session.rollback()
+        self.assertEqual(db_manager.get_next_invoice_no(self.session), "BR1-000002")
+
+
+if __name__ == '__main__':
+    unittest.main()
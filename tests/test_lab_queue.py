@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+from app.core.lab_queue import LabQueue, NOT_STARTED, IN_LAB, READY, RECEIVED
+
+from local_repo import LocalRepositoryTestCase
+
+
+def sale(i, status, day):
+    return {"id": f"s{i}", "invoice_no": str(i), "lab_status": status, "order_date": f"2026-04-{day:02d}"}
+
+
+class TestLabQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = LabQueue([
+            sale(1, READY, 3), sale(2, NOT_STARTED, 5), sale(3, NOT_STARTED, 1),
+            sale(4, IN_LAB, 2), sale(5, None, 1), sale(6, "On Hold", 1),
+        ])
+
+    def ids(self, status=None):
+        return [s["id"] for s in self.queue.ordered(status)]
+
+    def test_board_order_and_counts(self):
+        self.assertEqual(self.ids(), ["s3", "s2", "s4", "s1", "s6"])
+        self.assertEqual(self.queue.counts(), {NOT_STARTED: 2, IN_LAB: 1, READY: 1, RECEIVED: 0, "On Hold": 1})
+        self.assertNotIn("s5", self.queue)
+
+    def test_transitions_move_between_buckets(self):
+        self.assertEqual(self.queue.move(["s3", "s2", "s4", "missing"], IN_LAB), ["s3", "s2"])
+        self.assertEqual(self.ids(IN_LAB), ["s3", "s4", "s2"])
+        self.assertEqual((self.queue.count(NOT_STARTED), self.queue.count(IN_LAB)), (0, 3))
+
+        # The echo of a write already applied changes nothing
+        self.assertFalse(self.queue.apply("s3", {"lab_status": IN_LAB}))
+        self.assertTrue(self.queue.apply("s3", {"order_date": "2026-04-09"}))
+        self.assertEqual(self.ids(IN_LAB), ["s4", "s2", "s3"])
+
+        self.assertTrue(self.queue.apply("s1", {"lab_status": None}))
+        self.assertNotIn("s1", self.queue)
+        self.assertEqual(self.queue.count(READY), 0)
+
+    def test_add_replaces_and_remove(self):
+        self.assertTrue(self.queue.add(sale(2, RECEIVED, 5)))
+        self.assertEqual((self.queue.count(NOT_STARTED), self.queue.count(RECEIVED)), (1, 1))
+        self.assertFalse(self.queue.add(sale(7, None, 1)))
+        self.assertEqual(self.queue.remove("s2")["lab_status"], RECEIVED)
+        self.assertIsNone(self.queue.remove("s2"))
+        self.assertEqual(len(self.queue), 4)
+
+
+class TestBulkLabStatus(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.repo._local_transaction() as data:
+            data["sales"] += [sale(i, NOT_STARTED, 1) for i in range(25)]
+
+    def test_many_orders_in_one_write(self):
+        events = []
+        self.repo.set_change_publisher(events.append)
+        ids = [f"s{i}" for i in range(20)]
+        with mock.patch.object(self.repo, "_write_local", wraps=self.repo._write_local) as write:
+            self.repo.update_sales_lab_status(ids, IN_LAB)
+        self.assertEqual(write.call_count, 1)
+
+        queue = LabQueue(self.repo.get_sales())
+        self.assertEqual((queue.count(IN_LAB), queue.count(NOT_STARTED)), (20, 5))
+        self.assertEqual([e.id for e in events], ids)
+        self.assertEqual(events[0].data, {"lab_status": IN_LAB})
+
+        self.repo.update_sale_lab_status("s24", READY)
+        self.assertEqual(LabQueue(self.repo.get_sales()).count(READY), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
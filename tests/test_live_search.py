@@ -0,0 +1,90 @@
+import threading
+import unittest
+
+from app.core.live_search import DebouncedSearch, customer_matches, normalize_query
+
+CUSTOMERS = [
+    {"id": 1, "name": "Ahmed Ali", "phone": "0100", "city": "Cairo"},
+    {"id": 2, "name": "Ahmed Samir", "phone": "0111", "city": "Giza"},
+    {"id": 3, "name": "Mona Adel", "phone": "0122", "city": "Cairo"},
+]
+
+
+class FakeBackend:
+    def __init__(self):
+        self.queries = []
+        self.gate = None  # set to an Event to hold searches until released
+
+    def search(self, query, limit):
+        self.queries.append(query)
+        if self.gate:
+            self.gate.wait(2)
+        return [c for c in CUSTOMERS if customer_matches(c, query)][:limit]
+
+
+class TestDebouncedSearch(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.delivered = []
+        self.done = threading.Event()
+
+        def on_results(query, results):
+            self.delivered.append((query, [c["id"] for c in results]))
+            self.done.set()
+
+        self.search = DebouncedSearch(self.backend.search, on_results, matches=customer_matches,
+                                      delay=0.05, limit=2)
+
+    def wait(self):
+        self.assertTrue(self.done.wait(2))
+        self.done.clear()
+
+    def test_burst_of_keystrokes_runs_one_search(self):
+        for text in ("a", "ah", "ahm", "Ahme"):
+            self.search.submit(text)
+        self.wait()
+        self.assertEqual(self.backend.queries, ["ahme"])
+        self.assertEqual(self.delivered, [("Ahme", [1, 2])])
+
+    def test_narrowing_uses_complete_cached_results(self):
+        self.search.submit("cairo")
+        self.wait()
+        self.search.submit("Cairo ")  # same normalized query, answered at once
+        self.wait()
+        self.search.submit("mona")    # not a prefix extension: goes to the backend
+        self.wait()
+        self.search.submit("0")       # 3 matches > limit 2: incomplete, not reused
+        self.wait()
+        self.search.submit("01")
+        self.wait()
+        self.assertEqual(self.backend.queries, ["cairo", "mona", "0", "01"])
+
+        self.search.submit("ahmed")
+        self.wait()
+        self.search.submit("ahmed s")
+        self.assertEqual(self.delivered[-1], ("ahmed s", [2]))
+        self.assertEqual(self.backend.queries[-1], "ahmed")
+
+    def test_stale_in_flight_results_are_dropped(self):
+        self.backend.gate = threading.Event()
+        self.search.submit("ahmed")
+        while not self.backend.queries:
+            threading.Event().wait(0.01)
+        self.search.submit("mona")  # arrives while "ahmed" is still running
+        self.backend.gate.set()
+        self.wait()
+        self.search.cancel()
+        self.assertEqual(self.delivered, [("mona", [3])])
+
+    def test_cancel_stops_pending_search(self):
+        self.search.submit("ahmed")
+        self.search.cancel()
+        self.assertFalse(self.done.wait(0.2))
+        self.assertEqual(self.backend.queries, [])
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  Ahmed   ALI "), "ahmed ali")
+
+
+if __name__ == "__main__":
+    unittest.main()
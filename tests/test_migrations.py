@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import inspect
+
+from app.database import db_manager, migrations
+from app.database.db_manager import get_engine
+from app.database.models import Base, ContactLensType
+
+
+class TestMigrationRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'pos.db')}")
+        # Lay the file out like a database created by an older release
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(conn)
+            ContactLensType.__table__.drop(conn)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def index_names(self, table):
+        return {ix["name"] for ix in inspect(self.engine).get_indexes(table)}
+
+    def test_upgrades_existing_database_in_place(self):
+        self.assertEqual(migrations.run_migrations(self.engine), [1, 2, 3, 4, 5])
+        self.assertEqual(migrations.current_version(self.engine), len(migrations.MIGRATIONS))
+        self.assertIn("contact_lens_types", inspect(self.engine).get_table_names())
+        self.assertIn("ix_stock_movements_product_id", self.index_names("stock_movements"))
+        self.assertIn("ix_sales_lab_status_order_date", self.index_names("sales"))
+        self.assertIn("ix_customers_phone", self.index_names("customers"))
+
+        with self.engine.connect() as conn:
+            plan = " ".join(str(row) for row in conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT * FROM sale_items WHERE sale_id = 1"))
+        self.assertIn("ix_sale_items_sale_id", plan)
+
+    def test_shipped_migrations_ignore_later_models(self):
+        engine = get_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'empty.db')}")
+        self.addCleanup(engine.dispose)
+        self.assertEqual(migrations.run_migrations(engine, migrations.MIGRATIONS[:2]), [1, 2])
+
+        tables = set(inspect(engine).get_table_names()) - {"schema_migrations", "sqlite_stat1"}
+        self.assertNotIn("stock_balances", tables)     # added later, by migration 3
+        self.assertNotIn("customer_stats", tables)     # and migration 4
+        self.assertLess(tables, set(Base.metadata.tables))
+        self.assertIn("ix_sales_customer_id", {ix["name"] for ix in inspect(engine).get_indexes("sales")})
+
+    def test_trigger_migrations_use_their_frozen_ddl(self):
+        def moved_on(conn):
+            raise AssertionError("a shipped migration called a live installer")
+
+        with mock.patch.object(db_manager, "install_stock_balances", moved_on), \
+                mock.patch.object(db_manager, "install_customer_stats", moved_on), \
+                mock.patch.object(db_manager, "install_default_warehouse", moved_on):
+            self.assertEqual(migrations.run_migrations(self.engine), [1, 2, 3, 4, 5])
+
+        # The same objects the live installers create on a new database
+        engine = get_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'live.db')}")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        db_manager.ensure_stock_balances(engine)
+        db_manager.ensure_customer_stats(engine)
+
+        def schema_objects(engine):
+            with engine.connect() as conn:
+                return set(conn.exec_driver_sql(
+                    "SELECT type, name FROM sqlite_master WHERE tbl_name IN "
+                    "('stock_balances', 'customer_stats') OR type = 'trigger'"))
+
+        self.assertEqual(schema_objects(self.engine), schema_objects(engine))
+
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO products (id, name, sku, category) VALUES (1, 'Frame', '20001', 'Frame')")
+            conn.exec_driver_sql("INSERT INTO warehouses (id, name) VALUES (7, 'Main')")
+            conn.exec_driver_sql("INSERT INTO stock_movements (product_id, qty, type) VALUES (1, 5, 'purchase')")
+            self.assertEqual(conn.exec_driver_sql("SELECT warehouse_id, qty FROM stock_balances WHERE qty != 0").all(),
+                             [(7, 5)])
+
+    def test_second_run_is_a_no_op(self):
+        migrations.run_migrations(self.engine)
+        self.assertEqual(migrations.run_migrations(self.engine), [])
+
+    def test_failed_migration_is_retried(self):
+        def broken(conn):
+            conn.exec_driver_sql("CREATE TABLE half_done (id INTEGER)")
+            raise RuntimeError("boom")
+
+        steps = migrations.MIGRATIONS + [(99, "broken", broken)]
+        with self.assertRaises(RuntimeError):
+            migrations.run_migrations(self.engine, steps)
+        self.assertNotIn(99, migrations.applied_versions(self.engine))
+        self.assertEqual(migrations.current_version(self.engine), len(migrations.MIGRATIONS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import datetime
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.pagination import keyset_page
+from app.database.models import Base, Sale
+
+
+class TestKeysetPage(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        day = datetime.datetime(2026, 3, 1, 9, 0)
+        for n, order_date in enumerate([day, day, day + datetime.timedelta(hours=1), day, day, day], 1):
+            self.session.add(Sale(invoice_no=f"2026-{n:05d}", total_amount=1, net_amount=1,
+                                  payment_method="Cash", order_date=order_date))
+        self.session.commit()
+        # Legacy rows without a date (the column default would fill one in on insert)
+        self.session.query(Sale).filter(Sale.id.in_([2, 4, 6])).update({Sale.order_date: None})
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def walk(self, descending):
+        seen, after = [], None
+        while True:
+            rows, after = keyset_page(self.session.query(Sale), [Sale.order_date, Sale.id], after, 2, descending)
+            seen += [sale.id for sale in rows]
+            if after is None:
+                return seen
+
+    def test_rows_without_a_date_are_paged_last(self):
+        self.assertEqual(self.walk(descending=True), [3, 5, 1, 6, 4, 2])
+        self.assertEqual(self.walk(descending=False), [1, 5, 3, 2, 4, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()
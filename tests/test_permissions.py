@@ -0,0 +1,142 @@
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core import permissions
+from app.core.events import PERMISSIONS
+from app.database.models import Base, Permission, Role, RolePermission, UserPermission, User
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestCompiledPermissions(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        s = self.session
+
+        perms = {code: Permission(code=code) for code in ("CREATE_SALE", "APPLY_DISCOUNT", "SALE_EDIT_MAX_DAYS", "VIEW_LAB")}
+        seller, tech = Role(name="Seller"), Role(name="Technician")
+        s.add_all(list(perms.values()) + [seller, tech])
+        s.flush()
+        s.add_all([
+            RolePermission(role_id=seller.id, permission_id=perms["CREATE_SALE"].id),
+            RolePermission(role_id=seller.id, permission_id=perms["APPLY_DISCOUNT"].id),
+            RolePermission(role_id=seller.id, permission_id=perms["SALE_EDIT_MAX_DAYS"].id, value="3"),
+            RolePermission(role_id=tech.id, permission_id=perms["VIEW_LAB"].id),
+        ])
+        self.alice = User(username="alice", password_hash="x", role_id=seller.id)
+        self.bob = User(username="bob", password_hash="x", role_id=tech.id)
+        s.add_all([self.alice, self.bob])
+        s.flush()
+        s.add_all([
+            UserPermission(user_id=self.alice.id, permission_id=perms["APPLY_DISCOUNT"].id, allow=False),
+            UserPermission(user_id=self.bob.id, permission_id=perms["CREATE_SALE"].id, allow=True),
+        ])
+        s.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_overrides_win_over_role_grants(self):
+        perms = permissions.compile_permissions(self.session, self.alice.id)
+        self.assertEqual(set(perms), {"CREATE_SALE", "SALE_EDIT_MAX_DAYS"})
+        self.assertEqual(permissions.check_permission(perms, "SALE_EDIT_MAX_DAYS"), (True, "3"))
+        self.assertEqual(permissions.check_permission(perms, "APPLY_DISCOUNT"), (False, None))
+        with self.assertRaises(TypeError):
+            perms["VIEW_LAB"] = None
+
+    def test_has_permission_keeps_its_contract(self):
+        self.assertEqual(permissions.has_permission(self.session, self.bob.id, "CREATE_SALE"), (True, None))
+        self.assertEqual(permissions.has_permission(self.session, 999, "CREATE_SALE"), (False, None))
+
+    def test_bulk_compile_uses_constant_queries(self):
+        user_ids = [self.alice.id, self.bob.id]
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", listener)
+        try:
+            effective = permissions.get_effective_permissions(self.session, user_ids)
+        finally:
+            event.remove(self.engine, "before_cursor_execute", listener)
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(set(effective[user_ids[1]]), {"VIEW_LAB", "CREATE_SALE"})
+
+    def test_version_bump(self):
+        self.assertEqual(permissions.get_permissions_version(self.session), 0)
+        permissions.bump_permissions_version(self.session)
+        self.session.commit()
+        self.assertEqual(permissions.get_permissions_version(self.session), 1)
+
+    def test_user_permissions_kept_until_version_moves(self):
+        self.addCleanup(permissions._compiled_maps.clear)
+        first = permissions.user_permissions(self.session, self.alice.id)
+        with mock.patch.object(permissions, "compile_permissions") as compile_:
+            self.assertIs(permissions.user_permissions(self.session, self.alice.id), first)
+        compile_.assert_not_called()
+
+        permissions.bump_permissions_version(self.session)
+        self.session.commit()
+        with mock.patch.object(permissions, "compile_permissions", return_value=permissions.EMPTY_PERMISSIONS):
+            self.assertEqual(dict(permissions.user_permissions(self.session, self.alice.id)), {})
+
+    def test_counters_table_probed_once_per_engine(self):
+        permissions.get_permissions_version(self.session)
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", listener)
+        try:
+            permissions.get_permissions_version(self.session)
+        finally:
+            event.remove(self.engine, "before_cursor_execute", listener)
+        self.assertEqual(len(statements), 1)
+
+
+class TestRepositoryPermissions(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+
+        data = self.repo._read_local()
+        data["permissions"] = [{"id": "p1", "code": "CREATE_SALE"}, {"id": "p2", "code": "VIEW_LAB"}]
+        data["role_permissions"] = [
+            {"role_id": "1", "permission_id": "p1"},
+            {"role_id": "1", "permission_id": "p2"},
+            {"role_id": "2", "permission_id": "p1"},
+        ]
+        data["user_permissions"] = [{"user_id": "1", "permission_id": "p2", "allow": False}]
+        self.repo._write_local(data)
+
+    def test_compile_reads_once(self):
+        with mock.patch.object(self.repo, "_read_local", wraps=self.repo._read_local) as read:
+            perms = self.repo.compile_permissions("1")
+        self.assertEqual(read.call_count, 1)
+        self.assertEqual(dict(perms), {"CREATE_SALE": None})
+        self.assertEqual(self.repo.has_permission("1", "VIEW_LAB"), (False, None))
+
+    def test_role_change_bumps_version(self):
+        user = self.repo.add_user({"username": "sam", "password_hash": "x", "role_id": "2"})
+        before = self.repo.get_permissions_version()
+
+        self.repo.update_user(user["id"], {"full_name": "Sam"})
+        self.assertEqual(self.repo.get_permissions_version(), before)
+
+        self.repo.update_user(user["id"], {"role_id": "1"})
+        self.assertEqual(self.repo.get_permissions_version(), before + 1)
+        effective = self.repo.get_effective_permissions(["1", user["id"]])
+        self.assertEqual(set(effective[user["id"]]), {"CREATE_SALE", "VIEW_LAB"})
+
+    def test_role_change_is_published(self):
+        user = self.repo.add_user({"username": "sam", "password_hash": "x", "role_id": "2"})
+        events = []
+        self.repo.set_change_publisher(events.append)
+
+        self.repo.update_user(user["id"], {"full_name": "Sam"})
+        self.repo.update_user(user["id"], {"role_id": "1"})
+        self.assertEqual([(e.entity, e.id) for e in events], [(PERMISSIONS, user["id"])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import types
+import unittest
+from unittest import mock
+
+from app.core.events import (ChangeEvent, connect_session, subscribe_changes, on_view_closed,
+                             METADATA, PRODUCT, STOCK, UPDATE, DELETE)
+from app.core.pos_context import POSContext
+from app.database.repository import POSRepository
+
+from local_repo import LocalRepositoryTestCase
+
+
+class CountingRepository(POSRepository):
+    """Counts the reads the context is meant to save."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def get_lens_types(self):
+        self.reads.append("lens_types")
+        return super().get_lens_types()
+
+    def get_inventory(self, *args, **kwargs):
+        self.reads.append("inventory")
+        return super().get_inventory(*args, **kwargs)
+
+
+class TestPOSContext(LocalRepositoryTestCase):
+    repository_class = CountingRepository
+
+    def setUp(self):
+        super().setUp()
+        self.frame = self.repo.add_inventory_item({"name": "Ray Ban", "category": "Frame", "sale_price": 900})
+        self.repo.add_inventory_item({"name": "Case", "category": "Accessory"})
+        self.repo.add_lens_type("Blue Cut")
+        self.repo.set_settings({"shop_name": "Lensy"})
+        self.repo.reads.clear()
+
+        self.page = page = types.SimpleNamespace(data={}, pubsub=types.SimpleNamespace(
+            subscribe_topic=lambda topic, handler: setattr(self, "handler", handler),
+            send_all_on_topic=lambda topic, message: self.handler(topic, message),
+        ))
+        connect_session(page, self.repo)
+        self.context = POSContext(self.repo).start()
+        subscribe_changes(page, self.context.on_change, METADATA, PRODUCT, STOCK)
+        on_view_closed(page, self.context.close)
+
+    def test_lists_are_read_once_for_many_rows(self):
+        for _ in range(5):
+            self.assertEqual([p["name"] for p in self.context.frames], ["Ray Ban"])
+            self.assertIn("Blue Cut", [lt["name"] for lt in self.context.lens_types])
+        self.assertEqual(self.context.settings["shop_name"], "Lensy")
+        self.assertEqual(self.context.frame_product("ray ban ")["id"], self.frame["id"])
+        self.assertIsNotNone(self.context.ensure_lens_type("blue cut"))
+        self.assertEqual(sorted(self.repo.reads), ["inventory", "lens_types"])
+
+    def test_writes_update_the_context_through_change_events(self):
+        self.context.frames  # wait for the background load
+        self.repo.add_frame_color("Tortoise")
+        created = self.repo.create_frame_product_if_needed("Oakley")
+        self.repo.update_inventory_item(self.frame["id"], {"sale_price": 950})
+        self.repo.set_settings({"shop_name": "Lensy Optics"})
+        self.context.on_change(ChangeEvent(PRODUCT, "unknown", UPDATE, {"sale_price": 1}))
+
+        self.assertEqual(self.context.frame_colors[-1]["name"], "Tortoise")
+        self.assertEqual([p["name"] for p in self.context.frames], ["Oakley", "Ray Ban"])
+        self.assertEqual(self.context.find_frame("Ray Ban")["sale_price"], 950)
+        self.assertEqual(self.context.settings["shop_name"], "Lensy Optics")
+
+        self.context.on_change(ChangeEvent(PRODUCT, created["id"], DELETE))
+        self.assertIsNone(self.context.find_frame("Oakley"))
+        self.assertEqual(self.repo.reads.count("lens_types"), 1)
+
+    def test_stock_movements_reach_the_cached_frames_until_the_view_closes(self):
+        self.assertEqual(self.context.find_frame("Ray Ban")["stock_qty"], 0)
+        self.repo.adjust_stock(self.frame["id"], 4)
+        self.assertEqual(self.context.find_frame("Ray Ban")["stock_qty"], 4)
+
+        self.page.data["changes"].clear()   # the route changes away from the POS
+        self.repo.adjust_stock(self.frame["id"], -1)
+        self.repo.set_settings({"shop_name": "Lensy Optics"})
+        self.assertEqual(self.context.find_frame("Ray Ban")["stock_qty"], 4)
+        self.assertEqual(self.context.settings["shop_name"], "Lensy")
+
+    def test_failed_background_load_is_retried_on_first_use(self):
+        repo = mock.Mock(wraps=self.repo)
+        repo.get_frame_colors.side_effect = [RuntimeError("offline"), []]
+        with mock.patch("builtins.print"):
+            context = POSContext(repo).start()
+            self.assertEqual([p["name"] for p in context.frames], ["Ray Ban"])
+        self.assertEqual(repo.get_frame_colors.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
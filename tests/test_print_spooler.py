@@ -0,0 +1,135 @@
+import datetime
+import time
+import unittest
+from unittest import mock
+
+from app.core import print_spooler, receipts
+from app.core.print_spooler import PrintSpooler, MAX_ATTEMPTS
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestPrintSpooler(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.printer = self.path("printer.bin")
+        self.settings = {"shop_name": "Lensy", receipts.RECEIPT_PRINTER_SETTING: self.printer}
+        self.spoolers = []
+
+    def tearDown(self):
+        for spooler in self.spoolers:
+            spooler.stop()
+
+    def spooler(self):
+        spooler = PrintSpooler(self.repo, self.path("jobs.json"))
+        self.spoolers.append(spooler)
+        return spooler
+
+    def wait_until_printed(self, spooler):
+        deadline = time.time() + 5
+        while spooler.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(spooler.pending(), [])
+
+    def receipt(self, invoice_no):
+        return {"shop_name": "Lensy", "sale": {"invoice_no": invoice_no, "net_amount": 10, "amount_paid": 10},
+                "customer": {"name": "Ali"}, "balance": 0}
+
+    def printed(self):
+        with open(self.printer, "rb") as f:
+            return f.read()
+
+    def test_queued_jobs_survive_a_restart_and_print_in_one_session(self):
+        first = self.spooler()
+        for invoice_no in ("2026-00001", "2026-00002", "2026-00003"):
+            first.submit("sale_receipt", self.receipt(invoice_no), self.settings)
+        self.assertEqual(len(first.pending()), 3)
+
+        second = self.spooler()   # as after a restart, the worker never having run
+        self.assertEqual([job["id"] for job in second.pending()], [job["id"] for job in first.pending()])
+        sessions = []
+        real_session = receipts.FilePrinter.session
+
+        def counting_session(printer):
+            sessions.append(printer.path)
+            return real_session(printer)
+
+        with mock.patch.object(receipts.FilePrinter, "session", counting_session):
+            second.start()
+            self.wait_until_printed(second)
+        self.assertEqual(sessions, [self.printer])
+        data = self.printed()
+        self.assertEqual(data.count(b"\x1dV\x01"), 3)
+        self.assertLess(data.index(b"2026-00001"), data.index(b"2026-00003"))
+        self.assertEqual(self.spooler().pending(), [])
+
+    def test_failing_printer_is_retried_then_set_aside(self):
+        broken = dict(self.settings, lab_printer=self.path("missing/lp0"))
+        spooler = self.spooler()
+        with mock.patch.object(print_spooler, "RETRY_DELAY", 0):
+            spooler.submit("lab_ticket", {"sale": {"invoice_no": "2026-00009"}}, broken, role="lab")
+            spooler.submit("sale_receipt", self.receipt("2026-00010"), broken)
+            spooler.start()
+            deadline = time.time() + 5
+            while not spooler.failed_jobs() and time.time() < deadline:
+                time.sleep(0.01)
+            self.wait_until_printed(spooler)
+        failed = spooler.failed_jobs()
+        self.assertEqual([job["attempts"] for job in failed], [MAX_ATTEMPTS])
+        self.assertIn(b"2026-00010", self.printed())   # another printer is not held up
+
+    def test_lab_copies_for_a_day_stream_page_by_page(self):
+        today = datetime.date.today()
+        for n, (day, exams) in enumerate([(today, 1), (today, 0), (today, 2), (today - datetime.timedelta(days=1), 1),
+                                          (today, 1)], 1):
+            self.repo.add_sale({"invoice_no": f"2026-0000{n}", "order_date": f"{day.isoformat()}T09:0{n}:00"}, [],
+                               examinations=[{"exam_type": f"Exam {n}.{k}"} for k in range(exams)])
+        spooler = self.spooler()
+        pages = []
+        real_search = self.repo.search_sales
+
+        def search_sales(**kwargs):
+            pages.append(kwargs["cursor"])
+            return real_search(**kwargs)
+
+        with mock.patch.object(print_spooler, "LAB_DAY_PAGE", 2), \
+                mock.patch.object(self.repo, "get_settings", return_value=dict(self.settings)), \
+                mock.patch.object(self.repo, "search_sales", search_sales):
+            spooler.submit_lab_day(self.repo.get_settings())
+            spooler.start()
+            self.wait_until_printed(spooler)
+        data = self.printed()
+        self.assertEqual(len(pages), 2)
+        self.assertEqual([n for n in range(1, 6) if f"2026-0000{n}".encode() in data], [1, 3, 5])
+        self.assertIn(b"Exam 3.1", data)
+
+    def test_lab_day_is_retried_when_examinations_cannot_be_read(self):
+        self.repo.add_sale({"invoice_no": "2026-00001", "order_date": f"{datetime.date.today().isoformat()}T09:00:00"},
+                           [], examinations=[{"exam_type": "Refraction"}])
+        spooler = self.spooler()
+        real_exams = self.repo.get_examinations_for_sales
+        failures = [OSError("connection reset")]
+
+        def get_examinations_for_sales(sale_ids):
+            if failures:
+                raise failures.pop()
+            return real_exams(sale_ids)
+
+        with mock.patch.object(print_spooler, "RETRY_DELAY", 0), \
+                mock.patch.object(self.repo, "get_settings", return_value=dict(self.settings)), \
+                mock.patch.object(self.repo, "get_examinations_for_sales", get_examinations_for_sales):
+            spooler.submit_lab_day(self.repo.get_settings())
+            spooler.start()
+            self.wait_until_printed(spooler)
+        self.assertEqual(failures, [])
+        self.assertEqual(spooler.failed_jobs(), [])
+        self.assertIn(b"2026-00001", self.printed())
+
+        supabase = mock.Mock()
+        supabase.table.return_value.select.return_value.in_.return_value.execute.side_effect = OSError("timeout")
+        with mock.patch.object(self.repo, "supabase", supabase), self.assertRaises(OSError):
+            self.repo.get_examinations_for_sales(["1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
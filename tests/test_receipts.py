@@ -0,0 +1,150 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from app.core import receipts
+from app.core.i18n import get_language, set_language
+from app.core.receipts import (
+    PrinterProfile, ReceiptTemplate, encode_for_printer, get_template, load_logo,
+    print_document, render_escpos, render_text, shape_arabic, visual_order,
+)
+
+
+def pos_receipt(**overrides):
+    receipt = dict(
+        receipts.shop_context({"shop_name": "Lensy", "store_phone": "0100"}),
+        invoice_no="2026-00042",
+        date=datetime.datetime(2026, 5, 3, 10, 30),
+        delivery_date=datetime.date(2026, 5, 6),
+        customer={"name": "Mona", "phone": ""},
+        doctor_name="",
+        items=[{"name": "Aviator frame", "qty": 1, "total_price": 500.0}],
+        examinations=[{"exam_type": "Distance", "sphere_od": "-1.25", "axis_od": 90,
+                       "lens_info": "CR39", "frame_info": "Aviator", "frame_status": "New"}],
+        totals={"gross_total": 650, "discount": 50, "net_amount": 600, "amount_paid": 200, "balance": 400},
+    )
+    receipt.update(overrides)
+    return receipt
+
+
+class TestTemplates(unittest.TestCase):
+    def setUp(self):
+        self.language = get_language()
+        set_language("en")
+
+    def tearDown(self):
+        set_language(self.language)
+
+    def test_layout(self):
+        template = ReceiptTemplate(
+            "==\n*^{title}\n@if missing\nhidden\n@else\nItems:\n@for item in items\n{n}. {item.name} | {item.price:.2f}\n@end\n@end\n"
+            "Note: {note}\nTotal |. {total:>6.2f}\n--",
+        )
+        text = template.render_text({"title": "Lensy", "items": [{"name": "Lens", "price": 5},
+                                                                 {"name": "Case", "price": "2.5"}], "total": 7.5}, width=20)
+        self.assertEqual(text.split("\n"), [
+            "=" * 20, "       Lensy", "Items:", "1. Lens         5.00", "2. Case         2.50",
+            "Total.........  7.50", "-" * 20,
+        ])
+
+    def test_templates_compile_once_per_language(self):
+        self.assertIs(get_template("shop_copy"), get_template("shop_copy"))
+        english = render_text("customer_copy", pos_receipt())
+        set_language("ar")
+        self.assertIsNot(get_template("customer_copy"), receipts._compiled("customer_copy", "en"))
+        self.assertIn("شكراً لتسوقكم معنا!", render_text("customer_copy", pos_receipt()))
+        self.assertIn("Thank you for your purchase!", english)
+        self.assertIn("Delivery Date: 06/05/2026", english)
+        self.assertNotIn("Phone:", english)   # empty value, line left out
+
+    def test_copies(self):
+        shop = render_text("shop_copy", pos_receipt())
+        lab = render_text("lab_copy", pos_receipt())
+        self.assertIn("OD: -1.25/-x90", shop)
+        self.assertIn("Balance" + "." * 31 + "400.00 EGP", shop)
+        self.assertIn("    AXIS:      90", lab)
+        self.assertNotIn("Mona", lab)
+        self.assertNotIn("Aviator frame", lab)
+
+    def test_bad_template(self):
+        with self.assertRaises(ValueError):
+            ReceiptTemplate("@if total\nno end")
+        with self.assertRaises(ValueError):
+            ReceiptTemplate("@include nowhere")
+
+
+class TestArabic(unittest.TestCase):
+    def test_shaping_and_order(self):
+        # Initial seen, lam-alef ligature joined to it, isolated meem after the non-joining alef
+        self.assertEqual(shape_arabic("سلام"), "ﺳﻼﻡ")
+        self.assertEqual(shape_arabic("رد"), "ﺭﺩ")
+        self.assertEqual(visual_order(shape_arabic("فاتورة: #12")), "#12 :ﺓﺭﻮﺗﺎﻓ")
+        self.assertEqual(visual_order("Lensy"), "Lensy")
+
+    def test_code_page_fallback(self):
+        # cp864 has no final beh; the isolated form is printed instead
+        self.assertEqual(encode_for_printer("ﺐ", "cp864"), "ﺏ".encode("cp864"))
+        self.assertNotIn(b"?", encode_for_printer(shape_arabic("المبلغ المدفوع شكراً"), "cp864"))
+
+
+class TestEscPos(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_file_printer_receives_the_job(self):
+        logo = self.path("logo.pbm")
+        with open(logo, "wb") as f:
+            f.write(b"P4\n# shop logo\n10 2\n" + bytes([0xFF, 0xC0, 0x80, 0x40]))
+        out = self.path("printer.bin")
+        settings = {"shop_name": "Lensy", receipts.RECEIPT_PRINTER_SETTING: out,
+                    receipts.LOGO_SETTING: logo, receipts.PRINTER_WIDTH_SETTING: "32"}
+        print_document("shop_copy", pos_receipt(), settings)
+        print_document("lab_copy", pos_receipt(), settings, role="lab")
+        with open(out, "rb") as f:
+            data = f.read()
+        shop, lab, rest = data.split(b"\x1dV\x01")
+        self.assertEqual(rest, b"")
+        self.assertTrue(shop.startswith(b"\x1b@\x1bt%"))
+        self.assertIn(b"\x1dv0\x00\x02\x00\x02\x00\xff\xc0\x80\x40", shop)
+        self.assertIn(b"\x1bE\x01", shop)
+        self.assertIn(b"=" * 32 + b"\n", shop)
+        self.assertNotIn(b"\x1dv0", lab)
+        self.assertNotIn(b"=" * 33, shop)
+
+    def test_logo_cache_follows_the_file(self):
+        logo = self.path("logo.pbm")
+        with open(logo, "w") as f:
+            f.write("P1\n3 1\n1 0 1\n")
+        self.assertEqual(load_logo(logo)[-1:], b"\xa0")
+        self.assertIs(load_logo(logo), load_logo(logo))
+        with open(logo, "w") as f:
+            f.write("P1\n3 1\n0 1 0\n")
+        os.utime(logo, ns=(0, os.stat(logo).st_mtime_ns + 10**9))
+        self.assertEqual(load_logo(logo)[-1:], b"\x40")
+        self.assertEqual(load_logo(self.path("missing.pbm")), b"")
+
+    def test_width_follows_profile(self):
+        data = render_escpos("sale_receipt", {"shop_name": "Lensy", "sale": {"net_amount": 10, "amount_paid": 4},
+                                              "customer": {"name": "Ali"}, "balance": 6}, PrinterProfile(width=32, cut=False))
+        self.assertIn(b"-" * 32 + b"\n", data)
+        self.assertFalse(data.endswith(b"\x1dV\x01"))
+
+    def test_item_names_give_way_to_qty_and_price(self):
+        receipt = pos_receipt(items=[{"name": "Ray-Ban Aviator Classic Gold 58", "qty": 2, "total_price": 1800.0}])
+        for width in (48, 32):
+            lines = [line for line in render_text("customer_copy", receipt, width=width).split("\n") if " x2 " in line]
+            self.assertEqual(len(lines), 1)
+            self.assertEqual(len(lines[0]), width)
+            self.assertTrue(lines[0].startswith("  Ray-Ban Aviator"))
+            self.assertTrue(lines[0].endswith(" x2     1800.00"))
+
+
+if __name__ == "__main__":
+    unittest.main()
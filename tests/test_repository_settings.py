@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+
+from app.database import repository
+from app.database.repository import POSRepository
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestRepositorySettings(LocalRepositoryTestCase):
+    def test_snapshot_is_immutable(self):
+        settings = self.repo.get_settings()
+        self.assertEqual(settings["shop_name"], "Lensy Optical")
+        with self.assertRaises(TypeError):
+            settings["shop_name"] = "Changed"
+
+    def test_snapshot_is_cached_between_reads(self):
+        self.repo.get_settings()
+        with mock.patch.object(self.repo, "_read_local", wraps=self.repo._read_local) as read:
+            self.repo.get_setting("shop_name")
+            self.repo.get_setting("currency")
+            self.repo.get_setting("store_phone")
+        read.assert_not_called()
+
+    def test_set_settings_writes_once_and_notifies(self):
+        received = []
+        self.repo.subscribe_settings(received.append)
+
+        with mock.patch.object(self.repo, "_write_local", wraps=self.repo._write_local) as write:
+            self.repo.set_settings({"shop_name": "Vision Plus", "currency": "USD", "tax_rate": "14"})
+        self.assertEqual(write.call_count, 1)
+
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["shop_name"], "Vision Plus")
+        self.assertEqual(received[0]["tax_rate"], "14")
+
+        # A fresh repository sees the persisted values
+        other = POSRepository()
+        self.assertEqual(other.get_setting("currency"), "USD")
+
+    def test_external_change_invalidates_local_snapshot(self):
+        self.repo.get_settings()
+        POSRepository().set_setting("shop_name", "Other Terminal")
+        self.assertEqual(self.repo.get_setting("shop_name"), "Other Terminal")
+
+    def test_write_during_the_read_is_not_cached_as_current(self):
+        self.repo.get_settings()
+        read_local = self.repo._read_local
+
+        def read_then_other_terminal_writes():
+            data = read_local()
+            POSRepository().set_setting("shop_name", "Other Terminal")
+            return data
+
+        POSRepository().set_setting("shop_name", "First")
+        with mock.patch.object(self.repo, "_read_local", read_then_other_terminal_writes):
+            self.assertEqual(self.repo.get_setting("shop_name"), "First")
+        self.assertEqual(self.repo.get_setting("shop_name"), "Other Terminal")
+
+    def test_supabase_snapshot_is_rechecked_against_the_version(self):
+        rows = [{"key": "shop_name", "value": "Lensy"}]
+        versions = [1]
+        self.repo.supabase = mock.Mock()
+        self.repo.supabase.table.return_value.select.return_value.execute.side_effect = \
+            lambda: mock.Mock(data=[dict(r) for r in rows])
+        clock = [100.0]
+        with mock.patch.object(self.repo, "_peek_counter", side_effect=lambda key: versions[0]), \
+                mock.patch.object(repository.time, "monotonic", side_effect=lambda: clock[0]):
+            self.assertEqual(self.repo.get_setting("shop_name"), "Lensy")
+            rows[0]["value"], versions[0] = "Vision Plus", 2   # another terminal's set_settings
+            self.assertEqual(self.repo.get_setting("shop_name"), "Lensy")
+            clock[0] += repository.SETTINGS_RECHECK_SECONDS
+            self.assertEqual(self.repo.get_setting("shop_name"), "Vision Plus")
+            clock[0] += repository.SETTINGS_RECHECK_SECONDS
+            self.repo.get_settings()
+        self.assertEqual(self.repo.supabase.table.return_value.select.return_value.execute.call_count, 2)
+
+    def test_unsubscribe_and_weak_bound_methods(self):
+        class View:
+            def __init__(self):
+                self.calls = 0
+
+            def on_change(self, snapshot):
+                self.calls += 1
+
+        view = View()
+        unsubscribe = self.repo.subscribe_settings(view.on_change)
+        self.repo.set_setting("currency", "EUR")
+        self.assertEqual(view.calls, 1)
+
+        unsubscribe()
+        self.repo.set_setting("currency", "GBP")
+        self.assertEqual(view.calls, 1)
+
+        self.repo.subscribe_settings(view.on_change)
+        del view
+        self.repo.set_setting("currency", "EGP")
+        self.assertEqual(self.repo._settings_subscribers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from app.core.payments import PAID, PARTIAL, UNPAID, payment_state
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestSearchSales(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.repo._local_transaction() as data:
+            data["customers"] += [{"id": "c1", "name": "Mona Adel"}, {"id": "c2", "name": "Ahmed Ali"}]
+            paid = [100, 40, 0, 100, 0, 40]
+            for i, amount in enumerate(paid):
+                data["sales"].append({
+                    "id": f"s{i}", "invoice_no": f"2026-00{i}", "customer_id": "c1" if i % 2 else "c2",
+                    "net_amount": 100, "amount_paid": amount, "doctor_name": "Dr. Samir" if i == 4 else "",
+                    "order_date": f"2026-03-0{i + 1}T10:00:00", "lab_status": "Ready" if i < 3 else "In Lab",
+                })
+                data["sale_items"].append({"id": f"i{i}", "sale_id": f"s{i}", "product_id": "p1", "qty": 1})
+            # Same timestamp as s5: the id breaks the tie
+            data["sales"].append({"id": "s6", "invoice_no": "2026-006", "customer_id": None, "net_amount": 0,
+                                  "amount_paid": 0, "order_date": "2026-03-06T10:00:00", "lab_status": None})
+
+    def ids(self, **kwargs):
+        return [s["id"] for s in self.repo.search_sales(**kwargs)[0]]
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            sales, cursor = self.repo.search_sales(limit=3, cursor=cursor)
+            seen += [s["id"] for s in sales]
+            if cursor is None:
+                break
+        self.assertEqual(seen, ["s6", "s5", "s4", "s3", "s2", "s1", "s0"])
+
+        sale = self.repo.search_sales(limit=1, cursor=None, term="2026-005")[0][0]
+        self.assertEqual((sale["customer_name"], sale["balance_due"]), ("Mona Adel", 60.0))
+        self.assertEqual(sale["sale_items"][0]["id"], "i5")
+
+    def test_filters(self):
+        self.assertEqual(self.ids(term="mona"), ["s5", "s3", "s1"])
+        self.assertEqual(self.ids(term=" SAMIR "), ["s4"])
+        self.assertEqual(self.ids(lab_status="Ready"), ["s2", "s1", "s0"])
+        self.assertEqual(self.ids(payment_state=PAID), ["s6", "s3", "s0"])
+        self.assertEqual(self.ids(payment_state=PARTIAL), ["s5", "s1"])
+        self.assertEqual(self.ids(payment_state=UNPAID, term="ahmed"), ["s4", "s2"])
+        self.assertEqual(self.ids(date_range=("2026-03-02", "2026-03-03")), ["s2", "s1"])
+        self.assertEqual(self.ids(date_range=(None, "2026-03-01"), lab_status="Ready"), ["s0"])
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            self.repo.search_sales(payment_state="Overdue")
+        with self.assertRaises(ValueError):
+            self.repo.search_sales(cursor="not a cursor")
+
+    def test_payment_state(self):
+        self.assertEqual(payment_state({"net_amount": 100, "amount_paid": 120}), PAID)
+        self.assertEqual(payment_state({"net_amount": 100, "amount_paid": None}), UNPAID)
+        self.assertEqual(payment_state({"net_amount": "100", "amount_paid": "1"}), PARTIAL)
+
+
+if __name__ == "__main__":
+    unittest.main()
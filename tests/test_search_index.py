@@ -0,0 +1,165 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.core import search_index
+from app.core.events import ChangeEvent, ChangeFeed, CUSTOMER, PRODUCT, SALE, INSERT, UPDATE, DELETE
+from app.core.search_index import SearchIndex, EXACT, PREFIX, WORD_PREFIX, SUBSTRING
+from app.database import db_manager
+from app.database.models import Base, Customer
+
+from app.database.repository import POSRepository
+
+from local_repo import LocalRepositoryTestCase
+
+
+def records():
+    return {
+        CUSTOMER: [
+            {"id": 1, "name": "Mona Adel", "phone": "01001234567", "city": "Giza"},
+            {"id": 2, "name": "Ahmed Mon", "phone": "01112223334"},
+            {"id": 3, "name": "Simona", "phone": None},
+            {"id": 4, "name": "Mon", "phone2": "0100"},
+        ],
+        PRODUCT: [
+            {"id": 10, "name": "Ray-Ban Aviator", "sku": "FRM-0001", "barcode": "6291041500213", "sale_price": 900},
+            {"id": 11, "name": "Blue Cut 1.56", "sku": "LNS-0001", "sale_price": 300},
+        ],
+        SALE: [{"id": i, "invoice_no": f"2026-{i:05d}", "customer_id": 1 + i % 2} for i in range(1, 40)],
+    }
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.fetched = []
+
+        def fetch(kinds):
+            self.fetched.append(kinds)
+            data = records()
+            return {k: data[k] for k in kinds}
+        self.index = SearchIndex(fetch).start()
+
+    def ids(self, term, kind, **kwargs):
+        return [h.id for h in self.index.search(term, **kwargs)[kind]]
+
+    def test_ranking(self):
+        hits = self.index.search("mon")[CUSTOMER]
+        self.assertEqual([h.id for h in hits], ["4", "1", "2", "3"])
+        self.assertEqual([h.rank[0] for h in hits], [EXACT, PREFIX, WORD_PREFIX, SUBSTRING])
+        self.assertEqual(self.ids("  AVIATOR ", PRODUCT), ["10"])
+        self.assertEqual(self.ids("0001", PRODUCT), ["10", "11"])
+        self.assertEqual(self.ids("0100", CUSTOMER), ["4", "1"])
+        self.assertEqual(self.ids("zz", CUSTOMER), [])
+        self.assertEqual(self.fetched, [(CUSTOMER, PRODUCT, SALE)])
+
+    def test_per_kind_limits(self):
+        results = self.index.search("2026", limits={SALE: 3})
+        self.assertEqual([h.id for h in results[SALE]], ["1", "2", "3"])
+        # Starting right after the dash beats ending the number
+        self.assertEqual(self.ids("0003", SALE, limit=2), ["30", "31"])
+        self.assertEqual(self.ids("m", CUSTOMER, limit=10), ["4", "1"])
+
+    def test_change_events_patch_the_index(self):
+        on_change = self.index.on_change
+        on_change(ChangeEvent(CUSTOMER, "5", INSERT, {"id": 5, "name": "Monir", "phone": "0122"}))
+        on_change(ChangeEvent(CUSTOMER, "1", UPDATE, {"name": "Nour Adel"}))
+        on_change(ChangeEvent(CUSTOMER, "3", DELETE))
+        on_change(ChangeEvent(CUSTOMER, "99", UPDATE, {"name": "Unknown"}))
+        on_change(ChangeEvent(SALE, "77", INSERT, {"invoice_no": "2026-00077", "customer_id": 5, "sale_items": []}))
+        on_change(ChangeEvent(SALE, "1", UPDATE, {"lab_status": "Ready"}))
+
+        self.assertEqual(self.ids("mon", CUSTOMER), ["4", "5", "2"])
+        self.assertEqual(self.ids("nour", CUSTOMER), ["1"])
+        self.assertEqual(self.index.get(CUSTOMER, "1")["city"], "Giza")
+        self.assertIsNone(self.index.get(CUSTOMER, "99"))
+        self.assertEqual(self.index.get(SALE, 77), {"id": "77", "invoice_no": "2026-00077", "customer_id": 5})
+        self.assertEqual(self.ids("00077", SALE), ["77"])
+
+    def test_events_during_a_load_are_not_lost(self):
+        def fetch_then_write(kinds):
+            data = records()   # read before the writes below
+            index.on_change(ChangeEvent(CUSTOMER, "5", INSERT, {"id": 5, "name": "Monir"}))
+            index.on_change(ChangeEvent(CUSTOMER, "1", UPDATE, {"name": "Nour Adel"}))
+            index.on_change(ChangeEvent(CUSTOMER, "3", DELETE))
+            return {k: data[k] for k in kinds}
+
+        index = SearchIndex(fetch_then_write)
+        index.load()
+        self.assertEqual(index.get(CUSTOMER, "5")["name"], "Monir")
+        self.assertEqual(index.get(CUSTOMER, "1")["name"], "Nour Adel")
+        self.assertIsNone(index.get(CUSTOMER, "3"))
+
+    def test_reload_one_kind(self):
+        self.index.search("mon")
+        self.index.load([PRODUCT])
+        self.assertEqual(self.fetched[-1], (PRODUCT,))
+        self.assertEqual(self.ids("ray", PRODUCT), ["10"])
+
+
+class TestSearchRecords(LocalRepositoryTestCase):
+    def test_index_follows_repository_writes(self):
+        customer = self.repo.add_customer({"name": "Mona Adel", "phone": "0100", "email": "m@x.com"})
+        self.repo.add_sale({"invoice_no": "2026-00001", "customer_id": customer["id"], "net_amount": 100}, [])
+        records = self.repo.get_search_records()
+        self.assertNotIn("email", records[CUSTOMER][0])
+        self.assertNotIn("sale_items", records[SALE][0])
+
+        feed = ChangeFeed()
+        index = SearchIndex(self.repo.get_search_records)
+        feed.subscribe(index.on_change, CUSTOMER, PRODUCT, SALE, keep=True)
+        feed.clear()
+        self.repo.set_change_publisher(feed.dispatch)
+        index.load()
+
+        self.repo.add_inventory_item({"name": "Ray-Ban Aviator", "sku": "FRM-0001", "category": "Frame"})
+        self.repo.update_customer(customer["id"], {"name": "Mona Samir"})
+        self.assertEqual([h.record["name"] for h in index.search("ray")[PRODUCT]], ["Ray-Ban Aviator"])
+        self.assertEqual([h.record["name"] for h in index.search("samir")[CUSTOMER]], ["Mona Samir"])
+        self.assertEqual(len(index.search("2026-00001")[SALE]), 1)
+
+    def test_one_index_per_process(self):
+        with mock.patch.object(search_index, "_shared", None):
+            index = search_index.shared_search_index(self.repo)
+            self.assertIs(search_index.shared_search_index(POSRepository()), index)
+            self.assertEqual(len(index.search("mona")[CUSTOMER]), 0)
+
+
+class TestRowChanges(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = db_manager.get_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'pos.db')}")
+        Base.metadata.create_all(self.engine)
+        self.session = db_manager.get_session(self.engine)
+
+    def tearDown(self):
+        self.session.close()
+        for key in [k for k in db_manager._engines if db_manager._engines[k] is self.engine]:
+            db_manager._engines.pop(key).dispose()
+        db_manager._row_logged_engines.discard(self.engine)
+        self.tmp_dir.cleanup()
+
+    def test_only_rows_written_since_a_version_are_read_again(self):
+        version, changed = db_manager.get_row_changes(self.session, "customers")
+        self.assertEqual((version, changed), (0, []))
+        mona, ali, sara = Customer(name="Mona"), Customer(name="Ali"), Customer(name="Sara")
+        self.session.add_all([mona, ali, sara])
+        self.session.commit()
+        version, changed = db_manager.get_row_changes(self.session, "customers", since=0)
+        self.assertEqual(sorted(changed), sorted([mona.id, ali.id, sara.id]))
+
+        ali.name = "Ali Hassan"
+        self.session.delete(sara)
+        self.session.commit()
+        latest, changed = db_manager.get_row_changes(self.session, "customers", since=version)
+        self.assertEqual(sorted(changed), sorted([ali.id, sara.id]))
+        self.assertEqual(db_manager.get_row_changes(self.session, "customers", since=latest), (latest, []))
+        self.assertEqual(db_manager.get_row_changes(self.session, "products", since=0), (0, []))
+
+        rows = db_manager.get_search_records(self.session, [CUSTOMER], ids={CUSTOMER: changed})
+        self.assertEqual(rows[CUSTOMER], [{"id": ali.id, "name": "Ali Hassan", "phone": None, "phone2": None,
+                                           "city": None}])
+
+
+if __name__ == "__main__":
+    unittest.main()
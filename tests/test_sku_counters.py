@@ -0,0 +1,79 @@
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import db_manager
+from app.database.models import Base, Product
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestRepositorySkuCounters(LocalRepositoryTestCase):
+    def test_counter_seeds_from_highest_sku_not_count(self):
+        data = self.repo._read_local()
+        data["inventory"] += [
+            {"id": "a", "sku": "20001", "category": "Frame"},
+            {"id": "b", "sku": "20007", "category": "Frame"},
+        ]
+        self.repo._write_local(data)
+
+        self.assertEqual(self.repo.generate_sku("Frame"), "20008")
+        self.assertEqual(self.repo.generate_sku("Frame"), "20009")
+
+    def test_scanned_barcodes_do_not_seed_the_counter(self):
+        data = self.repo._read_local()
+        data["inventory"] += [
+            {"id": "a", "sku": "20007", "category": "Frame"},
+            {"id": "b", "sku": "2012345678901", "category": "Frame"},  # a barcode kept as the SKU
+            {"id": "c", "sku": "200099", "category": "Frame"},
+        ]
+        self.repo._write_local(data)
+
+        self.assertEqual(self.repo.generate_sku("Frame"), "20008")
+
+    def test_peek_is_stable_and_does_not_scan_again(self):
+        self.assertEqual(self.repo.peek_sku("Accessory"), "40001")
+        with mock.patch.object(self.repo, "_read_local") as read:
+            self.assertEqual(self.repo.peek_sku("Accessory"), "40001")
+        read.assert_not_called()
+
+    def test_reserve_skus_returns_consecutive_block(self):
+        self.repo.generate_sku("Sunglasses")
+        self.assertEqual(self.repo.reserve_skus("Sunglasses", 3), ["30002", "30003", "30004"])
+        self.assertEqual(self.repo.reserve_skus("Sunglasses", 0), [])
+
+    def test_deleted_products_do_not_cause_duplicates(self):
+        first = self.repo.add_inventory_item({"name": "A", "category": "Other"})
+        second = self.repo.add_inventory_item({"name": "B", "category": "Other"})
+        data = self.repo._read_local()
+        data["inventory"] = [i for i in data["inventory"] if i["id"] != first["id"]]
+        self.repo._write_local(data)
+
+        third = self.repo.add_inventory_item({"name": "C", "category": "Other"})
+        self.assertNotEqual(third["sku"], second["sku"])
+        self.assertEqual(third["sku"], "00003")
+
+
+class TestSqlAlchemySkuCounters(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_generate_and_reserve(self):
+        self.session.add(Product(name="Old", sku="20012", category="Frame"))
+        self.session.add(Product(name="Scanned", sku="2012345678901", category="Frame"))
+        self.session.commit()
+
+        self.assertEqual(db_manager.peek_sku(self.session, "Frame"), "20013")
+        self.assertEqual(db_manager.generate_sku(self.session, "Frame"), "20013")
+        self.assertEqual(db_manager.reserve_skus(self.session, "Frame", 2), ["20014", "20015"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import os
+import tempfile
+import threading
+import unittest
+import multiprocessing
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.inventory_service import InventoryService
+from app.core.stock import InsufficientStockError, requested_quantities, find_shortfalls, split_deduction
+from app.database import repository
+from app.database.models import Base, Product, Warehouse, StockMovement
+from app.database.repository import POSRepository
+
+from local_repo import LocalRepositoryTestCase
+
+TERMINALS = 4
+ATTEMPTS = 8
+STOCK = 10
+
+
+def _sell_local(db_path, product_id, queue):
+    with mock.patch.object(repository, "LOCAL_JSON_DB", db_path):
+        repo = POSRepository()
+        sold = 0
+        for _ in range(ATTEMPTS):
+            try:
+                repo.add_sale({"customer_id": None}, [{"product_id": product_id, "qty": 1, "name": "Frame"}])
+                sold += 1
+            except InsufficientStockError:
+                pass
+        queue.put(sold)
+
+
+def _sell_sqlalchemy(db_url, product_id, queue):
+    engine = create_engine(db_url, connect_args={"timeout": 30})
+    Session = sessionmaker(bind=engine)
+    sold = 0
+    for _ in range(ATTEMPTS):
+        with Session() as session:
+            if not InventoryService.reserve_and_deduct([{"product_id": product_id, "qty": 1}], session=session):
+                session.commit()
+                sold += 1
+    engine.dispose()
+    queue.put(sold)
+
+
+def _run_terminals(target, *args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=target, args=args + (queue,)) for _ in range(TERMINALS)]
+    for p in procs:
+        p.start()
+    sold = [queue.get(timeout=120) for _ in procs]
+    for p in procs:
+        p.join()
+    return sum(sold)
+
+
+class TestStockHelpers(unittest.TestCase):
+    def test_lines_for_the_same_product_are_summed(self):
+        items = [{"product_id": "a", "qty": 1}, {"product_id": "a", "qty": 2},
+                 {"product_id": None, "qty": 1}, {"product_id": "b", "qty": 0}]
+        self.assertEqual(requested_quantities(items), {"a": 3})
+
+    def test_shortfalls(self):
+        self.assertEqual(
+            find_shortfalls({"a": 3, "b": 1}, {"a": 2, "b": 1}),
+            [{"product_id": "a", "requested": 3, "available": 2}]
+        )
+
+    def test_error_keeps_the_shortfalls_and_an_english_log_line(self):
+        error = InsufficientStockError([{"product_id": "a", "requested": 3, "available": 2}])
+        self.assertEqual(error.shortfalls[0]["requested"], 3)
+        self.assertEqual(str(error), "Insufficient stock for a (need 3, have 2)")
+
+    def test_deduction_drains_the_default_warehouse_first(self):
+        self.assertEqual(split_deduction(2, {"1": 5, "2": 3}, "1"), {"1": 2})
+        self.assertEqual(split_deduction(4, {"1": 1, "2": -1, "3": 6}, "1"), {"1": 1, "3": 3})
+        self.assertEqual(split_deduction(3, {"2": 2}, "1"), {"2": 2, "1": 1})
+
+
+class TestRepositoryReserveAndDeduct(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.frame = self.repo.add_inventory_item({"name": "Frame", "category": "Frame", "stock_qty": STOCK})
+        self.lens = self.repo.add_inventory_item({"name": "Lens", "category": "Lens", "stock_qty": 1})
+
+    def test_reports_every_short_line_and_deducts_nothing(self):
+        items = [{"product_id": self.frame["id"], "qty": 2}, {"product_id": self.lens["id"], "qty": 1},
+                 {"product_id": self.lens["id"], "qty": 1}]
+        self.assertEqual(self.repo.reserve_and_deduct(items),
+                         [{"product_id": self.lens["id"], "requested": 2, "available": 1}])
+        self.assertEqual(self.repo.get_product_stock(self.frame["id"]), STOCK)
+
+        self.assertEqual(self.repo.reserve_and_deduct(items[:2], ref_no="X1"), [])
+        self.assertEqual(self.repo.get_product_stock(self.frame["id"]), STOCK - 2)
+        self.assertEqual(self.repo.get_product_stock(self.lens["id"]), 0)
+
+    def test_short_sale_is_not_saved_and_uses_no_invoice_number(self):
+        next_no = self.repo.get_next_invoice_no()
+        with self.assertRaises(InsufficientStockError) as ctx:
+            self.repo.add_sale({}, [{"product_id": self.lens["id"], "qty": 2}])
+        self.assertEqual(ctx.exception.shortfalls[0]["available"], 1)
+        self.assertEqual(self.repo.get_sales(), [])
+        self.assertEqual(self.repo.get_next_invoice_no(), next_no)
+
+        sale = self.repo.add_sale({}, [{"product_id": self.lens["id"], "qty": 1}])
+        self.assertEqual(sale["invoice_no"], next_no)
+        self.assertEqual(self.repo.get_product_stock(self.lens["id"]), 0)
+
+    def test_supabase_sale_is_one_create_sale_call(self):
+        supabase = self.repo.supabase = mock.Mock()
+        patcher = mock.patch.object(self.repo, "get_settings", return_value={"invoice_prefix": "BR1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sale_row = {"id": "s1", "invoice_no": "BR1-000007"}
+        supabase.rpc.return_value.execute.return_value = mock.Mock(data={"shortfalls": [], "sale": sale_row})
+        items = [{"product_id": "p1", "qty": 1}, {"product_id": "p1", "qty": 2}]
+
+        self.assertEqual(self.repo.add_sale({}, items, examinations=[{"exam_type": "Distance"}, None]), sale_row)
+        name, params = supabase.rpc.call_args.args
+        self.assertEqual(name, "create_sale")
+        self.assertEqual(params["p_stock"], [{"product_id": "p1", "qty": 3}])
+        self.assertEqual(params["p_exams"], [{"exam_type": "Distance"}])
+        self.assertEqual((params["p_counter_key"], params["p_stem"]), ("invoice:BR1:", "BR1-"))
+        supabase.table.assert_not_called()
+
+        shortfalls = [{"product_id": "p1", "requested": 3, "available": 1}]
+        supabase.rpc.return_value.execute.return_value = mock.Mock(data={"shortfalls": shortfalls, "sale": None})
+        with self.assertRaises(InsufficientStockError) as ctx:
+            self.repo.add_sale({}, items)
+        self.assertEqual(ctx.exception.shortfalls, shortfalls)
+        self.assertEqual(supabase.rpc.call_count, 2)
+
+    def test_other_writes_wait_for_a_sale_in_progress(self):
+        inside, release = threading.Event(), threading.Event()
+        real_append = self.repo._append_movements
+
+        def slow_append(*args, **kwargs):
+            inside.set()
+            release.wait(5)
+            return real_append(*args, **kwargs)
+
+        other_terminal = POSRepository()
+        with mock.patch.object(self.repo, "_append_movements", slow_append):
+            sale = threading.Thread(target=self.repo.add_sale,
+                                    args=({}, [{"product_id": self.frame["id"], "qty": 1}]))
+            sale.start()
+            self.assertTrue(inside.wait(5))
+            writer = threading.Thread(target=other_terminal.add_customer, args=({"name": "Mona"},))
+            writer.start()
+            writer.join(0.2)
+            self.assertTrue(writer.is_alive())   # held off until the sale is written
+            release.set()
+            sale.join(5)
+            writer.join(5)
+
+        self.assertEqual([c["name"] for c in self.repo.get_customers()], ["Mona"])
+        self.assertEqual(len(self.repo.get_sales()), 1)
+        self.assertEqual(self.repo.get_product_stock(self.frame["id"]), STOCK - 1)
+
+    def test_terminals_never_oversell(self):
+        sold = _run_terminals(_sell_local, self.db_path, self.frame["id"])
+        self.assertEqual(sold, STOCK)
+        self.assertEqual(self.repo.get_product_stock(self.frame["id"]), 0)
+        self.assertEqual(len(self.repo.get_sales()), STOCK)
+
+
+class TestSqlAlchemyReserveAndDeduct(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'pos.db')}"
+        self.engine = create_engine(self.db_url)
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session() as s:
+            s.add(Warehouse(name="Main"))
+            product = Product(name="Frame", sku="20001", category="Frame")
+            s.add(product)
+            s.flush()
+            s.add(StockMovement(product_id=product.id, qty=STOCK, type="purchase"))
+            s.commit()
+            self.product_id = product.id
+        InventoryService.clear_default_warehouse_cache()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+        InventoryService.clear_default_warehouse_cache()
+
+    def test_shortfall_leaves_stock_untouched(self):
+        with self.Session() as s:
+            shortfalls = InventoryService.reserve_and_deduct([{"product_id": self.product_id, "qty": STOCK + 1}], session=s)
+            self.assertEqual(shortfalls, [{"product_id": self.product_id, "requested": STOCK + 1, "available": STOCK}])
+            s.commit()
+            self.assertEqual(InventoryService.get_available_stock(self.product_id, s), STOCK)
+
+    def test_terminals_never_oversell(self):
+        sold = _run_terminals(_sell_sqlalchemy, self.db_url, self.product_id)
+        self.assertEqual(sold, STOCK)
+        with self.Session() as s:
+            self.assertEqual(InventoryService.get_available_stock(self.product_id, s), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
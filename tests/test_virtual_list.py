@@ -0,0 +1,127 @@
+import types
+import unittest
+
+import app.flet_compat  # noqa: F401 - ft.colors / ft.icons aliases used by the component
+from app.ui.components.virtual_list import VirtualList
+
+from local_repo import LocalRepositoryTestCase
+
+
+def scroll(vlist, pixels, viewport=400):
+    vlist._on_scroll(types.SimpleNamespace(pixels=pixels, viewport_dimension=viewport))
+
+
+class TestVirtualList(unittest.TestCase):
+    def setUp(self):
+        self.rows = [{"id": i, "name": f"Row {i}"} for i in range(1000)]
+        self.fetches = []
+        self.built = []
+
+        def fetch(offset, limit):
+            self.fetches.append(offset)
+            page = self.rows[offset:offset + limit]
+            return page, (offset + limit if offset + limit < len(self.rows) else None)
+
+        def build(item):
+            self.built.append(item["id"])
+            return types.SimpleNamespace(item=item)
+
+        self.vlist = VirtualList(build, fetch, item_extent=40, page_size=50, overscan=5)
+
+    def rendered_ids(self):
+        return [c.content.item["id"] for c in self.vlist.control.controls[1:-1]]
+
+    def test_builds_only_the_window_and_fetches_pages_on_scroll(self):
+        self.vlist.load()
+        self.assertEqual(self.fetches, [0])
+        self.assertEqual(self.rendered_ids(), list(range(17)))
+        self.assertEqual(self.vlist.control.controls[-1].height, (50 - 17) * 40)
+
+        # 400px viewport = 10 rows; scroll to row 45, which needs the second page and reads one ahead
+        scroll(self.vlist, 45 * 40)
+        self.assertEqual(self.fetches, [0, 50, 100])
+        self.assertEqual(self.rendered_ids(), list(range(40, 60)))
+        self.assertEqual(self.vlist.control.controls[0].height, 40 * 40)
+        self.assertEqual(len(self.vlist.control.controls), 22)
+
+    def test_rows_still_in_view_are_not_rebuilt(self):
+        self.vlist.load()
+        scroll(self.vlist, 0)
+        self.built.clear()
+        scroll(self.vlist, 2 * 40)
+        self.assertEqual(self.built, [15, 16])
+
+        self.vlist.get(5)["name"] = "Changed"
+        self.vlist.refresh(5)
+        self.assertEqual(self.built, [15, 16, 5])
+        self.assertEqual(self.rendered_ids()[:3], [0, 1, 2])
+
+    def test_slots_are_recycled_with_update_row(self):
+        rebound = []
+        self.vlist.update_row = lambda control, item: rebound.append(item["id"]) or setattr(control, "item", item)
+        self.vlist.load()
+        slots = {id(c) for c in self.vlist.control.controls[1:-1]}
+        self.built.clear()
+
+        scroll(self.vlist, 100 * 40)
+        self.assertEqual(self.fetches, [0, 50, 100, 150])
+        # 17 slots from the first window are rebound, 3 more are built for the 20-row window
+        self.assertEqual(rebound, list(range(95, 112)))
+        self.assertEqual(len(self.built), 3)
+        self.assertTrue(slots <= {id(c) for c in self.vlist.control.controls[1:-1]})
+
+    def test_insert_remove_and_duplicates_from_later_pages(self):
+        self.vlist.load()
+        self.vlist.insert(0, {"id": 70, "name": "Moved up"})
+        self.vlist.remove(3)
+        self.assertEqual(self.rendered_ids()[:5], [70, 0, 1, 2, 4])
+
+        scroll(self.vlist, 45 * 40)
+        self.assertEqual([i["id"] for i in self.vlist.items].count(70), 1)
+
+    def test_set_items_and_empty_state(self):
+        vlist = VirtualList(lambda item: types.SimpleNamespace(item=item), item_extent=40, empty_text="Nothing")
+        vlist.set_items([])
+        self.assertEqual(vlist.control.controls[1].title.value, "Nothing")
+        vlist.set_items(self.rows[:3])
+        self.assertEqual(len(vlist.control.controls), 5)
+        self.assertFalse(vlist.has_more)
+
+
+class TestRepositoryPages(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.repo._local_transaction() as data:
+            for i in range(7):
+                data["inventory"].append({"id": f"p{i}", "name": f"Frame {i}", "sku": f"2000{i}", "category": "Frame" if i % 2 else "Other"})
+                data["customers"].append({"id": f"c{i}", "name": f"Customer {i}", "city": "Cairo" if i < 3 else "Giza"})
+                data["sales"].append({"id": f"s{i}", "customer_id": "c0", "net_amount": 100, "amount_paid": 40,
+                                      "order_date": f"2026-01-0{i + 1}", "lab_status": "Ready" if i % 2 else None})
+                data["sale_items"].append({"id": f"i{i}", "sale_id": f"s{i}", "product_id": f"p{i}", "qty": 1})
+            self.repo._append_movements(data, {"p1": 4, "p3": 2}, "purchase")
+
+    def test_inventory_pages(self):
+        items, cursor = self.repo.get_inventory_page(0, 2, category="Frame")
+        self.assertEqual([(i["id"], i["stock_qty"]) for i in items], [("p1", 4), ("p3", 2)])
+        items, cursor = self.repo.get_inventory_page(cursor, 2, category="Frame")
+        self.assertEqual(([i["id"] for i in items], cursor), (["p5"], None))
+
+    def test_sales_pages_newest_first_with_items(self):
+        sales, cursor = self.repo.get_sales_page(0, 3)
+        self.assertEqual(([s["id"] for s in sales], cursor), (["s6", "s5", "s4"], 3))
+        self.assertEqual(sales[1]["sale_items"][0]["product_id"], "p5")
+        sales, cursor = self.repo.get_sales_page(0, 3, lab_only=True)
+        self.assertEqual(([s["id"] for s in sales], cursor), (["s5", "s3", "s1"], None))
+
+    def test_customer_pages_and_totals(self):
+        self.repo.rebuild_customer_stats()  # the sales above were written around the repository
+        customers, cursor = self.repo.get_customers_page(0, 2, search="giza")
+        self.assertEqual(([c["id"] for c in customers], cursor), (["c3", "c4"], 2))
+        totals = self.repo.get_customer_stats(["c0", "c1"])
+        self.assertEqual((totals["c0"]["order_count"], totals["c0"]["total_net"], totals["c0"]["balance_due"]),
+                         (7, 700.0, 420.0))
+        self.assertEqual(totals["c1"]["order_count"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
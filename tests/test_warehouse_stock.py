@@ -0,0 +1,148 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from app.core.inventory_service import InventoryService
+from app.database import db_manager
+from app.database.models import Base, Product, Warehouse, StockMovement, StockBalance
+
+from local_repo import LocalRepositoryTestCase
+
+
+class TestSqlAlchemyWarehouseStock(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = db_manager.get_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'pos.db')}")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session() as s:
+            self.showroom, self.store = Warehouse(name="Showroom"), Warehouse(name="Back store")
+            self.frame, self.case = Product(name="Frame", sku="20001"), Product(name="Case", sku="40001")
+            s.add_all([self.showroom, self.store, self.frame, self.case])
+            s.flush()
+            # Ledger written before the balances existed
+            s.add_all([
+                StockMovement(product_id=self.frame.id, warehouse_id=self.showroom.id, qty=3, type="purchase"),
+                StockMovement(product_id=self.frame.id, warehouse_id=self.store.id, qty=10, type="purchase"),
+                StockMovement(product_id=self.case.id, warehouse_id=None, qty=4, type="purchase"),
+            ])
+            s.commit()
+            self.ids = (self.showroom.id, self.store.id, self.frame.id, self.case.id)
+
+    def tearDown(self):
+        self.engine.dispose()
+        db_manager._engines = {k: v for k, v in db_manager._engines.items() if v is not self.engine}
+        self.tmp_dir.cleanup()
+
+    def assert_balances_match_ledger(self, s):
+        ledger = dict(((p, w or db_manager.UNASSIGNED_WAREHOUSE), q) for p, w, q in
+                      s.query(StockMovement.product_id, StockMovement.warehouse_id, func.sum(StockMovement.qty))
+                      .group_by(StockMovement.product_id, StockMovement.warehouse_id))
+        balances = {(b.product_id, b.warehouse_id): b.qty for b in s.query(StockBalance) if b.qty}
+        self.assertEqual(balances, {k: v for k, v in ledger.items() if v})
+
+    def test_balances_are_backfilled_then_kept_by_triggers(self):
+        showroom, store, frame, case = self.ids
+        with self.Session() as s:
+            self.assertEqual(InventoryService.get_stock_by_warehouse(frame, s), {showroom: 3, store: 10})
+            # Warehouse-less movements belong to the first warehouse, as on the other backends
+            self.assertEqual(InventoryService.get_stock_by_warehouse(case, s), {showroom: 4})
+            s.add(StockMovement(product_id=case, qty=2, type="purchase"))
+            s.flush()
+            self.assertEqual(InventoryService.get_stock_by_warehouse(case, s), {showroom: 6})
+
+            move = StockMovement(product_id=frame, warehouse_id=showroom, qty=-1, type="sale")
+            s.add(move)
+            s.flush()
+            move.warehouse_id = store
+            s.flush()
+            s.query(StockMovement).filter_by(product_id=case).delete()
+            s.commit()
+            self.assertEqual(InventoryService.get_stock_by_warehouse(frame, s), {showroom: 3, store: 9})
+            self.assert_balances_match_ledger(s)
+
+    def test_transfer_writes_paired_movements(self):
+        showroom, store, frame, _ = self.ids
+        with self.Session() as s:
+            self.assertEqual(InventoryService.transfer_stock(frame, store, showroom, 4, session=s), [])
+            s.commit()
+            self.assertEqual(InventoryService.get_stock_by_warehouse(frame, s), {showroom: 7, store: 6})
+            self.assertEqual(InventoryService.get_available_stock(frame, s), 13)
+
+            shortfalls = InventoryService.transfer_stock(frame, showroom, store, 8, session=s)
+            self.assertEqual(shortfalls, [{"product_id": frame, "requested": 8, "available": 7}])
+            s.commit()
+            self.assertEqual(s.query(StockMovement).filter_by(type="transfer").count(), 2)
+            self.assert_balances_match_ledger(s)
+
+        with self.assertRaises(ValueError):
+            InventoryService.transfer_stock(frame, store, store, 1)
+
+    def test_warehouse_inventory(self):
+        showroom, store, frame, case = self.ids
+        with self.Session() as s:
+            rows = InventoryService.get_warehouse_inventory(store, session=s)
+            self.assertEqual([(p.id, qty) for p, qty in rows], [(frame, 10)])
+            rows = InventoryService.get_warehouse_inventory(store, in_stock_only=False, session=s)
+            self.assertEqual(sorted((p.id, qty) for p, qty in rows), sorted([(frame, 10), (case, 0)]))
+
+    def test_sale_takes_what_the_default_warehouse_lacks_from_other_locations(self):
+        showroom, store, frame, _ = self.ids
+        with self.Session() as s:
+            self.assertEqual(InventoryService.reserve_and_deduct([{"product_id": frame, "qty": 5}], session=s), [])
+            s.commit()
+            self.assertEqual(InventoryService.get_stock_by_warehouse(frame, s), {store: 8})
+            self.assert_balances_match_ledger(s)
+
+
+class TestRepositoryWarehouseStock(LocalRepositoryTestCase):
+    def setUp(self):
+        super().setUp()
+
+        # A file from before balances: movements without warehouse_id
+        data = self.repo._read_local()
+        data["inventory"].append({"id": "f1", "name": "Frame", "sku": "20001", "category": "Frame"})
+        data["stock_movements"] += [
+            {"id": "m1", "product_id": "f1", "qty": 5, "type": "purchase"},
+            {"id": "m2", "product_id": "f1", "qty": -1, "type": "sale"},
+        ]
+        data["warehouses"].append({"id": "2", "name": "Back store"})
+        self.repo._write_local(data)
+
+    def test_legacy_movements_count_at_the_default_warehouse(self):
+        self.assertEqual(self.repo.get_stock_by_warehouse("f1"), {"1": 4})
+        self.assertEqual(self.repo.get_product_stock("f1"), 4)
+
+    def test_transfer_and_warehouse_inventory(self):
+        self.assertEqual(self.repo.transfer_stock("f1", "1", "2", 3), [])
+        self.assertEqual(self.repo.get_stock_by_warehouse("f1"), {"1": 1, "2": 3})
+        self.assertEqual(self.repo.get_product_stock("f1"), 4)
+        movements = self.repo._read_local()["stock_movements"]
+        self.assertEqual([(m["warehouse_id"], m["qty"]) for m in movements if m["type"] == "transfer"],
+                         [("1", -3), ("2", 3)])
+
+        self.assertEqual(self.repo.transfer_stock("f1", "1", "2", 2),
+                         [{"product_id": "f1", "requested": 2, "available": 1}])
+        self.assertEqual([i["stock_qty"] for i in self.repo.get_inventory(warehouse_id="2")], [3])
+
+        self.repo.reserve_and_deduct([{"product_id": "f1", "qty": 1}])
+        self.assertEqual(self.repo.get_inventory(warehouse_id="1"), [])
+
+    def test_sale_takes_what_the_default_warehouse_lacks_from_other_locations(self):
+        self.assertEqual(self.repo.transfer_stock("f1", "1", "2", 4), [])
+        self.repo.add_sale({}, [{"product_id": "f1", "qty": 2}])
+        self.assertEqual(self.repo.get_stock_by_warehouse("f1"), {"2": 2})
+
+        self.repo.transfer_stock("f1", "2", "1", 1)
+        self.assertEqual(self.repo.reserve_and_deduct([{"product_id": "f1", "qty": 2}], ref_no="X1"), [])
+        self.assertEqual(self.repo.get_stock_by_warehouse("f1"), {})
+        movements = self.repo._read_local()["stock_movements"]
+        self.assertEqual([(m["warehouse_id"], m["qty"]) for m in movements if m.get("ref_no") == "X1"],
+                         [("1", -1), ("2", -1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
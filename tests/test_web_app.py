@@ -0,0 +1,328 @@
+import os
+import re
+import gzip
+import datetime
+import tempfile
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+
+from sqlalchemy import event
+
+import web_app
+from app.core.permissions import seed_permissions, seed_roles_and_bindings
+from app.database.db_manager import get_engine
+from app.database.models import (
+    Base, User, Product, StockMovement, Customer, Sale, SaleItem, OrderExamination, Warehouse
+)
+
+
+class WebAppTestCase(unittest.TestCase):
+    """Runs the Flask bridge against a throwaway SQLite file with an admin logged in."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'pos.db')}")
+        Base.metadata.create_all(self.engine)
+
+        self._old_engine = web_app.engine
+        web_app.engine = self.engine
+        web_app.SessionLocal.configure(bind=self.engine)
+
+        with web_app.SessionLocal() as s:
+            s.add(User(username="admin", password_hash="x", full_name="Admin"))
+            s.commit()
+            seed_permissions(s)
+            seed_roles_and_bindings(s)
+            self.admin_id = s.query(User).filter_by(username="admin").one().id
+            self.seed(s)
+            s.commit()
+
+        web_app.app.config["TESTING"] = True
+        self.client = web_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["user_id"] = self.admin_id
+
+    def tearDown(self):
+        web_app.engine = self._old_engine
+        web_app.SessionLocal.configure(bind=self._old_engine)
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def seed(self, session):
+        """Hook for subclasses to add data."""
+
+    @contextmanager
+    def count_queries(self):
+        stats = {"queries": 0, "checkouts": 0}
+
+        def on_execute(*args):
+            stats["queries"] += 1
+
+        def on_checkout(*args):
+            stats["checkouts"] += 1
+
+        event.listen(self.engine, "before_cursor_execute", on_execute)
+        event.listen(self.engine.pool, "checkout", on_checkout)
+        try:
+            yield stats
+        finally:
+            event.remove(self.engine, "before_cursor_execute", on_execute)
+            event.remove(self.engine.pool, "checkout", on_checkout)
+
+
+class TestRequestScopedSession(WebAppTestCase):
+    def test_page_render_uses_one_connection(self):
+        # Warm the compiled permission map into the cookie session
+        self.client.get("/")
+        with self.count_queries() as stats:
+            response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stats["checkouts"], 1)
+        # The template checks several permissions; none of them queries the database
+        self.assertLessEqual(stats["queries"], 3)
+
+    def test_session_is_closed_after_request(self):
+        with web_app.app.test_request_context("/"):
+            db_session = web_app.get_db()
+            self.assertIs(web_app.get_db(), db_session)
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+    def test_permission_map_recompiled_after_version_bump(self):
+        self.client.get("/")
+        from app.core.permissions import bump_permissions_version
+        with web_app.SessionLocal() as s:
+            bump_permissions_version(s)
+            s.commit()
+        with self.client.session_transaction() as sess:
+            sess["permissions"] = {}
+        response = self.client.get("/inventory")
+        self.assertEqual(response.status_code, 200)
+
+
+class TestListRoutesQueryCount(WebAppTestCase):
+    """Each page's query count must not grow with the number of rows it renders."""
+
+    ROWS = 12
+
+    def seed(self, session):
+        customer = Customer(name="Mona", phone="0100")
+        session.add(customer)
+        for i in range(self.ROWS):
+            product = Product(name=f"Frame {i}", sku=f"2{i:04d}", category="Frame")
+            session.add(product)
+            session.flush()
+            session.add(StockMovement(product_id=product.id, qty=5, type="purchase"))
+            session.add(StockMovement(product_id=product.id, qty=-1, type="sale"))
+            sale = Sale(invoice_no=f"{i + 1:06d}", customer_id=customer.id, total_amount=100,
+                        net_amount=100, payment_method="Cash")
+            session.add(sale)
+            session.flush()
+            session.add(SaleItem(sale_id=sale.id, product_id=product.id, qty=1, unit_price=100, total_price=100))
+            session.add(OrderExamination(sale_id=sale.id, exam_type="Distance"))
+        self.customer_id = customer.id
+
+    def assert_bounded(self, url, max_queries):
+        self.client.get(url)  # warm the permission map
+        with self.count_queries() as stats:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(stats["queries"], max_queries, f"{url} ran {stats['queries']} queries")
+        return response
+
+    def test_inventory(self):
+        response = self.assert_bounded("/inventory", 4)
+        self.assertIn("Frame 11", response.get_data(as_text=True))
+
+    def test_lab(self):
+        response = self.assert_bounded("/lab", 5)
+        self.assertIn("Mona", response.get_data(as_text=True))
+
+    def test_sales(self):
+        response = self.assert_bounded("/sales?q=Mona", 6)
+        self.assertIn("Frame 3", response.get_data(as_text=True))
+
+    def test_customer_detail(self):
+        response = self.assert_bounded(f"/customer/{self.customer_id}", 7)
+        self.assertIn("Frame 7", response.get_data(as_text=True))
+
+
+
+class TestPagination(WebAppTestCase):
+    def seed(self, session):
+        same_time = datetime.datetime(2026, 1, 1, 10, 0)
+        customer = Customer(name="Walk-in")
+        session.add(customer)
+        session.flush()
+        for i in range(7):
+            session.add(Customer(name=f"Customer {i:02d}", phone=f"010{i}"))
+            # Identical timestamps: the id tie-breaker must keep pages disjoint
+            session.add(Sale(invoice_no=f"{i + 1:06d}", customer_id=customer.id, total_amount=1, net_amount=1,
+                             payment_method="Cash", order_date=same_time))
+
+    def walk(self, url, pattern):
+        seen = []
+        with mock.patch.object(web_app, "PAGE_SIZE", 3):
+            while url:
+                html = self.client.get(url).get_data(as_text=True)
+                seen += re.findall(pattern, html)
+                match = re.search(r'href="([^"]*after=[^"]*)"', html)
+                url = match.group(1).replace("&amp;", "&") if match else None
+        return seen
+
+    def test_customers_walk_every_row_once(self):
+        names = self.walk("/customers?q=Customer", r"Customer \d\d")
+        self.assertEqual(names, [f"Customer {i:02d}" for i in range(7)])
+
+    def test_lab_pages_with_tied_timestamps(self):
+        invoices = self.walk("/lab", r"فاتورة رقم (\d{6})")
+        self.assertEqual(sorted(invoices), [f"{i:06d}" for i in range(1, 8)])
+        self.assertEqual(len(invoices), 7)
+
+    def test_bad_cursor_is_rejected(self):
+        self.assertEqual(self.client.get("/customers?after=not-a-cursor").status_code, 400)
+
+    def test_csv_export_is_streamed(self):
+        response = self.client.get("/customers/export.csv?q=Customer")
+        self.assertTrue(response.is_streamed)
+        lines = response.get_data(as_text=True).strip().splitlines()
+        self.assertEqual(lines[0], "ID,Name,Phone,Phone 2,City,Email")
+        self.assertEqual(len(lines), 8)
+
+
+
+class TestJsonApi(WebAppTestCase):
+    def seed(self, session):
+        product = Product(name="Ray Frame", sku="20001", category="Frame", sale_price=500)
+        session.add(product)
+        session.flush()
+        session.add(StockMovement(product_id=product.id, qty=4, type="purchase"))
+        self.product_id = product.id
+
+    def test_inventory_json(self):
+        response = self.client.get("/api/inventory")
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["items"][0]["stock"], 4)
+        self.assertIsNone(body["next"])
+        self.assertTrue(response.headers["ETag"].startswith('W/"'))
+
+    def test_matching_etag_returns_304_without_running_the_query(self):
+        etag = self.client.get("/api/inventory").headers["ETag"]
+        with self.count_queries() as stats:
+            response = self.client.get("/api/inventory", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b"")
+        self.assertLessEqual(stats["queries"], 3)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get("/api/inventory").headers["ETag"]
+        with web_app.SessionLocal() as s:
+            s.add(StockMovement(product_id=self.product_id, qty=-1, type="sale"))
+            s.commit()
+        response = self.client.get("/api/inventory", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["items"][0]["stock"], 3)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        # Unrelated tables don't invalidate it
+        etag = response.headers["ETag"]
+        with web_app.SessionLocal() as s:
+            s.add(Customer(name="Someone"))
+            s.commit()
+        self.assertEqual(self.client.get("/api/inventory", headers={"If-None-Match": etag}).status_code, 304)
+
+    def test_etag_follows_the_utc_day_the_queries_use(self):
+        with mock.patch.object(web_app, "utc_today", return_value=datetime.date(2026, 3, 1)):
+            etag = self.client.get("/api/sales").headers["ETag"]
+        with mock.patch.object(web_app, "utc_today", return_value=datetime.date(2026, 3, 2)):
+            response = self.client.get("/api/sales", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_requires_login_and_permission(self):
+        with self.client.session_transaction() as sess:
+            sess.clear()
+        self.assertEqual(self.client.get("/api/customers").status_code, 401)
+
+
+class TestWarehouseFilter(WebAppTestCase):
+    def seed(self, session):
+        showroom, store = Warehouse(name="Showroom"), Warehouse(name="Back store")
+        on_show = Product(name="Display Frame", sku="20001", category="Frame")
+        in_store = Product(name="Boxed Frame", sku="20002", category="Frame")
+        session.add_all([showroom, store, on_show, in_store])
+        session.flush()
+        session.add_all([
+            StockMovement(product_id=on_show.id, warehouse_id=showroom.id, qty=2, type="purchase"),
+            StockMovement(product_id=in_store.id, warehouse_id=store.id, qty=6, type="purchase"),
+        ])
+        self.showroom_id = showroom.id
+
+    def test_inventory_for_one_location(self):
+        html = self.client.get(f"/inventory?warehouse={self.showroom_id}").get_data(as_text=True)
+        self.assertIn("Display Frame", html)
+        self.assertNotIn("Boxed Frame", html)
+        self.assertIn("Back store", html)  # location picker
+
+        items = self.client.get(f"/api/inventory?warehouse={self.showroom_id}").get_json()["items"]
+        self.assertEqual([(i["name"], i["stock"]) for i in items], [("Display Frame", 2)])
+
+
+class TestCompressionAndCaching(WebAppTestCase):
+    def seed(self, session):
+        for i in range(30):
+            session.add(Product(name=f"Frame {i}", sku=f"2{i:04d}", category="Frame"))
+
+    def test_html_is_gzipped_when_accepted(self):
+        plain = self.client.get("/inventory")
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+
+        packed = self.client.get("/inventory", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(packed.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(packed.get_data()), plain.get_data())
+        self.assertLess(int(packed.headers["Content-Length"]), len(plain.get_data()))
+
+    def test_json_is_gzipped_and_keeps_etag(self):
+        response = self.client.get("/api/inventory", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        etag = response.headers["ETag"]
+        again = self.client.get("/api/inventory", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertNotIn("Content-Encoding", again.headers)
+
+    def test_hashed_static_urls_are_immutable(self):
+        html = self.client.get("/").get_data(as_text=True)
+        url = re.search(r'rel="manifest" href="([^"]+)"', html).group(1)
+        self.assertIn("?v=", url)
+        response = self.client.get(url)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+        response.close()
+
+        worker = self.client.get("/sw.js")
+        self.assertIn("no-cache", worker.headers["Cache-Control"])
+        worker.close()
+
+    def test_uploads_are_private_and_conditional(self):
+        upload_dir = os.path.join(web_app.app.root_path, "uploads")
+        if not os.path.isdir(upload_dir):
+            os.makedirs(upload_dir)
+            self.addCleanup(os.rmdir, upload_dir)
+        path = os.path.join(upload_dir, "_test_prescription.txt")
+        with open(path, "w") as f:
+            f.write("scan")
+        self.addCleanup(os.remove, path)
+
+        response = self.client.get("/uploads/_test_prescription.txt")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("private", response.headers["Cache-Control"])
+        etag = response.headers["ETag"]
+        response.close()
+        again = self.client.get("/uploads/_test_prescription.txt", headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,24 +1,71 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory
+from flask import (
+    Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, g,
+    abort, Response, stream_with_context, jsonify
+)
 import datetime
 import os
-from app.database.db_manager import get_engine, get_session
-from app.database.models import User, Product, Sale, Customer, StockMovement, OrderExamination, Prescription
+import json
+import gzip
+import hashlib
+import io
+import csv
+from app.database.db_manager import get_engine, get_table_versions
+from app.database.models import User, Product, Sale, SaleItem, Customer, StockMovement, OrderExamination, Prescription, Warehouse
 from app.core.auth import authenticate_user
-from app.core.permissions import has_permission
+from app.core.permissions import compile_permissions, check_permission, get_permissions_version
+from app.core.inventory_service import InventoryService
+from app.core.pagination import keyset_page
 from sqlalchemy import func, not_
+from sqlalchemy.orm import sessionmaker, joinedload, selectinload, contains_eager
 from functools import wraps
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
 # Use a fixed secret key if we want sessions to persist across restarts
 # but for a simple bridge, urandom is fine.
 app.secret_key = os.urandom(24)
 
 # Database setup
-engine = get_engine()
+engine = get_engine(profile='server')
+SessionLocal = sessionmaker(bind=engine)
+
+def get_db():
+    """
+    The request's database session, opened on first use.
+
+    Every helper in a request (permission checks, the route, template lookups)
+    shares it, so a page render holds a single pooled connection.
+    """
+    if 'db' not in g:
+        g.db = SessionLocal()
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exc):
+    db_session = g.pop('db', None)
+    if db_session is not None:
+        if exc is not None:
+            db_session.rollback()
+        db_session.close()
+
+# Prescription images never change once uploaded; let the browser keep them a
+# week and revalidate with ETag/Last-Modified after that. Private: patient data.
+UPLOAD_MAX_AGE = 7 * 24 * 3600
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory('uploads', filename)
+    response = send_from_directory('uploads', filename, max_age=UPLOAD_MAX_AGE, conditional=True)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+def utc_today():
+    """The day "today" views cover: order dates are stored in UTC."""
+    return datetime.datetime.utcnow().date()
 
 def login_required(f):
     @wraps(f)
@@ -28,6 +75,27 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def load_permissions(db_session=None):
+    """
+    Return the logged-in user's compiled {code: value} map.
+
+    The map lives in the Flask session and is recompiled only when the
+    permissions version moves (an admin changed roles/grants); within a request
+    it is memoized on `g`, so template checks never touch the database.
+    """
+    if 'permissions' in g:
+        return g.permissions
+    if not session.get('user_id'):
+        return {}
+
+    db_session = db_session or get_db()
+    version = get_permissions_version(db_session)
+    if session.get('permissions_version') != version or 'permissions' not in session:
+        session['permissions'] = dict(compile_permissions(db_session, session['user_id']))
+        session['permissions_version'] = version
+    g.permissions = session['permissions']
+    return g.permissions
+
 def permission_required(permission_code):
     def decorator(f):
         @wraps(f)
@@ -35,14 +103,10 @@ def permission_required(permission_code):
             if 'user_id' not in session:
                 return redirect(url_for('login'))
             
-            db_session = get_session(engine)
-            try:
-                allowed, value = has_permission(db_session, session['user_id'], permission_code)
-                if not allowed:
-                    flash(f"ليس لديك صلاحية: {permission_code}", "danger")
-                    return redirect(url_for('dashboard'))
-            finally:
-                db_session.close()
+            allowed, value = check_permission(load_permissions(), permission_code)
+            if not allowed:
+                flash(f"ليس لديك صلاحية: {permission_code}", "danger")
+                return redirect(url_for('dashboard'))
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -51,38 +115,78 @@ def permission_required(permission_code):
 def inject_now():
     def check_perm(p):
         if not session.get('user_id'): return False
-        db_session = get_session(engine)
-        try:
-            from app.core.permissions import has_permission
-            allowed, _ = has_permission(db_session, session.get('user_id'), p)
-            return allowed
-        finally:
-            db_session.close()
+        allowed, _ = check_permission(load_permissions(), p)
+        return allowed
             
     return {
         'now': datetime.datetime.utcnow(),
         'has_perm': check_perm
     }
 
+PAGE_SIZE = 50
+CSV_BATCH_SIZE = 500
+
+def paginate(query, columns, descending=False):
+    """
+    One keyset page of `query` for the current request's `?after=` cursor.
+
+    Returns (rows, pager) where pager holds `next_url` / `first_url` for the
+    page links (None when not applicable).
+    """
+    after = request.args.get('after') or None
+    try:
+        rows, next_cursor = keyset_page(query, columns, after, PAGE_SIZE, descending)
+    except ValueError:
+        abort(400)
+
+    args = {k: v for k, v in request.args.items() if k != 'after'}
+    args.update(request.view_args or {})
+    pager = {
+        'next_url': url_for(request.endpoint, **args, after=next_cursor) if next_cursor else None,
+        'first_url': url_for(request.endpoint, **args) if after else None,
+    }
+    return rows, pager
+
+def stream_csv(filename, header, rows):
+    """
+    Stream `rows` as a CSV download.
+
+    Rows are written in small chunks as the query yields them, so the first
+    bytes go out immediately and memory stays flat however large the export.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 16384:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         
-        db_session = get_session(engine)
-        try:
-            user = authenticate_user(db_session, username, password)
-            if user:
-                session['user_id'] = user.id
-                session['username'] = user.username
-                session['full_name'] = user.full_name
-                return redirect(url_for('dashboard'))
-            else:
-                flash('اسم المستخدم أو كلمة المرور غير صحيحة', 'danger')
-        finally:
-            db_session.close()
-            
+        db_session = get_db()
+        user = authenticate_user(db_session, username, password)
+        if user:
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['full_name'] = user.full_name
+            session['permissions'] = dict(compile_permissions(db_session, user.id))
+            session['permissions_version'] = get_permissions_version(db_session)
+            return redirect(url_for('dashboard'))
+        else:
+            flash('اسم المستخدم أو كلمة المرور غير صحيحة', 'danger')
+
     return render_template('login.html')
 
 @app.route('/logout')
@@ -93,103 +197,131 @@ def logout():
 @app.route('/')
 @login_required
 def dashboard():
-    db_session = get_session(engine)
-    try:
-        today = datetime.datetime.utcnow().date()
-        start_of_today = datetime.datetime.combine(today, datetime.time.min)
-        
-        # Check if user can view reports
-        can_view_reports, _ = has_permission(db_session, session['user_id'], "REPORT_DAILY_SALES")
-        
-        if not can_view_reports:
-            return render_template('dashboard.html', 
-                                   revenue=0, 
-                                   paid=0, 
-                                   count=0,
-                                   low_stock=0,
-                                   no_permission=True)
-
-        # Today's Sales Stats
-        sales_today = db_session.query(Sale).filter(Sale.order_date >= start_of_today).all()
-        total_revenue = sum(s.net_amount for s in sales_today)
-        total_paid = sum(s.amount_paid for s in sales_today)
-        sales_count = len(sales_today)
-        
+    db_session = get_db()
+    today = utc_today()
+    start_of_today = datetime.datetime.combine(today, datetime.time.min)
+    
+    # Check if user can view reports
+    can_view_reports, _ = check_permission(load_permissions(db_session), "REPORT_DAILY_SALES")
+    
+    if not can_view_reports:
         return render_template('dashboard.html', 
-                               revenue=total_revenue, 
-                               paid=total_paid, 
-                               count=sales_count,
-                               low_stock=0)
-    finally:
-        db_session.close()
+                               revenue=0, 
+                               paid=0, 
+                               count=0,
+                               low_stock=0,
+                               no_permission=True)
+
+    # Today's Sales Stats
+    sales_today = db_session.query(Sale).filter(Sale.order_date >= start_of_today).all()
+    total_revenue = sum(s.net_amount for s in sales_today)
+    total_paid = sum(s.amount_paid for s in sales_today)
+    sales_count = len(sales_today)
+    
+    return render_template('dashboard.html', 
+                           revenue=total_revenue, 
+                           paid=total_paid, 
+                           count=sales_count,
+                           low_stock=0)
+
+def _inventory_query(db_session, q='', warehouse_id=None):
+    """
+    Listed products with their stock, as (Product, stock) rows.
+
+    With `warehouse_id`, only products held at that location, with the stock
+    there (read from the per-warehouse balances, not the ledger).
+    """
+    query = db_session.query(Product)
+    
+    # Exclude Lens and ContactLens from inventory list
+    query = query.filter(not_(Product.category.in_(['Lens', 'ContactLens'])))
+
+    if q:
+        query = query.filter(
+            (Product.name.ilike(f"%{q}%")) | 
+            (Product.sku.ilike(f"%{q}%")) | 
+            (Product.barcode.ilike(f"%{q}%")) |
+            (Product.lens_type.ilike(f"%{q}%")) |
+            (Product.frame_type.ilike(f"%{q}%")) |
+            (Product.frame_color.ilike(f"%{q}%"))
+        )
+    
+    if warehouse_id:
+        stock = InventoryService.warehouse_stock_subquery(db_session, warehouse_id)
+        return query.add_columns(stock.c.stock).join(stock, stock.c.product_id == Product.id)\
+            .filter(stock.c.stock != 0)
+
+    # Stock for every listed product comes from one grouped subquery
+    stock = InventoryService.stock_subquery(db_session)
+    return query.add_columns(func.coalesce(stock.c.stock, 0)).outerjoin(stock, stock.c.product_id == Product.id)
 
 @app.route('/inventory')
 @login_required
 @permission_required('VIEW_PRODUCTS')
 def inventory():
-    db_session = get_session(engine)
-    try:
-        q = request.args.get('q', '')
-        query = db_session.query(Product)
-        
-        # Exclude Lens and ContactLens from inventory list
-        query = query.filter(not_(Product.category.in_(['Lens', 'ContactLens'])))
-
-        if q:
-            query = query.filter(
-                (Product.name.ilike(f"%{q}%")) | 
-                (Product.sku.ilike(f"%{q}%")) | 
-                (Product.barcode.ilike(f"%{q}%")) |
-                (Product.lens_type.ilike(f"%{q}%")) |
-                (Product.frame_type.ilike(f"%{q}%")) |
-                (Product.frame_color.ilike(f"%{q}%"))
-            )
-        
-        products = query.all()
-        inventory_data = []
-        for p in products:
-            stock = db_session.query(func.sum(StockMovement.qty)).filter_by(product_id=p.id).scalar() or 0
-            inventory_data.append({
-                'sku': p.sku,
-                'name': p.name,
-                'sale_price': p.sale_price,
-                'stock': stock,
-                'category': p.category,
-                'lens_type': p.lens_type,
-                'frame_type': p.frame_type,
-                'frame_color': p.frame_color,
-                'barcode': p.barcode
-            })
-        return render_template('inventory.html', products=inventory_data, query=q)
-    finally:
-        db_session.close()
+    db_session = get_db()
+    q = request.args.get('q', '')
+    warehouse_id = request.args.get('warehouse', type=int)
+    rows, pager = paginate(_inventory_query(db_session, q, warehouse_id), [Product.name, Product.id])
+    warehouses = db_session.query(Warehouse.id, Warehouse.name).order_by(Warehouse.id).all()
+
+    inventory_data = []
+    for p, stock in rows:
+        inventory_data.append({
+            'sku': p.sku,
+            'name': p.name,
+            'sale_price': p.sale_price,
+            'stock': stock,
+            'category': p.category,
+            'lens_type': p.lens_type,
+            'frame_type': p.frame_type,
+            'frame_color': p.frame_color,
+            'barcode': p.barcode
+        })
+    return render_template('inventory.html', products=inventory_data, query=q, pager=pager,
+                           warehouses=warehouses, warehouse_id=warehouse_id)
+
+@app.route('/inventory/export.csv')
+@login_required
+@permission_required('VIEW_PRODUCTS')
+def inventory_export():
+    rows = _inventory_query(get_db(), request.args.get('q', ''), request.args.get('warehouse', type=int))\
+        .order_by(Product.name, Product.id)
+    return stream_csv('inventory.csv', ['SKU', 'Name', 'Category', 'Sale Price', 'Stock', 'Barcode'], (
+        [p.sku, p.name, p.category, p.sale_price, stock, p.barcode]
+        for p, stock in rows.yield_per(CSV_BATCH_SIZE)
+    ))
+
+def _lab_query(db_session, q='', status_filter=''):
+    query = db_session.query(Sale).join(Customer, isouter=True).options(
+        contains_eager(Sale.customer),
+        selectinload(Sale.examinations),
+    )
+    if q:
+        query = query.filter(
+            (Sale.invoice_no.ilike(f"%{q}%")) |
+            (Customer.name.ilike(f"%{q}%"))
+        )
+    if status_filter:
+        query = query.filter(Sale.lab_status == status_filter)
+    return query
 
 @app.route('/lab')
 @login_required
 @permission_required('VIEW_LAB')
 def lab():
-    db_session = get_session(engine)
-    try:
-        q = request.args.get('q', '')
-        status_filter = request.args.get('status', '')
-        
-        query = db_session.query(Sale).join(Customer, isouter=True)
-        if q:
-            query = query.filter(
-                (Sale.invoice_no.ilike(f"%{q}%")) |
-                (Customer.name.ilike(f"%{q}%"))
-            )
-        if status_filter:
-            query = query.filter(Sale.lab_status == status_filter)
-        
-        orders = query.order_by(Sale.order_date.desc()).limit(50).all()
-        
-        # Check edit permission
-        can_edit_lab, _ = has_permission(db_session, session['user_id'], "EDIT_LAB")
-        
-        return render_template('lab.html', orders=orders, query=q, status_filter=status_filter, can_edit=can_edit_lab)
-    finally:
-        db_session.close()
+    db_session = get_db()
+    q = request.args.get('q', '')
+    status_filter = request.args.get('status', '')
+    
+    query = _lab_query(db_session, q, status_filter)
+    orders, pager = paginate(query, [Sale.order_date, Sale.id], descending=True)
+    
+    # Check edit permission
+    can_edit_lab, _ = check_permission(load_permissions(db_session), "EDIT_LAB")
+    
+    return render_template('lab.html', orders=orders, query=q, status_filter=status_filter,
+                           can_edit=can_edit_lab, pager=pager)
 
 @app.route('/api/update_lab_status', methods=['POST'])
 @login_required
@@ -198,9 +330,9 @@ def update_lab_status():
     sale_id = request.form.get('sale_id')
     new_status = request.form.get('status')
     
-    db_session = get_session(engine)
+    db_session = get_db()
     try:
-        sale = db_session.query(Sale).get(sale_id)
+        sale = db_session.get(Sale, sale_id)
         if sale:
             sale.lab_status = new_status
             if new_status == 'Received':
@@ -213,8 +345,6 @@ def update_lab_status():
     except Exception as e:
         db_session.rollback()
         flash(f"خطأ: {str(e)}", "danger")
-    finally:
-        db_session.close()
     
     return redirect(request.referrer or url_for('lab'))
 
@@ -222,70 +352,279 @@ def update_lab_status():
 @login_required
 @permission_required('VIEW_PRESCRIPTIONS')
 def customer_detail(customer_id):
-    db_session = get_session(engine)
-    try:
-        customer = db_session.query(Customer).get(customer_id)
-        if not customer:
-            flash("العميل غير موجود", "danger")
-            return redirect(url_for('customers'))
-        
-        # Manual Prescriptions
-        rxs = db_session.query(Prescription).filter_by(customer_id=customer_id).order_by(Prescription.created_at.desc()).all()
-        
-        # POS Exams
-        sales = db_session.query(Sale).filter_by(customer_id=customer_id).order_by(Sale.order_date.desc()).all()
-        
-        return render_template('customer_detail.html', customer=customer, prescriptions=rxs, sales=sales)
-    finally:
-        db_session.close()
+    db_session = get_db()
+    customer = db_session.get(Customer, customer_id)
+    if not customer:
+        flash("العميل غير موجود", "danger")
+        return redirect(url_for('customers'))
+    
+    # Manual Prescriptions
+    rxs = db_session.query(Prescription).filter_by(customer_id=customer_id).order_by(Prescription.created_at.desc()).all()
+    
+    # POS Exams (items and exams loaded up front; the template walks both per sale)
+    sales = db_session.query(Sale).filter_by(customer_id=customer_id).options(
+        selectinload(Sale.examinations),
+        selectinload(Sale.items).joinedload(SaleItem.product),
+    ).order_by(Sale.order_date.desc()).all()
+    
+    return render_template('customer_detail.html', customer=customer, prescriptions=rxs, sales=sales)
+
+def _customers_query(db_session, q=''):
+    query = db_session.query(Customer)
+    if q:
+        query = query.filter((Customer.name.ilike(f"%{q}%")) | (Customer.phone.ilike(f"%{q}%")))
+    return query
 
 @app.route('/customers')
 @login_required
-@permission_required('VIEW_CUSTOMERS')
+@permission_required('VIEW_PRESCRIPTIONS')
 def customers():
-    db_session = get_session(engine)
-    try:
-        q = request.args.get('q', '')
-        query = db_session.query(Customer)
-        if q:
-            query = query.filter((Customer.name.ilike(f"%{q}%")) | (Customer.phone.ilike(f"%{q}%")))
-        
-        customers_list = query.order_by(Customer.name).all()
-        return render_template('customers.html', customers=customers_list, query=q)
-    finally:
-        db_session.close()
+    db_session = get_db()
+    q = request.args.get('q', '')
+    customers_list, pager = paginate(_customers_query(db_session, q), [Customer.name, Customer.id])
+    return render_template('customers.html', customers=customers_list, query=q, pager=pager)
+
+@app.route('/customers/export.csv')
+@login_required
+@permission_required('VIEW_PRESCRIPTIONS')
+def customers_export():
+    rows = _customers_query(get_db(), request.args.get('q', '')).order_by(Customer.name, Customer.id)
+    return stream_csv('customers.csv', ['ID', 'Name', 'Phone', 'Phone 2', 'City', 'Email'], (
+        [c.id, c.name, c.phone, c.phone2, c.city, c.email]
+        for c in rows.yield_per(CSV_BATCH_SIZE)
+    ))
+
+def _sales_query(db_session, q=''):
+    """Sales matching `q`, or today's sales when there is no search term."""
+    query = db_session.query(Sale).join(Customer, isouter=True)
+    if q:
+        return query.filter(
+            (Sale.invoice_no.ilike(f"%{q}%")) |
+            (Customer.name.ilike(f"%{q}%")) |
+            (Customer.phone.ilike(f"%{q}%"))
+        )
+    today = utc_today()
+    start_of_today = datetime.datetime.combine(today, datetime.time.min)
+    return query.filter(Sale.order_date >= start_of_today)
 
 @app.route('/sales')
 @login_required
 @permission_required('REPORT_DAILY_SALES')
 def sales():
-    db_session = get_session(engine)
+    db_session = get_db()
+    q = request.args.get('q', '')
+    # The template shows customer, exams and items (with product names) for every sale
+    query = _sales_query(db_session, q).options(
+        contains_eager(Sale.customer),
+        selectinload(Sale.examinations),
+        selectinload(Sale.items).joinedload(SaleItem.product),
+    )
+    sales, pager = paginate(query, [Sale.order_date, Sale.id], descending=True)
+    
+    return render_template('sales.html', sales=sales, query=q, pager=pager)
+
+@app.route('/sales/export.csv')
+@login_required
+@permission_required('REPORT_DAILY_SALES')
+def sales_export():
+    query = _sales_query(get_db(), request.args.get('q', '')).with_entities(
+        Sale.invoice_no, Sale.order_date, Customer.name, Customer.phone,
+        Sale.net_amount, Sale.amount_paid, Sale.lab_status
+    ).order_by(Sale.order_date.desc(), Sale.id.desc())
+    return stream_csv('sales.csv', ['Invoice', 'Date', 'Customer', 'Phone', 'Net', 'Paid', 'Lab Status'], (
+        list(row) for row in query.yield_per(CSV_BATCH_SIZE)
+    ))
+
+# JSON API (read-only, for the PWA)
+# Responses carry a weak ETag derived from the version counters of the tables
+# they read, so an unchanged list is revalidated with a bodiless 304.
+
+def api_permission_required(permission_code):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if 'user_id' not in session:
+                return jsonify(error="login required"), 401
+            allowed, _ = check_permission(load_permissions(), permission_code)
+            if not allowed:
+                return jsonify(error=f"missing permission: {permission_code}"), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def conditional_json(tables, build):
+    """
+    Return build()'s payload as JSON unless the client's copy is still current.
+
+    The ETag covers the URL, the date (for "today" views) and the version
+    counters of `tables`; build() only runs when it does not match.
+    """
+    versions = get_table_versions(get_db(), tables)
+    source = json.dumps([request.full_path, utc_today().isoformat(), versions])
+    etag = hashlib.sha1(source.encode()).hexdigest()[:24]
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def api_page(query, columns, descending=False):
     try:
-        q = request.args.get('q', '')
-        if q:
-            sales = db_session.query(Sale).join(Customer, isouter=True).filter(
-                (Sale.invoice_no.ilike(f"%{q}%")) |
-                (Customer.name.ilike(f"%{q}%")) |
-                (Customer.phone.ilike(f"%{q}%"))
-            ).order_by(Sale.order_date.desc()).limit(50).all()
-        else:
-            today = datetime.datetime.utcnow().date()
-            start_of_today = datetime.datetime.combine(today, datetime.time.min)
-            sales = db_session.query(Sale).join(Customer, isouter=True).filter(Sale.order_date >= start_of_today).order_by(Sale.order_date.desc()).all()
-        
-        return render_template('sales.html', sales=sales, query=q)
-    finally:
-        db_session.close()
+        return keyset_page(query, columns, request.args.get('after') or None, PAGE_SIZE, descending)
+    except ValueError:
+        abort(400)
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+def _customer_json(c):
+    if c is None:
+        return None
+    return {'id': c.id, 'name': c.name, 'phone': c.phone, 'phone2': c.phone2, 'city': c.city, 'email': c.email}
+
+def _exam_json(ex):
+    return {
+        'exam_type': ex.exam_type,
+        'sphere_od': ex.sphere_od, 'cylinder_od': ex.cylinder_od, 'axis_od': ex.axis_od,
+        'sphere_os': ex.sphere_os, 'cylinder_os': ex.cylinder_os, 'axis_os': ex.axis_os,
+        'ipd': ex.ipd, 'lens_info': ex.lens_info, 'frame_info': ex.frame_info, 'frame_color': ex.frame_color,
+    }
+
+def _sale_json(s):
+    return {
+        'id': s.id,
+        'invoice_no': s.invoice_no,
+        'order_date': _iso(s.order_date),
+        'delivery_date': _iso(s.delivery_date),
+        'net_amount': s.net_amount,
+        'amount_paid': s.amount_paid,
+        'lab_status': s.lab_status,
+        'customer': _customer_json(s.customer),
+        'examinations': [_exam_json(ex) for ex in s.examinations],
+    }
+
+@app.route('/api/inventory')
+@api_permission_required('VIEW_PRODUCTS')
+def api_inventory():
+    def build():
+        query = _inventory_query(get_db(), request.args.get('q', ''), request.args.get('warehouse', type=int))
+        rows, next_cursor = api_page(query, [Product.name, Product.id])
+        return {'items': [{
+            'id': p.id, 'sku': p.sku, 'name': p.name, 'category': p.category,
+            'sale_price': p.sale_price, 'stock': stock, 'barcode': p.barcode,
+            'lens_type': p.lens_type, 'frame_type': p.frame_type, 'frame_color': p.frame_color,
+        } for p, stock in rows], 'next': next_cursor}
+    return conditional_json(('products', 'stock_movements'), build)
+
+@app.route('/api/lab')
+@api_permission_required('VIEW_LAB')
+def api_lab():
+    def build():
+        query = _lab_query(get_db(), request.args.get('q', ''), request.args.get('status', ''))
+        rows, next_cursor = api_page(query, [Sale.order_date, Sale.id], descending=True)
+        return {'items': [_sale_json(s) for s in rows], 'next': next_cursor}
+    return conditional_json(('sales', 'customers', 'order_examinations'), build)
+
+@app.route('/api/sales')
+@api_permission_required('REPORT_DAILY_SALES')
+def api_sales():
+    def build():
+        query = _sales_query(get_db(), request.args.get('q', '')).options(
+            contains_eager(Sale.customer),
+            selectinload(Sale.examinations),
+            selectinload(Sale.items).joinedload(SaleItem.product),
+        )
+        rows, next_cursor = api_page(query, [Sale.order_date, Sale.id], descending=True)
+        items = []
+        for s in rows:
+            data = _sale_json(s)
+            data['items'] = [{'product_id': i.product_id, 'name': i.product.name if i.product else None,
+                              'qty': i.qty, 'total_price': i.total_price} for i in s.items]
+            items.append(data)
+        return {'items': items, 'next': next_cursor}
+    return conditional_json(('sales', 'customers', 'order_examinations', 'sale_items', 'products'), build)
+
+@app.route('/api/customers')
+@api_permission_required('VIEW_PRESCRIPTIONS')
+def api_customers():
+    def build():
+        rows, next_cursor = api_page(_customers_query(get_db(), request.args.get('q', '')), [Customer.name, Customer.id])
+        return {'items': [_customer_json(c) for c in rows], 'next': next_cursor}
+    return conditional_json(('customers',), build)
+
+# Static assets & response compression
+# Templates link static files through asset_url(), which appends a hash of the
+# file's content; such URLs can be cached forever because any change to the
+# file produces a new URL.
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIN_SIZE = 500
+COMPRESSIBLE_TYPES = ('text/html', 'application/json', 'text/css', 'application/javascript', 'text/javascript')
+
+_asset_hashes = {}
+
+@app.template_global()
+def asset_url(filename):
+    path = os.path.join(app.static_folder, filename)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _asset_hashes.get(filename)
+    if not cached or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = (mtime, hashlib.sha1(f.read()).hexdigest()[:12])
+        _asset_hashes[filename] = cached
+    return url_for('static', filename=filename, v=cached[1])
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+@app.after_request
+def compress_and_cache(response):
+    if request.endpoint == 'static' and request.args.get('v'):
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = _negotiate_encoding()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 # PWA Routes
 @app.route('/manifest.json')
 def manifest():
+    # Kept for installed PWAs; pages link the content-hashed URL instead
     return app.send_static_file('manifest.json')
 
 @app.route('/sw.js')
 def service_worker():
-    return app.send_static_file('sw.js')
+    # Must stay unversioned and always revalidated, or clients never see a new worker
+    response = app.send_static_file('sw.js')
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = 0
+    return response
 
 if __name__ == '__main__':
+    from app.database.migrations import run_migrations
+    run_migrations(engine)
     app.run(host='0.0.0.0', port=5000, debug=False)
 